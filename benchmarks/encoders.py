@@ -0,0 +1,257 @@
+"""
+Benchmark: circle encoder backends, presets and thread counts
+
+Generates synthetic test clips with ffmpeg (test pattern video and a sine
+tone; several resolutions, aspect ratios, frame rates and durations, with
+and without audio) and encodes each one with every combination of backend,
+x264 preset and thread count from utils/encoders.py. Every encode runs in a
+fresh worker process so the numbers do not leak between runs:
+
+- wall time,
+- CPU time (user + system, including the ffmpeg processes the worker runs),
+- peak RSS of the worker or any of its ffmpeg processes,
+- output size.
+
+Results are printed and written as a Markdown report (plus JSON with the raw
+numbers) that compares every configuration with the production default.
+Linux only (peak RSS and CPU time come from wait4).
+
+Usage:
+    python -m benchmarks.encoders [--quick] [--backends moviepy,ffmpeg]
+        [--presets ultrafast,veryfast] [--threads 1,4] [--repeat N]
+        [--workdir DIR] [--report PATH]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from moviepy.config import get_setting
+
+from utils.encoders import ENCODERS, encode
+
+
+class ClipSpec:
+    """Synthetic test clip"""
+
+    def __init__(self, width, height, fps, duration, audio):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.duration = duration
+        self.audio = audio
+
+    @property
+    def name(self):
+        shape = "square" if self.width == self.height else "portrait" if self.height > self.width else "landscape"
+        audio = "audio" if self.audio else "silent"
+        return f"{self.width}x{self.height}-{shape}-{self.fps}fps-{self.duration}s-{audio}"
+
+
+CLIPS = [
+    ClipSpec(640, 360, 30, 15, True),
+    ClipSpec(1280, 720, 30, 30, True),
+    ClipSpec(1920, 1080, 30, 60, True),
+    ClipSpec(1080, 1920, 60, 30, True),
+    ClipSpec(720, 720, 30, 30, False),
+    ClipSpec(480, 854, 24, 60, False),
+]
+
+# Smallest clips only, for a quick look
+QUICK_CLIPS = CLIPS[:2]
+
+# Production defaults, the baseline of the comparison
+BASELINE = ("moviepy", "ultrafast", 4)
+
+
+def generate_clip(spec, directory):
+    """
+    Create a test clip unless it already exists
+
+    Args:
+        spec (ClipSpec): Clip parameters
+        directory (str): Cache directory
+
+    Returns:
+        str: Path of the clip
+    """
+    path = os.path.join(directory, f"{spec.name}.mp4")
+    if os.path.exists(path):
+        return path
+
+    command = [
+        get_setting("FFMPEG_BINARY"), "-nostdin", "-y", "-loglevel", "error",
+        # testsrc2 has motion and detail, so encoders cannot cheat on it
+        "-f", "lavfi", "-i", f"testsrc2=size={spec.width}x{spec.height}:rate={spec.fps}:duration={spec.duration}",
+    ]
+    if spec.audio:
+        command += ["-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={spec.duration}",
+                    "-c:a", "aac", "-b:a", "128k"]
+    command += ["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-shortest", path + ".part"]
+    subprocess.run(command, check=True)
+    os.replace(path + ".part", path)
+    return path
+
+
+def run_worker(backend, preset, threads, input_file, output_file):
+    """Encode once; runs in the worker process"""
+    encode(backend, input_file, output_file, size=640, preset=preset, threads=threads,
+           temp_audiofile=output_file + ".m4a")
+
+
+def measure(backend, preset, threads, input_file, output_file):
+    """
+    Encode in a fresh worker process and measure it
+
+    Returns:
+        dict: wall, cpu (seconds), peak_rss (bytes), output_size (bytes) and
+        ok
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.encoders", "--worker",
+        backend, preset, str(threads), input_file, output_file,
+    ])
+    # wait4 reports the worker together with the ffmpeg processes it reaped
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    ok = process.returncode == 0 and os.path.exists(output_file)
+    result = {
+        "wall": wall,
+        "cpu": usage.ru_utime + usage.ru_stime,
+        "peak_rss": usage.ru_maxrss * 1024,
+        "output_size": os.path.getsize(output_file) if ok else 0,
+        "ok": ok,
+    }
+    if os.path.exists(output_file):
+        os.remove(output_file)
+    return result
+
+
+def summarize(runs):
+    """Median of repeated runs"""
+    ok = [run for run in runs if run["ok"]]
+    if not ok:
+        return {"ok": False}
+    return {
+        "ok": True,
+        "wall": statistics.median(run["wall"] for run in ok),
+        "cpu": statistics.median(run["cpu"] for run in ok),
+        "peak_rss": max(run["peak_rss"] for run in ok),
+        "output_size": statistics.median(run["output_size"] for run in ok),
+    }
+
+
+def write_report(path, clips, configs, results):
+    """
+    Write the Markdown comparison report
+
+    Args:
+        path (str): Report path; raw numbers go next to it as .json
+        clips (list): ClipSpec objects
+        configs (list): (backend, preset, threads) tuples
+        results (dict): (clip name, config) -> summary
+    """
+    lines = ["# Circle encoder benchmark", ""]
+    lines.append(f"Baseline: backend `{BASELINE[0]}`, preset `{BASELINE[1]}`, {BASELINE[2]} threads. "
+                 "Ratios are relative to the baseline on the same clip (lower is better).")
+    lines.append("")
+
+    totals = {config: {"wall": [], "cpu": [], "rss": []} for config in configs}
+    for clip in clips:
+        lines += [f"## {clip.name}", "",
+                  "| backend | preset | threads | wall s | CPU s | peak RSS MB | output KB | wall x | CPU x | RSS x |",
+                  "|---|---|---:|---:|---:|---:|---:|---:|---:|---:|"]
+        base = results.get((clip.name, BASELINE), {"ok": False})
+        for config in configs:
+            r = results[(clip.name, config)]
+            if not r["ok"]:
+                lines.append(f"| {config[0]} | {config[1]} | {config[2]} | failed | | | | | | |")
+                continue
+            ratios = ["", "", ""]
+            if base["ok"]:
+                ratios = [r["wall"] / base["wall"], r["cpu"] / base["cpu"], r["peak_rss"] / base["peak_rss"]]
+                totals[config]["wall"].append(ratios[0])
+                totals[config]["cpu"].append(ratios[1])
+                totals[config]["rss"].append(ratios[2])
+                ratios = [f"{value:.2f}" for value in ratios]
+            lines.append(
+                f"| {config[0]} | {config[1]} | {config[2]} | {r['wall']:.2f} | {r['cpu']:.2f} | "
+                f"{r['peak_rss'] / 2 ** 20:.0f} | {r['output_size'] / 1024:.0f} | " + " | ".join(ratios) + " |"
+            )
+        lines.append("")
+
+    lines += ["## Summary (geometric mean of ratios over all clips)", "",
+              "| backend | preset | threads | wall x | CPU x | RSS x |", "|---|---|---:|---:|---:|---:|"]
+    for config in configs:
+        if not totals[config]["wall"]:
+            continue
+        means = [statistics.geometric_mean(totals[config][key]) for key in ("wall", "cpu", "rss")]
+        lines.append(f"| {config[0]} | {config[1]} | {config[2]} | " + " | ".join(f"{m:.2f}" for m in means) + " |")
+    lines.append("")
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    with open(os.path.splitext(path)[0] + ".json", "w", encoding="utf-8") as f:
+        json.dump([{"clip": clip, "backend": config[0], "preset": config[1], "threads": config[2], **summary}
+                   for (clip, config), summary in results.items()], f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--quick", action="store_true", help="only the two smallest clips")
+    parser.add_argument("--backends", default=",".join(ENCODERS), help="comma-separated backends")
+    parser.add_argument("--presets", default="ultrafast,veryfast,medium", help="comma-separated x264 presets")
+    parser.add_argument("--threads", default="1,2,4", help="comma-separated thread counts")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per configuration (median is reported)")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "circle-encoder-bench"),
+                        help="cache for generated clips")
+    parser.add_argument("--report", default=os.path.join(tempfile.gettempdir(), "encoder-benchmark.md"),
+                        help="Markdown report path; the JSON goes next to it")
+    parser.add_argument("--worker", nargs=5, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        backend, preset, threads, input_file, output_file = args.worker
+        run_worker(backend, preset, int(threads), input_file, output_file)
+        return
+
+    if not hasattr(os, "wait4"):
+        raise SystemExit("This benchmark needs os.wait4 (Linux)")
+
+    os.makedirs(args.workdir, exist_ok=True)
+    clips = QUICK_CLIPS if args.quick else CLIPS
+    configs = [(backend, preset, int(threads))
+               for backend in args.backends.split(",")
+               for preset in args.presets.split(",")
+               for threads in args.threads.split(",")]
+    if BASELINE not in configs:
+        configs.insert(0, BASELINE)
+
+    results = {}
+    output_file = os.path.join(args.workdir, "output.mp4")
+    for clip in clips:
+        input_file = generate_clip(clip, args.workdir)
+        print(f"\n{clip.name}")
+        for config in configs:
+            summary = summarize([measure(*config, input_file, output_file) for _ in range(args.repeat)])
+            results[(clip.name, config)] = summary
+            label = f"{config[0]:<8} {config[1]:<10} {config[2]:>2} threads"
+            if summary["ok"]:
+                print(f"  {label}   wall {summary['wall']:6.2f} s   cpu {summary['cpu']:6.2f} s   "
+                      f"rss {summary['peak_rss'] / 2 ** 20:6.0f} MB   out {summary['output_size'] / 1024:6.0f} KB")
+            else:
+                print(f"  {label}   failed")
+
+    write_report(args.report, clips, configs, results)
+    print(f"\nReport written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
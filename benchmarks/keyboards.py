@@ -0,0 +1,62 @@
+"""
+Benchmark: per-request keyboard cost, rebuilt vs prebuilt
+
+Compares building an InlineKeyboardMarkup and serializing it the way
+python-telegram-bot does for every request against the prebuilt JSON from
+utils.keyboards.
+
+Usage:
+    python -m benchmarks.keyboards [--iterations N]
+"""
+import argparse
+import json
+import timeit
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from utils.localization import get_text, Msg
+from utils.keyboards import main_menu_keyboard, share_keyboard
+
+
+def build_main_menu(lang):
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton(get_text(Msg.CREATE_CIRCLE_BUTTON, lang), callback_data="create_circle")],
+        [InlineKeyboardButton(get_text(Msg.CREATE_CIRCLE_PRANK_BUTTON, lang), callback_data="create_circle_prank")],
+    ])
+    # What RequestParameter does with a TelegramObject
+    return json.dumps(keyboard.to_dict())
+
+
+def build_share(lang, short_id):
+    keyboard = InlineKeyboardMarkup([[
+        InlineKeyboardButton(get_text(Msg.SHARE_YES, lang), callback_data=f"sy_{short_id}"),
+        InlineKeyboardButton(get_text(Msg.SHARE_NO, lang), callback_data="sn"),
+    ]])
+    return json.dumps(keyboard.to_dict())
+
+
+def measure(label, func, iterations):
+    seconds = min(timeit.repeat(func, number=iterations, repeat=5))
+    per_call_us = seconds / iterations * 1e6
+    print(f"{label:<32} {per_call_us:8.2f} us/request")
+    return per_call_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    cases = [
+        ("main menu", lambda: build_main_menu("en"), lambda: main_menu_keyboard("en")),
+        ("share (sy_<short_id>)", lambda: build_share("en", "a1b2c3"), lambda: share_keyboard("en", "a1b2c3")),
+    ]
+
+    for name, rebuilt, prebuilt in cases:
+        before = measure(f"{name}: rebuilt", rebuilt, args.iterations)
+        after = measure(f"{name}: prebuilt", prebuilt, args.iterations)
+        print(f"{name + ': saved':<32} {before - after:8.2f} us/request ({before / after:.0f}x)\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: memory and false-positive rate of the known-user filter
+
+Fills the Bloom filter of utils/known_users.py with a synthetic population
+of Telegram IDs, spread over the id range like real ones, and probes it
+with as many IDs that were never added. Reports the filter's size, the
+measured and expected false-positive rates, the time per add and lookup,
+and the memory a Python set of the same IDs takes for comparison.
+
+Usage:
+    python -m benchmarks.known_users [--users N] [--error-rate P]
+        [--probes N] [--no-set] [--report PATH]
+"""
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from utils.known_users import BloomFilter
+
+# Telegram user ids seen in practice
+ID_RANGE = (100_000_000, 7_500_000_000)
+
+
+def population(users, seed=1):
+    """Distinct even ids spread evenly over ID_RANGE"""
+    rng = random.Random(seed)
+    low, high = ID_RANGE
+    step = (high - low) // 2 // users
+    for i in range(users):
+        yield low + 2 * (i * step + rng.randrange(step))
+
+
+def probes(count, seed=2):
+    """Odd ids, so never in the population"""
+    rng = random.Random(seed)
+    low, high = ID_RANGE
+    for _ in range(count):
+        yield rng.randrange(low, high) | 1
+
+
+def set_bytes(users):
+    """Memory of a Python set holding the population"""
+    tracemalloc.start()
+    ids = set(population(users))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del ids
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=10_000_000, help="known users")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="false-positive rate the filter is sized for")
+    parser.add_argument("--probes", type=int, default=1_000_000, help="lookups of unknown users")
+    parser.add_argument("--no-set", action="store_true", help="skip measuring the Python set")
+    parser.add_argument("--report", default=os.path.join(tempfile.gettempdir(), "known-users-benchmark.md"),
+                        help="Markdown report path")
+    args = parser.parse_args()
+
+    bloom = BloomFilter(args.users, args.error_rate)
+
+    start = time.perf_counter()
+    for telegram_id in population(args.users):
+        bloom.add(telegram_id)
+    add_us = (time.perf_counter() - start) / args.users * 1e6
+
+    start = time.perf_counter()
+    false_positives = sum(1 for telegram_id in probes(args.probes) if telegram_id in bloom)
+    lookup_us = (time.perf_counter() - start) / args.probes * 1e6
+
+    added = itertools.islice(population(args.users), args.probes)
+    missed = sum(1 for telegram_id in added if telegram_id not in bloom)
+    if missed:
+        raise SystemExit(f"{missed} added ids not found")
+
+    rows = [
+        ("users", f"{args.users}"),
+        ("filter", f"{bloom.nbytes / 2 ** 20:.1f} MiB, {bloom.size} bits, {bloom.hashes} hashes"),
+        ("bytes per user", f"{bloom.nbytes / args.users:.2f}"),
+        ("false positives", f"{false_positives / args.probes:.3%} measured, {bloom.error_rate():.3%} expected"),
+        ("add", f"{add_us:.2f} us"),
+        ("lookup", f"{lookup_us:.2f} us"),
+    ]
+    if not args.no_set:
+        size = set_bytes(args.users)
+        rows.append(("Python set", f"{size / 2 ** 20:.1f} MiB ({size / bloom.nbytes:.0f}x the filter)"))
+
+    for name, value in rows:
+        print(f"{name:<16} {value}")
+
+    lines = ["# Known-user filter", "", f"Sized for a {args.error_rate:.1%} false-positive rate, "
+             f"{args.probes} lookups of unknown users.", "", "| | |", "|---|---|"]
+    lines += [f"| {name} | {value} |" for name, value in rows]
+    lines.append("")
+    with open(args.report, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    print(f"\nReport written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark: outgoing request scheduler under Telegram flood limits
+
+Simulates a broadcast to many private chats and groups while users keep
+pressing buttons. A mock Bot API enforces the documented limits (30 messages
+per second overall, 1 per second per private chat, 20 per minute per group)
+and answers 429 with retry_after when they are exceeded. The same load is
+sent once without a limiter and once through RequestScheduler.
+
+All rates are multiplied by --speedup so the simulation finishes quickly;
+reported rates and latencies are converted back to real Telegram time.
+
+Usage:
+    python -m benchmarks.rate_limiter [--chats N] [--groups N] [--speedup X]
+"""
+import argparse
+import asyncio
+import collections
+import logging
+import statistics
+import time
+
+from utils.rate_limiter import Priority, RequestScheduler
+
+
+class SimulatedFlood(Exception):
+    """429 answer of the mock; retry_after is in simulation seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Flood control exceeded, retry in {retry_after}")
+        self.retry_after = retry_after
+
+
+def flood_retry_after(exc):
+    return exc.retry_after if isinstance(exc, SimulatedFlood) else None
+
+
+class MockBotAPI:
+    """Bot API stand-in enforcing flood limits"""
+
+    def __init__(self, speedup):
+        self.speedup = speedup
+        self.sent = 0
+        self.throttled = 0
+        self._overall = collections.deque()
+        self._chats = {}
+
+    async def send(self, chat_id):
+        now = time.monotonic()
+        s = self.speedup
+
+        while self._overall and now - self._overall[0] > 1.0 / s:
+            self._overall.popleft()
+        history = self._chats.setdefault(chat_id, collections.deque())
+        window, limit = (60.0 / s, 20) if chat_id < 0 else (1.0 / s, 1)
+        while history and now - history[0] > window:
+            history.popleft()
+
+        if len(self._overall) >= 30 or len(history) >= limit:
+            self.throttled += 1
+            raise SimulatedFlood(1.0 / s)
+
+        self._overall.append(now)
+        history.append(now)
+        self.sent += 1
+        # Network round trip
+        await asyncio.sleep(0.05 / s)
+
+
+async def run(api, scheduler, chats, groups, clicks_per_second, speedup):
+    """
+    Broadcast to every chat and group while callback answers keep arriving
+
+    Returns:
+        tuple: (seconds for the broadcast, callback answer latencies, failures)
+    """
+    failures = 0
+    latencies = []
+
+    async def send(chat_id, priority):
+        nonlocal failures
+        try:
+            if scheduler is None:
+                await api.send(chat_id)
+            else:
+                await scheduler.run(lambda: api.send(chat_id), chat_id, priority, flood_retry_after)
+        except SimulatedFlood:
+            failures += 1
+
+    async def answer(user_id):
+        start = time.monotonic()
+        await send(user_id, Priority.INTERACTIVE)
+        latencies.append((time.monotonic() - start) * speedup)
+
+    start = time.monotonic()
+    broadcast = [asyncio.create_task(send(chat_id, Priority.BULK)) for chat_id in range(1, chats + 1)]
+    broadcast += [asyncio.create_task(send(-group_id, Priority.BULK))
+                  for group_id in range(1, groups + 1) for _ in range(5)]
+
+    clicks = []
+    user_id = 10 ** 6
+    while not all(task.done() for task in broadcast):
+        user_id += 1
+        clicks.append(asyncio.create_task(answer(user_id)))
+        await asyncio.sleep(1.0 / clicks_per_second / speedup)
+    elapsed = (time.monotonic() - start) * speedup
+    await asyncio.gather(*clicks)
+    return elapsed, latencies, failures
+
+
+def report(label, api, elapsed, latencies, failures):
+    rate = api.sent / elapsed if elapsed else 0
+    p95 = sorted(latencies)[max(int(len(latencies) * 0.95) - 1, 0)] if latencies else 0
+    print(f"{label}")
+    print(f"  delivered {api.sent:6d}   failed {failures:5d}   429 answers {api.throttled:6d}")
+    print(f"  throughput {rate:6.1f} msg/s   callback answer p50 "
+          f"{statistics.median(latencies) * 1000 if latencies else 0:7.1f} ms   p95 {p95 * 1000:7.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chats", type=int, default=600, help="private chats in the broadcast")
+    parser.add_argument("--groups", type=int, default=10, help="groups getting 5 messages each")
+    parser.add_argument("--clicks", type=float, default=5.0, help="callback answers per second")
+    parser.add_argument("--speedup", type=float, default=10.0, help="simulation time compression")
+    args = parser.parse_args()
+    s = args.speedup
+    # Retry warnings would drown the report
+    logging.basicConfig(level=logging.ERROR)
+
+    api = MockBotAPI(s)
+    report("without limiter", api, *await run(api, None, args.chats, args.groups, args.clicks, s))
+
+    api = MockBotAPI(s)
+    scheduler = RequestScheduler(overall_rate=30 * s, chat_rate=1 * s, group_rate=20 * s)
+    report("with RequestScheduler", api, *await run(api, scheduler, args.chats, args.groups, args.clicks, s))
+    await scheduler.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,197 @@
+"""
+Benchmark: /start latency of returning users, full check vs verified marker
+
+Runs the bot's real /start handler through ``Application.process_update``
+against a local mock of the Bot API that answers after a simulated network
+round trip, with the models in an in-memory SQLite database and Redis on a
+scratch database. Every user has picked a language and is subscribed to all
+channels.
+
+- before: each user's "verified until" marker is dropped first, so /start
+  goes through User.get_or_create, Channel.filter, one getChatMember and one
+  UserSubscription upsert per channel and user.save() before the menu,
+- after: the markers left by the first run are valid, so /start sends the
+  menu straight away.
+
+SQLite in memory is much faster than MySQL over the network, so the real
+"before" numbers are higher than printed here.
+
+Usage:
+    python -m benchmarks.start_latency [--users N] [--iterations N]
+        [--channels N] [--api-latency MS] [--db N] [--flush]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import urllib.parse
+
+TOKEN = "123:BENCH"
+
+MEMBER = {"status": "member", "user": {"id": 1, "is_bot": False, "first_name": "u"}}
+BOT_USER = {"id": 123, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+class MockBotApi:
+    """
+    Bot API stand-in answering every call after ``latency`` seconds
+
+    Args:
+        latency (float): Simulated round trip in seconds
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def result(self, method, body):
+        if method == "getMe":
+            return BOT_USER
+        if method == "getChatMember":
+            return MEMBER
+        if method == "sendMessage":
+            chat_id = int(body.get("chat_id", 1))
+            return {"message_id": 1, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}, "text": "ok"}
+        return True
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.split(b"\r\n")
+                path = lines[0].split(b" ")[1].decode()
+                length = 0
+                for line in lines[1:]:
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                # PTB posts url-encoded forms
+                raw = await reader.readexactly(length) if length else b""
+                body = dict(urllib.parse.parse_qsl(raw.decode()))
+
+                self.calls += 1
+                await asyncio.sleep(self.latency)
+                payload = json.dumps({"ok": True, "result": self.result(path.rsplit("/", 1)[-1], body)}).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: keep-alive\r\n"
+                    b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def start_update(update_id, user_id):
+    """A private /start message as the Bot API sends it"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+async def run(application, api, users, iterations, clear_markers):
+    from telegram import Update
+    from utils.user_store import user_store
+
+    timings = []
+    calls = api.calls
+    for i in range(iterations):
+        user_id = users[i % len(users)]
+        if clear_markers:
+            user_store.clear_verified(user_id)
+        update = Update.de_json(start_update(i + 1, user_id), application.bot)
+        start = time.perf_counter()
+        await application.process_update(update)
+        timings.append(time.perf_counter() - start)
+    return timings, (api.calls - calls) / iterations
+
+
+def report(label, timings, calls):
+    timings = sorted(timings)
+    p50_ms = statistics.median(timings) * 1000
+    p95_ms = timings[int(len(timings) * 0.95) - 1] * 1000
+    print(f"{label:<32} p50 {p50_ms:7.2f} ms   p95 {p95_ms:7.2f} ms   {calls:4.1f} Bot API calls")
+    return p50_ms
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100, help="returning users")
+    parser.add_argument("--iterations", type=int, default=500, help="/start commands per run")
+    parser.add_argument("--channels", type=int, default=3, help="required channels")
+    parser.add_argument("--api-latency", type=float, default=30, help="mock Bot API round trip in ms")
+    parser.add_argument("--db", type=int, default=15, help="scratch Redis database")
+    parser.add_argument("--flush", action="store_true", help="flush the Redis database even if it holds keys")
+    args = parser.parse_args()
+
+    # The bot's modules read the Redis database from the environment
+    os.environ["REDIS_DB"] = str(args.db)
+
+    from telegram.ext import Application, CommandHandler
+    from tortoise import Tortoise
+
+    from main import start
+    from models.models import Channel
+    from utils.redis_client import redis_client
+    from utils.user_store import user_store
+
+    redis_client.mark_available()
+    if redis_client.dbsize() and not args.flush:
+        raise SystemExit(f"Database {args.db} holds keys; pass --flush to overwrite it")
+    redis_client.flushdb()
+
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["models.models"]})
+    await Tortoise.generate_schemas()
+    for n in range(args.channels):
+        await Channel.create(
+            channel_id=f"-100{n}", channel_name=f"channel {n}", channel_link=f"https://t.me/c{n}", button_text="join"
+        )
+
+    users = [1_000_000 + n for n in range(args.users)]
+    for user_id in users:
+        user_store.set_language(user_id, "ru")
+
+    api = MockBotApi(args.api_latency / 1000)
+    server = await asyncio.start_server(api.handle_connection, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    application = Application.builder().token(TOKEN).base_url(f"http://127.0.0.1:{port}/bot").build()
+    application.add_handler(CommandHandler("start", start))
+    errors = []
+
+    async def record_error(update, context):
+        errors.append(context.error)
+
+    application.add_error_handler(record_error)
+
+    print(f"{args.iterations} /start of {args.users} returning users, {args.channels} channels, "
+          f"{args.api_latency:g} ms Bot API round trip\n")
+    try:
+        async with server:
+            await application.initialize()
+            # Warm the connection pool and the database like a running bot
+            await run(application, api, users, len(users), clear_markers=True)
+            before = report("full check (before)", *await run(application, api, users, args.iterations, True))
+            after = report("verified marker (after)", *await run(application, api, users, args.iterations, False))
+            await application.shutdown()
+    finally:
+        await Tortoise.close_connections()
+        redis_client.flushdb()
+
+    if errors:
+        raise SystemExit(f"{len(errors)} handler errors, first: {errors[0]!r}")
+    print(f"\np50 saved per /start: {before - after:.2f} ms ({before / after:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+"""
+Benchmark: Redis memory of per-user languages, plain keys vs bucketed hashes
+
+Fills a scratch Redis database with a synthetic population of users, once as
+``user_lang:{id}`` string keys and once in the bucketed hashes of
+utils/user_store.py, and compares ``used_memory``. User ids are spread over
+Telegram's id range like real ones; 70% of the users speak Russian. For the
+buckets it also reports how full they are against
+``hash-max-listpack-entries`` and which encoding Redis picked.
+
+The database is flushed before and after every run; the benchmark refuses
+to touch a database that holds keys unless --flush is given.
+
+Usage:
+    python -m benchmarks.user_store [--users 1000000,10000000] [--buckets N]
+        [--host H] [--port P] [--db N] [--flush] [--report PATH]
+"""
+import argparse
+import collections
+import os
+import random
+import tempfile
+import time
+
+import redis
+
+from utils.user_store import BUCKET_PREFIX, LEGACY_LANGUAGE_KEY, locate
+from config.config import USER_STORE_BUCKETS
+
+# Telegram user ids seen in practice
+ID_RANGE = (100_000_000, 7_500_000_000)
+
+LAYOUTS = ("keys", "buckets")
+
+
+def population(users, seed=1):
+    """
+    Yield synthetic users, ids spread evenly over ID_RANGE
+
+    Args:
+        users (int): Population size
+        seed (int): Random seed
+
+    Yields:
+        tuple: (user id, language)
+    """
+    rng = random.Random(seed)
+    low, high = ID_RANGE
+    step = (high - low) // users
+    for i in range(users):
+        yield low + i * step + rng.randrange(step), "ru" if rng.random() < 0.7 else "en"
+
+
+def listpack_limit(client):
+    """hash-max-listpack-entries (hash-max-ziplist-entries before Redis 7)"""
+    for name in ("hash-max-listpack-entries", "hash-max-ziplist-entries"):
+        value = client.config_get(name).get(name)
+        if value is not None:
+            return int(value)
+    return None
+
+
+def run(client, layout, users, buckets, batch=10000):
+    """
+    Fill the database with one layout and measure it
+
+    Returns:
+        dict: used_memory (bytes), keys, seconds, and for buckets the
+        fullest bucket and the encodings of a sample
+    """
+    client.flushdb()
+    base = client.info("memory")["used_memory"]
+    fill = collections.Counter()
+
+    start = time.perf_counter()
+    pipeline = client.pipeline(transaction=False)
+    for n, (user_id, language) in enumerate(population(users), 1):
+        if layout == "keys":
+            pipeline.set(LEGACY_LANGUAGE_KEY.format(user_id), language)
+        else:
+            key, field = locate(user_id, buckets)
+            pipeline.hset(key, field, language)
+            fill[key] += 1
+        if n % batch == 0:
+            pipeline.execute()
+    pipeline.execute()
+    seconds = time.perf_counter() - start
+
+    result = {
+        "used_memory": client.info("memory")["used_memory"] - base,
+        "keys": client.dbsize(),
+        "seconds": seconds,
+    }
+    if layout == "buckets":
+        sample = random.Random(2).sample(sorted(fill), min(100, len(fill)))
+        result["fullest"] = max(fill.values())
+        result["encodings"] = dict(collections.Counter(client.object("encoding", key) for key in sample))
+    client.flushdb()
+    return result
+
+
+def write_report(path, buckets, limit, results):
+    lines = ["# Per-user language storage", ""]
+    lines.append(f"Buckets: {buckets} (`{BUCKET_PREFIX}{{id % {buckets}}}`), "
+                 f"hash-max-listpack-entries: {limit}.")
+    lines += ["", "| users | layout | used MB | bytes/user | keys | fill s | fullest bucket | encodings |",
+              "|---:|---|---:|---:|---:|---:|---:|---|"]
+    for (users, layout), r in results.items():
+        encodings = ", ".join(f"{name} {count}" for name, count in r.get("encodings", {}).items())
+        lines.append(
+            f"| {users} | {layout} | {r['used_memory'] / 2 ** 20:.1f} | {r['used_memory'] / users:.1f} | "
+            f"{r['keys']} | {r['seconds']:.1f} | {r.get('fullest', '')} | {encodings} |"
+        )
+    lines.append("")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", default="1000000,10000000", help="comma-separated population sizes")
+    parser.add_argument("--buckets", type=int, default=USER_STORE_BUCKETS, help="number of buckets")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=15, help="scratch database, flushed by the benchmark")
+    parser.add_argument("--flush", action="store_true", help="flush the database even if it holds keys")
+    parser.add_argument("--report", default=os.path.join(tempfile.gettempdir(), "user-store-benchmark.md"),
+                        help="Markdown report path")
+    args = parser.parse_args()
+
+    client = redis.Redis(host=args.host, port=args.port, db=args.db, decode_responses=True)
+    if client.dbsize() and not args.flush:
+        raise SystemExit(f"Database {args.db} holds keys; pass --flush to overwrite it")
+    limit = listpack_limit(client)
+
+    results = {}
+    for users in (int(value) for value in args.users.split(",")):
+        for layout in LAYOUTS:
+            r = results[(users, layout)] = run(client, layout, users, args.buckets)
+            print(f"{users:>10} users  {layout:<8} {r['used_memory'] / 2 ** 20:8.1f} MB  "
+                  f"{r['used_memory'] / users:6.1f} B/user  {r['seconds']:6.1f} s")
+        saved = 1 - results[(users, "buckets")]["used_memory"] / results[(users, "keys")]["used_memory"]
+        fullest = results[(users, "buckets")]["fullest"]
+        print(f"{'':>10}        buckets save {saved:.0%}; fullest bucket {fullest} fields (limit {limit})")
+
+    write_report(args.report, args.buckets, limit, results)
+    print(f"\nReport written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,18 @@ DB_USER = os.getenv('DB_USER', 'root')
 DB_PASSWORD = os.getenv('DB_PASSWORD', '')
 DB_NAME = os.getenv('DB_NAME', 'telegram_bot')
 
+# Admin user IDs; a frozenset so admin checks cost no I/O
+ADMIN_IDS = frozenset(int(id) for id in os.getenv('ADMIN_IDS', '1340988413').split(',') if id.strip())
+
+# Entries kept in memory while Redis is unavailable (see utils/cache.py)
+FALLBACK_CACHE_SIZE = int(os.getenv('FALLBACK_CACHE_SIZE', '10000'))
+
+# Per-user attributes in bucketed Redis hashes (see utils/user_store.py); keep buckets
+# above users / 128 so every bucket stays listpack-encoded. Legacy reads
+# fall back to user_lang:* keys until they have been migrated.
+USER_STORE_BUCKETS = int(os.getenv('USER_STORE_BUCKETS', '131072'))
+USER_STORE_LEGACY_READS = os.getenv('USER_STORE_LEGACY_READS', '1') == '1'
+
 # Redis configuration
 REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
@@ -21,8 +33,109 @@ REDIS_DB = int(os.getenv('REDIS_DB', 0))
 REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', None)
 
 # Video processing
-MAX_VIDEO_DURATION = 60  # seconds
+MAX_VIDEO_DURATION = int(os.getenv('MAX_VIDEO_DURATION', '60'))  # seconds
 TEMP_DIRECTORY = os.getenv('TEMP_DIRECTORY', 'temp')
 
 # Ensure temp directory exists
 os.makedirs(TEMP_DIRECTORY, exist_ok=True)
+
+# Startup dependency checks (timeouts per attempt, in seconds)
+REDIS_CHECK_TIMEOUT = float(os.getenv('REDIS_CHECK_TIMEOUT', '2'))
+DB_CHECK_TIMEOUT = float(os.getenv('DB_CHECK_TIMEOUT', '10'))
+BOT_API_CHECK_TIMEOUT = float(os.getenv('BOT_API_CHECK_TIMEOUT', '10'))
+
+# Localization catalogs (<lang>.json files)
+LOCALES_DIRECTORY = os.getenv(
+    'LOCALES_DIRECTORY',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'locales')
+)
+
+# Prometheus metrics endpoint; set METRICS_PORT=0 to disable
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# Logging: JSON lines by default; debug records are sampled and rate limited
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_JSON = os.getenv('LOG_JSON', '1') == '1'
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '1.0'))
+LOG_DEBUG_RATE_LIMIT = int(os.getenv('LOG_DEBUG_RATE_LIMIT', '20'))  # per message and second
+
+# Bot API connection pools (see utils/request_pools.py)
+CONTROL_POOL_SIZE = int(os.getenv('CONTROL_POOL_SIZE', '64'))
+CONTROL_TIMEOUT = float(os.getenv('CONTROL_TIMEOUT', '10'))
+MEDIA_POOL_SIZE = int(os.getenv('MEDIA_POOL_SIZE', '8'))
+MEDIA_TIMEOUT = float(os.getenv('MEDIA_TIMEOUT', '120'))
+
+# Media uploads (see utils/uploads.py)
+UPLOAD_CONCURRENCY = int(os.getenv('UPLOAD_CONCURRENCY', '4'))
+UPLOAD_MAX_INFLIGHT_MB = int(os.getenv('UPLOAD_MAX_INFLIGHT_MB', '64'))
+UPLOAD_ATTEMPTS = int(os.getenv('UPLOAD_ATTEMPTS', '3'))
+
+# Outgoing request limits (see utils/rate_limiter.py)
+RATE_LIMIT_OVERALL = float(os.getenv('RATE_LIMIT_OVERALL', '30'))  # messages per second
+RATE_LIMIT_CHAT = float(os.getenv('RATE_LIMIT_CHAT', '1'))  # per second in a private chat
+RATE_LIMIT_CHAT_BURST = float(os.getenv('RATE_LIMIT_CHAT_BURST', '4'))  # messages at once in a private chat
+RATE_LIMIT_GROUP = float(os.getenv('RATE_LIMIT_GROUP', '20'))  # per minute in a group or channel
+RATE_LIMIT_MAX_RETRIES = int(os.getenv('RATE_LIMIT_MAX_RETRIES', '3'))
+
+# Scratch space for video jobs (see utils/scratch.py); set SCRATCH_TMPFS_DIRECTORY
+# (e.g. /dev/shm/circles) to encode in RAM while it has room
+SCRATCH_TMPFS_DIRECTORY = os.getenv('SCRATCH_TMPFS_DIRECTORY', '')
+SCRATCH_MIN_FREE_MB = int(os.getenv('SCRATCH_MIN_FREE_MB', '512'))
+SCRATCH_MAX_MB = int(os.getenv('SCRATCH_MAX_MB', '2048'))
+SCRATCH_ORPHAN_AGE = float(os.getenv('SCRATCH_ORPHAN_AGE', '3600'))  # seconds
+SCRATCH_SWEEP_INTERVAL = float(os.getenv('SCRATCH_SWEEP_INTERVAL', '600'))  # seconds
+
+# Over-long videos: 'reject' them, or 'trim' them to the first
+# MAX_VIDEO_DURATION seconds or the window in the caption (see utils/trimming.py)
+LONG_VIDEO_MODE = os.getenv('LONG_VIDEO_MODE', 'reject')
+
+# Circle encoder (see utils/encoders.py); compare settings with
+# python -m benchmarks.encoders
+ENCODER_BACKEND = os.getenv('ENCODER_BACKEND', 'moviepy')  # moviepy or ffmpeg
+ENCODER_PRESET = os.getenv('ENCODER_PRESET', 'ultrafast')
+ENCODER_THREADS = int(os.getenv('ENCODER_THREADS', '4'))
+
+# Memory budget for encodes (see utils/memory.py); with ENCODER_WORKERS=process
+# each encode runs in its own worker process with a capped address space
+MEMORY_BUDGET_MB = int(os.getenv('MEMORY_BUDGET_MB', '1024'))
+MEMORY_WAIT_TIMEOUT = float(os.getenv('MEMORY_WAIT_TIMEOUT', '60'))  # seconds
+ENCODER_WORKERS = os.getenv('ENCODER_WORKERS', 'thread')  # thread or process
+
+# Moderation previews (see utils/previews.py), kept until the circle is
+# moderated or for PREVIEW_TTL seconds
+PREVIEW_DIRECTORY = os.getenv('PREVIEW_DIRECTORY', os.path.join(TEMP_DIRECTORY, 'previews'))
+PREVIEW_TTL = float(os.getenv('PREVIEW_TTL', '86400'))
+
+# Update processing (see utils/updates.py): updates of different users run
+# concurrently, each user's in order
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '16'))
+UPDATE_MAX_PENDING = int(os.getenv('UPDATE_MAX_PENDING', '256'))
+
+# Returning users (see handlers/subscription_handler.py): verified subscriptions
+# are trusted for VERIFIED_TTL seconds and re-checked in the background once
+# they are older than VERIFIED_REFRESH seconds; VERIFIED_TTL=0 checks every time
+VERIFIED_TTL = int(os.getenv('VERIFIED_TTL', '21600'))
+VERIFIED_REFRESH = int(os.getenv('VERIFIED_REFRESH', '900'))
+
+# Subscription sweeper (see utils/sweeper.py): re-checks all users every
+# SWEEP_INTERVAL seconds at SWEEP_RATE getChatMember calls per second, users
+# seen within SWEEP_ACTIVE_WINDOW seconds first; SWEEP_RATE=0 disables it
+SWEEP_RATE = float(os.getenv('SWEEP_RATE', '5'))
+SWEEP_BATCH_SIZE = int(os.getenv('SWEEP_BATCH_SIZE', '200'))
+SWEEP_INTERVAL = float(os.getenv('SWEEP_INTERVAL', '3600'))
+SWEEP_ACTIVE_WINDOW = float(os.getenv('SWEEP_ACTIVE_WINDOW', '86400'))
+
+# Channel health (see utils/channel_health.py): channels are validated every
+# CHANNEL_HEALTH_INTERVAL seconds; broken ones are skipped by subscription checks
+# and probed again after CHANNEL_HEALTH_BACKOFF seconds, doubling up to the max
+CHANNEL_HEALTH_INTERVAL = float(os.getenv('CHANNEL_HEALTH_INTERVAL', '300'))
+CHANNEL_HEALTH_BACKOFF = float(os.getenv('CHANNEL_HEALTH_BACKOFF', '60'))
+CHANNEL_HEALTH_MAX_BACKOFF = float(os.getenv('CHANNEL_HEALTH_MAX_BACKOFF', '3600'))
+
+# Known users (see utils/known_users.py): a Bloom filter sized for KNOWN_USERS_CAPACITY
+# Telegram IDs at a KNOWN_USERS_ERROR_RATE false-positive rate spares returning
+# users the User.get_or_create transaction; KNOWN_USERS_CAPACITY=0 disables it
+KNOWN_USERS_CAPACITY = int(os.getenv('KNOWN_USERS_CAPACITY', '10000000'))
+KNOWN_USERS_ERROR_RATE = float(os.getenv('KNOWN_USERS_ERROR_RATE', '0.01'))
+KNOWN_USERS_CACHE_SIZE = int(os.getenv('KNOWN_USERS_CACHE_SIZE', '10000'))
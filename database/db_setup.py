@@ -11,6 +11,25 @@ async def init_db():
     )
     # Generate schemas
     await Tortoise.generate_schemas()
+    await add_missing_columns()
+
+# Columns added to tables after they were first created; generate_schemas
+# only creates missing tables, so existing databases get them here
+ADDED_COLUMNS = [
+    ("channels", "join_requests", "BOOL NOT NULL DEFAULT 0"),
+]
+
+async def add_missing_columns():
+    """Add the columns of ADDED_COLUMNS that an existing database lacks"""
+    connection = Tortoise.get_connection("default")
+    for table, column, definition in ADDED_COLUMNS:
+        rows = await connection.execute_query_dict(
+            "SELECT COUNT(*) AS present FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+            [table, column]
+        )
+        if not rows[0]["present"]:
+            await connection.execute_script(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}")
 
 def run_init_db():
     """Run database initialization"""
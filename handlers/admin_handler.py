@@ -1,30 +1,14 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, MessageOriginChannel
+from telegram import Update, MessageOriginChannel
 from telegram.ext import CallbackContext, ConversationHandler
-import redis
 import logging
 
 from models.models import Channel
-from utils.localization import get_text
-from config.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
-
-# Initialize Redis connection
-try:
-    redis_client = redis.Redis(
-        host=REDIS_HOST,
-        port=REDIS_PORT,
-        db=REDIS_DB,
-        password=REDIS_PASSWORD,
-        decode_responses=True,
-        socket_timeout=3,
-        socket_connect_timeout=3
-    )
-except Exception as e:
-    logging.warning(f"Redis connection failed: {e}")
-    # Create in-memory cache as fallback
-    redis_client = {}
-
-# Admin user IDs - replace with actual admin IDs
-ADMIN_IDS = [1340988413]  # Added user's ID from conversation
+from utils.localization import get_text, Msg
+from utils.keyboards import (
+    admin_panel_keyboard, admin_back_keyboard, channels_list_keyboard, channel_edit_keyboard
+)
+from utils.user_store import user_store
+from config.config import ADMIN_IDS
 
 # FSM states
 (CHANNEL_NAME, BUTTON_TEXT, FORWARD_POST, CHANNEL_LINK) = range(4)
@@ -41,7 +25,7 @@ async def admin_handler(update: Update, context: CallbackContext) -> None:
     
     # Get user language from Redis or default to Russian
     try:
-        user_lang = redis_client.get(f"user_lang:{user_id}")
+        user_lang = user_store.get_language(user_id)
     except Exception:
         user_lang = context.user_data.get("language", "ru")
     
@@ -50,7 +34,7 @@ async def admin_handler(update: Update, context: CallbackContext) -> None:
     
     # Check if user is admin
     if user_id not in ADMIN_IDS:
-        await update.message.reply_text(get_text("feature_not_available", user_lang))
+        await update.message.reply_text(get_text(Msg.FEATURE_NOT_AVAILABLE, user_lang))
         return
     
     # Show admin panel
@@ -65,31 +49,16 @@ async def show_admin_panel(update: Update, context: CallbackContext, user_lang="
         context (CallbackContext): Telegram context object
         user_lang (str): User language preference
     """
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                get_text("admin_channels_list", user_lang), 
-                callback_data="admin_channels_list"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                get_text("admin_add_channel", user_lang), 
-                callback_data="admin_add_channel"
-            )
-        ]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = admin_panel_keyboard(user_lang)
     
     if update.callback_query:
         await update.callback_query.edit_message_text(
-            get_text("admin_welcome", user_lang),
+            get_text(Msg.ADMIN_WELCOME, user_lang),
             reply_markup=reply_markup
         )
     else:
         await update.message.reply_text(
-            get_text("admin_welcome", user_lang),
+            get_text(Msg.ADMIN_WELCOME, user_lang),
             reply_markup=reply_markup
         )
 
@@ -108,7 +77,7 @@ async def admin_callback(update: Update, context: CallbackContext) -> None:
     
     # Get user language from Redis or default to Russian
     try:
-        user_lang = redis_client.get(f"user_lang:{user_id}")
+        user_lang = user_store.get_language(user_id)
     except Exception:
         user_lang = context.user_data.get("language", "ru")
     
@@ -117,7 +86,7 @@ async def admin_callback(update: Update, context: CallbackContext) -> None:
     
     # Check if user is admin
     if user_id not in ADMIN_IDS:
-        await query.edit_message_text(get_text("feature_not_available", user_lang))
+        await query.edit_message_text(get_text(Msg.FEATURE_NOT_AVAILABLE, user_lang))
         return
     
     callback_data = query.data
@@ -127,13 +96,16 @@ async def admin_callback(update: Update, context: CallbackContext) -> None:
     elif callback_data == "admin_add_channel":
         # Start the channel addition process
         context.user_data["admin_state"] = CHANNEL_NAME
-        await query.edit_message_text(get_text("admin_channel_name_prompt", user_lang))
+        await query.edit_message_text(get_text(Msg.ADMIN_CHANNEL_NAME_PROMPT, user_lang))
     elif callback_data.startswith("admin_edit_channel_"):
         channel_id = int(callback_data.split("_")[-1])
         # Set state for editing channel
         context.user_data["admin_state"] = "edit_channel"
         context.user_data["edit_channel_id"] = channel_id
         await show_channel_edit(update, context, channel_id, user_lang)
+    elif callback_data.startswith("admin_join_requests_"):
+        channel_id = int(callback_data.split("_")[-1])
+        await toggle_join_requests(update, context, channel_id, user_lang)
     elif callback_data.startswith("admin_delete_channel_"):
         channel_id = int(callback_data.split("_")[-1])
         await delete_channel(update, context, channel_id, user_lang)
@@ -150,36 +122,36 @@ async def admin_message_handler(update: Update, context: CallbackContext) -> Non
     """
     user_id = update.effective_user.id
     
+    # Check if user is admin and in admin state before any I/O; main.py
+    # only routes admins' messages here
+    if user_id not in ADMIN_IDS:
+        return
+    
+    if "admin_state" not in context.user_data:
+        return
+    
     # Get user language from Redis or default to Russian
     try:
-        user_lang = redis_client.get(f"user_lang:{user_id}")
+        user_lang = user_store.get_language(user_id)
     except Exception:
         user_lang = context.user_data.get("language", "ru")
     
     if not user_lang:
         user_lang = "ru"
     
-    # Check if user is admin
-    if user_id not in ADMIN_IDS:
-        return
-    
-    # Check if user is in admin state
-    if "admin_state" not in context.user_data:
-        return
-    
     admin_state = context.user_data["admin_state"]
     
     if admin_state == CHANNEL_NAME:
         # Save channel name and ask for button text
         context.user_data["channel_name"] = update.message.text
         context.user_data["admin_state"] = BUTTON_TEXT
-        await update.message.reply_text(get_text("admin_button_text_prompt", user_lang))
+        await update.message.reply_text(get_text(Msg.ADMIN_BUTTON_TEXT_PROMPT, user_lang))
     
     elif admin_state == BUTTON_TEXT:
         # Save button text and ask for forwarded post
         context.user_data["button_text"] = update.message.text
         context.user_data["admin_state"] = FORWARD_POST
-        await update.message.reply_text(get_text("admin_forward_post_prompt", user_lang))
+        await update.message.reply_text(get_text(Msg.ADMIN_FORWARD_POST_PROMPT, user_lang))
     
     elif admin_state == CHANNEL_LINK:
         # Save channel link and create channel
@@ -201,7 +173,7 @@ async def admin_message_handler(update: Update, context: CallbackContext) -> Non
         context.user_data.pop("button_text", None)
         
         # Send success message
-        await update.message.reply_text(get_text("admin_channel_added", user_lang))
+        await update.message.reply_text(get_text(Msg.ADMIN_CHANNEL_ADDED, user_lang))
         
         # Show admin panel
         await show_admin_panel(update, context, user_lang)
@@ -216,26 +188,26 @@ async def admin_forward_handler(update: Update, context: CallbackContext) -> Non
     """
     user_id = update.effective_user.id
     
+    # Check if user is admin and waiting for the forward before any I/O;
+    # main.py only routes admins' messages here
+    if user_id not in ADMIN_IDS:
+        return
+    
+    if context.user_data.get("admin_state") != FORWARD_POST:
+        return
+    
     # Get user language from Redis or default to Russian
     try:
-        user_lang = redis_client.get(f"user_lang:{user_id}")
+        user_lang = user_store.get_language(user_id)
     except Exception:
         user_lang = context.user_data.get("language", "ru")
     
     if not user_lang:
         user_lang = "ru"
     
-    # Check if user is admin
-    if user_id not in ADMIN_IDS:
-        return
-    
-    # Check if user is in admin state
-    if "admin_state" not in context.user_data or context.user_data["admin_state"] != FORWARD_POST:
-        return
-    
     # Check if message is forwarded from channel using forward_origin (python-telegram-bot v20+)
     if not hasattr(update.message, 'forward_origin') or not isinstance(update.message.forward_origin, MessageOriginChannel):
-        await update.message.reply_text(get_text("admin_invalid_forward", user_lang))
+        await update.message.reply_text(get_text(Msg.ADMIN_INVALID_FORWARD, user_lang))
         return
     
     # Get channel ID from forward_origin
@@ -247,17 +219,17 @@ async def admin_forward_handler(update: Update, context: CallbackContext) -> Non
         is_admin = chat_member.status in ['administrator', 'creator']
         
         if not is_admin:
-            await update.message.reply_text(get_text("admin_not_admin", user_lang))
+            await update.message.reply_text(get_text(Msg.ADMIN_NOT_ADMIN, user_lang))
             return
         
         # Save channel ID and ask for channel link
         context.user_data["channel_id"] = channel_id
         context.user_data["admin_state"] = CHANNEL_LINK
-        await update.message.reply_text(get_text("admin_channel_link_prompt", user_lang))
+        await update.message.reply_text(get_text(Msg.ADMIN_CHANNEL_LINK_PROMPT, user_lang))
         
     except Exception as e:
         logging.error(f"Error checking admin status: {e}")
-        await update.message.reply_text(get_text("admin_not_admin", user_lang))
+        await update.message.reply_text(get_text(Msg.ADMIN_NOT_ADMIN, user_lang))
 
 async def show_channels_list(update: Update, context: CallbackContext, user_lang="ru") -> None:
     """
@@ -273,46 +245,17 @@ async def show_channels_list(update: Update, context: CallbackContext, user_lang
     
     if not channels:
         # If no channels, show message
-        keyboard = [
-            [
-                InlineKeyboardButton(
-                    get_text("admin_back", user_lang), 
-                    callback_data="admin_back"
-                )
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         await update.callback_query.edit_message_text(
-            f"{get_text('admin_channels_list', user_lang)}\n\nNo channels found.",
-            reply_markup=reply_markup
+            f"{get_text(Msg.ADMIN_CHANNELS_LIST, user_lang)}\n\nNo channels found.",
+            reply_markup=admin_back_keyboard(user_lang)
         )
         return
     
     # Create keyboard with channels
-    keyboard = []
-    
-    for channel in channels:
-        keyboard.append([
-            InlineKeyboardButton(
-                f"{channel.channel_name} ({channel.channel_id})", 
-                callback_data=f"admin_edit_channel_{channel.id}"
-            )
-        ])
-    
-    # Add back button
-    keyboard.append([
-        InlineKeyboardButton(
-            get_text("admin_back", user_lang), 
-            callback_data="admin_back"
-        )
-    ])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = channels_list_keyboard(user_lang, channels)
     
     await update.callback_query.edit_message_text(
-        get_text("admin_channels_list", user_lang),
+        get_text(Msg.ADMIN_CHANNELS_LIST, user_lang),
         reply_markup=reply_markup
     )
 
@@ -330,32 +273,11 @@ async def show_channel_edit(update: Update, context: CallbackContext, channel_id
     channel = await Channel.get(id=channel_id)
     
     # Create keyboard with edit options
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                get_text("admin_edit_channel", user_lang), 
-                callback_data=f"admin_edit_channel_name_{channel.id}"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                get_text("admin_delete_channel", user_lang), 
-                callback_data=f"admin_delete_channel_{channel.id}"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                get_text("admin_back", user_lang), 
-                callback_data="admin_channels_list"
-            )
-        ]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = channel_edit_keyboard(user_lang, channel.id, channel.join_requests)
     
     # Show channel info
     channel_info = f"""
-{get_text('admin_channels_list', user_lang)}
+{get_text(Msg.ADMIN_CHANNELS_LIST, user_lang)}
 
 ID: {channel.id}
 Name: {channel.channel_name}
@@ -363,6 +285,7 @@ Channel ID: {channel.channel_id}
 Link: {channel.channel_link}
 Button text: {channel.button_text}
 Active: {'Yes' if channel.is_active else 'No'}
+Join requests: {'Yes' if channel.join_requests else 'No'}
     """
     
     await update.callback_query.edit_message_text(
@@ -370,6 +293,22 @@ Active: {'Yes' if channel.is_active else 'No'}
         reply_markup=reply_markup
     )
 
+async def toggle_join_requests(update: Update, context: CallbackContext, channel_id, user_lang="ru") -> None:
+    """
+    Switch a channel between join request gating and membership checks
+    
+    Args:
+        update (Update): Telegram update object
+        context (CallbackContext): Telegram context object
+        channel_id (int): Channel ID to switch
+        user_lang (str): User language preference
+    """
+    channel = await Channel.get(id=channel_id)
+    channel.join_requests = not channel.join_requests
+    await channel.save(update_fields=["join_requests"])
+    
+    await show_channel_edit(update, context, channel_id, user_lang)
+
 async def delete_channel(update: Update, context: CallbackContext, channel_id, user_lang="ru") -> None:
     """
     Delete channel
@@ -387,7 +326,7 @@ async def delete_channel(update: Update, context: CallbackContext, channel_id, u
     await channel.delete()
     
     # Show success message
-    await update.callback_query.edit_message_text(get_text("admin_channel_deleted", user_lang))
+    await update.callback_query.edit_message_text(get_text(Msg.ADMIN_CHANNEL_DELETED, user_lang))
     
     # Show channels list
     await show_channels_list(update, context, user_lang)
@@ -1,18 +1,9 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import CallbackContext
-import redis
 
-from utils.localization import get_text
-from config.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
-
-# Initialize Redis connection
-redis_client = redis.Redis(
-    host=REDIS_HOST,
-    port=REDIS_PORT,
-    db=REDIS_DB,
-    password=REDIS_PASSWORD,
-    decode_responses=True
-)
+from utils.localization import get_text, Msg, SUPPORTED_LANGUAGES
+from utils.keyboards import language_keyboard
+from utils.user_store import user_store
 
 async def language_handler(update: Update, context: CallbackContext) -> None:
     """
@@ -22,17 +13,9 @@ async def language_handler(update: Update, context: CallbackContext) -> None:
         update (Update): Telegram update object
         context (CallbackContext): Telegram context object
     """
-    keyboard = [
-        [
-            InlineKeyboardButton("🇷🇺 Русский", callback_data="lang_ru"),
-            InlineKeyboardButton("🇬🇧 English", callback_data="lang_en"),
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     await update.message.reply_text(
         "Пожалуйста, выберите язык / Please select a language:",
-        reply_markup=reply_markup
+        reply_markup=language_keyboard()
     )
 
 async def language_callback(update: Update, context: CallbackContext) -> None:
@@ -49,11 +32,14 @@ async def language_callback(update: Update, context: CallbackContext) -> None:
     user_id = update.effective_user.id
     selected_lang = query.data.split('_')[1]  # Extract language code from callback data
     
+    if selected_lang not in SUPPORTED_LANGUAGES:
+        return
+    
     # Save language preference to Redis
-    redis_client.set(f"user_lang:{user_id}", selected_lang)
+    user_store.set_language(user_id, selected_lang)
     
     # Confirm language selection
-    await query.edit_message_text(get_text("language_selected", selected_lang))
+    await query.edit_message_text(get_text(Msg.LANGUAGE_SELECTED, selected_lang))
     
     # Continue with subscription check
     from handlers.subscription_handler import check_subscription
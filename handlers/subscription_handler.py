@@ -1,74 +1,132 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import CallbackContext
-import redis
 import logging
-from tortoise.exceptions import DoesNotExist
-
-from models.models import User, Channel, UserSubscription
-from utils.localization import get_text
-from config.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
-
-# Initialize Redis connection
-try:
-    redis_client = redis.Redis(
-        host=REDIS_HOST,
-        port=REDIS_PORT,
-        db=REDIS_DB,
-        password=REDIS_PASSWORD,
-        decode_responses=True,
-        socket_timeout=3,
-        socket_connect_timeout=3
-    )
-except Exception as e:
-    logging.warning(f"Redis connection failed: {e}")
-    # Create in-memory cache as fallback
-    redis_client = {}
+import time
+from tortoise.expressions import Q
+
+from config.config import VERIFIED_TTL, VERIFIED_REFRESH, SWEEP_RATE
+from models.models import Channel, UserSubscription
+from utils.channel_health import channel_health
+from utils.known_users import known_users
+from utils.localization import get_text, Msg
+from utils.keyboards import main_menu_keyboard, subscription_keyboard
+from utils.metrics import SUBSCRIPTION_CHECKS, JOIN_REQUESTS
+from utils.user_store import user_store
+
+logger = logging.getLogger(__name__)
 
-async def check_subscription(update: Update, context: CallbackContext, user_lang="ru") -> None:
+# Users whose subscriptions are being re-checked in the background
+_reverifying = set()
+
+async def check_subscription(update: Update, context: CallbackContext, user_lang="ru", verified_until=None) -> None:
     """
     Check if user is subscribed to all required channels
     
+    Users verified within the last VERIFIED_TTL seconds get the main menu
+    straight away, without database or Bot API calls; their subscriptions
+    are re-checked in the background once the verification is older than
+    VERIFIED_REFRESH seconds.
+    
     Args:
         update (Update): Telegram update object
         context (CallbackContext): Telegram context object
         user_lang (str): User language preference
+        verified_until (int, optional): The user's "verified until" marker,
+            if the caller has already read it
     """
     user_id = update.effective_user.id
+    _touch(user_id)
     
-    # Get or create user in database
-    user, created = await User.get_or_create(
-        telegram_id=user_id,
-        defaults={"language": user_lang}
+    if VERIFIED_TTL > 0:
+        if verified_until is None:
+            try:
+                verified_until = user_store.get_verified_until(user_id)
+            except Exception as e:
+                logger.warning("Redis get failed: %s", e)
+        
+        now = time.time()
+        if verified_until is not None and verified_until > now:
+            SUBSCRIPTION_CHECKS.inc("fast")
+            if verified_until - now < VERIFIED_TTL - VERIFIED_REFRESH:
+                reverify_later(context, user_id, user_lang)
+            await show_main_menu(update, context, user_lang)
+            return
+    
+    SUBSCRIPTION_CHECKS.inc("full")
+    created, was_subscribed_before, unsubscribed_channels = await refresh_subscription(
+        context.bot, user_id, user_lang
     )
     
     if created:
         # Update Redis cache with user language
         try:
-            redis_client.set(f"user_lang:{user_id}", user_lang)
+            user_store.set_language(user_id, user_lang)
         except Exception as e:
-            logging.warning(f"Redis set failed: {e}")
+            logger.warning("Redis set failed: %s", e)
             # Store in context.user_data as fallback
             context.user_data["language"] = user_lang
     
-    # Get all active channels
-    channels = await Channel.filter(is_active=True)
+    if not unsubscribed_channels:
+        # Only show thank you message if user wasn't subscribed before but is now
+        if not was_subscribed_before:
+            await update.effective_message.reply_text(get_text(Msg.SUBSCRIPTION_SUCCESS, user_lang))
+        
+        # Show main menu
+        await show_main_menu(update, context, user_lang)
+    else:
+        # If user is not subscribed to all channels, show subscription buttons
+        reply_markup = subscription_keyboard(user_lang, unsubscribed_channels)
+        
+        # Use the special format for subscription message
+        await update.effective_message.reply_text(
+            get_text(Msg.SUBSCRIPTION_REQUIRED, user_lang),
+            reply_markup=reply_markup
+        )
+
+async def refresh_subscription(bot, user_id, user_lang="ru"):
+    """
+    Check the user's channel memberships and record them
+    
+    Updates the user's subscription records and status, and sets or drops
+    their "verified until" marker.
+    
+    Args:
+        bot (Bot): Bot used for the membership checks
+        user_id (int): Telegram user ID
+        user_lang (str): Language of a newly created user
+        
+    Returns:
+        tuple: (whether the user was created, whether they were subscribed
+        before, channels they are not subscribed to)
+    """
+    # Get or create user in database
+    user, created = await known_users.get_or_create(user_id, defaults={"language": user_lang})
+    
+    # Get all active channels that are not quarantined
+    channels = channel_health.healthy(await Channel.filter(is_active=True))
     
     if not channels:
-        # If no channels to subscribe, show main menu
-        await show_main_menu(update, context, user_lang)
-        return
+        # Nothing to subscribe to
+        _mark_verified(user_id, True)
+        return created, True, []
     
-    # Check if user is subscribed to all channels
-    all_subscribed = True
     unsubscribed_channels = []
     
     # Store previous subscription status to detect changes
     was_subscribed_before = user.subscription_status
     
+    # Channels gated by join requests are answered from their records
+    joined = await _joined_channels(user_id, channels)
+    
     for channel in channels:
+        if channel.join_requests:
+            if channel.id not in joined:
+                unsubscribed_channels.append(channel)
+            continue
+        
         # Check if user is member of the channel
         try:
-            chat_member = await context.bot.get_chat_member(chat_id=channel.channel_id, user_id=user_id)
+            chat_member = await bot.get_chat_member(chat_id=channel.channel_id, user_id=user_id)
             is_member = chat_member.status in ['member', 'administrator', 'creator']
             
             # Update or create subscription record
@@ -79,7 +137,6 @@ async def check_subscription(update: Update, context: CallbackContext, user_lang
             )
             
             if not is_member:
-                all_subscribed = False
                 unsubscribed_channels.append(channel)
                 
                 # Update subscription status
@@ -90,46 +147,75 @@ async def check_subscription(update: Update, context: CallbackContext, user_lang
                 await subscription.save()
                 
         except Exception as e:
-            logging.error(f"Error checking subscription: {e}")
+            if await channel_health.report_error(channel, e):
+                # The channel is broken, not the user's subscription
+                continue
+            logger.error("Error checking subscription: %s", e)
             # If error occurs, assume user is not subscribed
-            all_subscribed = False
             unsubscribed_channels.append(channel)
     
     # Update user subscription status
-    user.subscription_status = all_subscribed
+    user.subscription_status = not unsubscribed_channels
     await user.save()
     
-    if all_subscribed:
-        # Only show thank you message if user wasn't subscribed before but is now
-        if not was_subscribed_before:
-            await update.effective_message.reply_text(get_text("subscription_success", user_lang))
-        
-        # Show main menu
-        await show_main_menu(update, context, user_lang)
-    else:
-        # If user is not subscribed to all channels, show subscription buttons
-        keyboard = []
-        
-        for channel in unsubscribed_channels:
-            keyboard.append([
-                InlineKeyboardButton(channel.button_text, url=channel.channel_link)
-            ])
-        
-        # Add check subscription button
-        keyboard.append([
-            InlineKeyboardButton(
-                get_text("check_subscription_button", user_lang), 
-                callback_data="check_sub"
-            )
-        ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        # Use the special format for subscription message
-        await update.effective_message.reply_text(
-            get_text("subscription_required", user_lang),
-            reply_markup=reply_markup
-        )
+    _mark_verified(user_id, user.subscription_status)
+    return created, was_subscribed_before, unsubscribed_channels
+
+async def _joined_channels(user_id, channels) -> set:
+    # IDs of the channels gated by join requests the user joined
+    gated = [channel.id for channel in channels if channel.join_requests]
+    if not gated:
+        return set()
+    return set(await UserSubscription.filter(
+        user__telegram_id=user_id, channel_id__in=gated, is_subscribed=True
+    ).values_list("channel_id", flat=True))
+
+def _touch(user_id) -> None:
+    # Recently active users are re-checked first by the sweeper, which also
+    # prunes them; without it the set would only grow
+    if SWEEP_RATE <= 0:
+        return
+    try:
+        user_store.touch(user_id)
+    except Exception as e:
+        logger.warning("Redis activity update failed: %s", e)
+
+def _mark_verified(user_id, subscribed) -> None:
+    if VERIFIED_TTL <= 0:
+        return
+    try:
+        if subscribed:
+            user_store.set_verified_until(user_id, time.time() + VERIFIED_TTL)
+        else:
+            user_store.clear_verified(user_id)
+    except Exception as e:
+        logger.warning("Redis verification marker update failed: %s", e)
+
+def reverify_later(context: CallbackContext, user_id, user_lang="ru") -> None:
+    """
+    Re-check the user's subscriptions in a background task
+    
+    A user who has left a channel loses their marker and goes through the
+    full check on their next visit.
+    
+    Args:
+        context (CallbackContext): Telegram context object
+        user_id (int): Telegram user ID
+        user_lang (str): User language preference
+    """
+    if user_id in _reverifying:
+        return
+    _reverifying.add(user_id)
+    context.application.create_task(_reverify(context.bot, user_id, user_lang))
+
+async def _reverify(bot, user_id, user_lang) -> None:
+    try:
+        SUBSCRIPTION_CHECKS.inc("background")
+        await refresh_subscription(bot, user_id, user_lang)
+    except Exception as e:
+        logger.warning("Background subscription check for user %s failed: %s", user_id, e)
+    finally:
+        _reverifying.discard(user_id)
 
 async def subscription_callback(update: Update, context: CallbackContext) -> None:
     """
@@ -146,7 +232,7 @@ async def subscription_callback(update: Update, context: CallbackContext) -> Non
     
     # Get user language from Redis or fallback to context
     try:
-        user_lang = redis_client.get(f"user_lang:{user_id}")
+        user_lang = user_store.get_language(user_id)
     except Exception:
         user_lang = context.user_data.get("language", "ru")
     
@@ -154,7 +240,7 @@ async def subscription_callback(update: Update, context: CallbackContext) -> Non
         user_lang = "ru"
     
     # Send checking message
-    await query.edit_message_text(get_text("subscription_check", user_lang))
+    await query.edit_message_text(get_text(Msg.SUBSCRIPTION_CHECK, user_lang))
     
     # Check subscription again
     await check_subscription(update, context, user_lang)
@@ -168,32 +254,18 @@ async def show_main_menu(update: Update, context: CallbackContext, user_lang="ru
         context (CallbackContext): Telegram context object
         user_lang (str): User language preference
     """
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                get_text("create_circle_button", user_lang), 
-                callback_data="create_circle"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                get_text("create_circle_prank_button", user_lang), 
-                callback_data="create_circle_prank"
-            )
-        ]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     await update.effective_message.reply_text(
-        get_text("main_menu", user_lang),
-        reply_markup=reply_markup
+        get_text(Msg.MAIN_MENU, user_lang),
+        reply_markup=main_menu_keyboard(user_lang)
     )
 
 async def verify_subscription(user_id, context):
     """
     Verify if user is subscribed to all required channels
     
+    Circle uploads stay gated on live membership: the "verified until"
+    marker is set or dropped from the result but never trusted here.
+    
     Args:
         user_id (int): Telegram user ID
         context (CallbackContext): Telegram context object
@@ -201,35 +273,156 @@ async def verify_subscription(user_id, context):
     Returns:
         bool: True if subscribed to all channels, False otherwise
     """
+    _touch(user_id)
+    SUBSCRIPTION_CHECKS.inc("live")
+    
     try:
-        user = await User.get(telegram_id=user_id)
-        
-        # Get all active channels
-        channels = await Channel.filter(is_active=True)
+        # Get all active channels that are not quarantined
+        channels = channel_health.healthy(await Channel.filter(is_active=True))
         
         if not channels:
             # If no channels to subscribe, return True
             return True
         
+        # Channels gated by join requests are answered from their records
+        joined = await _joined_channels(user_id, channels)
+        
         # Check if user is subscribed to all channels
         for channel in channels:
+            if channel.join_requests:
+                if channel.id not in joined:
+                    _mark_verified(user_id, False)
+                    return False
+                continue
+            
             try:
                 chat_member = await context.bot.get_chat_member(chat_id=channel.channel_id, user_id=user_id)
                 is_member = chat_member.status in ['member', 'administrator', 'creator']
                 
                 if not is_member:
+                    _mark_verified(user_id, False)
                     return False
                     
             except Exception as e:
-                logging.error(f"Error verifying subscription: {e}")
+                if await channel_health.report_error(channel, e):
+                    # The channel is broken, not the user's subscription
+                    continue
+                logger.error("Error verifying subscription: %s", e)
                 # If error occurs, assume user is not subscribed
                 return False
         
+        _mark_verified(user_id, True)
         return True
         
-    except DoesNotExist:
-        # If user not found in database, return False
-        return False
     except Exception as e:
-        logging.error(f"Error in verify_subscription: {e}")
+        logger.error("Error in verify_subscription: %s", e)
         return False
+
+async def join_request_handler(update: Update, context: CallbackContext) -> None:
+    """
+    Handle a join request to a channel gated by join requests
+    
+    The request is approved and the user recorded as subscribed, so
+    pressing check_sub needs no getChatMember call for the channel. A
+    request that cannot be approved records nothing. Requests to other
+    chats are left to their admins.
+    
+    Args:
+        update (Update): Telegram update object
+        context (CallbackContext): Telegram context object
+    """
+    join_request = update.chat_join_request
+    channel = await _gated_channel(join_request.chat)
+    if channel is None:
+        JOIN_REQUESTS.inc("ignored")
+        return
+    
+    try:
+        await join_request.approve()
+    except Exception as e:
+        # The request stays pending for the channel's admins
+        JOIN_REQUESTS.inc("failed")
+        logger.error(
+            "Error approving join request of user %s to channel %s: %s",
+            join_request.from_user.id, channel.channel_id, e
+        )
+        await channel_health.report_error(channel, e)
+        return
+    
+    JOIN_REQUESTS.inc("approved")
+    await record_membership(join_request.from_user.id, channel, True)
+
+async def channel_member_handler(update: Update, context: CallbackContext) -> None:
+    """
+    Keep the records of channels gated by join requests current
+    
+    Joins through other links, approvals by admins, leaves and bans arrive
+    as chat_member updates.
+    
+    Args:
+        update (Update): Telegram update object
+        context (CallbackContext): Telegram context object
+    """
+    change = update.chat_member
+    is_member = _is_member(change.new_chat_member)
+    if is_member == _is_member(change.old_chat_member):
+        return
+    
+    channel = await _gated_channel(change.chat)
+    if channel is None:
+        return
+    
+    await record_membership(change.new_chat_member.user.id, channel, is_member)
+
+async def record_membership(user_id, channel, is_member) -> None:
+    """
+    Record the user's membership in a channel gated by join requests
+    
+    The user's status and "verified until" marker follow from the recorded
+    subscriptions to all channels; stale records of the other channels are
+    corrected by the next background check.
+    
+    Args:
+        user_id (int): Telegram user ID
+        channel (Channel): Channel gated by join requests
+        is_member (bool): Whether the user joined, or was approved to join
+    """
+    try:
+        user_lang = user_store.get_language(user_id) or "ru"
+    except Exception:
+        user_lang = "ru"
+    
+    user, _ = await known_users.get_or_create(user_id, defaults={"language": user_lang})
+    subscription, created = await UserSubscription.get_or_create(
+        user=user,
+        channel=channel,
+        defaults={"is_subscribed": is_member}
+    )
+    if not created and subscription.is_subscribed != is_member:
+        subscription.is_subscribed = is_member
+        await subscription.save()
+    
+    subscribed = is_member
+    if subscribed:
+        channels = channel_health.healthy(await Channel.filter(is_active=True))
+        recorded = set(await UserSubscription.filter(
+            user=user, channel_id__in=[c.id for c in channels], is_subscribed=True
+        ).values_list("channel_id", flat=True))
+        subscribed = all(c.id in recorded for c in channels)
+    
+    if user.subscription_status != subscribed:
+        user.subscription_status = subscribed
+        await user.save()
+    
+    _mark_verified(user_id, subscribed)
+
+async def _gated_channel(chat):
+    # Channels are stored by numeric id or by @username
+    match = Q(channel_id=str(chat.id))
+    if chat.username:
+        match |= Q(channel_id__iexact=f"@{chat.username}")
+    return await Channel.filter(match, is_active=True, join_requests=True).first()
+
+def _is_member(chat_member) -> bool:
+    # Restricted users may still be members
+    return chat_member.status in ['member', 'administrator', 'creator'] or getattr(chat_member, "is_member", False)
@@ -1,13 +1,10 @@
-import os
 import tempfile
 import asyncio
 import concurrent.futures
 import uuid
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import CallbackContext
-import redis
 import logging
-from moviepy.editor import VideoFileClip
 
 __all__ = [
     'video_handler', 
@@ -16,93 +13,43 @@ __all__ = [
     'share_yes_callback', 
     'share_no_callback', 
     'publish_callback', 
-    'reject_callback'
+    'reject_callback',
+    'full_video_callback'
 ]
 
-from utils.localization import get_text
-from config.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD, MAX_VIDEO_DURATION, TEMP_DIRECTORY
+from utils.localization import get_text, Msg
+from utils.keyboards import share_keyboard, moderation_keyboard, view_in_channel_keyboard
+from config.config import (
+    MAX_VIDEO_DURATION, LONG_VIDEO_MODE, ENCODER_BACKEND, ENCODER_PRESET, ENCODER_THREADS, ADMIN_IDS,
+    FALLBACK_CACHE_SIZE
+)
+from utils.redis_client import redis_client
+from utils.user_store import user_store
+from utils.known_users import known_users
+from utils.cache import TTLCache
+from utils.rate_limiter import Priority
+from utils.scratch import ScratchSpaceFull
+from utils.memory import MemoryBudgetFull, estimate_job_bytes
+from utils.admission import admit_download, admit_video, incoming_video
+from utils.trimming import extract_window, format_timestamp, parse_window
 from handlers.subscription_handler import verify_subscription, check_subscription
 
-# Initialize Redis connection
-try:
-    redis_client = redis.Redis(
-        host=REDIS_HOST,
-        port=REDIS_PORT,
-        db=REDIS_DB,
-        password=REDIS_PASSWORD,
-        decode_responses=True,
-        socket_timeout=3,
-        socket_connect_timeout=3
-    )
-except Exception as e:
-    logging.warning(f"Redis connection failed: {e}")
-    # Create in-memory cache as fallback
-    redis_client = {}
-
-# Admin user IDs - replace with actual admin IDs
-ADMIN_IDS = [1340988413]  # Added user's ID from conversation
+logger = logging.getLogger(__name__)
 
 # Channel ID for publishing circles
 CHANNEL_ID = -1002561514226
 
-# Create a thread pool executor for CPU-bound tasks
-executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+# Characters of a circle's short id carried in callback data, which is
+# limited to 64 bytes
+CALLBACK_ID_LENGTH = 6
 
-# In-memory cache for file_ids when Redis is not available
-file_id_cache = {}
+# Thread pool for blocking probes and stream copies; encodes run in the
+# memory-governed workers in bot_data["encoders"]
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
 
-def process_video_sync(input_file, output_file, max_size=640):
-    """
-    Process video synchronously in a separate thread to avoid blocking the event loop
-    
-    Args:
-        input_file (str): Path to input video file
-        output_file (str): Path to output video file
-        max_size (int): Maximum size for width and height
-        
-    Returns:
-        bool: True if successful, False otherwise
-    """
-    try:
-        # Process video to create circle
-        video_clip = VideoFileClip(input_file)
-        
-        # Crop video to square if needed
-        if video_clip.w != video_clip.h:
-            # Get minimum dimension
-            min_dim = min(video_clip.w, video_clip.h)
-            
-            # Calculate crop coordinates
-            x_center = video_clip.w / 2
-            y_center = video_clip.h / 2
-            
-            # Crop to square
-            video_clip = video_clip.crop(
-                x1=x_center - min_dim/2,
-                y1=y_center - min_dim/2,
-                x2=x_center + min_dim/2,
-                y2=y_center + min_dim/2
-            )
-        
-        # Resize to max size if larger
-        if video_clip.w > max_size:
-            video_clip = video_clip.resize(width=max_size, height=max_size)
-        
-        # Write output file with proper codec for video note
-        video_clip.write_videofile(
-            output_file, 
-            codec="libx264", 
-            audio_codec="aac",
-            preset="ultrafast",  # Fastest encoding
-            ffmpeg_params=["-pix_fmt", "yuv420p", "-threads", "4"]  # Ensure compatibility and use multiple threads
-        )
-        
-        # Close video clip
-        video_clip.close()
-        return True
-    except Exception as e:
-        logging.error(f"Error in process_video_sync: {e}")
-        return False
+# In-memory cache for file_ids when Redis is not available; bounded, and
+# entries expire with the Redis keys they stand in for
+file_id_cache = TTLCache("file_id", maxsize=FALLBACK_CACHE_SIZE, ttl=86400)
 
 async def store_file_id(file_id, user_id):
     """
@@ -113,95 +60,96 @@ async def store_file_id(file_id, user_id):
         user_id (int): Telegram user ID
         
     Returns:
-        str: A short unique ID for referencing the file_id
+        str: The leading CALLBACK_ID_LENGTH characters of the stored short
+            ID, for callback data; get_file_id accepts them
     """
-    from models.models import User, VideoCircle
+    from models.models import VideoCircle
     
     # Generate a short unique ID
     short_id = str(uuid.uuid4())[:8]
+    callback_id = short_id[:CALLBACK_ID_LENGTH]
     
-    # Log for debugging
-    logging.info(f"Storing file_id with short_id: {short_id} for user {user_id}")
+    logger.debug("Storing file_id with short_id: %s for user %s", short_id, user_id)
     
     try:
-        # Get or create user
-        user, created = await User.get_or_create(telegram_id=user_id)
+        # Returning users' primary keys are cached
+        user_pk = await known_users.user_pk(user_id)
         
         # Create video circle record in database
         await VideoCircle.create(
-            user=user,
+            user_id=user_pk,
             file_id=file_id,
             short_id=short_id,
             status="created"
         )
         
-        logging.info(f"Successfully stored file_id in database with short_id: {short_id}")
+        logger.debug("Successfully stored file_id in database with short_id: %s", short_id)
         
         # Also store in Redis as a cache for faster access
         try:
-            redis_client.set(f"file_id:{short_id}", file_id, ex=86400)  # Expire after 24 hours
+            redis_client.set(f"file_id:{callback_id}", file_id, ex=86400)  # Expire after 24 hours
         except Exception as e:
-            logging.warning(f"Failed to store in Redis cache: {e}")
+            logger.warning("Failed to store in Redis cache: %s", e)
             # Fallback to in-memory cache
-            file_id_cache[short_id] = file_id
+            file_id_cache.set(callback_id, file_id)
             
-        return short_id
+        return callback_id
     except Exception as e:
-        logging.error(f"Error storing file_id in database: {e}")
+        logger.error("Error storing file_id in database: %s", e)
         
         # Fallback to old method if database fails
         try:
-            redis_client.set(f"file_id:{short_id}", file_id, ex=86400)
-            logging.info(f"Fallback: stored file_id in Redis with key file_id:{short_id}")
+            redis_client.set(f"file_id:{callback_id}", file_id, ex=86400)
+            logger.info("Fallback: stored file_id in Redis with key file_id:%s", callback_id)
         except Exception as redis_error:
-            logging.warning(f"Failed to store in Redis: {redis_error}, using in-memory cache")
-            file_id_cache[short_id] = file_id
+            logger.warning("Failed to store in Redis: %s, using in-memory cache", redis_error)
+            file_id_cache.set(callback_id, file_id)
             
-        return short_id
+        return callback_id
 
 async def get_file_id(short_id):
     """
     Retrieve file_id from database, Redis or in-memory cache
     
     Args:
-        short_id (str): The short unique ID
+        short_id (str): Short ID from callback data, as returned by
+            store_file_id
         
     Returns:
         str: The original file_id or None if not found
     """
     from models.models import VideoCircle
     
-    # Log for debugging
-    logging.info(f"Retrieving file_id for short_id: {short_id}")
+    logger.debug("Retrieving file_id for short_id: %s", short_id)
     
     try:
         # Try to get from database first
-        video_circle = await VideoCircle.filter(short_id=short_id).first()
+        video_circle = await VideoCircle.filter(short_id__startswith=short_id).first()
         if video_circle:
-            logging.info(f"Found file_id in database for short_id: {short_id}")
+            logger.debug("Found file_id in database for short_id: %s", short_id)
             return video_circle.file_id
         else:
-            logging.warning(f"No file_id found in database for short_id: {short_id}")
+            logger.debug("No file_id found in database for short_id: %s", short_id)
     except Exception as e:
-        logging.error(f"Error retrieving from database: {e}, checking Redis and memory cache")
+        logger.error("Error retrieving from database: %s, checking Redis and memory cache", e)
     
     # Try to get from Redis as fallback
     try:
         file_id = redis_client.get(f"file_id:{short_id}")
         if file_id:
-            logging.info(f"Found file_id in Redis for short_id: {short_id}")
+            logger.debug("Found file_id in Redis for short_id: %s", short_id)
             return file_id
         else:
-            logging.warning(f"No file_id found in Redis for short_id: {short_id}")
+            logger.debug("No file_id found in Redis for short_id: %s", short_id)
     except Exception as e:
-        logging.warning(f"Error retrieving from Redis: {e}, checking in-memory cache")
+        logger.warning("Error retrieving from Redis: %s, checking in-memory cache", e)
     
     # Fallback to in-memory cache
     file_id = file_id_cache.get(short_id)
     if file_id:
-        logging.info(f"Found file_id in memory cache for short_id: {short_id}")
+        logger.debug("Found file_id in memory cache for short_id: %s", short_id)
     else:
-        logging.warning(f"No file_id found in memory cache for short_id: {short_id}")
+        logger.warning("No file_id found in memory cache for short_id: %s", short_id)
     
     return file_id
 
@@ -217,7 +165,7 @@ async def video_handler(update: Update, context: CallbackContext) -> None:
     
     # Get user language from Redis or fallback to context
     try:
-        user_lang = redis_client.get(f"user_lang:{user_id}")
+        user_lang = user_store.get_language(user_id)
     except Exception:
         # Fix: Safely access user_data with proper error handling
         try:
@@ -236,100 +184,130 @@ async def video_handler(update: Update, context: CallbackContext) -> None:
         await check_subscription(update, context, user_lang)
         return
     
-    # Get video file
-    video = update.message.video
-    
-    # Check video duration
-    if video.duration > MAX_VIDEO_DURATION:
-        await update.message.reply_text(get_text("video_too_long", user_lang))
+    # Videos, animations and videos sent as files; reject what we cannot
+    # process before downloading anything
+    video = incoming_video(update.message)
+    trim = LONG_VIDEO_MODE == "trim"
+    window = parse_window(update.message.caption) if trim else None
+    decision = admit_video(video, MAX_VIDEO_DURATION, trim=trim, window=window)
+    if not decision.admitted:
+        await update.message.reply_text(get_text(decision.reject, user_lang))
         return
     
     # Send processing message
-    processing_message = await update.message.reply_text(get_text("processing_video", user_lang))
+    processing_message = await update.message.reply_text(get_text(Msg.PROCESSING_VIDEO, user_lang))
     
-    # Create temp directory if not exists
-    os.makedirs(TEMP_DIRECTORY, exist_ok=True)
-    
-    # Create temporary files for input and output
-    input_file = os.path.join(TEMP_DIRECTORY, f"input_{user_id}_{video.file_id}.mp4")
-    output_file = os.path.join(TEMP_DIRECTORY, f"output_{user_id}_{video.file_id}.mp4")
+    # Every job works in its own scratch directory, removed when the job
+    # ends; leftovers of crashed processes are swept at startup
+    scratch = context.bot_data["scratch"]
+    expected_bytes = 3 * video.file_size if video.file_size else None
     
     try:
-        # Download video file
-        video_file = await context.bot.get_file(video.file_id)
-        
-        # Download video to temp file
-        await video_file.download_to_drive(input_file)
-        
-        # Process video in a separate thread to avoid blocking the event loop
-        loop = asyncio.get_event_loop()
-        success = await loop.run_in_executor(executor, process_video_sync, input_file, output_file)
-        
-        if not success:
-            raise Exception("Video processing failed")
-        
-        # Send video as video note (circle) to user
-        with open(output_file, 'rb') as video_file:
-            # Send to user
-            sent_message = await context.bot.send_video_note(
-                chat_id=update.effective_chat.id,
-                video_note=video_file,
-                read_timeout=60,  # Increase timeout for large files
-                write_timeout=60,
-                connect_timeout=60,
-                pool_timeout=60
+        async with scratch.job(expected_bytes) as job:
+            input_file = job.path("input.mp4")
+            output_file = job.path("output.mp4")
+            
+            # Download video file
+            video_file = await context.bot.get_file(video.file_id)
+            
+            # Download video to temp file
+            await video_file.download_to_drive(input_file)
+            
+            # Process video in a separate thread to avoid blocking the event loop
+            loop = asyncio.get_event_loop()
+            
+            # Documents come without a duration; read it from the file header
+            if decision.duration is None:
+                await loop.run_in_executor(
+                    executor, admit_download, decision, input_file, MAX_VIDEO_DURATION, trim, window
+                )
+                if not decision.admitted:
+                    await processing_message.edit_text(get_text(decision.reject, user_lang))
+                    return
+            
+            # Cut the kept window out of long videos without decoding; if the
+            # stream copy fails the encoder seeks to the window itself
+            clip_window = None
+            if decision.trim is not None:
+                start, length = decision.trim
+                trimmed_file = job.path("trimmed.mp4")
+                if await loop.run_in_executor(executor, extract_window, input_file, trimmed_file, start, length):
+                    input_file = trimmed_file
+                    # The copy starts at the keyframe before ``start``
+                    clip_window = (0, length)
+                else:
+                    clip_window = (start, length)
+            
+            # Crop to a square, scale down and encode once the job's
+            # estimated memory fits into the budget; the moderation preview
+            # and contact sheet come out of the same decode
+            duration = clip_window[1] if clip_window else decision.duration
+            estimate = estimate_job_bytes(
+                decision.width, decision.height, duration,
+                ENCODER_BACKEND, ENCODER_THREADS, decision.target_resolution, previews=True
             )
-                        # Get the file_id from the sent message
-            if sent_message and hasattr(sent_message, 'video_note') and sent_message.video_note:
+            encoders = context.bot_data["encoders"]
+            await encoders.encode(
+                ENCODER_BACKEND, input_file, output_file, estimate,
+                size=640,
+                preset=ENCODER_PRESET,
+                threads=ENCODER_THREADS,
+                temp_audiofile=job.path("audio.m4a"),
+                target_resolution=decision.target_resolution,
+                window=clip_window,
+                preview_file=job.path("preview.mp4"),
+                sheet_file=job.path("sheet.jpg"),
+                duration=duration
+            )
+            
+            # Send video as video note (circle) to user; the upload is streamed
+            # through the media pool so it cannot block control requests
+            uploads = context.bot_data["uploads"]
+            sent_message = await uploads.send_video_note(update.effective_chat.id, output_file)
+            
+            if decision.trim is not None:
+                start, length = decision.trim
+                await update.message.reply_text(get_text(
+                    Msg.VIDEO_TRIMMED, user_lang, count=int(length), start=format_timestamp(start)
+                ))
+            
+            # Get the file_id from the sent message; moderation and publishing
+            # re-send by file_id instead of uploading again
+            if sent_message and sent_message.video_note:
                 video_note_file_id = sent_message.video_note.file_id
-                
+            
                 # Store file_id and get a short ID for callback data
                 # Pass user_id to store in database
                 short_id = await store_file_id(video_note_file_id, user_id)
                 
+                # Keep the preview for moderation beyond the job directory
+                await context.bot_data["previews"].keep(
+                    short_id, job.path("preview.mp4"), job.path("sheet.jpg")
+                )
+            
                 # Create inline keyboard with Yes/No buttons using short ID
                 # Ensure callback_data is not too long (max 64 bytes)
-                # Use a shorter prefix to save space
-                keyboard = [
-                    [
-                        InlineKeyboardButton(
-                            get_text("share_yes", user_lang), 
-                            callback_data=f"sy_{short_id[:6]}"  # Shortened prefix and limited ID length
-                        ),
-                        InlineKeyboardButton(
-                            get_text("share_no", user_lang), 
-                            callback_data="sn"  # Shortened callback data
-                        )
-                    ]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
+                reply_markup = share_keyboard(user_lang, short_id)
+            
                 # Send success message with share buttons
                 await update.message.reply_text(
-                    get_text("video_saved", user_lang),
+                    get_text(Msg.VIDEO_SAVED, user_lang),
                     reply_markup=reply_markup
                 )
             else:
-                logging.error("Failed to get video_note from sent message")
+                logger.error("Failed to get video_note from sent message")
                 # Send simple success message without share buttons
-                await update.message.reply_text(get_text("video_saved", user_lang))
-        
-        # Delete processing message
-        await processing_message.delete()
+                await update.message.reply_text(get_text(Msg.VIDEO_SAVED, user_lang))
+            
+            # Delete processing message
+            await processing_message.delete()
         
+    except (ScratchSpaceFull, MemoryBudgetFull):
+        await processing_message.edit_text(get_text(Msg.SERVER_BUSY, user_lang))
     except Exception as e:
         # If error occurs, send error message
-        await processing_message.edit_text(get_text("video_processing_error", user_lang))
-        logging.error(f"Error processing video: {e}")
-    finally:
-        # Always clean up files in finally block to ensure they're deleted
-        try:
-            if os.path.exists(input_file):
-                os.remove(input_file)
-            if os.path.exists(output_file):
-                os.remove(output_file)
-        except Exception as cleanup_error:
-            logging.error(f"Error cleaning up files: {cleanup_error}")
+        await processing_message.edit_text(get_text(Msg.VIDEO_PROCESSING_ERROR, user_lang))
+        logger.error("Error processing video: %s", e)
 
 async def share_yes_callback(update: Update, context: CallbackContext) -> None:
     """
@@ -346,7 +324,7 @@ async def share_yes_callback(update: Update, context: CallbackContext) -> None:
     
     # Get user language from Redis or fallback to context
     try:
-        user_lang = redis_client.get(f"user_lang:{user_id}")
+        user_lang = user_store.get_language(user_id)
     except Exception:
         # Fix: Safely access user_data with proper error handling
         try:
@@ -362,18 +340,17 @@ async def share_yes_callback(update: Update, context: CallbackContext) -> None:
     callback_data = query.data
     short_id = callback_data[3:]  # Remove "sy_" prefix
     
-    # Log for debugging
-    logging.info(f"Share yes callback with short_id: {short_id}")
+    logger.debug("Share yes callback with short_id: %s", short_id)
     
     # Get the original file_id from database
     video_note_file_id = await get_file_id(short_id)
     
     # Log result of file_id lookup
-    logging.info(f"Retrieved file_id for {short_id}: {'Found' if video_note_file_id else 'Not found'}")
+    logger.debug("Retrieved file_id for %s: %s", short_id, 'Found' if video_note_file_id else 'Not found')
     
     if not video_note_file_id:
-        await query.edit_message_text(get_text("error_video_expired", user_lang))
-        logging.error(f"File ID not found for short_id: {short_id}")
+        await query.edit_message_text(get_text(Msg.ERROR_VIDEO_EXPIRED, user_lang))
+        logger.error("File ID not found for short_id: %s", short_id)
         return
     
     # Update video status in database
@@ -383,57 +360,100 @@ async def share_yes_callback(update: Update, context: CallbackContext) -> None:
         if video_circle:
             video_circle.status = "pending"
             await video_circle.save()
-            logging.info(f"Updated video status to 'pending' for short_id: {short_id}")
+            logger.info("Video status changed to pending", extra={"short_id": short_id, "status": "pending"})
     except Exception as e:
-        logging.error(f"Error updating video status in database: {e}")
+        logger.error("Error updating video status in database: %s", e)
     
     # Send thank you message to user
-    await query.edit_message_text(get_text("share_thanks", user_lang))
+    await query.edit_message_text(get_text(Msg.SHARE_THANKS, user_lang))
     
     # Send video to admins with publish/reject buttons
-    user_info = f"{get_text('admin_new_video', user_lang)}\n{update.effective_user.first_name} (@{update.effective_user.username or 'без username'}, ID: {user_id})"
+    user_info = f"{get_text(Msg.ADMIN_NEW_VIDEO, user_lang)}\n{update.effective_user.first_name} (@{update.effective_user.username or 'без username'}, ID: {user_id})"
     
     # Store file_id for admin buttons and get a new short ID
     # We'll use the same short_id for admin to maintain consistency in database
     admin_short_id = short_id
     
+    # Admins get the lightweight preview first and the full circle on
+    # demand; circles without a stored preview are sent in full
+    preview_file, sheet_file = context.bot_data["previews"].get(short_id)
+    
     # Create inline keyboard with publish/reject buttons using short ID
     # Ensure callback_data is not too long (max 64 bytes)
-    # Use a shorter prefix to save space
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                get_text("admin_publish", user_lang), 
-                callback_data=f"p_{admin_short_id}_{user_id}"  # Shortened prefix and limited ID length
-            ),
-            InlineKeyboardButton(
-                get_text("admin_reject", user_lang), 
-                callback_data=f"r_{admin_short_id}_{user_id}"  # Shortened prefix and limited ID length
-            )
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = moderation_keyboard(user_lang, admin_short_id, user_id, full_video=preview_file is not None)
     
-    # Send to all admins
+    # Send to all admins; the fan-out yields to interactive requests. Preview
+    # files are uploaded once and re-sent by file_id.
+    file_ids = {}
     for admin_id in ADMIN_IDS:
         try:
-            # Send the video note to admin
-            await context.bot.send_video_note(
-                chat_id=admin_id,
-                video_note=video_note_file_id,
-                read_timeout=60,  # Increase timeout for large files
-                write_timeout=60,
-                connect_timeout=60,
-                pool_timeout=60
-            )
-            # Send user info with buttons to admin
-            await context.bot.send_message(
-                chat_id=admin_id,
-                text=user_info,
-                reply_markup=reply_markup
-            )
+            # Send the preview or the video note to admin
+            if preview_file:
+                await _send_preview_file(
+                    context, "video_note", admin_id, preview_file, file_ids,
+                    rate_limit_args={"priority": Priority.BULK}
+                )
+            else:
+                await context.bot.send_video_note(
+                    chat_id=admin_id,
+                    video_note=video_note_file_id,
+                    rate_limit_args={"priority": Priority.BULK}
+                )
+            # Send user info with buttons to admin, on the contact sheet if
+            # there is one
+            if sheet_file:
+                await _send_preview_file(
+                    context, "photo", admin_id, sheet_file, file_ids,
+                    caption=user_info,
+                    reply_markup=reply_markup,
+                    rate_limit_args={"priority": Priority.BULK}
+                )
+            else:
+                await context.bot.send_message(
+                    chat_id=admin_id,
+                    text=user_info,
+                    reply_markup=reply_markup,
+                    rate_limit_args={"priority": Priority.BULK}
+                )
         except Exception as e:
-            logging.error(f"Error sending video to admin {admin_id}: {e}")
+            logger.error("Error sending video to admin %s: %s", admin_id, e)
+
+async def _send_preview_file(context, kind, chat_id, path, file_ids, **kwargs):
+    """
+    Send a stored preview file, uploading it only the first time
+    
+    Args:
+        context (CallbackContext): Telegram context object
+        kind (str): ``video_note`` or ``photo``
+        chat_id (int): Target chat
+        path (str): Local preview file
+        file_ids (dict): file_ids of files uploaded in this fan-out by kind
+        **kwargs: Extra arguments for the send method
+    """
+    if kind in file_ids:
+        send = getattr(context.bot, f"send_{kind}")
+        await send(chat_id=chat_id, **{kind: file_ids[kind]}, **kwargs)
+        return
+    
+    upload = getattr(context.bot_data["uploads"], f"send_{kind}")
+    message = await upload(chat_id, path, **kwargs)
+    # Photos come back in several sizes, the largest last
+    media = message.photo[-1] if kind == "photo" else message.video_note
+    file_ids[kind] = media.file_id
+
+async def _edit_moderation_message(query, text, **kwargs):
+    """
+    Edit an admin's moderation message, plain text or a contact sheet
+    
+    Args:
+        query (CallbackQuery): Callback query of the moderation button
+        text (str): New text
+        **kwargs: Extra arguments for the edit method
+    """
+    if query.message and query.message.photo:
+        await query.edit_message_caption(caption=text, **kwargs)
+    else:
+        await query.edit_message_text(text, **kwargs)
 
 async def share_no_callback(update: Update, context: CallbackContext) -> None:
     """
@@ -450,7 +470,7 @@ async def share_no_callback(update: Update, context: CallbackContext) -> None:
     
     # Get user language from Redis or fallback to context
     try:
-        user_lang = redis_client.get(f"user_lang:{user_id}")
+        user_lang = user_store.get_language(user_id)
     except Exception:
         # Fix: Safely access user_data with proper error handling
         try:
@@ -462,11 +482,11 @@ async def share_no_callback(update: Update, context: CallbackContext) -> None:
         user_lang = "ru"
     
     # Send declined message
-    await query.edit_message_text(get_text("share_declined", user_lang))
+    await query.edit_message_text(get_text(Msg.SHARE_DECLINED, user_lang))
 
-async def reject_callback(update: Update, context: CallbackContext) -> None:
+async def publish_callback(update: Update, context: CallbackContext) -> None:
     """
-    Handle reject button callback
+    Handle publish button callback
     
     Args:
         update (Update): Telegram update object
@@ -483,7 +503,7 @@ async def reject_callback(update: Update, context: CallbackContext) -> None:
     
     # Get admin language
     try:
-        admin_lang = redis_client.get(f"user_lang:{admin_id}")
+        admin_lang = user_store.get_language(admin_id)
     except Exception:
         admin_lang = context.user_data.get("language", "ru") if hasattr(context, "user_data") else "ru"
     
@@ -491,126 +511,78 @@ async def reject_callback(update: Update, context: CallbackContext) -> None:
         admin_lang = "ru"
     
     # Extract short_id and user_id from callback data
-    # Format: r_<short_id>_<user_id> (shortened from reject_<short_id>_<user_id>)
+    # Format: p_<short_id>_<user_id> (shortened from publish_<short_id>_<user_id>)
     callback_data = query.data
     parts = callback_data.split("_")
     if len(parts) < 3:
-        logging.error(f"Invalid callback data format: {callback_data}")
+        logger.error("Invalid callback data format: %s", callback_data)
+        await _edit_moderation_message(query, "Error: Invalid callback data format")
         return
     
     short_id = parts[1]
     user_id = int(parts[2])
     
+    # Get the original file_id from database or cache
+    video_note_file_id = await get_file_id(short_id)
+    
+    logger.debug("Retrieved file_id for publishing %s: %s", short_id, 'Found' if video_note_file_id else 'Not found')
+    
+    if not video_note_file_id:
+        await _edit_moderation_message(query, get_text(Msg.ERROR_VIDEO_EXPIRED, admin_lang))
+        logger.error("File ID not found for short_id: %s", short_id)
+        return
+    
+    try:
+        # Publish video note to channel; re-sending by file_id needs no upload
+        message = await context.bot.send_video_note(
+            chat_id=CHANNEL_ID,
+            video_note=video_note_file_id
+        )
+    except Exception as e:
+        logger.error("Error publishing video to channel: %s", e)
+        await _edit_moderation_message(query, f"Error: {str(e)}")
+        return
+    
     # Update video status in database
     try:
         from models.models import VideoCircle
         video_circle = await VideoCircle.filter(short_id__startswith=short_id).first()
         if video_circle:
-            video_circle.status = "rejected"
+            video_circle.status = "published"
             await video_circle.save()
-            logging.info(f"Updated video status to 'rejected' for short_id: {short_id}")
+            logger.info("Video status changed to published", extra={"short_id": short_id, "status": "published"})
     except Exception as e:
-        logging.error(f"Error updating video status in database: {e}")
+        logger.error("Error updating video status in database: %s", e)
+    
+    await context.bot_data["previews"].discard(short_id)
+    
+    # Get message link
+    channel_post_link = f"https://t.me/c/{str(CHANNEL_ID)[4:]}/{message.message_id}"
+    
+    # Send published message to admin with view in channel button
+    await _edit_moderation_message(query, 
+        get_text(Msg.ADMIN_PUBLISHED, admin_lang),
+        reply_markup=view_in_channel_keyboard(admin_lang, channel_post_link)
+    )
     
     # Get user language
     try:
-        user_lang = redis_client.get(f"user_lang:{user_id}")
+        user_lang = user_store.get_language(user_id)
     except Exception:
         user_lang = "ru"
     
     if not user_lang:
         user_lang = "ru"
-        
-    # Send rejection message to admin
-    await query.edit_message_text(get_text("admin_rejected", admin_lang))
     
-    # Send notification to user
-        
-    # Update video status in database
+    # Send published message to user
     try:
-        from models.models import VideoCircle
-        video_circle = await VideoCircle.filter(short_id__startswith=short_id).first()
-        if video_circle:
-            video_circle.status = "published"
-            await video_circle.save()
-            logging.info(f"Updated video status to 'published' for short_id: {short_id}")
-    except Exception as e:
-        logging.error(f"Error updating video status in database: {e}")
-    
-    # Get the original file_id from database or cache
-    video_note_file_id = await get_file_id(short_id)
-    
-    # Log result of file_id lookup
-    logging.info(f"Retrieved file_id for publishing {short_id}: {'Found' if video_note_file_id else 'Not found'}")
-    
-    if not video_note_file_id:
-        await query.edit_message_text(get_text("error_video_expired", admin_lang))
-        logging.error(f"File ID not found for short_id: {short_id}")
-        return
-        
-    try:
-            # Publish video note to channel
-            message = await context.bot.send_video_note(
-                chat_id=CHANNEL_ID,
-                video_note=video_note_file_id,
-                read_timeout=60,  # Increase timeout for large files
-                write_timeout=60,
-                connect_timeout=60,
-                pool_timeout=60
-            )
-            
-            # Get message link
-            channel_post_link = f"https://t.me/c/{str(CHANNEL_ID)[4:]}/{message.message_id}"
-            
-            # Create inline keyboard with view in channel button
-            keyboard = [
-                [
-                    InlineKeyboardButton(
-                        get_text("view_in_channel", admin_lang), 
-                        url=channel_post_link
-                    )
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            # Send published message to admin
-            await query.edit_message_text(
-                get_text("admin_published", admin_lang),
-                reply_markup=reply_markup
-            )
-            
-            # Get user language
-            try:
-                user_lang = redis_client.get(f"user_lang:{user_id}")
-            except Exception:
-                user_lang = "ru"
-            
-            if not user_lang:
-                user_lang = "ru"
-            
-            # Create inline keyboard with view in channel button for user
-            user_keyboard = [
-                [
-                    InlineKeyboardButton(
-                        get_text("view_in_channel", user_lang), 
-                        url=channel_post_link
-                    )
-                ]
-            ]
-            user_reply_markup = InlineKeyboardMarkup(user_keyboard)
-            
-            # Send published message to user
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=get_text("user_video_published", user_lang),
-                reply_markup=user_reply_markup
-            )
+        await context.bot.send_message(
+            chat_id=user_id,
+            text=get_text(Msg.USER_VIDEO_PUBLISHED, user_lang),
+            reply_markup=view_in_channel_keyboard(user_lang, channel_post_link)
+        )
     except Exception as e:
-        logging.error(f"Error publishing video to channel: {e}")
-        await query.edit_message_text(f"Error: {str(e)}")
-    else:
-        logging.error(f"Invalid callback data format: {callback_data}")
-        await query.edit_message_text("Error: Invalid callback data format")
+        logger.error("Error sending notification to user %s: %s", user_id, e)
 
 async def reject_callback(update: Update, context: CallbackContext) -> None:
     """
@@ -625,9 +597,13 @@ async def reject_callback(update: Update, context: CallbackContext) -> None:
     
     admin_id = update.effective_user.id
     
+    # Check if user is admin
+    if admin_id not in ADMIN_IDS:
+        return
+    
     # Get admin language from Redis or fallback to context
     try:
-        admin_lang = redis_client.get(f"user_lang:{admin_id}")
+        admin_lang = user_store.get_language(admin_id)
     except Exception:
         # Fix: Safely access user_data with proper error handling
         try:
@@ -646,12 +622,25 @@ async def reject_callback(update: Update, context: CallbackContext) -> None:
         short_id = parts[1]
         user_id = int(parts[2])
         
+        # Update video status in database
+        try:
+            from models.models import VideoCircle
+            video_circle = await VideoCircle.filter(short_id__startswith=short_id).first()
+            if video_circle:
+                video_circle.status = "rejected"
+                await video_circle.save()
+                logger.info("Video status changed to rejected", extra={"short_id": short_id, "status": "rejected"})
+        except Exception as e:
+            logger.error("Error updating video status in database: %s", e)
+        
+        await context.bot_data["previews"].discard(short_id)
+        
         # Send rejected message to admin
-        await query.edit_message_text(get_text("admin_rejected", admin_lang))
+        await _edit_moderation_message(query, get_text(Msg.ADMIN_REJECTED, admin_lang))
         
         # Get user language
         try:
-            user_lang = redis_client.get(f"user_lang:{user_id}")
+            user_lang = user_store.get_language(user_id)
         except Exception:
             user_lang = "ru"
         
@@ -661,11 +650,43 @@ async def reject_callback(update: Update, context: CallbackContext) -> None:
         # Send rejected message to user
         await context.bot.send_message(
             chat_id=user_id,
-            text=get_text("user_video_rejected", user_lang)
+            text=get_text(Msg.USER_VIDEO_REJECTED, user_lang)
         )
     else:
-        logging.error(f"Invalid callback data format: {callback_data}")
-        await query.edit_message_text("Error: Invalid callback data format")
+        logger.error("Invalid callback data format: %s", callback_data)
+        await _edit_moderation_message(query, "Error: Invalid callback data format")
+
+async def full_video_callback(update: Update, context: CallbackContext) -> None:
+    """
+    Send the full circle to an admin who got its preview
+    
+    Args:
+        update (Update): Telegram update object
+        context (CallbackContext): Telegram context object
+    """
+    query = update.callback_query
+    admin_id = update.effective_user.id
+    
+    # Check if user is admin
+    if admin_id not in ADMIN_IDS:
+        await query.answer()
+        return
+    
+    # Format: fv_<short_id>
+    short_id = query.data[3:]
+    video_note_file_id = await get_file_id(short_id)
+    
+    if not video_note_file_id:
+        try:
+            admin_lang = user_store.get_language(admin_id) or "ru"
+        except Exception:
+            admin_lang = "ru"
+        await query.answer(get_text(Msg.ERROR_VIDEO_EXPIRED, admin_lang), show_alert=True)
+        logger.error("File ID not found for short_id: %s", short_id)
+        return
+    
+    await query.answer()
+    await context.bot.send_video_note(chat_id=admin_id, video_note=video_note_file_id)
 
 async def create_circle_callback(update: Update, context: CallbackContext) -> None:
     """
@@ -682,7 +703,7 @@ async def create_circle_callback(update: Update, context: CallbackContext) -> No
     
     # Get user language from Redis or fallback to context
     try:
-        user_lang = redis_client.get(f"user_lang:{user_id}")
+        user_lang = user_store.get_language(user_id)
     except Exception:
         # Fix: Safely access user_data with proper error handling
         try:
@@ -703,7 +724,7 @@ async def create_circle_callback(update: Update, context: CallbackContext) -> No
         return
     
     # Send instruction to send video
-    await query.edit_message_text(get_text("upload_video_instruction", user_lang))
+    await query.edit_message_text(get_text(Msg.UPLOAD_VIDEO_INSTRUCTION, user_lang))
 
 async def create_circle_prank_callback(update: Update, context: CallbackContext) -> None:
     """
@@ -720,7 +741,7 @@ async def create_circle_prank_callback(update: Update, context: CallbackContext)
     
     # Get user language from Redis or fallback to context
     try:
-        user_lang = redis_client.get(f"user_lang:{user_id}")
+        user_lang = user_store.get_language(user_id)
     except Exception:
         # Fix: Safely access user_data with proper error handling
         try:
@@ -732,4 +753,4 @@ async def create_circle_prank_callback(update: Update, context: CallbackContext)
         user_lang = "ru"
     
     # Send feature not available message
-    await query.edit_message_text(get_text("feature_not_available", user_lang))
+    await query.edit_message_text(get_text(Msg.FEATURE_NOT_AVAILABLE, user_lang))
@@ -5,68 +5,77 @@ import platform
 import subprocess
 import asyncio
 import signal
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import (
     Application, CommandHandler, CallbackQueryHandler, 
-    MessageHandler, filters, ContextTypes
+    MessageHandler, ChatJoinRequestHandler, ChatMemberHandler, filters, ContextTypes
 )
 import redis
-from tortoise import Tortoise
+import redis.asyncio
 
-from config.config import BOT_TOKEN, REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
+from config.config import (
+    BOT_TOKEN, ADMIN_IDS, REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD,
+    REDIS_CHECK_TIMEOUT, DB_CHECK_TIMEOUT, BOT_API_CHECK_TIMEOUT,
+    METRICS_HOST, METRICS_PORT,
+    LOG_LEVEL, LOG_JSON, LOG_DEBUG_SAMPLE_RATE, LOG_DEBUG_RATE_LIMIT,
+    CONTROL_POOL_SIZE, CONTROL_TIMEOUT, MEDIA_POOL_SIZE, MEDIA_TIMEOUT,
+    UPLOAD_CONCURRENCY, UPLOAD_MAX_INFLIGHT_MB, UPLOAD_ATTEMPTS,
+    RATE_LIMIT_OVERALL, RATE_LIMIT_CHAT, RATE_LIMIT_CHAT_BURST, RATE_LIMIT_GROUP, RATE_LIMIT_MAX_RETRIES,
+    TEMP_DIRECTORY, SCRATCH_TMPFS_DIRECTORY, SCRATCH_MIN_FREE_MB, SCRATCH_MAX_MB,
+    SCRATCH_ORPHAN_AGE, SCRATCH_SWEEP_INTERVAL,
+    MEMORY_BUDGET_MB, MEMORY_WAIT_TIMEOUT, ENCODER_WORKERS,
+    PREVIEW_DIRECTORY, PREVIEW_TTL, UPDATE_CONCURRENCY, UPDATE_MAX_PENDING,
+    VERIFIED_TTL, SWEEP_RATE, SWEEP_BATCH_SIZE, SWEEP_INTERVAL, SWEEP_ACTIVE_WINDOW
+)
 from database.db_setup import init_db
 from handlers.language_handler import language_handler, language_callback
-from handlers.subscription_handler import check_subscription, subscription_callback
+from handlers.subscription_handler import (
+    check_subscription, subscription_callback, join_request_handler, channel_member_handler
+)
 from handlers.video_handler import (
     video_handler, create_circle_callback, create_circle_prank_callback,
-    share_yes_callback, share_no_callback, publish_callback, reject_callback
+    share_yes_callback, share_no_callback, publish_callback, reject_callback,
+    full_video_callback
 )
 from handlers.admin_handler import admin_handler, admin_callback, admin_message_handler, admin_forward_handler
-from utils.localization import get_text
-
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+from utils.localization import get_text, Msg
+from utils.redis_client import redis_client
+from utils.user_store import user_store
+from utils.bootstrap import Bootstrap, DependencyCheck
+from utils.uploads import UploadManager
+from utils.request_pools import build_bot_request, build_media_request
+from utils.rate_limiter import ChatRateLimiter, RequestScheduler
+from utils.scratch import ScratchSpace
+from utils.memory import EncoderWorkers, MemoryBudget
+from utils.previews import PreviewStore
+from utils.sweeper import SubscriptionSweeper
+from utils.channel_health import channel_health
+from utils.known_users import known_users
+from utils.updates import UserOrderedUpdateProcessor
+from utils.structured_logging import setup_logging, stop_logging, correlate_application
+from utils.metrics import (
+    InstrumentedHTTPXRequest, instrument_application, instrument_tortoise, start_metrics_server
 )
+
 logger = logging.getLogger(__name__)
 
-# In-memory language cache as fallback for Redis
-language_cache = {}
 redis_process = None
 
-def start_redis_server():
+async def start_redis_server():
     """
-    Attempt to start Redis server if not running
+    Attempt to start a local Redis server without blocking the event loop
+    
+    The process is only spawned here; readiness is detected by the Redis
+    probe of the startup bootstrap, which keeps pinging with backoff.
     
     Returns:
-        bool: True if Redis server started or already running, False otherwise
+        bool: True if a Redis process was spawned, False otherwise
     """
     global redis_process
     
-    # Log system information for diagnostics
-    logger.info(f"Operating System: {platform.system()} {platform.release()}")
-    logger.info(f"Python Version: {platform.python_version()}")
-    
-    # Check if Redis is already running
-    try:
-        r = redis.Redis(
-            host=REDIS_HOST, 
-            port=REDIS_PORT, 
-            db=REDIS_DB, 
-            password=REDIS_PASSWORD,
-            socket_timeout=1,
-            socket_connect_timeout=1
-        )
-        r.ping()
-        logger.info("Redis server is already running")
+    if redis_process is not None and redis_process.returncode is None:
         return True
-    except redis.exceptions.ConnectionError:
-        logger.info("Redis server is not running or not accessible: Timeout connecting to server")
-    except Exception as e:
-        logger.info(f"Redis server is not running or not accessible: {e}")
     
-    # Try to start Redis server
     if platform.system() == "Windows":
         # Common Redis installation paths on Windows
         redis_paths = [
@@ -75,210 +84,194 @@ def start_redis_server():
             r"C:\Program Files (x86)\Redis\redis-server.exe",
             r"redis-server.exe"  # If in PATH
         ]
-        
-        for path in redis_paths:
-            try:
-                if os.path.exists(path):
-                    # Start Redis server
-                    redis_process = subprocess.Popen(
-                        [path],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        creationflags=subprocess.CREATE_NO_WINDOW
-                    )
-                    
-                    # Wait a bit for Redis to start
-                    import time
-                    time.sleep(2)
-                    
-                    # Check if process is still running
-                    if redis_process.poll() is None:
-                        # Try to connect to Redis
-                        try:
-                            r = redis.Redis(
-                                host=REDIS_HOST, 
-                                port=REDIS_PORT, 
-                                db=REDIS_DB, 
-                                password=REDIS_PASSWORD,
-                                socket_timeout=1,
-                                socket_connect_timeout=1
-                            )
-                            r.ping()
-                            logger.info(f"Redis server started successfully using {path}")
-                            return True
-                        except Exception as e:
-                            logger.warning(f"Redis server started but connection failed: {e}")
-                            # Get stdout/stderr for diagnostics
-                            stdout, stderr = redis_process.communicate(timeout=1)
-                            logger.debug(f"Redis stdout: {stdout.decode('utf-8', errors='ignore')}")
-                            logger.debug(f"Redis stderr: {stderr.decode('utf-8', errors='ignore')}")
-                            
-                            # Kill the process as it's not working correctly
-                            try:
-                                redis_process.kill()
-                            except:
-                                pass
-                    else:
-                        # Process exited immediately
-                        stdout, stderr = redis_process.communicate()
-                        logger.warning(f"Redis server failed to start. Exit code: {redis_process.returncode}")
-                        logger.debug(f"Redis stdout: {stdout.decode('utf-8', errors='ignore')}")
-                        logger.debug(f"Redis stderr: {stderr.decode('utf-8', errors='ignore')}")
-            except Exception as e:
-                logger.warning(f"Error starting Redis server with {path}: {e}")
-        
-        logger.warning("Redis executable not found in common locations. Please install Redis or specify the path manually.")
+        creationflags = subprocess.CREATE_NO_WINDOW
     else:
         # Linux/Mac
+        redis_paths = ["redis-server"]
+        creationflags = 0
+    
+    for path in redis_paths:
+        if os.path.isabs(path) and not os.path.exists(path):
+            continue
         try:
-            redis_process = subprocess.Popen(
-                ["redis-server"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
+            redis_process = await asyncio.create_subprocess_exec(
+                path,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                creationflags=creationflags
             )
-            
-            # Wait a bit for Redis to start
-            import time
-            time.sleep(2)
-            
-            # Check if process is still running
-            if redis_process.poll() is None:
-                # Try to connect to Redis
-                try:
-                    r = redis.Redis(
-                        host=REDIS_HOST, 
-                        port=REDIS_PORT, 
-                        db=REDIS_DB, 
-                        password=REDIS_PASSWORD,
-                        socket_timeout=1,
-                        socket_connect_timeout=1
-                    )
-                    r.ping()
-                    logger.info("Redis server started successfully")
-                    return True
-                except Exception as e:
-                    logger.warning(f"Redis server started but connection failed: {e}")
-                    # Kill the process as it's not working correctly
-                    try:
-                        redis_process.kill()
-                    except:
-                        pass
-            else:
-                # Process exited immediately
-                stdout, stderr = redis_process.communicate()
-                logger.warning(f"Redis server failed to start. Exit code: {redis_process.returncode}")
-                logger.debug(f"Redis stdout: {stdout.decode('utf-8', errors='ignore')}")
-                logger.debug(f"Redis stderr: {stderr.decode('utf-8', errors='ignore')}")
+            logger.info(f"Spawned Redis server using {path} (pid {redis_process.pid})")
+            return True
         except Exception as e:
-            logger.warning(f"Error starting Redis server: {e}")
+            logger.debug("Error starting Redis server with %s: %s", path, e)
     
-    logger.warning("Could not start Redis server, using in-memory cache for language preferences")
+    logger.warning("Could not start Redis server, using in-memory fallbacks for language preferences")
     logger.info("To use Redis, please install it manually and ensure it's running on localhost:6379")
     return False
 
-# Initialize Redis connection
-redis_client = None
-
-def init_redis():
+def make_redis_probe():
     """
-    Initialize Redis client
+    Build the Redis readiness probe
+    
+    The first failed ping tries to spawn a local redis-server once; later
+    attempts just ping again until the server accepts connections.
     
     Returns:
-        redis.Redis or dict: Redis client or dict as fallback
+        callable: Coroutine function for DependencyCheck
     """
-    global redis_client
+    client = redis.asyncio.Redis(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_DB,
+        password=REDIS_PASSWORD,
+        socket_timeout=REDIS_CHECK_TIMEOUT,
+        socket_connect_timeout=REDIS_CHECK_TIMEOUT
+    )
+    spawn_attempted = False
     
-    try:
-        redis_client = redis.Redis(
-            host=REDIS_HOST,
-            port=REDIS_PORT,
-            db=REDIS_DB,
-            password=REDIS_PASSWORD,
-            decode_responses=True,
-            socket_timeout=3,
-            socket_connect_timeout=3
-        )
-        redis_client.ping()
-        logger.info("Redis client initialized successfully")
-        return redis_client
-    except Exception as e:
-        logger.warning(f"Could not connect to Redis: {e}")
-        logger.info("Using in-memory cache for language preferences")
-        redis_client = language_cache
-        return language_cache
-
-# Run database initialization
-async def run_init_db():
-    """Run database initialization"""
-    await init_db()
+    async def probe():
+        nonlocal spawn_attempted
+        try:
+            await client.ping()
+        except redis.exceptions.ConnectionError:
+            if not spawn_attempted:
+                spawn_attempted = True
+                await start_redis_server()
+            raise
+        await client.close()
+    
+    return probe
 
-def cleanup():
+async def cleanup():
     """Clean up resources before exit"""
     global redis_process
     
-    # Kill Redis process if we started it
-    if redis_process is not None:
+    # Stop Redis process if we started it
+    if redis_process is not None and redis_process.returncode is None:
         try:
             redis_process.terminate()
-            redis_process.wait(timeout=5)
+            await asyncio.wait_for(redis_process.wait(), timeout=5)
             logger.info("Redis server stopped")
         except Exception as e:
             logger.warning(f"Error stopping Redis server: {e}")
             try:
                 redis_process.kill()
-            except:
+            except Exception:
                 pass
+    redis_process = None
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /start is issued."""
     user_id = update.effective_user.id
     
-    # Check if user exists in Redis cache for language preference
+    # Language preference and "verified until" marker in one Redis round trip
+    verified_until = None
     try:
-        user_lang = redis_client.get(f"user_lang:{user_id}")
+        user_lang, verified_until = user_store.lookup(user_id)
     except Exception as e:
-        logger.warning(f"Redis get failed: {e}")
+        logger.warning("Redis get failed: %s", e)
         user_lang = context.user_data.get("language")
     
     if not user_lang:
         # If not in Redis, show language selection
-        keyboard = [
-            [
-                InlineKeyboardButton("🇷🇺 Русский", callback_data="lang_ru"),
-                InlineKeyboardButton("🇬🇧 English", callback_data="lang_en"),
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
-            "Пожалуйста, выберите язык / Please select a language:",
-            reply_markup=reply_markup
-        )
+        await language_handler(update, context)
     else:
-        # User already has language preference, check subscription
-        await check_subscription(update, context, user_lang)
+        # User already has language preference, check subscription; recently
+        # verified users get the menu without a database or Bot API call
+        await check_subscription(update, context, user_lang, verified_until)
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /help is issued."""
     user_id = update.effective_user.id
     
     try:
-        user_lang = redis_client.get(f"user_lang:{user_id}")
+        user_lang = user_store.get_language(user_id)
     except Exception:
         user_lang = context.user_data.get("language", "ru")
     
     if not user_lang:
         user_lang = "ru"
     
-    await update.message.reply_text(get_text("help_text", user_lang))
+    await update.message.reply_text(get_text(Msg.HELP_TEXT, user_lang))
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Log errors caused by Updates."""
-    logger.warning(f'Update "{update}" caused error "{context.error}"')
+    # The update repr is large and may contain user content; log its id only
+    logger.warning(
+        "Update %s caused error %r",
+        getattr(update, "update_id", None), context.error,
+        exc_info=context.error
+    )
 
 async def run_bot():
     """Run the bot with proper async setup"""
     # Create the Application and pass it your bot's token
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Control calls (answers, messages, edits) and media calls (video notes,
+    # getFile, downloads) use separate connection pools. Instrumented
+    # requests record the time spent in every Bot API method. Outgoing
+    # requests are paced within Telegram's flood limits, callback answers
+    # first. Updates of different users are processed concurrently.
+    media_request = build_media_request(MEDIA_POOL_SIZE, MEDIA_TIMEOUT)
+    rate_limiter = ChatRateLimiter(RequestScheduler(
+        overall_rate=RATE_LIMIT_OVERALL,
+        chat_rate=RATE_LIMIT_CHAT,
+        chat_burst=RATE_LIMIT_CHAT_BURST,
+        group_rate=RATE_LIMIT_GROUP,
+        max_retries=RATE_LIMIT_MAX_RETRIES
+    ))
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(build_bot_request(CONTROL_POOL_SIZE, CONTROL_TIMEOUT, media_request, MEDIA_POOL_SIZE))
+        .get_updates_request(InstrumentedHTTPXRequest())
+        .rate_limiter(rate_limiter)
+        .concurrent_updates(UserOrderedUpdateProcessor(UPDATE_CONCURRENCY, UPDATE_MAX_PENDING))
+        .build()
+    )
+
+    # Encoded videos are uploaded through the media pool
+    uploads = UploadManager(
+        BOT_TOKEN,
+        media_request,
+        max_concurrent=UPLOAD_CONCURRENCY,
+        max_inflight_bytes=UPLOAD_MAX_INFLIGHT_MB * 1024 * 1024,
+        attempts=UPLOAD_ATTEMPTS,
+        rate_limiter=rate_limiter
+    )
+    application.bot_data["uploads"] = uploads
+    
+    # Per-job scratch directories for downloads and encodes
+    scratch = ScratchSpace(
+        [root for root in (SCRATCH_TMPFS_DIRECTORY, TEMP_DIRECTORY) if root],
+        min_free_bytes=SCRATCH_MIN_FREE_MB * 1024 * 1024,
+        max_bytes=SCRATCH_MAX_MB * 1024 * 1024,
+        orphan_age=SCRATCH_ORPHAN_AGE,
+        sweep_interval=SCRATCH_SWEEP_INTERVAL
+    )
+    application.bot_data["scratch"] = scratch
+    
+    # Encodes are admitted against a global memory budget
+    encoders = EncoderWorkers(
+        MemoryBudget(MEMORY_BUDGET_MB * 1024 * 1024, wait_timeout=MEMORY_WAIT_TIMEOUT),
+        mode=ENCODER_WORKERS
+    )
+    application.bot_data["encoders"] = encoders
+    
+    # Moderation previews wait here until their circle is moderated
+    previews = PreviewStore(PREVIEW_DIRECTORY, ttl=PREVIEW_TTL)
+    application.bot_data["previews"] = previews
+    
+    # Subscriptions of all users are re-checked in the background
+    sweeper = SubscriptionSweeper(
+        application.bot,
+        user_store,
+        redis_client,
+        rate=SWEEP_RATE,
+        batch_size=SWEEP_BATCH_SIZE,
+        interval=SWEEP_INTERVAL,
+        active_window=SWEEP_ACTIVE_WINDOW,
+        verified_ttl=VERIFIED_TTL
+    )
 
     # Basic commands
     application.add_handler(CommandHandler("start", start))
@@ -290,6 +283,10 @@ async def run_bot():
     # Subscription check handler
     application.add_handler(CallbackQueryHandler(subscription_callback, pattern=r'^check_sub'))
     
+    # Channels gated by join requests
+    application.add_handler(ChatJoinRequestHandler(join_request_handler))
+    application.add_handler(ChatMemberHandler(channel_member_handler, ChatMemberHandler.CHAT_MEMBER))
+    
     # Menu handlers
     application.add_handler(CallbackQueryHandler(create_circle_callback, pattern=r'^create_circle$'))
     application.add_handler(CallbackQueryHandler(create_circle_prank_callback, pattern=r'^create_circle_prank$'))
@@ -301,30 +298,66 @@ async def run_bot():
     # Admin moderation handlers
     application.add_handler(CallbackQueryHandler(publish_callback, pattern=r'^p_'))
     application.add_handler(CallbackQueryHandler(reject_callback, pattern=r'^r_'))
+    application.add_handler(CallbackQueryHandler(full_video_callback, pattern=r'^fv_'))
     
     # Admin panel handlers
     application.add_handler(CommandHandler("admin", admin_handler))
     application.add_handler(CallbackQueryHandler(admin_callback, pattern=r'^admin_'))
     
     # Message handlers
-    application.add_handler(MessageHandler(filters.VIDEO, video_handler))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, admin_message_handler))
-    application.add_handler(MessageHandler(filters.FORWARDED, admin_forward_handler))
+    application.add_handler(MessageHandler(
+        filters.VIDEO | filters.ANIMATION | filters.Document.VIDEO, video_handler
+    ))
+    # Admin conversation steps; other users' chatter is dropped by the
+    # filter without touching Redis. Forwards go first so a forwarded text
+    # post reaches the forward step.
+    admin_filter = filters.User(user_id=ADMIN_IDS)
+    application.add_handler(MessageHandler(filters.FORWARDED & admin_filter, admin_forward_handler))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & admin_filter, admin_message_handler))
     
     # Log all errors
     application.add_error_handler(error_handler)
     
-    # Start the Bot
-    logger.info("Starting bot...")
-    await application.initialize()
-    await application.start()
-    await application.updater.start_polling()
+    # Record wall time per handler and tag log records with the update id
+    instrument_application(application)
+    correlate_application(application)
     
-    # Run the bot until the user presses Ctrl-C
-    logger.info("Bot is running. Press Ctrl+C to stop.")
+    # Bring up dependencies concurrently. Telegram is required before polling
+    # can start; Redis and MySQL keep retrying in the background.
+    bootstrap = Bootstrap()
+    metrics_runner = None
     
-    # Keep the bot running
     try:
+        logger.info("Starting bot...")
+        await bootstrap.start([
+            DependencyCheck(
+                "redis", make_redis_probe(), REDIS_CHECK_TIMEOUT,
+                on_ready=redis_client.mark_available
+            ),
+            DependencyCheck("mysql", init_db, DB_CHECK_TIMEOUT, on_ready=instrument_tortoise),
+            # Application.initialize() performs the getMe call
+            DependencyCheck("bot_api", application.initialize, BOT_API_CHECK_TIMEOUT, required=True),
+        ])
+        
+        if METRICS_PORT:
+            metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+        
+        await uploads.start()
+        await scratch.start()
+        await previews.start()
+        channel_health.start(application.bot)
+        known_users.start()
+        if SWEEP_RATE > 0:
+            sweeper.start()
+        
+        await application.start()
+        # chat_member updates are only sent when asked for
+        await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        bootstrap.mark("bot", "polling started")
+        
+        # Run the bot until the user presses Ctrl-C
+        logger.info("Bot is running. Press Ctrl+C to stop.")
+        
         # Keep the main task running
         while True:
             await asyncio.sleep(1)
@@ -332,39 +365,45 @@ async def run_bot():
         logger.info("Bot stopped by user request")
     finally:
         # Stop the bot gracefully
-        await application.stop()
-        await application.updater.stop()
+        await bootstrap.shutdown()
+        await sweeper.stop()
+        await channel_health.stop()
+        await known_users.stop()
+        if application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
         await application.shutdown()
+        await uploads.shutdown()
+        await scratch.stop()
+        await previews.stop()
+        encoders.shutdown()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         
         # Cleanup resources
-        cleanup()
+        await cleanup()
 
 def main() -> None:
     """Start the bot with proper event loop handling for Python 3.13+"""
-    # Try to start Redis server
-    start_redis_server()
-    
-    # Initialize Redis client
-    init_redis()
-    
-    # Initialize database
+    log_listener = setup_logging(LOG_LEVEL, LOG_JSON, LOG_DEBUG_SAMPLE_RATE, LOG_DEBUG_RATE_LIMIT)
     try:
         # Create and set event loop explicitly for Python 3.13+ compatibility
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         
-        # Run database initialization
-        loop.run_until_complete(run_init_db())
+        # Log system information for diagnostics
+        logger.info(f"Operating System: {platform.system()} {platform.release()}")
+        logger.info(f"Python Version: {platform.python_version()}")
         
-        # Run the bot
+        # Run the bot; dependencies are brought up inside the event loop
         loop.run_until_complete(run_bot())
     except KeyboardInterrupt:
         logger.info("Bot stopped by user request")
     except Exception as e:
         logger.error(f"Error running bot: {e}", exc_info=True)
     finally:
-        # Cleanup on exit
-        cleanup()
+        stop_logging(log_listener)
 
 if __name__ == '__main__':
     main()
@@ -9,16 +9,18 @@ import tempfile
 from concurrent.futures import ThreadPoolExecutor
 
 from app.keyboards.admin import get_admin_panel_keyboard, get_channels_list_keyboard, get_channel_edit_keyboard
-from app.utils.localization import get_text
-from app.services.redis_service import RedisService
+from app.utils.localization import get_text, Msg
+from app.services.user_store import UserStore
 from app.services.admin_service import AdminService
+from app.utils.fsm_storage import RedisHashStorage
 from app.models.models import Channel
+from config.config import ADMIN_IDS
 
 # Create router
 admin_router = Router()
 
-# Admin user IDs - replace with actual admin IDs
-ADMIN_IDS = [1340988413]  # Added user's ID from conversation
+# Matches admins' updates without any I/O
+IS_ADMIN = F.from_user.id.in_(ADMIN_IDS)
 
 # FSM states for conversation
 CHANNEL_NAME, BUTTON_TEXT, FORWARD_POST, CHANNEL_LINK = range(4)
@@ -34,12 +36,12 @@ async def admin_handler(message: Message):
     user_id = message.from_user.id
     
     # Get user language from Redis
-    redis_service = RedisService()
-    user_lang = await redis_service.get(f"user_lang:{user_id}") or "ru"
+    user_store = UserStore()
+    user_lang = await user_store.get_language(user_id) or "ru"
     
     # Check if user is admin
     if user_id not in ADMIN_IDS:
-        await message.answer(get_text("feature_not_available", user_lang))
+        await message.answer(get_text(Msg.FEATURE_NOT_AVAILABLE, user_lang))
         return
     
     # Show admin panel
@@ -53,17 +55,17 @@ async def show_admin_panel(message, user_lang="ru"):
     
     if isinstance(message, CallbackQuery):
         await message.message.edit_text(
-            get_text("admin_welcome", user_lang),
+            get_text(Msg.ADMIN_WELCOME, user_lang),
             reply_markup=keyboard
         )
     else:
         await message.answer(
-            get_text("admin_welcome", user_lang),
+            get_text(Msg.ADMIN_WELCOME, user_lang),
             reply_markup=keyboard
         )
 
 @admin_router.callback_query(F.data.startswith("admin_"))
-async def admin_callback(callback: CallbackQuery):
+async def admin_callback(callback: CallbackQuery, admin_storage: RedisHashStorage):
     """
     Handle admin panel callbacks
     """
@@ -72,39 +74,44 @@ async def admin_callback(callback: CallbackQuery):
     user_id = callback.from_user.id
     
     # Get user language from Redis
-    redis_service = RedisService()
-    user_lang = await redis_service.get(f"user_lang:{user_id}") or "ru"
+    user_store = UserStore()
+    user_lang = await user_store.get_language(user_id) or "ru"
     
     # Check if user is admin
     if user_id not in ADMIN_IDS:
-        await callback.message.edit_text(get_text("feature_not_available", user_lang))
+        await callback.message.edit_text(get_text(Msg.FEATURE_NOT_AVAILABLE, user_lang))
         return
     
     callback_data = callback.data
-    admin_service = AdminService()
+    admin_service = AdminService(admin_storage, callback.bot.id)
     
     if callback_data == "admin_channels_list":
         await show_channels_list(callback, user_lang)
     elif callback_data == "admin_add_channel":
-        # Start the channel addition process using FSM
+        # Start the channel addition process using FSM, dropping whatever
+        # an abandoned earlier flow left behind
+        await admin_service.clear_state(user_id)
         await admin_service.set_state(user_id, CHANNEL_NAME)
-        await callback.message.edit_text(get_text("admin_channel_name_prompt", user_lang))
+        await callback.message.edit_text(get_text(Msg.ADMIN_CHANNEL_NAME_PROMPT, user_lang))
     elif callback_data.startswith("admin_edit_channel_"):
         channel_id = int(callback_data.split("_")[-1])
         # Set state for editing channel
-        await admin_service.set_state(user_id, "edit_channel")
-        await admin_service.set_data(user_id, "edit_channel_id", channel_id)
+        await admin_service.set_state(user_id, "edit_channel", edit_channel_id=channel_id)
         await show_channel_edit(callback, channel_id, user_lang)
+    elif callback_data.startswith("admin_join_requests_"):
+        channel_id = int(callback_data.split("_")[-1])
+        await toggle_join_requests(callback, channel_id, user_lang)
     elif callback_data.startswith("admin_delete_channel_"):
         channel_id = int(callback_data.split("_")[-1])
         await delete_channel(callback, channel_id, user_lang)
     elif callback_data == "admin_back":
         await show_admin_panel(callback, user_lang)
 
-@admin_router.message()
-async def admin_message_handler(message: Message):
+# Registered before the text step so a forwarded text post reaches it
+@admin_router.message(IS_ADMIN, F.forward_from_chat)
+async def admin_forward_handler(message: Message, admin_storage: RedisHashStorage):
     """
-    Handle text messages in admin mode
+    Handle forwarded messages in admin mode
     """
     user_id = message.from_user.id
     
@@ -112,38 +119,87 @@ async def admin_message_handler(message: Message):
     if user_id not in ADMIN_IDS:
         return
     
+    # Get admin service
+    admin_service = AdminService(admin_storage, message.bot.id)
+    
+    # Check if user is in admin state before anything else is read; the
+    # data collected so far comes with it
+    admin_state, admin_data = await admin_service.get_conversation(user_id)
+    if admin_state != FORWARD_POST:
+        return
+    
     # Get user language from Redis
-    redis_service = RedisService()
-    user_lang = await redis_service.get(f"user_lang:{user_id}") or "ru"
+    user_store = UserStore()
+    user_lang = await user_store.get_language(user_id) or "ru"
+    
+    # Check if message is forwarded from channel
+    if not message.forward_from_chat or message.forward_from_chat.type != "channel":
+        await message.answer(get_text(Msg.ADMIN_INVALID_FORWARD, user_lang))
+        return
+    
+    # Get channel ID from forward
+    channel_id = message.forward_from_chat.id
+    
+    # Check if user is admin of the channel
+    try:
+        bot = message.bot
+        chat_member = await bot.get_chat_member(chat_id=channel_id, user_id=user_id)
+        is_admin = chat_member.status in ['administrator', 'creator']
+        
+        if not is_admin:
+            await message.answer(get_text(Msg.ADMIN_NOT_ADMIN, user_lang))
+            return
+        
+        # Save channel ID and ask for channel link
+        await admin_service.set_state(user_id, CHANNEL_LINK, channel_id=channel_id)
+        await message.answer(get_text(Msg.ADMIN_CHANNEL_LINK_PROMPT, user_lang))
+        
+    except Exception as e:
+        logging.error(f"Error checking admin status: {e}")
+        await message.answer(get_text(Msg.ADMIN_NOT_ADMIN, user_lang))
+
+@admin_router.message(IS_ADMIN, F.text, ~F.text.startswith("/"))
+async def admin_message_handler(message: Message, admin_storage: RedisHashStorage):
+    """
+    Handle text messages in admin mode
+    """
+    user_id = message.from_user.id
+    
+    # Check if user is admin
+    if user_id not in ADMIN_IDS:
+        return
     
     # Get admin service
-    admin_service = AdminService()
+    admin_service = AdminService(admin_storage, message.bot.id)
     
-    # Check if user is in admin state
-    admin_state = await admin_service.get_state(user_id)
-    if not admin_state:
+    # Check if user is in admin state before anything else is read; the
+    # data collected so far comes with it
+    admin_state, admin_data = await admin_service.get_conversation(user_id)
+    if admin_state is None:
         return
     
+    # Get user language from Redis
+    user_store = UserStore()
+    user_lang = await user_store.get_language(user_id) or "ru"
+    
     if admin_state == CHANNEL_NAME:
         # Save channel name and ask for button text
-        await admin_service.set_data(user_id, "channel_name", message.text)
-        await admin_service.set_state(user_id, BUTTON_TEXT)
-        await message.answer(get_text("admin_button_text_prompt", user_lang))
+        await admin_service.set_state(user_id, BUTTON_TEXT, channel_name=message.text)
+        await message.answer(get_text(Msg.ADMIN_BUTTON_TEXT_PROMPT, user_lang))
     
     elif admin_state == BUTTON_TEXT:
         # Save button text and ask for forwarded post
-        await admin_service.set_data(user_id, "button_text", message.text)
-        await admin_service.set_state(user_id, FORWARD_POST)
-        await message.answer(get_text("admin_forward_post_prompt", user_lang))
+        await admin_service.set_state(user_id, FORWARD_POST, button_text=message.text)
+        await message.answer(get_text(Msg.ADMIN_FORWARD_POST_PROMPT, user_lang))
     
     elif admin_state == CHANNEL_LINK:
         # Save channel link and create channel
         channel_link = message.text
         
         # Get saved data
-        channel_name = await admin_service.get_data(user_id, "channel_name")
-        channel_id = await admin_service.get_data(user_id, "channel_id")
-        button_text = await admin_service.get_data(user_id, "button_text")
+        channel_name = admin_data.get("channel_name")
+        channel_id = admin_data.get("channel_id")
+        button_text = admin_data.get("button_text")
         
         # Create channel in database
         channel = await Channel.create(
@@ -158,61 +214,11 @@ async def admin_message_handler(message: Message):
         await admin_service.clear_state(user_id)
         
         # Send success message
-        await message.answer(get_text("admin_channel_added", user_lang))
+        await message.answer(get_text(Msg.ADMIN_CHANNEL_ADDED, user_lang))
         
         # Show admin panel
         await show_admin_panel(message, user_lang)
 
-@admin_router.message(F.forward_from_chat)
-async def admin_forward_handler(message: Message):
-    """
-    Handle forwarded messages in admin mode
-    """
-    user_id = message.from_user.id
-    
-    # Check if user is admin
-    if user_id not in ADMIN_IDS:
-        return
-    
-    # Get user language from Redis
-    redis_service = RedisService()
-    user_lang = await redis_service.get(f"user_lang:{user_id}") or "ru"
-    
-    # Get admin service
-    admin_service = AdminService()
-    
-    # Check if user is in admin state
-    admin_state = await admin_service.get_state(user_id)
-    if not admin_state or admin_state != FORWARD_POST:
-        return
-    
-    # Check if message is forwarded from channel
-    if not message.forward_from_chat or message.forward_from_chat.type != "channel":
-        await message.answer(get_text("admin_invalid_forward", user_lang))
-        return
-    
-    # Get channel ID from forward
-    channel_id = message.forward_from_chat.id
-    
-    # Check if user is admin of the channel
-    try:
-        bot = message.bot
-        chat_member = await bot.get_chat_member(chat_id=channel_id, user_id=user_id)
-        is_admin = chat_member.status in ['administrator', 'creator']
-        
-        if not is_admin:
-            await message.answer(get_text("admin_not_admin", user_lang))
-            return
-        
-        # Save channel ID and ask for channel link
-        await admin_service.set_data(user_id, "channel_id", channel_id)
-        await admin_service.set_state(user_id, CHANNEL_LINK)
-        await message.answer(get_text("admin_channel_link_prompt", user_lang))
-        
-    except Exception as e:
-        logging.error(f"Error checking admin status: {e}")
-        await message.answer(get_text("admin_not_admin", user_lang))
-
 async def show_channels_list(callback, user_lang="ru"):
     """
     Show list of channels
@@ -225,7 +231,7 @@ async def show_channels_list(callback, user_lang="ru"):
         keyboard = get_channels_list_keyboard([], user_lang)
         
         await callback.message.edit_text(
-            f"{get_text('admin_channels_list', user_lang)}\n\nNo channels found.",
+            f"{get_text(Msg.ADMIN_CHANNELS_LIST, user_lang)}\n\nNo channels found.",
             reply_markup=keyboard
         )
         return
@@ -234,7 +240,7 @@ async def show_channels_list(callback, user_lang="ru"):
     keyboard = get_channels_list_keyboard(channels, user_lang)
     
     await callback.message.edit_text(
-        get_text("admin_channels_list", user_lang),
+        get_text(Msg.ADMIN_CHANNELS_LIST, user_lang),
         reply_markup=keyboard
     )
 
@@ -250,7 +256,7 @@ async def show_channel_edit(callback, channel_id, user_lang="ru"):
     
     # Show channel info
     channel_info = f"""
-{get_text('admin_channels_list', user_lang)}
+{get_text(Msg.ADMIN_CHANNELS_LIST, user_lang)}
 
 ID: {channel.id}
 Name: {channel.channel_name}
@@ -258,6 +264,7 @@ Channel ID: {channel.channel_id}
 Link: {channel.channel_link}
 Button text: {channel.button_text}
 Active: {'Yes' if channel.is_active else 'No'}
+Join requests: {'Yes' if channel.join_requests else 'No'}
     """
     
     await callback.message.edit_text(
@@ -265,6 +272,16 @@ Active: {'Yes' if channel.is_active else 'No'}
         reply_markup=keyboard
     )
 
+async def toggle_join_requests(callback, channel_id, user_lang="ru"):
+    """
+    Switch a channel between join request gating and membership checks
+    """
+    channel = await Channel.get(id=channel_id)
+    channel.join_requests = not channel.join_requests
+    await channel.save(update_fields=["join_requests"])
+    
+    await show_channel_edit(callback, channel_id, user_lang)
+
 async def delete_channel(callback, channel_id, user_lang="ru"):
     """
     Delete channel
@@ -276,7 +293,7 @@ async def delete_channel(callback, channel_id, user_lang="ru"):
     await channel.delete()
     
     # Show success message
-    await callback.message.edit_text(get_text("admin_channel_deleted", user_lang))
+    await callback.message.edit_text(get_text(Msg.ADMIN_CHANNEL_DELETED, user_lang))
     
     # Show channels list
     await show_channels_list(callback, user_lang)
@@ -3,8 +3,8 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 
 from app.keyboards.language import get_language_keyboard
-from app.utils.localization import get_text
-from app.services.redis_service import RedisService
+from app.utils.localization import get_text, Msg, SUPPORTED_LANGUAGES
+from app.services.user_store import UserStore
 from app.handlers.subscription import check_subscription
 
 # Create router
@@ -30,12 +30,15 @@ async def language_callback(callback: CallbackQuery):
     user_id = callback.from_user.id
     selected_lang = callback.data.split('_')[1]  # Extract language code from callback data
     
+    if selected_lang not in SUPPORTED_LANGUAGES:
+        return
+    
     # Save language preference to Redis
-    redis_service = RedisService()
-    await redis_service.set(f"user_lang:{user_id}", selected_lang)
+    user_store = UserStore()
+    await user_store.set_language(user_id, selected_lang)
     
     # Confirm language selection
-    await callback.message.edit_text(get_text("language_selected", selected_lang))
+    await callback.message.edit_text(get_text(Msg.LANGUAGE_SELECTED, selected_lang))
     
     # Continue with subscription check
     await check_subscription(callback, selected_lang)
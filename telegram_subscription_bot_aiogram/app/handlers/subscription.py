@@ -1,20 +1,35 @@
-from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+import asyncio
+import logging
+import time
+
+from aiogram import Bot, Router, F
+from aiogram.types import Message, CallbackQuery, ChatJoinRequest, ChatMemberUpdated
 from aiogram.filters import Command
 
 from app.keyboards.subscription import get_subscription_keyboard, get_main_menu_keyboard
-from app.utils.localization import get_text
-from app.services.redis_service import RedisService
+from app.utils.localization import get_text, Msg
+from app.utils.metrics import SUBSCRIPTION_CHECKS, JOIN_REQUESTS
+from app.services.user_store import UserStore
 from app.services.subscription_service import SubscriptionService
-from app.models.models import User, Channel, UserSubscription
+from app.services.channel_health import channel_health
+from app.models.models import Channel, UserSubscription
+from config.config import VERIFIED_TTL, VERIFIED_REFRESH, SWEEP_RATE
 
 # Create router
 subscription_router = Router()
 
+# Background re-checks by user ID
+_reverifying = {}
+
 async def check_subscription(update, user_lang="ru"):
     """
     Check if user is subscribed to all required channels
     
+    Users verified within the last VERIFIED_TTL seconds get the main menu
+    straight away, without database or Bot API calls; their subscriptions
+    are re-checked in the background once the verification is older than
+    VERIFIED_REFRESH seconds.
+    
     Args:
         update: Update object (Message or CallbackQuery)
         user_lang (str): User language preference
@@ -26,42 +41,36 @@ async def check_subscription(update, user_lang="ru"):
         user_id = update.from_user.id
         message = update
     
-    # Get subscription service
-    subscription_service = SubscriptionService()
-    
-    # Get or create user in database
-    user, created = await User.get_or_create(
-        telegram_id=user_id,
-        defaults={"language": user_lang}
-    )
-    
-    if created:
-        # Update Redis cache with user language
-        redis_service = RedisService()
-        await redis_service.set(f"user_lang:{user_id}", user_lang)
+    user_store = UserStore()
     
-    # Get all active channels
-    channels = await Channel.filter(is_active=True)
+    await _touch(user_store, user_id)
     
-    if not channels:
-        # If no channels to subscribe, show main menu
-        await show_main_menu(message, user_lang)
-        return
+    if VERIFIED_TTL > 0:
+        verified_until = await user_store.get_verified_until(user_id)
+        now = time.time()
+        if verified_until is not None and verified_until > now:
+            SUBSCRIPTION_CHECKS.inc("fast")
+            if verified_until - now < VERIFIED_TTL - VERIFIED_REFRESH:
+                reverify_later(update.bot, user_id, user_lang)
+            await show_main_menu(message, user_lang)
+            return
     
-    # Check if user is subscribed to all channels
-    all_subscribed, unsubscribed_channels = await subscription_service.check_user_subscriptions(user_id, channels)
+    # Get subscription service bound to the dispatcher's bot and session
+    subscription_service = SubscriptionService(update.bot)
     
-    # Store previous subscription status to detect changes
-    was_subscribed_before = user.subscription_status
+    SUBSCRIPTION_CHECKS.inc("full")
+    created, was_subscribed_before, unsubscribed_channels = await subscription_service.refresh_user(
+        user_id, user_lang
+    )
     
-    # Update user subscription status
-    user.subscription_status = all_subscribed
-    await user.save()
+    if created:
+        # Update Redis cache with user language
+        await user_store.set_language(user_id, user_lang)
     
-    if all_subscribed:
+    if not unsubscribed_channels:
         # Only show thank you message if user wasn't subscribed before but is now
         if not was_subscribed_before:
-            await message.answer(get_text("subscription_success", user_lang))
+            await message.answer(get_text(Msg.SUBSCRIPTION_SUCCESS, user_lang))
         
         # Show main menu
         await show_main_menu(message, user_lang)
@@ -71,10 +80,35 @@ async def check_subscription(update, user_lang="ru"):
         
         # Use the special format for subscription message
         await message.answer(
-            get_text("subscription_required", user_lang),
+            get_text(Msg.SUBSCRIPTION_REQUIRED, user_lang),
             reply_markup=keyboard
         )
 
+def reverify_later(bot: Bot, user_id: int, user_lang: str = "ru") -> None:
+    """
+    Re-check the user's subscriptions in a background task
+    
+    A user who has left a channel loses their marker and goes through the
+    full check on their next visit.
+    
+    Args:
+        bot (Bot): Bot of the current update
+        user_id (int): Telegram user ID
+        user_lang (str): User language preference
+    """
+    if user_id in _reverifying:
+        return
+    task = asyncio.create_task(_reverify(bot, user_id, user_lang))
+    _reverifying[user_id] = task
+    task.add_done_callback(lambda _: _reverifying.pop(user_id, None))
+
+async def _reverify(bot: Bot, user_id: int, user_lang: str) -> None:
+    try:
+        SUBSCRIPTION_CHECKS.inc("background")
+        await SubscriptionService(bot).refresh_user(user_id, user_lang)
+    except Exception as e:
+        logging.warning(f"Background subscription check for user {user_id} failed: {e}")
+
 @subscription_router.callback_query(F.data == "check_sub")
 async def subscription_callback(callback: CallbackQuery):
     """
@@ -85,11 +119,11 @@ async def subscription_callback(callback: CallbackQuery):
     user_id = callback.from_user.id
     
     # Get user language from Redis
-    redis_service = RedisService()
-    user_lang = await redis_service.get(f"user_lang:{user_id}") or "ru"
+    user_store = UserStore()
+    user_lang = await user_store.get_language(user_id) or "ru"
     
     # Send checking message
-    await callback.message.edit_text(get_text("subscription_check", user_lang))
+    await callback.message.edit_text(get_text(Msg.SUBSCRIPTION_CHECK, user_lang))
     
     # Check subscription again
     await check_subscription(callback, user_lang)
@@ -105,19 +139,86 @@ async def show_main_menu(message, user_lang="ru"):
     keyboard = get_main_menu_keyboard(user_lang)
     
     await message.answer(
-        get_text("main_menu", user_lang),
+        get_text(Msg.MAIN_MENU, user_lang),
         reply_markup=keyboard
     )
 
-async def verify_subscription(user_id):
+async def verify_subscription(user_id, bot):
     """
     Verify if user is subscribed to all required channels
     
+    Circle uploads stay gated on live membership: the "verified until"
+    marker is set or dropped from the result but never trusted here.
+    
     Args:
         user_id (int): Telegram user ID
+        bot (Bot): Bot of the current update
         
     Returns:
         bool: True if subscribed to all channels, False otherwise
     """
-    subscription_service = SubscriptionService()
+    await _touch(UserStore(), user_id)
+    SUBSCRIPTION_CHECKS.inc("live")
+    
+    subscription_service = SubscriptionService(bot)
     return await subscription_service.verify_user_subscription(user_id)
+
+@subscription_router.chat_join_request()
+async def join_request_handler(join_request: ChatJoinRequest, bot: Bot):
+    """
+    Handle a join request to a channel gated by join requests
+    
+    The request is approved and the user recorded as subscribed, so
+    pressing check_sub needs no getChatMember call for the channel. A
+    request that cannot be approved records nothing. Requests to other
+    chats are left to their admins.
+    """
+    channel = await _gated_channel(join_request.chat.id)
+    if channel is None:
+        JOIN_REQUESTS.inc("ignored")
+        return
+    
+    try:
+        await join_request.approve()
+    except Exception as e:
+        # The request stays pending for the channel's admins
+        JOIN_REQUESTS.inc("failed")
+        logging.error(
+            f"Error approving join request of user {join_request.from_user.id} to channel {channel.channel_id}: {e}"
+        )
+        await channel_health.report_error(channel, e)
+        return
+    
+    JOIN_REQUESTS.inc("approved")
+    await SubscriptionService(bot).record_membership(join_request.from_user.id, channel, True)
+
+@subscription_router.chat_member()
+async def channel_member_handler(change: ChatMemberUpdated, bot: Bot):
+    """
+    Keep the records of channels gated by join requests current
+    
+    Joins through other links, approvals by admins, leaves and bans arrive
+    as chat_member updates.
+    """
+    is_member = _is_member(change.new_chat_member)
+    if is_member == _is_member(change.old_chat_member):
+        return
+    
+    channel = await _gated_channel(change.chat.id)
+    if channel is None:
+        return
+    
+    await SubscriptionService(bot).record_membership(change.new_chat_member.user.id, channel, is_member)
+
+async def _touch(user_store: UserStore, user_id: int) -> None:
+    # Recently active users are re-checked first by the sweeper, which also
+    # prunes them; without it the set would only grow
+    if SWEEP_RATE > 0:
+        await user_store.touch(user_id)
+
+async def _gated_channel(chat_id):
+    return await Channel.filter(channel_id=chat_id, is_active=True, join_requests=True).first()
+
+def _is_member(chat_member) -> bool:
+    # Restricted users may still be members
+    return chat_member.status in ['member', 'administrator', 'creator'] or getattr(chat_member, "is_member", False)
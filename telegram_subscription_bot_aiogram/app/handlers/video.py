@@ -1,53 +1,55 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 import asyncio
-import os
 import uuid
 import logging
 import tempfile
 from concurrent.futures import ThreadPoolExecutor
 from moviepy.editor import VideoFileClip
 
-from app.keyboards.video import get_share_keyboard, get_admin_moderation_keyboard
-from app.utils.localization import get_text
-from app.services.redis_service import RedisService
+from app.keyboards.video import get_share_keyboard, get_admin_moderation_keyboard, get_view_in_channel_keyboard
+from app.utils.localization import get_text, Msg
+from app.utils.rate_limiter import bulk_requests
+from app.utils.scratch import ScratchSpace, ScratchSpaceFull
+from app.utils.memory import EncoderWorkers, MemoryBudgetFull, estimate_job_bytes
+from app.utils.previews import PreviewStore
+from app.utils.admission import admit_download, admit_video, incoming_video
+from app.utils.trimming import extract_window, format_timestamp, parse_window
+from app.services.user_store import UserStore
 from app.services.video_service import VideoService
+from app.services.upload_service import UploadService
 from app.handlers.subscription import verify_subscription
 from app.models.models import User, VideoCircle
+from config.config import LONG_VIDEO_MODE, ENCODER_BACKEND, ENCODER_THREADS, ADMIN_IDS
+
+logger = logging.getLogger(__name__)
 
 # Create router
 video_router = Router()
 
-# Admin user IDs - replace with actual admin IDs
-ADMIN_IDS = [1340988413]  # Added user's ID from conversation
-
 # Channel ID for publishing circles
 CHANNEL_ID = -1002561514226
 
 # Thread pool executor for CPU-bound tasks
 executor = ThreadPoolExecutor(max_workers=4)
 
-# Temp directory for video processing
-TEMP_DIRECTORY = os.getenv('TEMP_DIRECTORY', 'temp')
 MAX_VIDEO_DURATION = 60  # seconds
 
-# Ensure temp directory exists
-os.makedirs(TEMP_DIRECTORY, exist_ok=True)
-
-@video_router.message(F.video)
-async def video_handler(message: Message):
+@video_router.message(F.video | F.animation | F.document.mime_type.startswith("video/"))
+async def video_handler(message: Message, uploads: UploadService, scratch: ScratchSpace,
+                        encoders: EncoderWorkers, previews: PreviewStore):
     """
     Handle video messages for circle creation
     """
     user_id = message.from_user.id
     
     # Get user language from Redis
-    redis_service = RedisService()
-    user_lang = await redis_service.get(f"user_lang:{user_id}") or "ru"
+    user_store = UserStore()
+    user_lang = await user_store.get_language(user_id) or "ru"
     
     # Strict subscription check before processing video
-    is_subscribed = await verify_subscription(user_id)
+    is_subscribed = await verify_subscription(user_id, message.bot)
     
     if not is_subscribed:
         # If user is not subscribed, check subscription and show subscription message
@@ -55,85 +57,123 @@ async def video_handler(message: Message):
         await check_subscription(message, user_lang)
         return
     
-    # Get video file
-    video = message.video
-    
-    # Check video duration
-    if video.duration > MAX_VIDEO_DURATION:
-        await message.reply(get_text("video_too_long", user_lang))
+    # Videos, animations and videos sent as files; reject what we cannot
+    # process before downloading anything
+    video = incoming_video(message)
+    trim = LONG_VIDEO_MODE == "trim"
+    window = parse_window(message.caption) if trim else None
+    decision = admit_video(video, MAX_VIDEO_DURATION, trim=trim, window=window)
+    if not decision.admitted:
+        await message.reply(get_text(decision.reject, user_lang))
         return
     
     # Send processing message
-    processing_message = await message.reply(get_text("processing_video", user_lang))
+    processing_message = await message.reply(get_text(Msg.PROCESSING_VIDEO, user_lang))
     
-    # Create temp directory if not exists
-    os.makedirs(TEMP_DIRECTORY, exist_ok=True)
-    
-    # Create temporary files for input and output
-    input_file = os.path.join(TEMP_DIRECTORY, f"input_{user_id}_{video.file_id}.mp4")
-    output_file = os.path.join(TEMP_DIRECTORY, f"output_{user_id}_{video.file_id}.mp4")
+    # Every job works in its own scratch directory, removed when the job
+    # ends; leftovers of crashed processes are swept at startup
+    expected_bytes = 3 * video.file_size if video.file_size else None
     
     try:
-        # Download video file
-        await message.bot.download(
-            video.file_id,
-            destination=input_file
-        )
-        
-        # Process video in a separate thread to avoid blocking the event loop
-        video_service = VideoService()
-        success = await video_service.process_video(input_file, output_file)
-        
-        if not success:
-            raise Exception("Video processing failed")
-        
-        # Send video as video note (circle) to user
-        with open(output_file, 'rb') as video_file:
-            # Send to user
-            video_note = FSInputFile(output_file)
-            sent_message = await message.answer_video_note(
-                video_note=video_note
+        async with scratch.job(expected_bytes) as job:
+            input_file = job.path("input.mp4")
+            output_file = job.path("output.mp4")
+            
+            # Download video file
+            await message.bot.download(
+                video.file_id,
+                destination=input_file
+            )
+            
+            # Documents come without a duration; read it from the file header
+            loop = asyncio.get_running_loop()
+            if decision.duration is None:
+                await loop.run_in_executor(
+                    executor, admit_download, decision, input_file, MAX_VIDEO_DURATION, trim, window
+                )
+                if not decision.admitted:
+                    await processing_message.edit_text(get_text(decision.reject, user_lang))
+                    return
+            
+            # Cut the kept window out of long videos without decoding; if the
+            # stream copy fails the encoder seeks to the window itself
+            clip_window = None
+            if decision.trim is not None:
+                start, length = decision.trim
+                trimmed_file = job.path("trimmed.mp4")
+                if await loop.run_in_executor(executor, extract_window, input_file, trimmed_file, start, length):
+                    input_file = trimmed_file
+                    # The copy starts at the keyframe before ``start``
+                    clip_window = (0, length)
+                else:
+                    clip_window = (start, length)
+            
+            # Encode once the job's estimated memory fits into the budget;
+            # the moderation preview and contact sheet come out of the same
+            # decode
+            duration = clip_window[1] if clip_window else decision.duration
+            estimate = estimate_job_bytes(
+                decision.width, decision.height, duration,
+                ENCODER_BACKEND, ENCODER_THREADS, decision.target_resolution, previews=True
+            )
+            video_service = VideoService()
+            success = await video_service.process_video(
+                encoders, input_file, output_file, job.path("audio.m4a"), estimate,
+                decision.target_resolution, clip_window,
+                preview_file=job.path("preview.mp4"),
+                sheet_file=job.path("sheet.jpg"),
+                duration=duration
             )
             
-            # Get the file_id from the sent message
+            if not success:
+                raise Exception("Video processing failed")
+            
+            # Send video as video note (circle) to user; the upload is streamed
+            # through the media pool so it cannot block control requests
+            sent_message = await uploads.send_video_note(message.chat.id, output_file)
+            
+            if decision.trim is not None:
+                start, length = decision.trim
+                await message.reply(get_text(
+                    Msg.VIDEO_TRIMMED, user_lang, count=int(length), start=format_timestamp(start)
+                ))
+            
+            # Get the file_id from the sent message; moderation and publishing
+            # re-send by file_id instead of uploading again
             if sent_message and sent_message.video_note:
                 video_note_file_id = sent_message.video_note.file_id
-                
+            
                 # Store file_id and get a short ID for callback data
                 short_id = await video_service.store_file_id(video_note_file_id, user_id)
                 
+                # Keep the preview for moderation beyond the job directory
+                await previews.keep(short_id[:6], job.path("preview.mp4"), job.path("sheet.jpg"))
+            
                 # Create inline keyboard with Yes/No buttons using short ID
                 keyboard = get_share_keyboard(short_id, user_lang)
-                
+            
                 # Send success message with share buttons
                 await message.reply(
-                    get_text("video_saved", user_lang),
+                    get_text(Msg.VIDEO_SAVED, user_lang),
                     reply_markup=keyboard
                 )
             else:
-                logging.error("Failed to get video_note from sent message")
+                logger.error("Failed to get video_note from sent message")
                 # Send simple success message without share buttons
-                await message.reply(get_text("video_saved", user_lang))
-        
-        # Delete processing message
-        await processing_message.delete()
+                await message.reply(get_text(Msg.VIDEO_SAVED, user_lang))
+            
+            # Delete processing message
+            await processing_message.delete()
         
+    except (ScratchSpaceFull, MemoryBudgetFull):
+        await processing_message.edit_text(get_text(Msg.SERVER_BUSY, user_lang))
     except Exception as e:
         # If error occurs, send error message
-        await processing_message.edit_text(get_text("video_processing_error", user_lang))
-        logging.error(f"Error processing video: {e}")
-    finally:
-        # Always clean up files in finally block to ensure they're deleted
-        try:
-            if os.path.exists(input_file):
-                os.remove(input_file)
-            if os.path.exists(output_file):
-                os.remove(output_file)
-        except Exception as cleanup_error:
-            logging.error(f"Error cleaning up files: {cleanup_error}")
+        await processing_message.edit_text(get_text(Msg.VIDEO_PROCESSING_ERROR, user_lang))
+        logger.error("Error processing video: %s", e)
 
 @video_router.callback_query(F.data.startswith("sy_"))
-async def share_yes_callback(callback: CallbackQuery):
+async def share_yes_callback(callback: CallbackQuery, uploads: UploadService, previews: PreviewStore):
     """
     Handle share yes button callback
     """
@@ -142,8 +182,8 @@ async def share_yes_callback(callback: CallbackQuery):
     user_id = callback.from_user.id
     
     # Get user language from Redis
-    redis_service = RedisService()
-    user_lang = await redis_service.get(f"user_lang:{user_id}") or "ru"
+    user_store = UserStore()
+    user_lang = await user_store.get_language(user_id) or "ru"
     
     # Extract short_id from callback data
     # Format: sy_<short_id> (shortened from share_yes_<short_id>)
@@ -151,7 +191,7 @@ async def share_yes_callback(callback: CallbackQuery):
     short_id = callback_data[3:]  # Remove "sy_" prefix
     
     # Log for debugging
-    logging.info(f"Share yes callback with short_id: {short_id}")
+    logger.debug("Share yes callback with short_id: %s", short_id)
     
     # Get video service
     video_service = VideoService()
@@ -160,11 +200,11 @@ async def share_yes_callback(callback: CallbackQuery):
     video_note_file_id = await video_service.get_file_id(short_id)
     
     # Log result of file_id lookup
-    logging.info(f"Retrieved file_id for {short_id}: {'Found' if video_note_file_id else 'Not found'}")
+    logger.debug("Retrieved file_id for %s: %s", short_id, 'Found' if video_note_file_id else 'Not found')
     
     if not video_note_file_id:
-        await callback.message.edit_text(get_text("error_video_expired", user_lang))
-        logging.error(f"File ID not found for short_id: {short_id}")
+        await callback.message.edit_text(get_text(Msg.ERROR_VIDEO_EXPIRED, user_lang))
+        logger.error("File ID not found for short_id: %s", short_id)
         return
     
     # Update video status in database
@@ -173,39 +213,97 @@ async def share_yes_callback(callback: CallbackQuery):
         if video_circle:
             video_circle.status = "pending"
             await video_circle.save()
-            logging.info(f"Updated video status to 'pending' for short_id: {short_id}")
+            logger.info("Video status changed to pending", extra={"short_id": short_id, "status": "pending"})
     except Exception as e:
-        logging.error(f"Error updating video status in database: {e}")
+        logger.error("Error updating video status in database: %s", e)
     
     # Send thank you message to user
-    await callback.message.edit_text(get_text("share_thanks", user_lang))
+    await callback.message.edit_text(get_text(Msg.SHARE_THANKS, user_lang))
     
     # Send video to admins with publish/reject buttons
-    user_info = f"{get_text('admin_new_video', user_lang)}\n{callback.from_user.first_name} (@{callback.from_user.username or 'без username'}, ID: {user_id})"
+    user_info = f"{get_text(Msg.ADMIN_NEW_VIDEO, user_lang)}\n{callback.from_user.first_name} (@{callback.from_user.username or 'без username'}, ID: {user_id})"
     
     # Store file_id for admin buttons and get a new short ID
     # We'll use the same short_id for admin to maintain consistency in database
     admin_short_id = short_id
     
+    # Admins get the lightweight preview first and the full circle on
+    # demand; circles without a stored preview are sent in full
+    preview_file, sheet_file = previews.get(short_id)
+    
     # Create inline keyboard with publish/reject buttons using short ID
-    keyboard = get_admin_moderation_keyboard(admin_short_id, user_id, user_lang)
+    keyboard = get_admin_moderation_keyboard(admin_short_id, user_id, user_lang,
+                                             full_video=preview_file is not None)
+    
+    # Send to all admins; the fan-out yields to interactive requests. Preview
+    # files are uploaded once and re-sent by file_id.
+    file_ids = {}
+    with bulk_requests():
+        for admin_id in ADMIN_IDS:
+            try:
+                # Send the preview or the video note to admin
+                if preview_file:
+                    await _send_preview_file(callback.bot, uploads, "video_note", admin_id, preview_file, file_ids)
+                else:
+                    await callback.bot.send_video_note(
+                        chat_id=admin_id,
+                        video_note=video_note_file_id
+                    )
+                # Send user info with buttons to admin, on the contact sheet
+                # if there is one
+                if sheet_file:
+                    await _send_preview_file(
+                        callback.bot, uploads, "photo", admin_id, sheet_file, file_ids,
+                        caption=user_info,
+                        reply_markup=keyboard
+                    )
+                else:
+                    await callback.bot.send_message(
+                        chat_id=admin_id,
+                        text=user_info,
+                        reply_markup=keyboard
+                    )
+            except Exception as e:
+                logger.error("Error sending video to admin %s: %s", admin_id, e)
+
+async def _send_preview_file(bot, uploads: UploadService, kind: str, chat_id: int, path: str,
+                             file_ids: dict, **kwargs):
+    """
+    Send a stored preview file, uploading it only the first time
+    
+    Args:
+        bot (Bot): Bot instance
+        uploads (UploadService): Upload service
+        kind (str): ``video_note`` or ``photo``
+        chat_id (int): Target chat
+        path (str): Local preview file
+        file_ids (dict): file_ids of files uploaded in this fan-out by kind
+        **kwargs: Extra arguments for the send method
+    """
+    if kind in file_ids:
+        send = getattr(bot, f"send_{kind}")
+        await send(chat_id=chat_id, **{kind: file_ids[kind]}, **kwargs)
+        return
     
-    # Send to all admins
-    for admin_id in ADMIN_IDS:
-        try:
-            # Send the video note to admin
-            await callback.bot.send_video_note(
-                chat_id=admin_id,
-                video_note=video_note_file_id
-            )
-            # Send user info with buttons to admin
-            await callback.bot.send_message(
-                chat_id=admin_id,
-                text=user_info,
-                reply_markup=keyboard
-            )
-        except Exception as e:
-            logging.error(f"Error sending video to admin {admin_id}: {e}")
+    upload = getattr(uploads, f"send_{kind}")
+    message = await upload(chat_id, path, **kwargs)
+    # Photos come back in several sizes, the largest last
+    media = message.photo[-1] if kind == "photo" else message.video_note
+    file_ids[kind] = media.file_id
+
+async def _edit_moderation_message(message: Message, text: str, **kwargs):
+    """
+    Edit an admin's moderation message, plain text or a contact sheet
+    
+    Args:
+        message (Message): Moderation message
+        text (str): New text
+        **kwargs: Extra arguments for the edit method
+    """
+    if message.photo:
+        await message.edit_caption(caption=text, **kwargs)
+    else:
+        await message.edit_text(text, **kwargs)
 
 @video_router.callback_query(F.data == "sn")
 async def share_no_callback(callback: CallbackQuery):
@@ -217,14 +315,14 @@ async def share_no_callback(callback: CallbackQuery):
     user_id = callback.from_user.id
     
     # Get user language from Redis
-    redis_service = RedisService()
-    user_lang = await redis_service.get(f"user_lang:{user_id}") or "ru"
+    user_store = UserStore()
+    user_lang = await user_store.get_language(user_id) or "ru"
     
     # Send declined message
-    await callback.message.edit_text(get_text("share_declined", user_lang))
+    await callback.message.edit_text(get_text(Msg.SHARE_DECLINED, user_lang))
 
 @video_router.callback_query(F.data.startswith("p_"))
-async def publish_callback(callback: CallbackQuery):
+async def publish_callback(callback: CallbackQuery, previews: PreviewStore):
     """
     Handle publish button callback
     """
@@ -237,8 +335,8 @@ async def publish_callback(callback: CallbackQuery):
         return
     
     # Get admin language from Redis
-    redis_service = RedisService()
-    admin_lang = await redis_service.get(f"user_lang:{user_id}") or "ru"
+    user_store = UserStore()
+    admin_lang = await user_store.get_language(user_id) or "ru"
     
     # Extract short_id and user_id from callback data
     # Format: p_<short_id>_<user_id>
@@ -254,8 +352,8 @@ async def publish_callback(callback: CallbackQuery):
     video_note_file_id = await video_service.get_file_id(short_id)
     
     if not video_note_file_id:
-        await callback.message.edit_text(get_text("error_video_expired", admin_lang))
-        logging.error(f"File ID not found for short_id: {short_id}")
+        await _edit_moderation_message(callback.message, get_text(Msg.ERROR_VIDEO_EXPIRED, admin_lang))
+        logger.error("File ID not found for short_id: %s", short_id)
         return
     
     try:
@@ -277,36 +375,34 @@ async def publish_callback(callback: CallbackQuery):
             video_circle.status = "published"
             video_circle.published_message_id = message_id
             await video_circle.save()
-            logging.info(f"Updated video status to 'published' for short_id: {short_id}")
+            logger.info("Video status changed to published", extra={"short_id": short_id, "status": "published"})
+        await previews.discard(short_id)
         
         # Send success message to admin
-        await callback.message.edit_text(get_text("admin_published", admin_lang))
+        await _edit_moderation_message(callback.message, get_text(Msg.ADMIN_PUBLISHED, admin_lang))
         
         # Get user language
-        user_lang = await redis_service.get(f"user_lang:{target_user_id}") or "ru"
+        user_lang = await user_store.get_language(target_user_id) or "ru"
         
         # Create inline keyboard with link to post
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=get_text("view_in_channel", user_lang), url=channel_post_link)]
-        ])
+        keyboard = get_view_in_channel_keyboard(channel_post_link, user_lang)
         
         # Send notification to user
         try:
             await callback.bot.send_message(
                 chat_id=target_user_id,
-                text=get_text("video_published", user_lang),
+                text=get_text(Msg.VIDEO_PUBLISHED, user_lang),
                 reply_markup=keyboard
             )
         except Exception as e:
-            logging.error(f"Error sending notification to user {target_user_id}: {e}")
+            logger.error("Error sending notification to user %s: %s", target_user_id, e)
     
     except Exception as e:
-        logging.error(f"Error publishing video: {e}")
-        await callback.message.edit_text(get_text("admin_publish_error", admin_lang))
+        logger.error("Error publishing video: %s", e)
+        await _edit_moderation_message(callback.message, get_text(Msg.ADMIN_PUBLISH_ERROR, admin_lang))
 
 @video_router.callback_query(F.data.startswith("r_"))
-async def reject_callback(callback: CallbackQuery):
+async def reject_callback(callback: CallbackQuery, previews: PreviewStore):
     """
     Handle reject button callback
     """
@@ -319,8 +415,8 @@ async def reject_callback(callback: CallbackQuery):
         return
     
     # Get admin language from Redis
-    redis_service = RedisService()
-    admin_lang = await redis_service.get(f"user_lang:{user_id}") or "ru"
+    user_store = UserStore()
+    admin_lang = await user_store.get_language(user_id) or "ru"
     
     # Extract short_id and user_id from callback data
     # Format: r_<short_id>_<user_id>
@@ -335,26 +431,53 @@ async def reject_callback(callback: CallbackQuery):
         if video_circle:
             video_circle.status = "rejected"
             await video_circle.save()
-            logging.info(f"Updated video status to 'rejected' for short_id: {short_id}")
+            logger.info("Video status changed to rejected", extra={"short_id": short_id, "status": "rejected"})
+        await previews.discard(short_id)
         
         # Send success message to admin
-        await callback.message.edit_text(get_text("admin_rejected", admin_lang))
+        await _edit_moderation_message(callback.message, get_text(Msg.ADMIN_REJECTED, admin_lang))
         
         # Get user language
-        user_lang = await redis_service.get(f"user_lang:{target_user_id}") or "ru"
+        user_lang = await user_store.get_language(target_user_id) or "ru"
         
         # Send notification to user
         try:
             await callback.bot.send_message(
                 chat_id=target_user_id,
-                text=get_text("video_rejected", user_lang)
+                text=get_text(Msg.VIDEO_REJECTED, user_lang)
             )
         except Exception as e:
-            logging.error(f"Error sending notification to user {target_user_id}: {e}")
+            logger.error("Error sending notification to user %s: %s", target_user_id, e)
     
     except Exception as e:
-        logging.error(f"Error rejecting video: {e}")
-        await callback.message.edit_text(get_text("admin_reject_error", admin_lang))
+        logger.error("Error rejecting video: %s", e)
+        await _edit_moderation_message(callback.message, get_text(Msg.ADMIN_REJECT_ERROR, admin_lang))
+
+@video_router.callback_query(F.data.startswith("fv_"))
+async def full_video_callback(callback: CallbackQuery):
+    """
+    Send the full circle to an admin who got its preview
+    """
+    user_id = callback.from_user.id
+    
+    # Check if user is admin
+    if user_id not in ADMIN_IDS:
+        await callback.answer()
+        return
+    
+    # Format: fv_<short_id>
+    short_id = callback.data[3:]
+    video_note_file_id = await VideoService().get_file_id(short_id)
+    
+    if not video_note_file_id:
+        user_store = UserStore()
+        admin_lang = await user_store.get_language(user_id) or "ru"
+        await callback.answer(get_text(Msg.ERROR_VIDEO_EXPIRED, admin_lang), show_alert=True)
+        logger.error("File ID not found for short_id: %s", short_id)
+        return
+    
+    await callback.answer()
+    await callback.bot.send_video_note(chat_id=user_id, video_note=video_note_file_id)
 
 @video_router.callback_query(F.data == "create_circle")
 async def create_circle_callback(callback: CallbackQuery):
@@ -366,11 +489,11 @@ async def create_circle_callback(callback: CallbackQuery):
     user_id = callback.from_user.id
     
     # Get user language from Redis
-    redis_service = RedisService()
-    user_lang = await redis_service.get(f"user_lang:{user_id}") or "ru"
+    user_store = UserStore()
+    user_lang = await user_store.get_language(user_id) or "ru"
     
     # Send instruction to upload video
-    await callback.message.edit_text(get_text("upload_video_instruction", user_lang))
+    await callback.message.edit_text(get_text(Msg.UPLOAD_VIDEO_INSTRUCTION, user_lang))
 
 @video_router.callback_query(F.data == "create_circle_prank")
 async def create_circle_prank_callback(callback: CallbackQuery):
@@ -382,8 +505,8 @@ async def create_circle_prank_callback(callback: CallbackQuery):
     user_id = callback.from_user.id
     
     # Get user language from Redis
-    redis_service = RedisService()
-    user_lang = await redis_service.get(f"user_lang:{user_id}") or "ru"
+    user_store = UserStore()
+    user_lang = await user_store.get_language(user_id) or "ru"
     
     # Send prank message
-    await callback.message.edit_text(get_text("prank_message", user_lang))
+    await callback.message.edit_text(get_text(Msg.PRANK_MESSAGE, user_lang))
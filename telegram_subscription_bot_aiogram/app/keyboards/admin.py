@@ -1,35 +1,49 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from typing import List
 
-from app.utils.localization import get_text
+from app.utils.localization import get_text, Msg, SUPPORTED_LANGUAGES
 from app.models.models import Channel
 
-def get_admin_panel_keyboard(user_lang: str) -> InlineKeyboardMarkup:
-    """
-    Create admin panel keyboard
-    
-    Args:
-        user_lang (str): User language preference
-        
-    Returns:
-        InlineKeyboardMarkup: Keyboard with admin options
-    """
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+_ADMIN_PANEL_KEYBOARDS = {
+    lang: InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(
-                text=get_text("admin_channels_list_button", user_lang),
+                text=get_text(Msg.ADMIN_CHANNELS_LIST_BUTTON, lang),
                 callback_data="admin_channels_list"
             )
         ],
         [
             InlineKeyboardButton(
-                text=get_text("admin_add_channel_button", user_lang),
+                text=get_text(Msg.ADMIN_ADD_CHANNEL_BUTTON, lang),
                 callback_data="admin_add_channel"
             )
         ]
     ])
+    for lang in SUPPORTED_LANGUAGES
+}
+
+_BACK_BUTTONS = {
+    lang: InlineKeyboardButton(
+        text=get_text(Msg.BACK_BUTTON, lang),
+        callback_data="admin_back"
+    )
+    for lang in SUPPORTED_LANGUAGES
+}
+
+def _lang(user_lang: str) -> str:
+    return user_lang if user_lang in _ADMIN_PANEL_KEYBOARDS else SUPPORTED_LANGUAGES[0]
+
+def get_admin_panel_keyboard(user_lang: str) -> InlineKeyboardMarkup:
+    """
+    Get admin panel keyboard
     
-    return keyboard
+    Args:
+        user_lang (str): User language preference
+        
+    Returns:
+        InlineKeyboardMarkup: Keyboard with admin options
+    """
+    return _ADMIN_PANEL_KEYBOARDS[_lang(user_lang)]
 
 def get_channels_list_keyboard(channels: List[Channel], user_lang: str) -> InlineKeyboardMarkup:
     """
@@ -53,12 +67,7 @@ def get_channels_list_keyboard(channels: List[Channel], user_lang: str) -> Inlin
         ])
     
     # Add back button
-    buttons.append([
-        InlineKeyboardButton(
-            text=get_text("back_button", user_lang),
-            callback_data="admin_back"
-        )
-    ])
+    buttons.append([_BACK_BUTTONS[_lang(user_lang)]])
     
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -73,25 +82,28 @@ def get_channel_edit_keyboard(channel: Channel, user_lang: str) -> InlineKeyboar
     Returns:
         InlineKeyboardMarkup: Keyboard with channel edit options
     """
-    active_text = get_text("deactivate_button", user_lang) if channel.is_active else get_text("activate_button", user_lang)
+    active_text = get_text(Msg.DEACTIVATE_BUTTON, user_lang) if channel.is_active else get_text(Msg.ACTIVATE_BUTTON, user_lang)
     active_data = f"admin_deactivate_channel_{channel.id}" if channel.is_active else f"admin_activate_channel_{channel.id}"
+    join_requests_text = get_text(
+        Msg.DISABLE_JOIN_REQUESTS_BUTTON if channel.join_requests else Msg.ENABLE_JOIN_REQUESTS_BUTTON, user_lang
+    )
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(
-                text=get_text("edit_name_button", user_lang),
+                text=get_text(Msg.EDIT_NAME_BUTTON, user_lang),
                 callback_data=f"admin_edit_name_{channel.id}"
             )
         ],
         [
             InlineKeyboardButton(
-                text=get_text("edit_link_button", user_lang),
+                text=get_text(Msg.EDIT_LINK_BUTTON, user_lang),
                 callback_data=f"admin_edit_link_{channel.id}"
             )
         ],
         [
             InlineKeyboardButton(
-                text=get_text("edit_button_text_button", user_lang),
+                text=get_text(Msg.EDIT_BUTTON_TEXT_BUTTON, user_lang),
                 callback_data=f"admin_edit_button_text_{channel.id}"
             )
         ],
@@ -103,13 +115,19 @@ def get_channel_edit_keyboard(channel: Channel, user_lang: str) -> InlineKeyboar
         ],
         [
             InlineKeyboardButton(
-                text=get_text("delete_button", user_lang),
+                text=join_requests_text,
+                callback_data=f"admin_join_requests_{channel.id}"
+            )
+        ],
+        [
+            InlineKeyboardButton(
+                text=get_text(Msg.DELETE_BUTTON, user_lang),
                 callback_data=f"admin_delete_channel_{channel.id}"
             )
         ],
         [
             InlineKeyboardButton(
-                text=get_text("back_button", user_lang),
+                text=get_text(Msg.BACK_BUTTON, user_lang),
                 callback_data="admin_channels_list"
             )
         ]
@@ -1,21 +1,24 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from typing import List
 
-from app.utils.localization import get_text
+from app.utils.localization import SUPPORTED_LANGUAGES, LANGUAGE_NAMES
 from app.models.models import Channel
 
+_LANGUAGE_BUTTONS = [
+    InlineKeyboardButton(text=LANGUAGE_NAMES[lang], callback_data=f"lang_{lang}")
+    for lang in SUPPORTED_LANGUAGES
+]
+
+# Language-independent, built once at import
+_LANGUAGE_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    _LANGUAGE_BUTTONS[i:i + 2] for i in range(0, len(_LANGUAGE_BUTTONS), 2)
+])
+
 def get_language_keyboard() -> InlineKeyboardMarkup:
     """
-    Create language selection keyboard
+    Get language selection keyboard
     
     Returns:
-        InlineKeyboardMarkup: Keyboard with language options
+        InlineKeyboardMarkup: Keyboard with one button per available catalog
     """
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text="🇷🇺 Русский", callback_data="lang_ru"),
-            InlineKeyboardButton(text="🇬🇧 English", callback_data="lang_en")
-        ]
-    ])
-    
-    return keyboard
+    return _LANGUAGE_KEYBOARD
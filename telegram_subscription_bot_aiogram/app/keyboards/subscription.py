@@ -1,13 +1,65 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from typing import List
+from functools import lru_cache
+from typing import List, Tuple
 
-from app.utils.localization import get_text
+from app.utils.localization import get_text, Msg, SUPPORTED_LANGUAGES
 from app.models.models import Channel
 
+_CHECK_SUBSCRIPTION_BUTTONS = {
+    lang: InlineKeyboardButton(
+        text=get_text(Msg.CHECK_SUBSCRIPTION, lang),
+        callback_data="check_sub"
+    )
+    for lang in SUPPORTED_LANGUAGES
+}
+
+# Main menu is static, so it is built once per language at import
+_MAIN_MENU_KEYBOARDS = {
+    lang: InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(
+                text=get_text(Msg.CREATE_CIRCLE_BUTTON, lang),
+                callback_data="create_circle"
+            )
+        ],
+        [
+            InlineKeyboardButton(
+                text=get_text(Msg.CREATE_CIRCLE_PRANK_BUTTON, lang),
+                callback_data="create_circle_prank"
+            )
+        ],
+        [
+            InlineKeyboardButton(
+                text=get_text(Msg.LANGUAGE_BUTTON, lang),
+                callback_data="language"
+            )
+        ]
+    ])
+    for lang in SUPPORTED_LANGUAGES
+}
+
+def _lang(user_lang: str) -> str:
+    return user_lang if user_lang in _MAIN_MENU_KEYBOARDS else SUPPORTED_LANGUAGES[0]
+
+@lru_cache(maxsize=64)
+def _build_subscription_keyboard(channel_buttons: Tuple[Tuple[str, str], ...], user_lang: str) -> InlineKeyboardMarkup:
+    buttons = [
+        [InlineKeyboardButton(text=button_text, url=channel_link)]
+        for button_text, channel_link in channel_buttons
+    ]
+    
+    # Add check subscription button
+    buttons.append([_CHECK_SUBSCRIPTION_BUTTONS[user_lang]])
+    
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
 def get_subscription_keyboard(channels: List[Channel], user_lang: str) -> InlineKeyboardMarkup:
     """
     Create subscription keyboard with channel buttons
     
+    The channel set rarely changes, so keyboards are cached by the exact
+    list of channel buttons.
+    
     Args:
         channels (List[Channel]): List of channels to subscribe
         user_lang (str): User language preference
@@ -15,29 +67,12 @@ def get_subscription_keyboard(channels: List[Channel], user_lang: str) -> Inline
     Returns:
         InlineKeyboardMarkup: Keyboard with channel buttons
     """
-    buttons = []
-    
-    for channel in channels:
-        buttons.append([
-            InlineKeyboardButton(
-                text=channel.button_text,
-                url=channel.channel_link
-            )
-        ])
-    
-    # Add check subscription button
-    buttons.append([
-        InlineKeyboardButton(
-            text=get_text("check_subscription", user_lang),
-            callback_data="check_sub"
-        )
-    ])
-    
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
+    channel_buttons = tuple((channel.button_text, channel.channel_link) for channel in channels)
+    return _build_subscription_keyboard(channel_buttons, _lang(user_lang))
 
 def get_main_menu_keyboard(user_lang: str) -> InlineKeyboardMarkup:
     """
-    Create main menu keyboard
+    Get main menu keyboard
     
     Args:
         user_lang (str): User language preference
@@ -45,25 +80,4 @@ def get_main_menu_keyboard(user_lang: str) -> InlineKeyboardMarkup:
     Returns:
         InlineKeyboardMarkup: Keyboard with main menu options
     """
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(
-                text=get_text("create_circle_button", user_lang),
-                callback_data="create_circle"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                text=get_text("create_circle_prank_button", user_lang),
-                callback_data="create_circle_prank"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                text=get_text("language_button", user_lang),
-                callback_data="language"
-            )
-        ]
-    ])
-    
-    return keyboard
+    return _MAIN_MENU_KEYBOARDS[_lang(user_lang)]
@@ -1,7 +1,39 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from typing import List
 
-from app.utils.localization import get_text
+from app.utils.localization import get_text, Msg, SUPPORTED_LANGUAGES
+
+# Buttons are prebuilt once per language; per-message keyboards only copy
+# them with the variable callback data or URL spliced in, skipping model
+# validation on the hot path.
+_SHARE_BUTTONS = {
+    lang: (
+        InlineKeyboardButton(text=get_text(Msg.SHARE_YES, lang), callback_data="sy_"),
+        InlineKeyboardButton(text=get_text(Msg.SHARE_NO, lang), callback_data="sn")
+    )
+    for lang in SUPPORTED_LANGUAGES
+}
+
+_MODERATION_BUTTONS = {
+    lang: (
+        InlineKeyboardButton(text=get_text(Msg.PUBLISH_BUTTON, lang), callback_data="p_"),
+        InlineKeyboardButton(text=get_text(Msg.REJECT_BUTTON, lang), callback_data="r_")
+    )
+    for lang in SUPPORTED_LANGUAGES
+}
+
+_FULL_VIDEO_BUTTONS = {
+    lang: InlineKeyboardButton(text=get_text(Msg.FULL_VIDEO_BUTTON, lang), callback_data="fv_")
+    for lang in SUPPORTED_LANGUAGES
+}
+
+_VIEW_IN_CHANNEL_BUTTONS = {
+    lang: InlineKeyboardButton(text=get_text(Msg.VIEW_IN_CHANNEL, lang), url="https://t.me/")
+    for lang in SUPPORTED_LANGUAGES
+}
+
+def _lang(user_lang: str) -> str:
+    return user_lang if user_lang in _SHARE_BUTTONS else SUPPORTED_LANGUAGES[0]
 
 def get_share_keyboard(short_id: str, user_lang: str) -> InlineKeyboardMarkup:
     """
@@ -16,22 +48,15 @@ def get_share_keyboard(short_id: str, user_lang: str) -> InlineKeyboardMarkup:
     """
     # Use shortened callback data to avoid 64 byte limit
     # sy_ = share_yes, sn = share_no
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(
-                text=get_text("share_yes", user_lang),
-                callback_data=f"sy_{short_id[:6]}"
-            ),
-            InlineKeyboardButton(
-                text=get_text("share_no", user_lang),
-                callback_data="sn"
-            )
-        ]
-    ])
+    yes_button, no_button = _SHARE_BUTTONS[_lang(user_lang)]
     
-    return keyboard
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=[[
+        yes_button.model_copy(update={"callback_data": f"sy_{short_id[:6]}"}),
+        no_button
+    ]])
 
-def get_admin_moderation_keyboard(short_id: str, user_id: int, user_lang: str) -> InlineKeyboardMarkup:
+def get_admin_moderation_keyboard(short_id: str, user_id: int, user_lang: str,
+                                  full_video: bool = False) -> InlineKeyboardMarkup:
     """
     Create keyboard with moderation options for admin
     
@@ -39,23 +64,39 @@ def get_admin_moderation_keyboard(short_id: str, user_id: int, user_lang: str) -
         short_id (str): Short ID for callback data
         user_id (int): User ID who created the video
         user_lang (str): User language preference
+        full_video (bool): Add a button fetching the full video, for
+            moderation messages sent with a preview
         
     Returns:
         InlineKeyboardMarkup: Keyboard with moderation options
     """
     # Use shortened callback data to avoid 64 byte limit
-    # p_ = publish, r_ = reject
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(
-                text=get_text("publish_button", user_lang),
-                callback_data=f"p_{short_id[:6]}_{user_id}"
-            ),
-            InlineKeyboardButton(
-                text=get_text("reject_button", user_lang),
-                callback_data=f"r_{short_id[:6]}_{user_id}"
-            )
-        ]
-    ])
+    # p_ = publish, r_ = reject, fv_ = full video
+    lang = _lang(user_lang)
+    publish_button, reject_button = _MODERATION_BUTTONS[lang]
+    
+    rows = [[
+        publish_button.model_copy(update={"callback_data": f"p_{short_id[:6]}_{user_id}"}),
+        reject_button.model_copy(update={"callback_data": f"r_{short_id[:6]}_{user_id}"})
+    ]]
+    if full_video:
+        rows.insert(0, [_FULL_VIDEO_BUTTONS[lang].model_copy(update={"callback_data": f"fv_{short_id[:6]}"})])
+    
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=rows)
+
+def get_view_in_channel_keyboard(url: str, user_lang: str) -> InlineKeyboardMarkup:
+    """
+    Create keyboard with a link to the published post
+    
+    Args:
+        url (str): Link to the channel post
+        user_lang (str): User language preference
+        
+    Returns:
+        InlineKeyboardMarkup: Keyboard with a single link button
+    """
+    button = _VIEW_IN_CHANNEL_BUTTONS[_lang(user_lang)]
     
-    return keyboard
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=[[
+        button.model_copy(update={"url": url})
+    ]])
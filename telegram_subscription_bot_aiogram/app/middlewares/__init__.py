@@ -0,0 +1,3 @@
+from .correlation import CorrelationMiddleware
+from .metrics import HandlerMetricsMiddleware, BotApiMetricsMiddleware
+from .rate_limit import RateLimitMiddleware
@@ -0,0 +1,27 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.utils.structured_logging import correlation_id
+
+
+class CorrelationMiddleware(BaseMiddleware):
+    """
+    Tag log records with the id of the update being processed
+
+    Register as an outer middleware on ``dp.update`` so the id is set before
+    any router, filter or handler runs.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        token = correlation_id.set(str(event.update_id))
+        try:
+            return await handler(event, data)
+        finally:
+            correlation_id.reset(token)
@@ -0,0 +1,43 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+
+from app.utils.metrics import HANDLER_SECONDS, HANDLER_ERRORS, BOT_API_SECONDS
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Record wall time of every handler
+
+    Register as an inner middleware so it only runs once a handler has
+    matched and ``data["handler"]`` is set.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, name)
+
+
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    """Record time spent in Bot API calls by method"""
+
+    async def __call__(self, make_request, bot, method):
+        with BOT_API_SECONDS.time(method.__api_method__):
+            return await make_request(bot, method)
@@ -0,0 +1,38 @@
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+from app.utils.rate_limiter import (
+    INTERACTIVE_METHODS, READ_METHODS, Priority, RequestScheduler, request_priority, retry_after_of
+)
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Pace Bot API calls with a shared RequestScheduler
+
+    Register the same instance on every session of the bot (control and
+    media), before the metrics middleware so retries are measured as
+    separate calls.
+
+    Args:
+        scheduler (RequestScheduler): Shared scheduler
+    """
+
+    def __init__(self, scheduler: RequestScheduler):
+        self.scheduler = scheduler
+
+    async def __call__(self, make_request, bot, method):
+        endpoint = method.__api_method__
+        if endpoint == "getUpdates":
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        priority = request_priority.get()
+        if priority is None:
+            priority = Priority.INTERACTIVE if endpoint in INTERACTIVE_METHODS else Priority.DEFAULT
+
+        # Sends to a chat and callback answers take tokens; reads do not
+        limited = endpoint == "answerCallbackQuery" or (chat_id is not None and endpoint not in READ_METHODS)
+
+        return await self.scheduler.run(
+            lambda: make_request(bot, method), chat_id, priority, retry_after_of, limited=limited
+        )
@@ -29,6 +29,8 @@ class Channel(Model):
     channel_link = fields.CharField(max_length=255)
     button_text = fields.CharField(max_length=255)
     is_active = fields.BooleanField(default=True)
+    # Gate with join requests instead of getChatMember checks
+    join_requests = fields.BooleanField(default=False)
     created_at = fields.DatetimeField(auto_now_add=True)
     updated_at = fields.DatetimeField(auto_now=True)
     
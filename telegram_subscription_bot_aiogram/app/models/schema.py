@@ -0,0 +1,24 @@
+"""
+Columns added to tables after they were first created
+
+Tortoise.generate_schemas only creates missing tables, so existing
+databases get new columns from add_missing_columns at startup.
+"""
+from tortoise import Tortoise
+
+ADDED_COLUMNS = [
+    ("channels", "join_requests", "BOOL NOT NULL DEFAULT 0"),
+]
+
+
+async def add_missing_columns() -> None:
+    """Add the columns of ADDED_COLUMNS that the database lacks"""
+    connection = Tortoise.get_connection("default")
+    for table, column, definition in ADDED_COLUMNS:
+        rows = await connection.execute_query_dict(
+            "SELECT COUNT(*) AS present FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+            [table, column]
+        )
+        if not rows[0]["present"]:
+            await connection.execute_script(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}")
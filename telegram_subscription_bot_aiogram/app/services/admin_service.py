@@ -1,130 +1,95 @@
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+
+from aiogram.fsm.storage.base import StorageKey
+
+from app.utils.fsm_storage import RedisHashStorage
 
 class AdminService:
     """Service for working with admin functionality"""
-    
-    def __init__(self):
-        from app.services.redis_service import RedisService
-        self.redis_service = RedisService()
-    
-    async def set_state(self, user_id: int, state: Any) -> bool:
-        """
-        Set admin state for user
-        
-        Args:
-            user_id (int): Telegram user ID
-            state (Any): State to set
-            
-        Returns:
-            bool: True if successful, False otherwise
-        """
-        try:
-            redis_key = f"admin_state:{user_id}"
-            await self.redis_service.set(redis_key, str(state))
-            return True
-        except Exception as e:
-            logging.error(f"Error setting admin state for user {user_id}: {e}")
-            return False
-    
-    async def get_state(self, user_id: int) -> Optional[Any]:
+
+    def __init__(self, storage: RedisHashStorage, bot_id: int):
         """
-        Get admin state for user
-        
         Args:
-            user_id (int): Telegram user ID
-            
-        Returns:
-            Optional[Any]: State or None if not set
+            storage (RedisHashStorage): Storage of admin conversations
+            bot_id (int): ID of the bot the conversations belong to
         """
-        try:
-            redis_key = f"admin_state:{user_id}"
-            state = await self.redis_service.get(redis_key)
-            
-            if state and state.isdigit():
-                return int(state)
-            
-            return state
-        except Exception as e:
-            logging.error(f"Error getting admin state for user {user_id}: {e}")
-            return None
-    
-    async def clear_state(self, user_id: int) -> bool:
+        self.storage = storage
+        self.bot_id = bot_id
+
+    def _key(self, user_id: int) -> StorageKey:
+        # Admin conversations run in the admin's private chat
+        return StorageKey(bot_id=self.bot_id, chat_id=user_id, user_id=user_id)
+
+    @staticmethod
+    def _parse_state(state: Optional[str]) -> Optional[Any]:
+        if state and state.isdigit():
+            return int(state)
+        return state
+
+    async def get_conversation(self, user_id: int) -> Tuple[Optional[Any], Dict[str, Any]]:
         """
-        Clear admin state for user
-        
+        Get admin state and all collected data for user in one read
+
         Args:
             user_id (int): Telegram user ID
-            
+
         Returns:
-            bool: True if successful, False otherwise
+            Tuple[Optional[Any], Dict[str, Any]]: State or None if not set,
+            and the data collected so far
         """
         try:
-            redis_key = f"admin_state:{user_id}"
-            await self.redis_service.delete(redis_key)
-            return True
+            state, data = await self.storage.read(self._key(user_id))
+            return self._parse_state(state), data
         except Exception as e:
-            logging.error(f"Error clearing admin state for user {user_id}: {e}")
-            return False
-    
-    async def set_data(self, user_id: int, key: str, value: Any) -> bool:
+            logging.error(f"Error getting admin conversation for user {user_id}: {e}")
+            return None, {}
+
+    async def set_state(self, user_id: int, state: Any, **data: Any) -> bool:
         """
-        Set admin data for user
-        
+        Set admin state for user, together with data collected in the step
+
         Args:
             user_id (int): Telegram user ID
-            key (str): Data key
-            value (Any): Data value
-            
+            state (Any): State to set
+            **data: Data entries to store atomically with the state
+
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            redis_key = f"admin_data:{user_id}:{key}"
-            await self.redis_service.set(redis_key, str(value))
+            await self.storage.transition(self._key(user_id), str(state), data)
             return True
         except Exception as e:
-            logging.error(f"Error setting admin data for user {user_id}, key {key}: {e}")
+            logging.error(f"Error setting admin state for user {user_id}: {e}")
             return False
-    
-    async def get_data(self, user_id: int, key: str) -> Optional[Any]:
+
+    async def get_state(self, user_id: int) -> Optional[Any]:
         """
-        Get admin data for user
-        
+        Get admin state for user
+
         Args:
             user_id (int): Telegram user ID
-            key (str): Data key
-            
+
         Returns:
-            Optional[Any]: Data value or None if not set
+            Optional[Any]: State or None if not set
         """
-        try:
-            redis_key = f"admin_data:{user_id}:{key}"
-            value = await self.redis_service.get(redis_key)
-            
-            if value and value.isdigit():
-                return int(value)
-            
-            return value
-        except Exception as e:
-            logging.error(f"Error getting admin data for user {user_id}, key {key}: {e}")
-            return None
-    
-    async def clear_data(self, user_id: int, key: str) -> bool:
+        state, _ = await self.get_conversation(user_id)
+        return state
+
+    async def clear_state(self, user_id: int) -> bool:
         """
-        Clear admin data for user
-        
+        Clear admin state and data for user
+
         Args:
             user_id (int): Telegram user ID
-            key (str): Data key
-            
+
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            redis_key = f"admin_data:{user_id}:{key}"
-            await self.redis_service.delete(redis_key)
+            await self.storage.clear(self._key(user_id))
             return True
         except Exception as e:
-            logging.error(f"Error clearing admin data for user {user_id}, key {key}: {e}")
+            logging.error(f"Error clearing admin state for user {user_id}: {e}")
             return False
@@ -0,0 +1,253 @@
+"""
+Health of the channels users must subscribe to
+
+When the bot loses its admin rights in a channel, or the channel is deleted,
+every getChatMember call for it fails, and every user would be treated as
+not subscribed. The monitor validates each active channel every
+``interval`` seconds with getChat and the bot's own membership (it has to
+be an administrator to see the channel's members). A channel that fails is
+quarantined: hot-path checks skip it, it is probed again after an
+exponentially growing backoff, and admins are alerted when it breaks and
+when it recovers.
+
+A failed membership check in a healthy channel triggers an immediate probe
+(shared by all concurrent callers, at most one per ``backoff`` seconds), so
+a channel that breaks between two rounds is quarantined on first use.
+Network errors and flood control are inconclusive and never quarantine a
+channel.
+"""
+import asyncio
+import html
+import logging
+import time
+from typing import Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from app.models.models import Channel
+from app.services.user_store import UserStore
+from app.utils.localization import get_text, Msg
+from app.utils.metrics import CHANNELS_QUARANTINED, CHANNEL_PROBES
+from app.utils.rate_limiter import bulk_requests
+from config.config import ADMIN_IDS, CHANNEL_HEALTH_INTERVAL, CHANNEL_HEALTH_BACKOFF, CHANNEL_HEALTH_MAX_BACKOFF
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the channel itself is unusable
+CHANNEL_ERRORS = (TelegramBadRequest, TelegramForbiddenError)
+
+ADMIN_STATUSES = frozenset({"administrator", "creator"})
+
+
+class _Quarantine:
+    __slots__ = ("failures", "retry_at", "error")
+
+    def __init__(self):
+        self.failures = 0
+        self.retry_at = 0.0
+        self.error = None
+
+
+class ChannelHealthMonitor:
+    """
+    Validate channels periodically and quarantine broken ones
+
+    Args:
+        interval (float): Seconds between validations of a healthy channel
+        backoff (float): Seconds before a broken channel is probed again
+            the first time; doubled after every failed probe
+        max_backoff (float): Longest wait between probes of a broken channel
+        clock (callable): Monotonic clock, replaceable in tests
+    """
+
+    def __init__(self, interval: float = 300.0, backoff: float = 60.0, max_backoff: float = 3600.0,
+                 clock=time.monotonic):
+        self.interval = interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._bot: Optional[Bot] = None
+        self._quarantined: Dict[str, _Quarantine] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._probes: Dict[str, asyncio.Task] = {}
+        self._task = None
+
+    def start(self, bot: Bot) -> None:
+        """
+        Start validating channels
+
+        Args:
+            bot (Bot): Bot used for probes and alerts
+        """
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop validating channels"""
+        tasks = [task for task in (self._task, *self._probes.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._probes.clear()
+
+    def is_quarantined(self, channel_id) -> bool:
+        """Whether hot-path checks skip the channel"""
+        return str(channel_id) in self._quarantined
+
+    def healthy(self, channels: List[Channel]) -> List[Channel]:
+        """
+        Drop quarantined channels
+
+        Args:
+            channels (List[Channel]): Channel models
+
+        Returns:
+            List[Channel]: Channels that are not quarantined
+        """
+        if not self._quarantined:
+            return channels
+        return [channel for channel in channels if str(channel.channel_id) not in self._quarantined]
+
+    async def report_error(self, channel: Channel, error: Exception) -> bool:
+        """
+        A membership check in the channel failed; probe it if it is due
+
+        Args:
+            channel (Channel): Channel of the failed check
+            error (Exception): The error
+
+        Returns:
+            bool: True if the channel is quarantined and the check should be
+            skipped, False if the error concerns the user
+        """
+        channel_id = str(channel.channel_id)
+        if channel_id in self._quarantined:
+            return True
+        if self._bot is None or not isinstance(error, CHANNEL_ERRORS):
+            return False
+        checked_at = self._checked_at.get(channel_id)
+        if checked_at is not None and self._clock() - checked_at < self.backoff:
+            # The channel passed a probe a moment ago
+            return False
+        await asyncio.shield(self._probe_once(channel))
+        return channel_id in self._quarantined
+
+    def _probe_once(self, channel):
+        channel_id = str(channel.channel_id)
+        task = self._probes.get(channel_id)
+        if task is None:
+            task = asyncio.create_task(self.probe(channel))
+            self._probes[channel_id] = task
+            task.add_done_callback(lambda _: self._probes.pop(channel_id, None))
+        return task
+
+    async def _run(self) -> None:
+        # Probes run at least once per backoff period; each channel is only
+        # probed when it is due
+        while True:
+            try:
+                channels = await Channel.filter(is_active=True)
+                self._forget_others(channels)
+                now = self._clock()
+                due = [channel for channel in channels if self._due(str(channel.channel_id), now)]
+                await asyncio.gather(*(self._probe_once(channel) for channel in due))
+            except Exception as e:
+                logger.warning("Channel health check failed: %s", e)
+            await asyncio.sleep(min(self.interval, self.backoff))
+
+    def _due(self, channel_id, now) -> bool:
+        quarantine = self._quarantined.get(channel_id)
+        if quarantine is not None:
+            return now >= quarantine.retry_at
+        checked_at = self._checked_at.get(channel_id)
+        return checked_at is None or now - checked_at >= self.interval
+
+    def _forget_others(self, channels) -> None:
+        # Deleted and deactivated channels are no longer checked anywhere
+        active = {str(channel.channel_id) for channel in channels}
+        for channel_id in [channel_id for channel_id in self._quarantined if channel_id not in active]:
+            del self._quarantined[channel_id]
+        for channel_id in [channel_id for channel_id in self._checked_at if channel_id not in active]:
+            del self._checked_at[channel_id]
+        CHANNELS_QUARANTINED.set(len(self._quarantined))
+
+    async def check(self, channel: Channel) -> Optional[str]:
+        """
+        Validate a channel
+
+        Args:
+            channel (Channel): Channel to validate
+
+        Returns:
+            Optional[str]: What is wrong with the channel, or None if it is usable
+
+        Raises:
+            TelegramAPIError: For inconclusive errors such as timeouts
+        """
+        try:
+            await self._bot.get_chat(chat_id=channel.channel_id)
+            member = await self._bot.get_chat_member(chat_id=channel.channel_id, user_id=self._bot.id)
+        except CHANNEL_ERRORS as e:
+            return str(e)
+        if member.status not in ADMIN_STATUSES:
+            return f"the bot is {member.status}, not an administrator"
+        return None
+
+    async def probe(self, channel: Channel) -> None:
+        """
+        Validate a channel and quarantine or release it
+
+        Args:
+            channel (Channel): Channel to validate
+        """
+        channel_id = str(channel.channel_id)
+        try:
+            error = await self.check(channel)
+        except Exception as e:
+            CHANNEL_PROBES.inc("inconclusive")
+            logger.warning("Probing channel %s was inconclusive: %s", channel_id, e)
+            return
+
+        self._checked_at[channel_id] = self._clock()
+        if error is None:
+            CHANNEL_PROBES.inc("ok")
+            if self._quarantined.pop(channel_id, None) is not None:
+                CHANNELS_QUARANTINED.set(len(self._quarantined))
+                logger.info("Channel %s recovered", channel_id)
+                await self._alert(Msg.ADMIN_CHANNEL_RECOVERED, channel)
+            return
+
+        CHANNEL_PROBES.inc("broken")
+        quarantine = self._quarantined.get(channel_id)
+        first = quarantine is None
+        if first:
+            quarantine = self._quarantined[channel_id] = _Quarantine()
+            CHANNELS_QUARANTINED.set(len(self._quarantined))
+        quarantine.failures += 1
+        quarantine.error = error
+        quarantine.retry_at = self._clock() + min(self.max_backoff, self.backoff * 2 ** (quarantine.failures - 1))
+        if first:
+            logger.warning("Channel %s quarantined: %s", channel_id, error)
+            await self._alert(Msg.ADMIN_CHANNEL_BROKEN, channel, error=error)
+
+    async def _alert(self, message: Msg, channel: Channel, **params) -> None:
+        user_store = UserStore()
+        params = {name: html.escape(str(value)) for name, value in params.items()}
+        with bulk_requests():
+            for admin_id in ADMIN_IDS:
+                admin_lang = await user_store.get_language(admin_id) or "ru"
+                try:
+                    await self._bot.send_message(
+                        chat_id=admin_id,
+                        text=get_text(
+                            message, admin_lang,
+                            name=html.escape(channel.channel_name), channel_id=channel.channel_id, **params
+                        )
+                    )
+                except Exception as e:
+                    logger.error("Error alerting admin %s about channel %s: %s", admin_id, channel.channel_id, e)
+
+channel_health = ChannelHealthMonitor(CHANNEL_HEALTH_INTERVAL, CHANNEL_HEALTH_BACKOFF, CHANNEL_HEALTH_MAX_BACKOFF)
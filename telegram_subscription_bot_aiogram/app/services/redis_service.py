@@ -1,31 +1,77 @@
 import redis
 import logging
-from typing import Optional, Any
+import time
+from typing import Optional, Any, List, Tuple
+
+from app.utils.cache import TTLCache
+from app.utils.metrics import InstrumentedRedis
+
+# Seconds between connection attempts while Redis is unreachable
+RECONNECT_INTERVAL = 30.0
+
+_CONNECTION_ERRORS = (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError)
 
 class RedisService:
-    """Service for working with Redis"""
+    """
+    Service for working with Redis
+    
+    All instances share one client, connected and pinged once, and one
+    bounded in-memory fallback used while Redis is unreachable, so handlers
+    can create a RedisService per call for free.
+    """
+    
+    _client = None
+    _connected = False
+    _next_attempt = 0.0
+    _fallback = None
     
     def __init__(self):
+        if RedisService._fallback is None:
+            from config.config import FALLBACK_CACHE_SIZE
+            RedisService._fallback = TTLCache("redis_fallback", maxsize=FALLBACK_CACHE_SIZE)
+        self.memory_cache = RedisService._fallback
+    
+    @property
+    def redis(self) -> Optional[redis.Redis]:
+        return RedisService._client
+    
+    @property
+    def connected(self) -> bool:
+        """Whether Redis answers; retried every RECONNECT_INTERVAL seconds while it does not"""
+        if RedisService._connected:
+            return True
+        
+        now = time.monotonic()
+        if now < RedisService._next_attempt:
+            return False
+        RedisService._next_attempt = now + RECONNECT_INTERVAL
+        
         from config.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
         
         try:
-            self.redis = redis.Redis(
-                host=REDIS_HOST,
-                port=REDIS_PORT,
-                db=REDIS_DB,
-                password=REDIS_PASSWORD,
-                decode_responses=True,
-                socket_timeout=3,
-                socket_connect_timeout=3
-            )
+            if RedisService._client is None:
+                RedisService._client = InstrumentedRedis(
+                    host=REDIS_HOST,
+                    port=REDIS_PORT,
+                    db=REDIS_DB,
+                    password=REDIS_PASSWORD,
+                    decode_responses=True,
+                    socket_timeout=3,
+                    socket_connect_timeout=3
+                )
             # Test connection
-            self.redis.ping()
-            self.connected = True
+            RedisService._client.ping()
+            RedisService._connected = True
         except Exception as e:
             logging.warning(f"Redis connection failed: {e}")
-            self.connected = False
-            # Create in-memory cache as fallback
-            self.memory_cache = {}
+        return RedisService._connected
+    
+    @staticmethod
+    def _disconnected(e: Exception) -> None:
+        # Use the fallback until the next connection attempt succeeds
+        if isinstance(e, _CONNECTION_ERRORS):
+            RedisService._connected = False
+            RedisService._next_attempt = time.monotonic() + RECONNECT_INTERVAL
     
     async def set(self, key: str, value: str, ex: int = None) -> bool:
         """
@@ -35,7 +81,7 @@ class RedisService:
             key (str): Redis key
             value (str): Value to set
             ex (int, optional): Expiration time in seconds
-            
+        
         Returns:
             bool: True if successful, False otherwise
         """
@@ -43,9 +89,10 @@ class RedisService:
             if self.connected:
                 self.redis.set(key, value, ex=ex)
             else:
-                self.memory_cache[key] = value
+                self.memory_cache.set(key, value, ttl=ex)
             return True
         except Exception as e:
+            self._disconnected(e)
             logging.error(f"Error setting Redis key {key}: {e}")
             return False
     
@@ -55,7 +102,7 @@ class RedisService:
         
         Args:
             key (str): Redis key
-            
+        
         Returns:
             Optional[str]: Value or None if key doesn't exist
         """
@@ -65,6 +112,7 @@ class RedisService:
             else:
                 return self.memory_cache.get(key)
         except Exception as e:
+            self._disconnected(e)
             logging.error(f"Error getting Redis key {key}: {e}")
             return None
     
@@ -74,7 +122,7 @@ class RedisService:
         
         Args:
             key (str): Redis key
-            
+        
         Returns:
             bool: True if successful, False otherwise
         """
@@ -82,10 +130,10 @@ class RedisService:
             if self.connected:
                 self.redis.delete(key)
             else:
-                if key in self.memory_cache:
-                    del self.memory_cache[key]
+                self.memory_cache.delete(key)
             return True
         except Exception as e:
+            self._disconnected(e)
             logging.error(f"Error deleting Redis key {key}: {e}")
             return False
     
@@ -95,7 +143,7 @@ class RedisService:
         
         Args:
             key (str): Redis key
-            
+        
         Returns:
             bool: True if key exists, False otherwise
         """
@@ -105,5 +153,169 @@ class RedisService:
             else:
                 return key in self.memory_cache
         except Exception as e:
+            self._disconnected(e)
             logging.error(f"Error checking Redis key {key}: {e}")
             return False
+    
+    async def hget(self, key: str, field: str) -> Optional[str]:
+        """
+        Get a hash field from Redis
+        
+        Args:
+            key (str): Redis key of the hash
+            field (str): Field name
+        
+        Returns:
+            Optional[str]: Value or None if the field doesn't exist
+        """
+        try:
+            if self.connected:
+                return self.redis.hget(key, field)
+            else:
+                return self.memory_cache.get((key, field))
+        except Exception as e:
+            self._disconnected(e)
+            logging.error(f"Error getting Redis hash field {key} {field}: {e}")
+            return None
+    
+    async def hset(self, key: str, field: str, value: str, nx: bool = False) -> bool:
+        """
+        Set a hash field in Redis
+        
+        Args:
+            key (str): Redis key of the hash
+            field (str): Field name
+            value (str): Value to set
+            nx (bool): Only set the field if it doesn't exist yet
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            if self.connected:
+                if nx:
+                    self.redis.hsetnx(key, field, value)
+                else:
+                    self.redis.hset(key, field, value)
+            elif not nx or (key, field) not in self.memory_cache:
+                self.memory_cache.set((key, field), value)
+            return True
+        except Exception as e:
+            self._disconnected(e)
+            logging.error(f"Error setting Redis hash field {key} {field}: {e}")
+            return False
+    
+    async def hdel(self, key: str, field: str) -> bool:
+        """
+        Delete a hash field from Redis
+        
+        Args:
+            key (str): Redis key of the hash
+            field (str): Field name
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            if self.connected:
+                self.redis.hdel(key, field)
+            else:
+                self.memory_cache.delete((key, field))
+            return True
+        except Exception as e:
+            self._disconnected(e)
+            logging.error(f"Error deleting Redis hash field {key} {field}: {e}")
+            return False
+    
+    async def zadd(self, key: str, mapping: dict) -> bool:
+        """
+        Add members to a sorted set in Redis
+        
+        Sorted sets are not kept while Redis is unreachable.
+        
+        Args:
+            key (str): Redis key of the sorted set
+            mapping (dict): Scores by member
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            if not self.connected:
+                return False
+            self.redis.zadd(key, mapping)
+            return True
+        except Exception as e:
+            self._disconnected(e)
+            logging.error(f"Error adding to Redis sorted set {key}: {e}")
+            return False
+    
+    async def zrevrangebyscore(self, key: str, max_score: Any, min_score: Any,
+                               count: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Get members of a sorted set with their scores, highest first
+        
+        Args:
+            key (str): Redis key of the sorted set
+            max_score (Any): Highest score, e.g. a number or "+inf"
+            min_score (Any): Lowest score
+            count (Optional[int]): Most members to return; all if None
+        
+        Returns:
+            List[Tuple[str, float]]: (member, score) pairs, empty while Redis
+                is unreachable
+        """
+        try:
+            if not self.connected:
+                return []
+            if count is None:
+                return self.redis.zrevrangebyscore(key, max_score, min_score, withscores=True)
+            return self.redis.zrevrangebyscore(key, max_score, min_score, start=0, num=count, withscores=True)
+        except Exception as e:
+            self._disconnected(e)
+            logging.error(f"Error reading Redis sorted set {key}: {e}")
+            return []
+    
+    async def zremrangebyscore(self, key: str, min_score: Any, max_score: Any) -> int:
+        """
+        Remove members of a sorted set by score
+        
+        Args:
+            key (str): Redis key of the sorted set
+            min_score (Any): Lowest score, e.g. a number or "-inf"
+            max_score (Any): Highest score
+        
+        Returns:
+            int: Number of members removed
+        """
+        try:
+            if not self.connected:
+                return 0
+            return self.redis.zremrangebyscore(key, min_score, max_score)
+        except Exception as e:
+            self._disconnected(e)
+            logging.error(f"Error trimming Redis sorted set {key}: {e}")
+            return 0
+    
+    async def publish(self, channel: str, message: str) -> bool:
+        """
+        Publish a message on a Redis channel
+        
+        Messages are dropped while Redis is unreachable.
+        
+        Args:
+            channel (str): Redis channel
+            message (str): Message
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            if not self.connected:
+                return False
+            self.redis.publish(channel, message)
+            return True
+        except Exception as e:
+            self._disconnected(e)
+            logging.error(f"Error publishing to Redis channel {channel}: {e}")
+            return False
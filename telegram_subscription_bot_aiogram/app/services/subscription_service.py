@@ -1,15 +1,60 @@
+import asyncio
 import logging
-from typing import List, Tuple, Optional
+import time
+from typing import List, Set, Tuple, Optional
 
-from app.models.models import Channel, User, UserSubscription
+from aiogram import Bot
+
+from app.models.models import Channel, UserSubscription
+from app.services.channel_health import channel_health
+from app.services.known_users import known_users
+from app.services.user_store import UserStore
+from config.config import VERIFIED_TTL
 
 class SubscriptionService:
-    """Service for working with channel subscriptions"""
+    """
+    Service for working with channel subscriptions
+
+    The service uses the bot it is given, so membership checks go through
+    the dispatcher's session and reuse its warm keep-alive connections
+    instead of opening (and TLS-handshaking) a new session per check.
+
+    Args:
+        bot (Bot): Bot whose session is used for Bot API calls
+    """
+    
+    def __init__(self, bot: Bot):
+        self.bot = bot
+    
+    async def _is_member(self, user_id: int, channel: Channel) -> Optional[bool]:
+        """
+        Check membership in a single channel
+        
+        Args:
+            user_id (int): Telegram user ID
+            channel (Channel): Channel to check
+            
+        Returns:
+            Optional[bool]: Membership, or None if the check failed or the
+            channel turned out to be quarantined
+        """
+        try:
+            chat_member = await self.bot.get_chat_member(chat_id=channel.channel_id, user_id=user_id)
+            return chat_member.status in ['member', 'administrator', 'creator']
+        except Exception as e:
+            if await channel_health.report_error(channel, e):
+                # The channel is broken, not the user's subscription
+                return None
+            logging.error(f"Error checking subscription for user {user_id} to channel {channel.channel_id}: {e}")
+            return None
     
     async def check_user_subscriptions(self, user_id: int, channels: List[Channel]) -> Tuple[bool, List[Channel]]:
         """
         Check if user is subscribed to all required channels
         
+        All channels are checked concurrently over the shared session.
+        Channels gated by join requests are answered from their records.
+        
         Args:
             user_id (int): Telegram user ID
             channels (List[Channel]): List of channels to check
@@ -17,40 +62,135 @@ class SubscriptionService:
         Returns:
             Tuple[bool, List[Channel]]: (all_subscribed, unsubscribed_channels)
         """
-        from aiogram import Bot
-        from config.config import BOT_TOKEN
-        
-        bot = Bot(token=BOT_TOKEN)
-        
-        unsubscribed_channels = []
-        all_subscribed = True
+        joined = await self._joined_channels(user_id, channels)
+        polled = [channel for channel in channels if not channel.join_requests]
+        results = await asyncio.gather(*(self._is_member(user_id, channel) for channel in polled))
         
-        for channel in channels:
+        unsubscribed_channels = [
+            channel for channel in channels if channel.join_requests and channel.id not in joined
+        ]
+        user_pk = None
+        for channel, is_member in zip(polled, results):
+            if is_member is None:
+                if not channel_health.is_quarantined(channel.channel_id):
+                    # Failed check; the record is left as it is
+                    unsubscribed_channels.append(channel)
+                # Quarantined channels are skipped until they work again
+                continue
+            if not is_member:
+                unsubscribed_channels.append(channel)
+            
             try:
-                # Check if user is member of channel
-                chat_member = await bot.get_chat_member(chat_id=channel.channel_id, user_id=user_id)
-                is_member = chat_member.status in ['member', 'administrator', 'creator']
+                # Update or create subscription record, so a user who left
+                # is recorded as such; it refers to the User primary key,
+                # not the Telegram ID
+                if user_pk is None:
+                    user_pk = await known_users.user_pk(user_id)
+                subscription, created = await UserSubscription.get_or_create(
+                    user_id=user_pk,
+                    channel_id=channel.id,
+                    defaults={"is_subscribed": is_member}
+                )
                 
-                if not is_member:
-                    all_subscribed = False
-                    unsubscribed_channels.append(channel)
-                else:
-                    # Update or create subscription record
-                    subscription, created = await UserSubscription.get_or_create(
-                        user_id=user_id,
-                        channel_id=channel.id
-                    )
-                    
-                    if not subscription.is_subscribed:
-                        subscription.is_subscribed = True
-                        await subscription.save()
+                if subscription.is_subscribed != is_member:
+                    subscription.is_subscribed = is_member
+                    await subscription.save()
             except Exception as e:
-                logging.error(f"Error checking subscription for user {user_id} to channel {channel.channel_id}: {e}")
-                all_subscribed = False
-                unsubscribed_channels.append(channel)
+                logging.error(f"Error saving subscription for user {user_id} to channel {channel.channel_id}: {e}")
+        
+        return not unsubscribed_channels, unsubscribed_channels
+    
+    @staticmethod
+    async def _joined_channels(user_id: int, channels: List[Channel]) -> Set[int]:
+        # IDs of the channels gated by join requests the user joined
+        gated = [channel.id for channel in channels if channel.join_requests]
+        if not gated:
+            return set()
+        return set(await UserSubscription.filter(
+            user__user_id=user_id, channel_id__in=gated, is_subscribed=True
+        ).values_list("channel_id", flat=True))
+    
+    async def record_membership(self, user_id: int, channel: Channel, is_member: bool) -> None:
+        """
+        Record the user's membership in a channel gated by join requests
+        
+        The user's "verified until" marker follows from the recorded
+        subscriptions to all channels; stale records of the other channels
+        are corrected by the next background check.
+        
+        Args:
+            user_id (int): Telegram user ID
+            channel (Channel): Channel gated by join requests
+            is_member (bool): Whether the user joined, or was approved to join
+        """
+        user_lang = await UserStore().get_language(user_id) or "ru"
+        user, _ = await known_users.get_or_create(user_id, defaults={"language": user_lang})
+        subscription, created = await UserSubscription.get_or_create(
+            user=user,
+            channel=channel,
+            defaults={"is_subscribed": is_member}
+        )
+        if not created and subscription.is_subscribed != is_member:
+            subscription.is_subscribed = is_member
+            await subscription.save()
         
-        await bot.session.close()
-        return all_subscribed, unsubscribed_channels
+        subscribed = is_member
+        if subscribed:
+            channels = channel_health.healthy(await Channel.filter(is_active=True))
+            recorded = set(await UserSubscription.filter(
+                user=user, channel_id__in=[c.id for c in channels], is_subscribed=True
+            ).values_list("channel_id", flat=True))
+            subscribed = all(c.id in recorded for c in channels)
+        
+        await self._mark_verified(user_id, subscribed)
+    
+    async def refresh_user(self, user_id: int, user_lang: str = "ru") -> Tuple[bool, bool, List[Channel]]:
+        """
+        Check the user's channel memberships and record them
+        
+        Updates the user's subscription records and sets or drops their
+        "verified until" marker. The user counts as subscribed before if
+        their records showed all channels before the check.
+        
+        Args:
+            user_id (int): Telegram user ID
+            user_lang (str): Language of a newly created user
+            
+        Returns:
+            Tuple[bool, bool, List[Channel]]: (created, was_subscribed_before,
+            unsubscribed_channels)
+        """
+        # Get or create user in database
+        user, created = await known_users.get_or_create(user_id, defaults={"language": user_lang})
+        
+        # Get all active channels that are not quarantined
+        channels = channel_health.healthy(await Channel.filter(is_active=True))
+        
+        if not channels:
+            # Nothing to subscribe to
+            await self._mark_verified(user_id, True)
+            return created, True, []
+        
+        # Previous subscription status, to detect changes
+        recorded = set(await UserSubscription.filter(
+            user=user, channel_id__in=[channel.id for channel in channels], is_subscribed=True
+        ).values_list("channel_id", flat=True))
+        was_subscribed_before = all(channel.id in recorded for channel in channels)
+        
+        all_subscribed, unsubscribed_channels = await self.check_user_subscriptions(user_id, channels)
+        
+        await self._mark_verified(user_id, all_subscribed)
+        return created, was_subscribed_before, unsubscribed_channels
+    
+    @staticmethod
+    async def _mark_verified(user_id: int, subscribed: bool) -> None:
+        if VERIFIED_TTL <= 0:
+            return
+        user_store = UserStore()
+        if subscribed:
+            await user_store.set_verified_until(user_id, time.time() + VERIFIED_TTL)
+        else:
+            await user_store.clear_verified(user_id)
     
     async def verify_user_subscription(self, user_id: int) -> bool:
         """
@@ -62,8 +202,8 @@ class SubscriptionService:
         Returns:
             bool: True if subscribed to all channels, False otherwise
         """
-        # Get all active channels
-        channels = await Channel.filter(is_active=True)
+        # Get all active channels that are not quarantined
+        channels = channel_health.healthy(await Channel.filter(is_active=True))
         
         if not channels:
             # If no channels to subscribe, user is considered subscribed
@@ -72,4 +212,5 @@ class SubscriptionService:
         # Check if user is subscribed to all channels
         all_subscribed, _ = await self.check_user_subscriptions(user_id, channels)
         
+        await self._mark_verified(user_id, all_subscribed)
         return all_subscribed
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+import random
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.types import FSInputFile, Message
+
+from app.utils.metrics import UPLOADS_IN_FLIGHT, UPLOAD_BYTES_IN_FLIGHT, UPLOAD_RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+class ByteBudget:
+    """
+    Bound the number of bytes in flight
+
+    A single request larger than the limit is admitted alone, so oversized
+    files are slowed down but never deadlock.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, size: int) -> int:
+        """
+        Wait until ``size`` bytes fit into the budget
+
+        Args:
+            size (int): Bytes to reserve
+
+        Returns:
+            int: Bytes actually reserved; pass to release()
+        """
+        size = min(size, self.limit)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.used + size <= self.limit)
+            self.used += size
+        return size
+
+    async def release(self, size: int) -> None:
+        """
+        Return reserved bytes to the budget
+
+        Args:
+            size (int): Value returned by acquire()
+        """
+        async with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+
+class UploadService:
+    """
+    Service for uploading local media through the media connection pool
+
+    Uploads go through a Bot bound to the media session (see
+    ``app.utils.request_pools``), so multipart uploads never hold the
+    connections used by ``answer`` calls. FSInputFile streams the file from
+    disk in chunks, the number of uploads and bytes in flight is bounded, and
+    transient failures are retried with backoff. Later sends of the same
+    video reuse its file_id instead.
+    """
+
+    def __init__(self, token: str, session: BaseSession, max_concurrent: int = 4,
+                 max_inflight_bytes: int = 64 * 1024 * 1024, attempts: int = 3,
+                 initial_backoff: float = 1.0):
+        self.bot = Bot(token=token, session=session)
+        self.attempts = attempts
+        self.initial_backoff = initial_backoff
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._budget = ByteBudget(max_inflight_bytes)
+
+    async def close(self) -> None:
+        """Close the media session"""
+        await self.bot.session.close()
+
+    async def send_video_note(self, chat_id: int, path: str, **kwargs) -> Message:
+        """
+        Upload a video note from a local file
+
+        Args:
+            chat_id (int): Target chat
+            path (str): Path of the encoded video note
+            **kwargs: Extra arguments for Bot.send_video_note
+
+        Returns:
+            Message: Sent message
+        """
+        return await self._upload(self.bot.send_video_note, "video_note", chat_id, path, **kwargs)
+
+    async def send_photo(self, chat_id: int, path: str, **kwargs) -> Message:
+        """
+        Upload a photo from a local file
+
+        Args:
+            chat_id (int): Target chat
+            path (str): Path of the image
+            **kwargs: Extra arguments for Bot.send_photo
+
+        Returns:
+            Message: Sent message
+        """
+        return await self._upload(self.bot.send_photo, "photo", chat_id, path, **kwargs)
+
+    async def _upload(self, send, field_name: str, chat_id: int, path: str, **kwargs) -> Message:
+        size = os.path.getsize(path)
+
+        async with self._slots:
+            reserved = await self._budget.acquire(size)
+            UPLOADS_IN_FLIGHT.inc()
+            UPLOAD_BYTES_IN_FLIGHT.inc(amount=size)
+            try:
+                return await self._send_with_retries(send, field_name, chat_id, path, **kwargs)
+            finally:
+                UPLOADS_IN_FLIGHT.dec()
+                UPLOAD_BYTES_IN_FLIGHT.dec(amount=size)
+                await self._budget.release(reserved)
+
+    async def _send_with_retries(self, send, field_name: str, chat_id: int, path: str, **kwargs) -> Message:
+        delay = self.initial_backoff
+
+        for attempt in range(1, self.attempts + 1):
+            try:
+                # A fresh FSInputFile re-reads the file from the start
+                return await send(chat_id=chat_id, **{field_name: FSInputFile(path)}, **kwargs)
+            except TelegramRetryAfter as e:
+                if attempt == self.attempts:
+                    raise
+                logger.warning("Upload to %s throttled, retrying in %ss", chat_id, e.retry_after)
+                UPLOAD_RETRIES.inc("retry_after")
+                await asyncio.sleep(e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if attempt == self.attempts:
+                    raise
+                sleep_for = delay * (1 + random.random() * 0.2)
+                logger.warning("Upload to %s failed (%s), attempt %s of %s, retrying in %.1fs",
+                               chat_id, e, attempt, self.attempts, sleep_for)
+                UPLOAD_RETRIES.inc(type(e).__name__)
+                await asyncio.sleep(sleep_for)
+                delay *= 2
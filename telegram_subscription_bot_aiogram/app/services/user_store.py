@@ -0,0 +1,270 @@
+"""
+Compact per-user attributes in Redis
+
+A plain ``user_lang:{id}`` string key costs around 60 bytes of key and
+object overhead for a two-byte value. Users are instead grouped into small
+hashes: user ``id`` is stored in hash ``u:{id % buckets}`` under field
+``{id // buckets}``. Telegram user ids are spread over billions, so bucketing
+by the low digits keeps every bucket equally full whatever the id range;
+with ``buckets`` chosen so buckets stay below ``hash-max-listpack-entries``
+(128 by default), Redis keeps them in its compact listpack encoding.
+
+Existing ``user_lang:*`` keys are moved over with
+``python -m app.services.user_store migrate``; until that has run, reads
+fall back to them and move users over one by one.
+
+The "verified until" marker of users whose subscriptions were checked lives
+in the same layout under ``v:{id % buckets}``, as a Unix timestamp. Users
+seen recently are kept in the sorted set ``active_users``, scored by the
+time they were last seen, so the subscription sweeper can check them first.
+"""
+import argparse
+import logging
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import redis
+
+from app.services.redis_service import RedisService
+from config.config import (
+    REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD, USER_STORE_BUCKETS, USER_STORE_LEGACY_READS
+)
+
+logger = logging.getLogger(__name__)
+
+BUCKET_PREFIX = "u:"
+VERIFIED_PREFIX = "v:"
+ACTIVE_USERS_KEY = "active_users"
+LEGACY_LANGUAGE_KEY = "user_lang:{}"
+
+
+def locate(user_id: int, buckets: int, prefix: str = BUCKET_PREFIX) -> Tuple[str, str]:
+    """
+    Hash and field of a user
+
+    Args:
+        user_id (int): Telegram user ID
+        buckets (int): Number of buckets
+        prefix (str): Key prefix of the attribute
+
+    Returns:
+        Tuple[str, str]: Hash key and field
+    """
+    return f"{prefix}{user_id % buckets}", str(user_id // buckets)
+
+
+class UserStore:
+    """Service for per-user language and verification marker in bucketed Redis hashes"""
+
+    def __init__(self):
+        self.redis_service = RedisService()
+        self.buckets = USER_STORE_BUCKETS
+
+    async def get_language(self, user_id: int) -> Optional[str]:
+        """
+        Get the user's language
+
+        Args:
+            user_id (int): Telegram user ID
+
+        Returns:
+            Optional[str]: Language code, or None if the user has not picked one
+        """
+        key, field = locate(user_id, self.buckets)
+        language = await self.redis_service.hget(key, field)
+        if language is None and USER_STORE_LEGACY_READS:
+            legacy_key = LEGACY_LANGUAGE_KEY.format(user_id)
+            language = await self.redis_service.get(legacy_key)
+            if language is not None:
+                # A language set in the meantime wins over the old key
+                await self.redis_service.hset(key, field, language, nx=True)
+                await self.redis_service.delete(legacy_key)
+        return language
+
+    async def set_language(self, user_id: int, language: str) -> bool:
+        """
+        Set the user's language
+
+        Args:
+            user_id (int): Telegram user ID
+            language (str): Language code
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        key, field = locate(user_id, self.buckets)
+        return await self.redis_service.hset(key, field, language)
+
+    async def get_verified_until(self, user_id: int) -> Optional[int]:
+        """
+        Get the user's "verified until" marker
+
+        Args:
+            user_id (int): Telegram user ID
+
+        Returns:
+            Optional[int]: Unix time the user's subscriptions were verified
+            until, or None if they have not been verified
+        """
+        verified_until = await self.redis_service.hget(*locate(user_id, self.buckets, VERIFIED_PREFIX))
+        return int(verified_until) if verified_until else None
+
+    async def set_verified_until(self, user_id: int, until: float) -> bool:
+        """
+        Record that the user's subscriptions are verified until a point in time
+
+        Args:
+            user_id (int): Telegram user ID
+            until (float): Unix time the verification is trusted until
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        key, field = locate(user_id, self.buckets, VERIFIED_PREFIX)
+        return await self.redis_service.hset(key, field, str(int(until)))
+
+    async def clear_verified(self, user_id: int) -> bool:
+        """
+        Drop the user's "verified until" marker
+
+        Args:
+            user_id (int): Telegram user ID
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        return await self.redis_service.hdel(*locate(user_id, self.buckets, VERIFIED_PREFIX))
+
+    async def record_verifications(self, subscribed: Iterable[int], unsubscribed: Iterable[int], until: float) -> None:
+        """
+        Set the markers of subscribed users and drop those of the others
+
+        Args:
+            subscribed (Iterable[int]): Telegram IDs of verified users
+            unsubscribed (Iterable[int]): Telegram IDs of users who are missing
+                a subscription
+            until (float): Unix time the verifications are trusted until
+        """
+        if not self.redis_service.connected:
+            for user_id in subscribed:
+                await self.set_verified_until(user_id, until)
+            for user_id in unsubscribed:
+                await self.clear_verified(user_id)
+            return
+        pipeline = self.redis_service.redis.pipeline(transaction=False)
+        for user_id in subscribed:
+            pipeline.hset(*locate(user_id, self.buckets, VERIFIED_PREFIX), str(int(until)))
+        for user_id in unsubscribed:
+            pipeline.hdel(*locate(user_id, self.buckets, VERIFIED_PREFIX))
+        pipeline.execute()
+
+    async def touch(self, user_id: int) -> bool:
+        """
+        Record that the user was seen
+
+        Args:
+            user_id (int): Telegram user ID
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        return await self.redis_service.zadd(ACTIVE_USERS_KEY, {user_id: time.time()})
+
+    async def active_since(self, since: float, before: Optional[float] = None,
+                           count: int = 1000) -> List[Tuple[int, float]]:
+        """
+        A page of the users seen since a point in time, most recent first
+
+        Pages are keyed by the time the last user of the previous page was
+        seen, so users seen meanwhile do not shift them.
+
+        Args:
+            since (float): Unix time
+            before (Optional[float]): Only users seen before this Unix time;
+                None for the first page
+            count (int): Users per page
+
+        Returns:
+            List[Tuple[int, float]]: (Telegram user ID, Unix time seen) pairs
+        """
+        top = "+inf" if before is None else f"({before}"
+        page = await self.redis_service.zrevrangebyscore(ACTIVE_USERS_KEY, top, since, count)
+        return [(int(user_id), seen) for user_id, seen in page]
+
+    async def forget_inactive(self, before: float) -> int:
+        """
+        Drop users last seen before a point in time from the active set
+
+        Args:
+            before (float): Unix time
+
+        Returns:
+            int: Number of users dropped
+        """
+        return await self.redis_service.zremrangebyscore(ACTIVE_USERS_KEY, "-inf", f"({before}")
+
+
+def migrate(client: redis.Redis, buckets: int, batch: int = 1000, keep: bool = False) -> int:
+    """
+    Move ``user_lang:{id}`` keys into bucketed hashes
+
+    Values already in a bucket win, so the migration can run while the bot
+    is up and be repeated.
+
+    Args:
+        client (redis.Redis): Redis client with ``decode_responses=True``
+        buckets (int): Number of buckets
+        batch (int): Keys per SCAN and pipeline
+        keep (bool): Keep the old keys instead of deleting them
+
+    Returns:
+        int: Number of migrated users
+    """
+    migrated = 0
+    keys = []
+    for key in client.scan_iter(match=LEGACY_LANGUAGE_KEY.format("*"), count=batch):
+        keys.append(key)
+        if len(keys) >= batch:
+            migrated += _migrate_batch(client, buckets, keys, keep)
+            keys = []
+    if keys:
+        migrated += _migrate_batch(client, buckets, keys, keep)
+    return migrated
+
+
+def _migrate_batch(client, buckets, keys, keep):
+    pipeline = client.pipeline(transaction=False)
+    for key in keys:
+        pipeline.get(key)
+    values = pipeline.execute()
+
+    migrated = 0
+    for key, language in zip(keys, values):
+        user_id = key.rsplit(":", 1)[-1]
+        if language is None or not user_id.isdigit():
+            continue
+        pipeline.hsetnx(*locate(int(user_id), buckets), language)
+        if not keep:
+            pipeline.delete(key)
+        migrated += 1
+    pipeline.execute()
+    return migrated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact per-user attributes in Redis")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("migrate", help="move user_lang:* keys into bucketed hashes")
+    command.add_argument("--batch", type=int, default=1000, help="keys per SCAN and pipeline")
+    command.add_argument("--keep", action="store_true", help="keep the old keys")
+    args = parser.parse_args(argv)
+
+    client = redis.Redis(
+        host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, password=REDIS_PASSWORD, decode_responses=True
+    )
+    migrated = migrate(client, USER_STORE_BUCKETS, batch=args.batch, keep=args.keep)
+    print(f"Migrated {migrated} users into {BUCKET_PREFIX}* buckets ({USER_STORE_BUCKETS} buckets)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,99 +1,77 @@
 import uuid
 import logging
-import asyncio
 from typing import Optional, Tuple, List
-from concurrent.futures import ThreadPoolExecutor
 import os
-from moviepy.editor import VideoFileClip
 
 from app.models.models import VideoCircle
+from app.services.known_users import known_users
 from app.services.redis_service import RedisService
+from app.utils.memory import EncoderWorkers, MemoryBudgetFull
+from config.config import ENCODER_BACKEND, ENCODER_PRESET, ENCODER_THREADS
+
+logger = logging.getLogger(__name__)
 
 class VideoService:
     """Service for working with videos"""
     
     def __init__(self):
         self.redis_service = RedisService()
-        self.executor = ThreadPoolExecutor(max_workers=4)
     
-    async def process_video(self, input_file: str, output_file: str) -> bool:
+    async def process_video(self, encoders: EncoderWorkers, input_file: str, output_file: str,
+                            temp_audiofile: str, estimate: int,
+                            target_resolution: Optional[Tuple] = None,
+                            window: Optional[Tuple] = None,
+                            preview_file: Optional[str] = None,
+                            sheet_file: Optional[str] = None,
+                            duration: Optional[float] = None) -> bool:
         """
         Process video to create a circle (video note)
         
         Args:
+            encoders (EncoderWorkers): Memory-governed encoder workers
             input_file (str): Path to input video file
             output_file (str): Path to output video file
+            temp_audiofile (str): Path for the intermediate audio track,
+                inside the job's scratch directory
+            estimate (int): Peak memory of the encode from
+                estimate_job_bytes()
+            target_resolution (tuple, optional): Size ffmpeg scales frames
+                to while decoding, from the admission stage
+            window (tuple, optional): ``(start, length)`` in seconds of the
+                part to encode; only that part is decoded
+            preview_file (str, optional): Path of the moderation preview
+                written from the same decode
+            sheet_file (str, optional): Path of the JPEG contact sheet
+            duration (float, optional): Length in seconds of the encoded
+                part, spreads the contact sheet frames over it
             
         Returns:
             bool: True if successful, False otherwise
-        """
-        try:
-            # Run video processing in a separate thread to avoid blocking the event loop
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                self.executor,
-                self._process_video_sync,
-                input_file,
-                output_file
-            )
-            return result
-        except Exception as e:
-            logging.error(f"Error processing video: {e}")
-            return False
-    
-    def _process_video_sync(self, input_file: str, output_file: str) -> bool:
-        """
-        Synchronous video processing function to be run in a separate thread
-        
-        Args:
-            input_file (str): Path to input video file
-            output_file (str): Path to output video file
             
-        Returns:
-            bool: True if successful, False otherwise
+        Raises:
+            MemoryBudgetFull: If the encode does not get its memory in time
         """
         try:
-            # Open video file
-            clip = VideoFileClip(input_file)
-            
-            # Get video dimensions
-            width, height = clip.size
-            
-            # Calculate crop dimensions for square aspect ratio
-            size = min(width, height)
-            x_center = width / 2
-            y_center = height / 2
-            
-            # Crop video to square
-            cropped_clip = clip.crop(
-                x_center=x_center,
-                y_center=y_center,
-                width=size,
-                height=size
+            # Crop to a square, scale to 640x640 and encode with the
+            # configured backend once the memory is reserved
+            await encoders.encode(
+                ENCODER_BACKEND, input_file, output_file, estimate,
+                size=640,
+                preset=ENCODER_PRESET,
+                threads=ENCODER_THREADS,
+                upscale=True,
+                temp_audiofile=temp_audiofile,
+                target_resolution=target_resolution,
+                window=window,
+                preview_file=preview_file,
+                sheet_file=sheet_file,
+                duration=duration
             )
-            
-            # Resize to 640x640 (standard size for video notes)
-            resized_clip = cropped_clip.resize((640, 640))
-            
-            # Write output file
-            resized_clip.write_videofile(
-                output_file,
-                codec="libx264",
-                audio_codec="aac",
-                temp_audiofile="temp-audio.m4a",
-                remove_temp=True,
-                preset="ultrafast",
-                threads=4
-            )
-            
-            # Close clips to release resources
-            resized_clip.close()
-            cropped_clip.close()
-            clip.close()
-            
             return True
+        except MemoryBudgetFull:
+            raise
         except Exception as e:
-            logging.error(f"Error in _process_video_sync: {e}")
+            logger.error("Error processing video: %s", e)
             return False
     
     async def store_file_id(self, file_id: str, user_id: int) -> str:
@@ -111,24 +89,25 @@ class VideoService:
             # Generate short ID
             short_id = str(uuid.uuid4())[:8]
             
-            # Store in Redis with expiration (24 hours)
-            redis_key = f"file_id:{short_id}"
+            # Store in Redis with expiration (24 hours), under the part of
+            # the short ID carried in callback data (app/keyboards/video.py)
+            redis_key = f"file_id:{short_id[:6]}"
             await self.redis_service.set(redis_key, file_id, ex=86400)
             
-            # Store in database
+            # Store in database; returning users' primary keys are cached
             await VideoCircle.create(
                 short_id=short_id,
                 file_id=file_id,
-                user_id=user_id,
+                user_id=await known_users.user_pk(user_id),
                 status="created"
             )
             
             # Log for debugging
-            logging.info(f"Stored file_id {file_id} with short_id {short_id}")
+            logger.debug("Stored file_id %s with short_id %s", file_id, short_id)
             
             return short_id
         except Exception as e:
-            logging.error(f"Error storing file_id: {e}")
+            logger.error("Error storing file_id: %s", e)
             return str(uuid.uuid4())[:8]  # Return a new short ID in case of error
     
     async def get_file_id(self, short_id: str) -> Optional[str]:
@@ -147,7 +126,7 @@ class VideoService:
             file_id = await self.redis_service.get(redis_key)
             
             if file_id:
-                logging.info(f"Retrieved file_id from Redis for short_id {short_id}")
+                logger.debug("Retrieved file_id from Redis for short_id %s", short_id)
                 return file_id
             
             # If not in Redis, try to get from database
@@ -156,11 +135,11 @@ class VideoService:
             if video_circle and video_circle.file_id:
                 # Store in Redis for future use
                 await self.redis_service.set(redis_key, video_circle.file_id, ex=86400)
-                logging.info(f"Retrieved file_id from database for short_id {short_id}")
+                logger.debug("Retrieved file_id from database for short_id %s", short_id)
                 return video_circle.file_id
             
-            logging.warning(f"File ID not found for short_id {short_id}")
+            logger.warning("File ID not found for short_id %s", short_id)
             return None
         except Exception as e:
-            logging.error(f"Error getting file_id: {e}")
+            logger.error("Error getting file_id: %s", e)
             return None
@@ -0,0 +1,120 @@
+"""
+Bounded in-process cache
+
+Fallback paths keep values in memory while Redis is down. A plain dict
+grows with every user for as long as the outage lasts; TTLCache holds at
+most ``maxsize`` entries, evicting the least recently used one, and drops
+entries after their TTL like the Redis keys they stand in for.
+
+Hits, misses and evictions are exported per cache name.
+"""
+import time
+from collections import OrderedDict
+
+from app.utils.metrics import CACHE_HITS, CACHE_MISSES, CACHE_EVICTIONS, CACHE_ENTRIES
+
+_MISSING = object()
+
+
+class _Entry:
+    __slots__ = ("value", "expires")
+
+    def __init__(self, value, expires):
+        self.value = value
+        self.expires = expires
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache with per-key expiry
+
+    Args:
+        name (str): Cache name in the metrics
+        maxsize (int): Maximum number of entries
+        ttl (float, optional): Default seconds an entry lives; None keeps
+            entries until they are evicted
+        clock (callable): Monotonic clock, replaceable in tests
+    """
+
+    def __init__(self, name, maxsize=10000, ttl=None, clock=time.monotonic):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key, default=None, count=True):
+        """
+        Look up a key and mark it as recently used
+
+        Args:
+            key (hashable): Key
+            default (Any): Returned for missing or expired keys
+            count (bool): Whether the lookup counts as a hit or miss
+
+        Returns:
+            Any: Cached value or ``default``
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires is not None and entry.expires <= self._clock():
+            self._remove(key, "expired")
+            entry = None
+        if entry is None:
+            if count:
+                CACHE_MISSES.inc(self.name)
+            return default
+        self._entries.move_to_end(key)
+        if count:
+            CACHE_HITS.inc(self.name)
+        return entry.value
+
+    def set(self, key, value, ttl=None) -> None:
+        """
+        Store a value, evicting the least recently used entry when full
+
+        Args:
+            key (hashable): Key
+            value (Any): Value
+            ttl (float, optional): Seconds the entry lives; defaults to the
+                cache's TTL
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires = self._clock() + ttl if ttl is not None else None
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        elif len(self._entries) >= self.maxsize:
+            oldest = next(iter(self._entries))
+            self._remove(oldest, "size")
+        self._entries[key] = _Entry(value, expires)
+        CACHE_ENTRIES.set(len(self._entries), self.name)
+
+    def delete(self, key) -> bool:
+        """
+        Remove a key
+
+        Args:
+            key (hashable): Key
+
+        Returns:
+            bool: True if the key was cached
+        """
+        if self._entries.pop(key, None) is None:
+            return False
+        CACHE_ENTRIES.set(len(self._entries), self.name)
+        return True
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        self._entries.clear()
+        CACHE_ENTRIES.set(0, self.name)
+
+    def _remove(self, key, reason) -> None:
+        del self._entries[key]
+        CACHE_EVICTIONS.inc(self.name, reason)
+        CACHE_ENTRIES.set(len(self._entries), self.name)
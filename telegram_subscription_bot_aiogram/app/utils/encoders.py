@@ -0,0 +1,247 @@
+"""
+Circle encoding backends
+
+Both backends crop the input to a centred square, scale it to the video
+note size and encode H.264/AAC in an MP4 container:
+
+- ``moviepy``: frames are decoded by ffmpeg, cropped and resized in Python
+  and piped back into a second ffmpeg process. Flexible, but every frame
+  crosses the process boundary twice as raw RGB.
+- ``ffmpeg``: a single ffmpeg process with a crop/scale filter graph; frames
+  never leave ffmpeg.
+
+Next to the circle both can write a moderation preview: a 320px low-bitrate
+video note and a JPEG contact sheet of frames spread over the clip. The
+ffmpeg backend splits them off the same decode as the circle; the moviepy
+backend derives both from the encoded circle in one more ffmpeg pass, which
+only decodes the small 640px output.
+
+Encodes run in the bot's process or, with ``ENCODER_WORKERS=process``, in a
+worker process started as ``python -m app.utils.encoders`` (see
+app/utils/memory.py).
+
+The backend, x264 preset and thread count come from the configuration; use
+``benchmarks/encoders.py`` in the repository root to compare them on this machine.
+"""
+import json
+import logging
+import subprocess
+import sys
+
+from moviepy.config import get_setting
+from moviepy.editor import VideoFileClip
+
+logger = logging.getLogger(__name__)
+
+
+# Moderation preview: small enough to load instantly in the admin chat
+PREVIEW_SIZE = 320
+PREVIEW_VIDEO_BITRATE = "200k"
+PREVIEW_AUDIO_BITRATE = "48k"
+
+# Contact sheet of SHEET_COLUMNS x SHEET_COLUMNS frames
+SHEET_COLUMNS = 3
+
+
+class EncodeError(Exception):
+    """Raised when a backend fails to produce the output file"""
+
+
+def _preview_outputs(preview_file, sheet_file, preset, size, duration):
+    """
+    Filter chains and outputs of the moderation preview
+
+    Args:
+        preview_file (str, optional): Destination of the preview video note
+        sheet_file (str, optional): Destination of the JPEG contact sheet
+        preset (str): x264 preset
+        size (int): Side of the square video the chains start from
+        duration (float, optional): Length of the clip; spreads the sheet
+            frames over it, without it the sheet is a single representative
+            frame
+
+    Returns:
+        tuple: (input pads to split the square video into, filter chains,
+        output arguments)
+    """
+    pads, chains, outputs = [], [], []
+    if preview_file:
+        pads.append("[preview_in]")
+        chains.append(f"[preview_in]scale={PREVIEW_SIZE}:{PREVIEW_SIZE},setsar=1[preview]")
+        outputs += [
+            "-map", "[preview]", "-map", "0:a:0?",
+            "-c:v", "libx264", "-preset", preset, "-pix_fmt", "yuv420p",
+            "-b:v", PREVIEW_VIDEO_BITRATE, "-maxrate", PREVIEW_VIDEO_BITRATE, "-bufsize", PREVIEW_VIDEO_BITRATE,
+            "-c:a", "aac", "-b:a", PREVIEW_AUDIO_BITRATE, "-ac", "1",
+            "-movflags", "+faststart",
+            preview_file,
+        ]
+    if sheet_file:
+        tile = size // SHEET_COLUMNS
+        if duration:
+            rate = SHEET_COLUMNS ** 2 / duration
+            pick = f"fps={rate:.6f},scale={tile}:{tile},tile={SHEET_COLUMNS}x{SHEET_COLUMNS}"
+        else:
+            pick = f"thumbnail,scale={size}:{size}"
+        pads.append("[sheet_in]")
+        chains.append(f"[sheet_in]{pick}[sheet]")
+        outputs += ["-map", "[sheet]", "-frames:v", "1", "-q:v", "3", sheet_file]
+    return pads, chains, outputs
+
+
+def _run_ffmpeg(command):
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise EncodeError(result.stderr.decode(errors="replace").strip()[-500:])
+
+
+def encode_moviepy(input_file, output_file, size=640, preset="ultrafast", threads=4, upscale=False,
+                   temp_audiofile=None, target_resolution=None, window=None, preview_file=None,
+                   sheet_file=None, duration=None):
+    """
+    Encode a circle with moviepy
+
+    Args:
+        input_file (str): Source video
+        output_file (str): Destination MP4
+        size (int): Side of the square output
+        preset (str): x264 preset
+        threads (int): Encoder threads
+        upscale (bool): Scale inputs smaller than ``size`` up as well
+        temp_audiofile (str, optional): Path for the intermediate audio track
+        target_resolution (tuple, optional): ``(height, width)`` ffmpeg
+            scales frames to while decoding
+        window (tuple, optional): ``(start, length)`` in seconds to keep
+        preview_file (str, optional): Destination of the preview video note
+        sheet_file (str, optional): Destination of the JPEG contact sheet
+        duration (float, optional): Length of the encoded clip; the moviepy
+            backend reads it from the clip
+    """
+    clip = VideoFileClip(input_file, target_resolution=target_resolution)
+    try:
+        if window is not None:
+            start, length = window
+            clip = clip.subclip(start, min(start + length, clip.duration))
+
+        if clip.w != clip.h:
+            side = min(clip.w, clip.h)
+            clip = clip.crop(x_center=clip.w / 2, y_center=clip.h / 2, width=side, height=side)
+
+        if clip.w > size or (upscale and clip.w < size):
+            clip = clip.resize((size, size))
+
+        clip.write_videofile(
+            output_file,
+            codec="libx264",
+            audio_codec="aac",
+            temp_audiofile=temp_audiofile,
+            preset=preset,
+            threads=threads,
+            ffmpeg_params=["-pix_fmt", "yuv420p"],
+            logger=None
+        )
+        duration, side = clip.duration, clip.w
+    finally:
+        clip.close()
+
+    if preview_file or sheet_file:
+        pads, chains, outputs = _preview_outputs(preview_file, sheet_file, preset, side, duration)
+        graph = ";".join([f"[0:v]split={len(pads)}{''.join(pads)}"] + chains)
+        try:
+            _run_ffmpeg([get_setting("FFMPEG_BINARY"), "-nostdin", "-y", "-loglevel", "error",
+                         "-i", output_file, "-filter_complex", graph, "-threads", str(threads)] + outputs)
+        except EncodeError as e:
+            # The circle is done; moderation falls back to the full video
+            logger.warning("Could not write the preview of %s: %s", output_file, e)
+
+
+def encode_ffmpeg(input_file, output_file, size=640, preset="ultrafast", threads=4, upscale=False,
+                  temp_audiofile=None, target_resolution=None, window=None, preview_file=None,
+                  sheet_file=None, duration=None):
+    """
+    Encode a circle with a single ffmpeg process
+
+    Takes the same arguments as encode_moviepy(); ``temp_audiofile`` and
+    ``target_resolution`` are not needed because audio is muxed directly
+    and scaling happens in the same filter graph. The preview and the
+    contact sheet are split off the same decode.
+
+    Raises:
+        EncodeError: If ffmpeg fails
+    """
+    # Even sides: yuv420p cannot encode odd dimensions
+    side = "2*trunc(min(iw,ih)/2)"
+    scale = f"{size}:{size}" if upscale else f"'min({size},iw)':'min({size},ih)'"
+
+    command = [get_setting("FFMPEG_BINARY"), "-nostdin", "-y", "-loglevel", "error"]
+    if window is not None:
+        start, length = window
+        command += ["-ss", f"{start:.3f}", "-t", f"{length:.3f}"]
+    pads, chains, outputs = _preview_outputs(preview_file, sheet_file, preset, size, duration)
+    graph = ";".join(
+        [f"[0:v]crop='{side}':'{side}',scale={scale},setsar=1,split={len(pads) + 1}[circle]{''.join(pads)}"]
+        + chains
+    )
+    command += [
+        "-i", input_file,
+        "-filter_complex", graph,
+        "-map", "[circle]", "-map", "0:a:0?",
+        "-c:v", "libx264", "-preset", preset, "-threads", str(threads), "-pix_fmt", "yuv420p",
+        "-c:a", "aac",
+        "-movflags", "+faststart",
+        output_file,
+    ] + outputs
+
+    _run_ffmpeg(command)
+
+
+ENCODERS = {
+    "moviepy": encode_moviepy,
+    "ffmpeg": encode_ffmpeg,
+}
+
+
+def encode(backend, input_file, output_file, **options):
+    """
+    Encode a circle with the named backend
+
+    Blocking; run in an executor.
+
+    Args:
+        backend (str): Key of ENCODERS
+        input_file (str): Source video
+        output_file (str): Destination MP4
+        **options: Backend options, see encode_moviepy()
+
+    Raises:
+        KeyError: If the backend is unknown
+    """
+    ENCODERS[backend](input_file, output_file, **options)
+
+
+def main(argv=None):
+    """
+    Encode in a worker process
+
+    Arguments: backend, input file, output file, backend options as JSON and
+    the address space limit in bytes (0 for none).
+    """
+    backend, input_file, output_file, options, limit = (argv or sys.argv[1:])
+    options = {key: tuple(value) if isinstance(value, list) else value
+               for key, value in json.loads(options).items()}
+
+    limit = int(limit)
+    if limit:
+        # POSIX only; process workers are not supported elsewhere
+        import resource
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        # Inherited by the ffmpeg processes the backend starts
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+    encode(backend, input_file, output_file, **options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+FSM storage keeping each conversation in one Redis hash
+
+Every conversation (bot, chat, user) lives in a single hash: the ``state``
+field holds the state and every data entry is a ``d:<name>`` field with a
+JSON value. The hash expires ``ttl`` seconds after its last use, so
+abandoned conversations clean themselves up.
+
+- a state read returns all of its data too: one MULTI with HGETALL and the
+  TTL refresh;
+- transitions set the state and data fields in one MULTI;
+- replacing all data runs as a Lua script, so other fields never survive a
+  concurrent write.
+
+RedisHashStorage implements aiogram's BaseStorage and can back
+``Dispatcher(storage=...)``. The dispatcher then reads the state of every
+update, so this bot keeps the in-memory default there and uses the storage
+for the admin conversation only (see app/services/admin_service.py).
+"""
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+from app.utils.metrics import REDIS_SECONDS
+
+STATE_FIELD = "state"
+DATA_PREFIX = "d:"
+
+# KEYS[1] = hash; ARGV[1] = TTL in milliseconds, then field/value pairs.
+# Replaces all data fields and keeps the state.
+_REPLACE_DATA = """
+local state = redis.call('HGET', KEYS[1], 'state')
+redis.call('DEL', KEYS[1])
+if state then
+    redis.call('HSET', KEYS[1], 'state', state)
+end
+if #ARGV > 1 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+end
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+
+def _state_name(state) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+def _encode_data(data: Dict[str, Any]) -> Dict[str, str]:
+    return {DATA_PREFIX + name: json.dumps(value) for name, value in data.items()}
+
+
+def _decode(fields: Dict[str, str]) -> Tuple[Optional[str], Dict[str, Any]]:
+    data = {
+        name[len(DATA_PREFIX):]: json.loads(value)
+        for name, value in fields.items() if name.startswith(DATA_PREFIX)
+    }
+    return fields.get(STATE_FIELD), data
+
+
+class RedisHashStorage(BaseStorage):
+    """
+    aiogram FSM storage with one Redis hash per conversation
+
+    Args:
+        redis (redis.asyncio.Redis): Client with ``decode_responses=True``
+        ttl (float): Seconds a conversation lives after its last use
+        prefix (str): Key prefix
+    """
+
+    def __init__(self, redis, ttl: float = 3600, prefix: str = "fsm"):
+        self.redis = redis
+        self.ttl_ms = int(ttl * 1000)
+        self.prefix = prefix
+        self._replace_data = redis.register_script(_REPLACE_DATA)
+
+    def _key(self, key: StorageKey) -> str:
+        parts = [self.prefix, str(key.bot_id), str(key.chat_id), str(key.user_id)]
+        thread_id = getattr(key, "thread_id", None)
+        if thread_id:
+            parts.append(f"t{thread_id}")
+        business_connection_id = getattr(key, "business_connection_id", None)
+        if business_connection_id:
+            parts.append(f"b{business_connection_id}")
+        if key.destiny != "default":
+            parts.append(key.destiny)
+        return ":".join(parts)
+
+    async def _transaction(self, pipeline):
+        with REDIS_SECONDS.time("MULTI"):
+            return await pipeline.execute()
+
+    async def read(self, key: StorageKey) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        Read the state and all data of a conversation in one round trip
+
+        Args:
+            key (StorageKey): Conversation
+
+        Returns:
+            tuple: (state or None, data dict)
+        """
+        name = self._key(key)
+        pipeline = self.redis.pipeline(transaction=True)
+        pipeline.hgetall(name)
+        pipeline.pexpire(name, self.ttl_ms)
+        fields, _ = await self._transaction(pipeline)
+        return _decode(fields)
+
+    async def transition(self, key: StorageKey, state=None, data: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Set the state and merge data fields atomically
+
+        Args:
+            key (StorageKey): Conversation
+            state (str or State, optional): New state; None clears it
+            data (dict, optional): Data entries to add or overwrite
+        """
+        name = self._key(key)
+        state = _state_name(state)
+        pipeline = self.redis.pipeline(transaction=True)
+        if state is None:
+            pipeline.hdel(name, STATE_FIELD)
+        else:
+            pipeline.hset(name, STATE_FIELD, state)
+        if data:
+            pipeline.hset(name, mapping=_encode_data(data))
+        pipeline.pexpire(name, self.ttl_ms)
+        await self._transaction(pipeline)
+
+    async def clear(self, key: StorageKey) -> None:
+        """
+        Drop the state and all data of a conversation
+
+        Args:
+            key (StorageKey): Conversation
+        """
+        await self.redis.delete(self._key(key))
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        await self.transition(key, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self.read(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        args = [self.ttl_ms]
+        for field, value in _encode_data(data).items():
+            args += [field, value]
+        await self._replace_data(keys=[self._key(key)], args=args)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self.read(key)
+        return data
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        name = self._key(key)
+        pipeline = self.redis.pipeline(transaction=True)
+        if data:
+            pipeline.hset(name, mapping=_encode_data(data))
+        pipeline.hgetall(name)
+        pipeline.pexpire(name, self.ttl_ms)
+        results = await self._transaction(pipeline)
+        _, merged = _decode(results[-2])
+        return merged
+
+    async def close(self) -> None:
+        await self.redis.close()
@@ -1,131 +1,266 @@
-from typing import Dict, Optional
-
-# Translations dictionary
-translations = {
-    "ru": {
-        "welcome_message": "Добро пожаловать! Пожалуйста, выберите язык.",
-        "language_selected": "Язык выбран: Русский",
-        "subscription_required": "Для использования бота необходимо подписаться на наши каналы:",
-        "subscription_check": "Проверяем вашу подписку...",
-        "subscription_success": "Спасибо за подписку! Теперь вы можете использовать бота.",
-        "main_menu": "Главное меню",
-        "create_circle_button": "🎬 Создать кружок",
-        "create_circle_prank_button": "🎭 Создать пранк-кружок",
-        "language_button": "🌐 Изменить язык",
-        "check_subscription": "✅ Проверить подписку",
-        "processing_video": "⏳ Обрабатываем ваше видео...",
-        "video_too_long": "❌ Видео слишком длинное. Максимальная длительность - 1 минута.",
-        "video_saved": "✅ Видео успешно сохранено как кружок! Хотите поделиться им в нашем канале с кружочками?",
-        "video_processing_error": "❌ Произошла ошибка при обработке видео. Пожалуйста, попробуйте еще раз.",
-        "share_yes": "Да",
-        "share_no": "Нет",
-        "share_thanks": "Спасибо! Ваш кружок отправлен на модерацию.",
-        "share_declined": "Вы отказались от публикации кружка.",
-        "video_published": "🎉 Мы опубликовали ваш кружок в нашем канале!",
-        "video_rejected": "❌ К сожалению, ваш кружок не прошел модерацию.",
-        "view_in_channel": "👁 Смотреть в канале",
-        "upload_video_instruction": "Пожалуйста, загрузите видео, которое хотите преобразовать в кружок. Максимальная длительность - 1 минута.",
-        "prank_message": "Это была шутка! 😄 Для создания кружка используйте обычную кнопку.",
-        "feature_not_available": "Эта функция вам недоступна.",
-        "error_video_expired": "Извините, видео больше недоступно. Пожалуйста, загрузите новое видео.",
-        
-        # Admin translations
-        "admin_welcome": "Панель администратора",
-        "admin_channels_list": "Список каналов",
-        "admin_channels_list_button": "📋 Список каналов",
-        "admin_add_channel_button": "➕ Добавить канал",
-        "admin_channel_name_prompt": "Введите название канала:",
-        "admin_button_text_prompt": "Введите текст кнопки для подписки:",
-        "admin_forward_post_prompt": "Перешлите сообщение из канала, чтобы я мог получить ID канала:",
-        "admin_channel_link_prompt": "Введите ссылку на канал (t.me/...):",
-        "admin_channel_added": "✅ Канал успешно добавлен!",
-        "admin_invalid_forward": "❌ Пожалуйста, перешлите сообщение из канала.",
-        "admin_not_admin": "❌ Вы не являетесь администратором этого канала.",
-        "admin_channel_deleted": "✅ Канал успешно удален!",
-        "admin_new_video": "🆕 Новый кружок от пользователя:",
-        "publish_button": "✅ Опубликовать",
-        "reject_button": "❌ Отклонить",
-        "admin_published": "✅ Кружок опубликован в канале!",
-        "admin_rejected": "❌ Кружок отклонен.",
-        "admin_publish_error": "❌ Ошибка при публикации кружка.",
-        "admin_reject_error": "❌ Ошибка при отклонении кружка.",
-        "back_button": "⬅️ Назад",
-        "edit_name_button": "✏️ Изменить название",
-        "edit_link_button": "🔗 Изменить ссылку",
-        "edit_button_text_button": "📝 Изменить текст кнопки",
-        "activate_button": "✅ Активировать",
-        "deactivate_button": "❌ Деактивировать",
-        "delete_button": "🗑️ Удалить"
-    },
-    "en": {
-        "welcome_message": "Welcome! Please select your language.",
-        "language_selected": "Language selected: English",
-        "subscription_required": "To use the bot, you need to subscribe to our channels:",
-        "subscription_check": "Checking your subscription...",
-        "subscription_success": "Thank you for subscribing! Now you can use the bot.",
-        "main_menu": "Main Menu",
-        "create_circle_button": "🎬 Create circle",
-        "create_circle_prank_button": "🎭 Create prank circle",
-        "language_button": "🌐 Change language",
-        "check_subscription": "✅ Check subscription",
-        "processing_video": "⏳ Processing your video...",
-        "video_too_long": "❌ Video is too long. Maximum duration is 1 minute.",
-        "video_saved": "✅ Video successfully saved as a circle! Would you like to share it in our circle channel?",
-        "video_processing_error": "❌ An error occurred while processing the video. Please try again.",
-        "share_yes": "Yes",
-        "share_no": "No",
-        "share_thanks": "Thank you! Your circle has been sent for moderation.",
-        "share_declined": "You declined to publish the circle.",
-        "video_published": "🎉 We published your circle in our channel!",
-        "video_rejected": "❌ Unfortunately, your circle did not pass moderation.",
-        "view_in_channel": "👁 View in channel",
-        "upload_video_instruction": "Please upload a video you want to convert to a circle. Maximum duration is 1 minute.",
-        "prank_message": "This was a joke! 😄 To create a circle, use the regular button.",
-        "feature_not_available": "This feature is not available to you.",
-        "error_video_expired": "Sorry, the video is no longer available. Please upload a new video.",
-        
-        # Admin translations
-        "admin_welcome": "Admin Panel",
-        "admin_channels_list": "Channels List",
-        "admin_channels_list_button": "📋 Channels List",
-        "admin_add_channel_button": "➕ Add Channel",
-        "admin_channel_name_prompt": "Enter channel name:",
-        "admin_button_text_prompt": "Enter button text for subscription:",
-        "admin_forward_post_prompt": "Forward a message from the channel so I can get the channel ID:",
-        "admin_channel_link_prompt": "Enter channel link (t.me/...):",
-        "admin_channel_added": "✅ Channel successfully added!",
-        "admin_invalid_forward": "❌ Please forward a message from a channel.",
-        "admin_not_admin": "❌ You are not an administrator of this channel.",
-        "admin_channel_deleted": "✅ Channel successfully deleted!",
-        "admin_new_video": "🆕 New circle from user:",
-        "publish_button": "✅ Publish",
-        "reject_button": "❌ Reject",
-        "admin_published": "✅ Circle published in the channel!",
-        "admin_rejected": "❌ Circle rejected.",
-        "admin_publish_error": "❌ Error publishing circle.",
-        "admin_reject_error": "❌ Error rejecting circle.",
-        "back_button": "⬅️ Back",
-        "edit_name_button": "✏️ Edit name",
-        "edit_link_button": "🔗 Edit link",
-        "edit_button_text_button": "📝 Edit button text",
-        "activate_button": "✅ Activate",
-        "deactivate_button": "❌ Deactivate",
-        "delete_button": "🗑️ Delete"
-    }
+"""
+Localization utilities for the bot
+
+Translations live in JSON catalogs (``locales/<lang>.json``). At import time
+every catalog is compiled into a tuple indexed by ``Msg`` ids, so a lookup is
+a single tuple index. Catalogs that miss a message, contain unknown keys,
+lack plural forms or disagree on placeholders fail the import instead of
+showing a placeholder text to users at runtime.
+"""
+import json
+import os
+import string
+import sys
+from enum import IntEnum, auto
+
+from config.config import LOCALES_DIRECTORY
+
+DEFAULT_LANGUAGE = "ru"
+
+
+class LocalizationError(Exception):
+    """Raised when the translation catalogs are inconsistent"""
+
+
+class Msg(IntEnum):
+    """Message identifiers; catalog keys are the lower-case member names"""
+
+    def _generate_next_value_(name, start, count, last_values):
+        return count
+
+    WELCOME_MESSAGE = auto()
+    LANGUAGE_SELECTED = auto()
+    SUBSCRIPTION_REQUIRED = auto()
+    SUBSCRIPTION_CHECK = auto()
+    SUBSCRIPTION_SUCCESS = auto()
+    MAIN_MENU = auto()
+    CREATE_CIRCLE_BUTTON = auto()
+    CREATE_CIRCLE_PRANK_BUTTON = auto()
+    LANGUAGE_BUTTON = auto()
+    CHECK_SUBSCRIPTION = auto()
+    PROCESSING_VIDEO = auto()
+    VIDEO_TOO_LONG = auto()
+    VIDEO_SAVED = auto()
+    VIDEO_PROCESSING_ERROR = auto()
+    SHARE_YES = auto()
+    SHARE_NO = auto()
+    SHARE_THANKS = auto()
+    SHARE_DECLINED = auto()
+    VIDEO_PUBLISHED = auto()
+    VIDEO_REJECTED = auto()
+    VIEW_IN_CHANNEL = auto()
+    UPLOAD_VIDEO_INSTRUCTION = auto()
+    PRANK_MESSAGE = auto()
+    FEATURE_NOT_AVAILABLE = auto()
+    ERROR_VIDEO_EXPIRED = auto()
+    ADMIN_WELCOME = auto()
+    ADMIN_CHANNELS_LIST = auto()
+    ADMIN_CHANNELS_LIST_BUTTON = auto()
+    ADMIN_ADD_CHANNEL_BUTTON = auto()
+    ADMIN_CHANNEL_NAME_PROMPT = auto()
+    ADMIN_BUTTON_TEXT_PROMPT = auto()
+    ADMIN_FORWARD_POST_PROMPT = auto()
+    ADMIN_CHANNEL_LINK_PROMPT = auto()
+    ADMIN_CHANNEL_ADDED = auto()
+    ADMIN_INVALID_FORWARD = auto()
+    ADMIN_NOT_ADMIN = auto()
+    ADMIN_CHANNEL_DELETED = auto()
+    ADMIN_NEW_VIDEO = auto()
+    PUBLISH_BUTTON = auto()
+    REJECT_BUTTON = auto()
+    ADMIN_PUBLISHED = auto()
+    ADMIN_REJECTED = auto()
+    ADMIN_PUBLISH_ERROR = auto()
+    ADMIN_REJECT_ERROR = auto()
+    BACK_BUTTON = auto()
+    EDIT_NAME_BUTTON = auto()
+    EDIT_LINK_BUTTON = auto()
+    EDIT_BUTTON_TEXT_BUTTON = auto()
+    ACTIVATE_BUTTON = auto()
+    DEACTIVATE_BUTTON = auto()
+    ENABLE_JOIN_REQUESTS_BUTTON = auto()
+    DISABLE_JOIN_REQUESTS_BUTTON = auto()
+    DELETE_BUTTON = auto()
+    SERVER_BUSY = auto()
+    VIDEO_TOO_BIG = auto()
+    VIDEO_UNSUPPORTED = auto()
+    VIDEO_TRIMMED = auto()
+    VIDEO_WINDOW_INVALID = auto()
+    FULL_VIDEO_BUTTON = auto()
+    ADMIN_CHANNEL_BROKEN = auto()
+    ADMIN_CHANNEL_RECOVERED = auto()
+
+
+def _plural_one_other(n):
+    return "one" if n == 1 else "other"
+
+
+def _plural_east_slavic(n):
+    if n != int(n):
+        return "other"
+    n = int(abs(n))
+    if n % 10 == 1 and n % 100 != 11:
+        return "one"
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return "few"
+    return "many"
+
+
+def _plural_french(n):
+    return "one" if 0 <= n < 2 else "other"
+
+
+# Plural rule name -> (rule, categories the rule can return)
+PLURAL_RULES = {
+    "en": (_plural_one_other, ("one", "other")),
+    "de": (_plural_one_other, ("one", "other")),
+    "es": (_plural_one_other, ("one", "other")),
+    "it": (_plural_one_other, ("one", "other")),
+    "fr": (_plural_french, ("one", "other")),
+    "ru": (_plural_east_slavic, ("one", "few", "many", "other")),
+    "uk": (_plural_east_slavic, ("one", "few", "many", "other")),
+    "be": (_plural_east_slavic, ("one", "few", "many", "other")),
 }
 
-def get_text(key: str, lang: str = "ru") -> str:
+
+class _Plural:
+    """Compiled plural message: forms keyed by CLDR category"""
+
+    __slots__ = ("rule", "forms")
+
+    def __init__(self, rule, forms):
+        self.rule = rule
+        self.forms = forms
+
+    def select(self, count):
+        return self.forms.get(self.rule(count)) or self.forms["other"]
+
+
+_formatter = string.Formatter()
+
+
+def _placeholders(text):
+    return frozenset(field for _, field, _, _ in _formatter.parse(text) if field)
+
+
+def _compile_catalog(lang, raw, errors):
     """
-    Get localized text by key and language
-    
+    Compile one raw catalog into a tuple indexed by Msg
+
     Args:
-        key (str): Text key
-        lang (str, optional): Language code. Defaults to "ru".
-        
+        lang (str): Language code
+        raw (dict): Parsed catalog file
+        errors (list): Collected validation errors
+
     Returns:
-        str: Localized text or key if not found
+        tuple: (compiled messages tuple, display name, placeholders per message)
     """
-    if lang not in translations:
-        lang = "ru"
-    
-    return translations[lang].get(key, key)
+    meta = raw.pop("_meta", {})
+    rule_name = meta.get("plural", lang)
+    rule, categories = PLURAL_RULES.get(rule_name, PLURAL_RULES["en"])
+
+    unknown = sorted(set(raw) - {msg.name.lower() for msg in Msg})
+    if unknown:
+        errors.append(f"{lang}: unknown keys {', '.join(unknown)}")
+
+    compiled = []
+    placeholders = []
+    for msg in Msg:
+        key = msg.name.lower()
+        value = raw.get(key)
+
+        if isinstance(value, str):
+            compiled.append(sys.intern(value))
+            placeholders.append(_placeholders(value))
+        elif isinstance(value, dict):
+            missing_forms = [c for c in categories if c not in value]
+            if missing_forms:
+                errors.append(f"{lang}: {key} is missing plural forms {', '.join(missing_forms)}")
+            forms = {category: sys.intern(text) for category, text in value.items()}
+            compiled.append(_Plural(rule, forms))
+            placeholders.append(frozenset().union(*(_placeholders(text) for text in forms.values())))
+        else:
+            errors.append(f"{lang}: missing translation for {key}")
+            compiled.append(None)
+            placeholders.append(frozenset())
+
+    return tuple(compiled), meta.get("name", lang), placeholders
+
+
+def compile_catalogs(directory=LOCALES_DIRECTORY):
+    """
+    Load and compile every ``<lang>.json`` catalog in a directory
+
+    Args:
+        directory (str): Directory with catalog files
+
+    Returns:
+        tuple: (catalogs by language, display names by language)
+
+    Raises:
+        LocalizationError: If any catalog is incomplete or inconsistent
+    """
+    catalogs = {}
+    names = {}
+    placeholders = {}
+    errors = []
+
+    for filename in sorted(os.listdir(directory)):
+        lang, ext = os.path.splitext(filename)
+        if ext != ".json":
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            raw = json.load(f)
+        catalogs[lang], names[lang], placeholders[lang] = _compile_catalog(lang, raw, errors)
+
+    if DEFAULT_LANGUAGE not in catalogs:
+        errors.append(f"default language catalog {DEFAULT_LANGUAGE}.json not found in {directory}")
+    else:
+        reference = placeholders[DEFAULT_LANGUAGE]
+        for lang, fields in placeholders.items():
+            for msg in Msg:
+                if fields[msg] != reference[msg]:
+                    errors.append(f"{lang}: placeholders of {msg.name.lower()} differ from {DEFAULT_LANGUAGE}")
+
+    if errors:
+        raise LocalizationError("Invalid translation catalogs:\n" + "\n".join(errors))
+
+    return catalogs, names
+
+
+_CATALOGS, LANGUAGE_NAMES = compile_catalogs()
+_DEFAULT_CATALOG = _CATALOGS[DEFAULT_LANGUAGE]
+_KEY_IDS = {msg.name.lower(): msg.value for msg in Msg}
+
+# Default language first, then the rest in file order
+SUPPORTED_LANGUAGES = (DEFAULT_LANGUAGE,) + tuple(lang for lang in _CATALOGS if lang != DEFAULT_LANGUAGE)
+
+
+def get_text(key, lang=DEFAULT_LANGUAGE, count=None, **params):
+    """
+    Get localized text by message id and language
+
+    Args:
+        key (Msg or str): Message id (or its lower-case catalog key)
+        lang (str): Language code; unknown languages fall back to Russian
+        count (int, optional): Number used to select the plural form
+        **params: Values for ``{placeholder}`` fields
+
+    Returns:
+        str: Localized text
+
+    Raises:
+        KeyError: If the key is not a known message
+    """
+    if key.__class__ is str:
+        key = _KEY_IDS[key]
+
+    entry = _CATALOGS.get(lang, _DEFAULT_CATALOG)[key]
+
+    if entry.__class__ is _Plural:
+        entry = entry.select(count if count is not None else 0)
+        params["count"] = count
+
+    if params:
+        return entry.format(**params)
+    return entry
@@ -0,0 +1,265 @@
+"""
+Latency instrumentation for the Telegram bot
+
+Collects per-handler wall time and the time spent in Bot API calls, Redis,
+the ORM and video encoding, and exposes everything in the Prometheus text
+format on a local HTTP endpoint. Handler and Bot API timings are recorded by
+the middlewares in ``app.middlewares.metrics``.
+"""
+import functools
+import logging
+import time
+from bisect import bisect_left
+
+import redis
+import redis.asyncio
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers fast Redis calls up to long video uploads
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labels, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class for metrics kept in the module registry"""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        self._series[labels] = value
+
+    def inc(self, *labels, amount=1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self._series[labels] = self._series.get(labels, 0) - amount
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._start, *self._labels)
+        return False
+
+
+class Histogram(_Metric):
+    """Distribution of observed values with cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            # [per-bucket counts (+Inf last), sum, count]
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *labels):
+        """Context manager observing the wall time of its block"""
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+HANDLER_SECONDS = Histogram("bot_handler_duration_seconds", "Wall time of update handlers", ["handler"])
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Handlers that raised", ["handler"])
+BOT_API_SECONDS = Histogram("bot_api_request_duration_seconds", "Time spent in Bot API calls", ["method"])
+REDIS_SECONDS = Histogram("redis_command_duration_seconds", "Time spent in Redis commands", ["command"])
+ORM_SECONDS = Histogram("orm_query_duration_seconds", "Time spent in ORM queries", ["operation"])
+VIDEO_ENCODE_SECONDS = Histogram("video_encode_duration_seconds", "Time spent encoding video notes")
+UPLOADS_IN_FLIGHT = Gauge("media_uploads_in_flight", "Media uploads currently running")
+UPLOAD_BYTES_IN_FLIGHT = Gauge("media_upload_bytes_in_flight", "Bytes of media uploads currently running")
+UPLOAD_RETRIES = Counter("media_upload_retries_total", "Media upload retries", ["reason"])
+POOL_SIZE = Gauge("bot_api_pool_size", "Connections in a Bot API pool", ["pool"])
+POOL_IN_USE = Gauge("bot_api_pool_in_use", "Bot API requests in flight per pool", ["pool"])
+POOL_SATURATED = Counter("bot_api_pool_saturated_total", "Requests that had to wait for a free connection", ["pool"])
+RATE_LIMIT_WAIT_SECONDS = Histogram("bot_api_rate_limit_wait_seconds", "Time requests waited for rate limit tokens", ["priority"])
+RATE_LIMIT_RETRIES = Counter("bot_api_flood_retries_total", "Requests retried after a 429 answer")
+SCRATCH_JOBS = Gauge("scratch_jobs", "Video jobs holding a scratch directory")
+SCRATCH_REJECTED = Counter("scratch_jobs_rejected_total", "Video jobs rejected for lack of scratch space")
+SCRATCH_ORPHANS_REMOVED = Counter("scratch_orphans_removed_total", "Leftover scratch directories and files removed")
+ADMISSION_REJECTED = Counter("video_admission_rejected_total", "Videos rejected by the admission stage", ["reason"])
+ADMISSION_BYTES_SAVED = Counter("video_admission_bytes_saved_total", "Download bytes avoided by rejecting videos before download")
+MEMORY_RESERVED_BYTES = Gauge("video_memory_reserved_bytes", "Memory reserved by running encodes")
+MEMORY_WAIT_SECONDS = Histogram("video_memory_wait_seconds", "Time encodes waited for memory")
+MEMORY_REJECTED = Counter("video_memory_rejected_total", "Encodes rejected because memory did not free up in time")
+VIDEO_JOB_PEAK_RSS = Histogram(
+    "video_job_peak_rss_bytes", "Peak RSS of encodes", ["mode"],
+    buckets=tuple(mb * 1024 * 1024 for mb in (32, 64, 128, 256, 384, 512, 768, 1024, 1536, 2048))
+)
+VIDEO_JOB_ESTIMATE_RATIO = Histogram(
+    "video_job_peak_rss_estimate_ratio", "Peak RSS of encodes relative to the estimate", ["mode"],
+    buckets=(0.25, 0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 3.0)
+)
+CACHE_HITS = Counter("cache_hits_total", "In-process cache hits", ["cache"])
+CACHE_MISSES = Counter("cache_misses_total", "In-process cache misses", ["cache"])
+CACHE_EVICTIONS = Counter("cache_evictions_total", "In-process cache entries evicted", ["cache", "reason"])
+CACHE_ENTRIES = Gauge("cache_entries", "Entries in an in-process cache", ["cache"])
+SUBSCRIPTION_CHECKS = Counter("subscription_checks_total", "Subscription checks by path", ["path"])
+SWEEP_USERS = Counter("subscription_sweep_users_total", "Users re-checked by the subscription sweeper", ["result"])
+SWEEP_CURSOR = Gauge("subscription_sweep_cursor", "Last user primary key written by the subscription sweeper")
+CHANNELS_QUARANTINED = Gauge("channels_quarantined", "Channels excluded from subscription checks")
+CHANNEL_PROBES = Counter("channel_health_probes_total", "Channel health probes", ["result"])
+JOIN_REQUESTS = Counter("join_requests_total", "Join requests to channels gated by join requests", ["result"])
+KNOWN_USERS = Gauge("known_users", "Telegram IDs added to the known-user filter")
+USER_LOOKUPS = Counter("user_lookups_total", "User lookups by path", ["path"])
+
+
+def render_metrics() -> str:
+    """
+    Render all registered metrics
+
+    Returns:
+        str: Prometheus text exposition format
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client that records time per command"""
+
+    def execute_command(self, *args, **options):
+        with REDIS_SECONDS.time(str(args[0]).upper() if args else "UNKNOWN"):
+            return super().execute_command(*args, **options)
+
+
+class InstrumentedAsyncRedis(redis.asyncio.Redis):
+    """Asyncio Redis client that records time per command"""
+
+    async def execute_command(self, *args, **options):
+        with REDIS_SECONDS.time(str(args[0]).upper() if args else "UNKNOWN"):
+            return await super().execute_command(*args, **options)
+
+
+_ORM_METHODS = ("execute_insert", "execute_query", "execute_query_dict", "execute_many", "execute_script")
+
+
+def _instrument_orm_method(func, name):
+    @functools.wraps(func)
+    async def wrapper(self, query, *args, **kwargs):
+        operation = query.split(None, 1)[0].upper() if query else name
+        with ORM_SECONDS.time(operation):
+            return await func(self, query, *args, **kwargs)
+
+    wrapper._instrumented = True
+    return wrapper
+
+
+def instrument_tortoise() -> None:
+    """
+    Record query time for every Tortoise connection class in use
+
+    The wrappers are installed on the client classes, so transaction
+    wrappers derived from them are covered too. Safe to call repeatedly.
+    """
+    from tortoise import connections
+
+    for connection in connections.all():
+        cls = type(connection)
+        for name in _ORM_METHODS:
+            func = getattr(cls, name, None)
+            if func is None or getattr(func, "_instrumented", False):
+                continue
+            setattr(cls, name, _instrument_orm_method(func, name))
+
+
+async def start_metrics_server(host, port):
+    """
+    Serve /metrics over HTTP
+
+    Args:
+        host (str): Address to bind, normally 127.0.0.1
+        port (int): Port to bind
+
+    Metrics are optional: if the port cannot be bound, e.g. because another
+    replica holds it, the bot runs on without them.
+
+    Returns:
+        aiohttp.web.AppRunner: Runner to clean up on shutdown, or None if
+            the server could not be started
+    """
+    async def metrics_view(request):
+        return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_view)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        await runner.cleanup()
+        logger.error("Metrics server not started on %s:%s: %s", host, port, e)
+        return None
+    logger.info("Metrics available at http://%s:%s/metrics", host, port)
+    return runner
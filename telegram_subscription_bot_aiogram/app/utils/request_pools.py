@@ -0,0 +1,175 @@
+"""
+Separate Bot API connection pools for control and media requests
+
+Small, latency-sensitive calls (``answerCallbackQuery``, ``sendMessage``,
+``editMessageText``) and slow media calls (video note sends, ``getFile`` and
+file downloads) go through differently sized aiohttp sessions with their own
+timeouts, so a handful of slow transfers cannot exhaust the connections the
+control calls need. Pool usage is exported as metrics and saturation is
+logged.
+"""
+import logging
+import ssl
+import time
+from typing import Any, AsyncGenerator, Optional
+
+import certifi
+from aiohttp import ClientSession, TCPConnector
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.base import BaseSession
+
+from app.utils.metrics import POOL_IN_USE, POOL_SIZE, POOL_SATURATED
+
+logger = logging.getLogger(__name__)
+
+# Bot API methods that transfer media; everything else is a control call
+MEDIA_METHODS = frozenset({
+    "sendVideoNote", "sendVideo", "sendAnimation", "sendDocument", "sendPhoto",
+    "sendAudio", "sendVoice", "sendMediaGroup", "getFile",
+})
+
+# Seconds between saturation warnings per pool
+SATURATION_LOG_INTERVAL = 60.0
+
+
+class _Pool:
+    __slots__ = ("name", "session", "size", "in_use", "_last_warning")
+
+    def __init__(self, name: str, session: AiohttpSession, size: int):
+        self.name = name
+        self.session = session
+        self.size = size
+        self.in_use = 0
+        self._last_warning = 0.0
+        POOL_SIZE.set(size, name)
+        POOL_IN_USE.set(0, name)
+
+    def acquire(self) -> None:
+        if self.in_use >= self.size:
+            # The request will wait for a free connection
+            POOL_SATURATED.inc(self.name)
+            now = time.monotonic()
+            if now - self._last_warning >= SATURATION_LOG_INTERVAL:
+                self._last_warning = now
+                logger.warning("Bot API %s pool saturated (%s of %s connections in use)",
+                               self.name, self.in_use, self.size)
+        self.in_use += 1
+        POOL_IN_USE.set(self.in_use, self.name)
+
+    def release(self) -> None:
+        self.in_use -= 1
+        POOL_IN_USE.set(self.in_use, self.name)
+
+
+class KeepAliveSession(AiohttpSession):
+    """
+    AiohttpSession whose idle connections stay open longer
+
+    aiohttp closes idle connections after 15s by default; between bursts of
+    subscription checks that means a new TLS handshake every time. The
+    session builds its own connector with ``keepalive_timeout``.
+
+    Args:
+        limit (int): Connections in the pool
+        keepalive_timeout (float): Seconds idle connections stay open
+        **kwargs: Passed to AiohttpSession, e.g. ``timeout``
+    """
+
+    def __init__(self, limit: int = 100, keepalive_timeout: float = 60.0, **kwargs: Any):
+        super().__init__(limit=limit, **kwargs)
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self._client: Optional[ClientSession] = None
+
+    async def create_session(self) -> ClientSession:
+        if self._client is None or self._client.closed:
+            self._client = ClientSession(connector=TCPConnector(
+                ssl=ssl.create_default_context(cafile=certifi.where()),
+                limit=self.limit,
+                ttl_dns_cache=3600,
+                keepalive_timeout=self.keepalive_timeout
+            ))
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None and not self._client.closed:
+            await self._client.close()
+        await super().close()
+
+
+class RoutingSession(BaseSession):
+    """
+    Bot session that routes every call to the control or media pool
+
+    Request middlewares registered on this session run once per call; the
+    pooled sessions are used directly.
+
+    Args:
+        control (AiohttpSession): Session for control calls
+        control_size (int): Connection limit of ``control``
+        media (AiohttpSession): Session for media calls and file downloads
+        media_size (int): Connection limit of ``media``
+    """
+
+    def __init__(self, control: AiohttpSession, control_size: int, media: AiohttpSession, media_size: int):
+        super().__init__(timeout=control.timeout)
+        self._control = _Pool("control", control, control_size)
+        self._media = _Pool("media", media, media_size)
+
+    async def make_request(self, bot, method, timeout=None) -> Any:
+        pool = self._media if method.__api_method__ in MEDIA_METHODS else self._control
+        pool.acquire()
+        try:
+            return await pool.session.make_request(bot, method, timeout=timeout)
+        finally:
+            pool.release()
+
+    async def stream_content(self, *args, **kwargs) -> AsyncGenerator[bytes, None]:
+        # File downloads always use the media pool
+        self._media.acquire()
+        try:
+            async for chunk in self._media.session.stream_content(*args, **kwargs):
+                yield chunk
+        finally:
+            self._media.release()
+
+    async def close(self) -> None:
+        await self._control.session.close()
+        await self._media.session.close()
+
+
+def build_media_session(pool_size: int, timeout: float) -> AiohttpSession:
+    """
+    Session for the media pool
+
+    Shared by the main bot (sends by file_id, getFile, downloads) and the
+    upload service.
+
+    Args:
+        pool_size (int): Connections in the pool
+        timeout (float): Request timeout in seconds
+
+    Returns:
+        AiohttpSession: Media session
+    """
+    return AiohttpSession(limit=pool_size, timeout=timeout)
+
+
+def build_bot_session(control_pool_size: int, control_timeout: float,
+                      media_session: AiohttpSession, media_pool_size: int,
+                      keepalive_timeout: float = 60.0) -> RoutingSession:
+    """
+    Session for the main bot
+
+    Args:
+        control_pool_size (int): Connections for control calls
+        control_timeout (float): Timeout of control calls in seconds
+        media_session (AiohttpSession): Session from build_media_session
+        media_pool_size (int): Connections of ``media_session``
+        keepalive_timeout (float): Seconds idle control connections stay open
+
+    Returns:
+        RoutingSession: Session routing control and media calls
+    """
+    control = KeepAliveSession(limit=control_pool_size, keepalive_timeout=keepalive_timeout, timeout=control_timeout)
+    return RoutingSession(control, control_pool_size, media_session, media_pool_size)
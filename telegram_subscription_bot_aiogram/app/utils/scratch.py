@@ -0,0 +1,236 @@
+"""
+Scratch space for video jobs
+
+Every job (download, encode, upload) gets its own directory, so moviepy and
+ffmpeg temp files of concurrent jobs never share a path. Directories are
+named ``job-<pid>-<random>``; when a process dies without cleaning up (crash,
+OOM kill), the next sweep finds directories of processes that no longer run
+and removes them. Sweeps run at startup and periodically.
+
+Jobs are admitted only while the filesystem keeps ``min_free_bytes`` free
+after reserving the job's expected size, and while the bot's own scratch
+usage stays within ``max_bytes``. A tmpfs root such as ``/dev/shm`` can be
+listed first: jobs use it while it has room and fall back to disk otherwise.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from app.utils.metrics import SCRATCH_JOBS, SCRATCH_REJECTED, SCRATCH_ORPHANS_REMOVED
+
+logger = logging.getLogger(__name__)
+
+JOB_PREFIX = "job-"
+
+# Bytes reserved for a job when the input size is unknown: the Bot API
+# download limit (20 MB) for the input, the output and the audio track
+DEFAULT_JOB_BYTES = 3 * 20 * 1024 * 1024
+
+
+class ScratchSpaceFull(Exception):
+    """Raised when a job does not fit into the scratch quota"""
+
+
+def _pid_alive(pid):
+    if os.name == "nt":
+        # os.kill(pid, 0) terminates the process on Windows; rely on age there
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _tree_size(path):
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return total
+
+
+class ScratchJob:
+    """
+    Private directory of one job
+
+    Args:
+        directory (str): Job directory
+        reserved (int): Bytes reserved for the job
+    """
+
+    def __init__(self, directory, reserved):
+        self.directory = directory
+        self.reserved = reserved
+
+    def path(self, name):
+        """
+        Path of a file inside the job directory
+
+        Args:
+            name (str): File name, e.g. ``input.mp4``
+
+        Returns:
+            str: Absolute path
+        """
+        return os.path.join(self.directory, name)
+
+
+class ScratchSpace:
+    """
+    Allocate per-job directories within a disk quota
+
+    Args:
+        roots (list): Candidate root directories in order of preference
+            (e.g. a tmpfs directory first, then the disk directory)
+        min_free_bytes (int): Free space each filesystem must keep
+        max_bytes (int): Upper bound for all jobs of this process together
+        orphan_age (float): Seconds after which a job directory or a loose
+            file is removed even if its process still runs
+        sweep_interval (float): Seconds between periodic sweeps
+    """
+
+    def __init__(self, roots, min_free_bytes=512 * 1024 * 1024, max_bytes=2 * 1024 * 1024 * 1024,
+                 orphan_age=3600.0, sweep_interval=600.0):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.min_free_bytes = min_free_bytes
+        self.max_bytes = max_bytes
+        self.orphan_age = orphan_age
+        self.sweep_interval = sweep_interval
+        self._active = {}
+        self._reserved = {root: 0 for root in self.roots}
+        self._task = None
+
+    async def start(self) -> None:
+        """Remove leftovers of earlier runs and start periodic sweeps"""
+        usable = []
+        for root in self.roots:
+            try:
+                os.makedirs(root, exist_ok=True)
+                usable.append(root)
+            except OSError as e:
+                logger.warning("Scratch root %s unavailable: %s", root, e)
+        self.roots = usable or self.roots[-1:]
+        await asyncio.to_thread(self.sweep)
+        self._task = asyncio.create_task(self._sweep_periodically())
+
+    async def stop(self) -> None:
+        """Stop periodic sweeps"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.warning("Scratch sweep failed: %s", e)
+
+    def sweep(self) -> int:
+        """
+        Remove job directories of dead processes and stale files
+
+        Returns:
+            int: Number of removed entries
+        """
+        removed = 0
+        now = time.time()
+        pid = os.getpid()
+
+        for root in self.roots:
+            try:
+                entries = list(os.scandir(root))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    age = now - entry.stat(follow_symlinks=False).st_mtime
+                except OSError:
+                    continue
+
+                if entry.is_dir(follow_symlinks=False) and entry.name.startswith(JOB_PREFIX):
+                    if entry.path in self._active:
+                        continue
+                    try:
+                        owner = int(entry.name[len(JOB_PREFIX):].split("-", 1)[0])
+                    except ValueError:
+                        owner = None
+                    # A directory of our own pid that is not active was left
+                    # by an earlier process with the same pid (containers)
+                    orphaned = owner is None or owner == pid or not _pid_alive(owner)
+                    if not orphaned and age < self.orphan_age:
+                        continue
+                    size = _tree_size(entry.path)
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                elif entry.is_file(follow_symlinks=False) and age >= self.orphan_age:
+                    # Files of the old fixed-name layout and stray temp files
+                    size = entry.stat(follow_symlinks=False).st_size
+                    with contextlib.suppress(OSError):
+                        os.remove(entry.path)
+                else:
+                    continue
+
+                removed += 1
+                SCRATCH_ORPHANS_REMOVED.inc()
+                logger.info("Removed orphaned scratch entry %s (%s bytes)", entry.path, size)
+
+        return removed
+
+    def _pick_root(self, size):
+        if sum(self._reserved.values()) + size > self.max_bytes:
+            return None
+        for root in self.roots:
+            try:
+                free = shutil.disk_usage(root).free
+            except OSError:
+                continue
+            # Reservations of running jobs may not be written yet
+            if free - self._reserved[root] - size >= self.min_free_bytes:
+                return root
+        return None
+
+    @contextlib.asynccontextmanager
+    async def job(self, expected_bytes=None):
+        """
+        Allocate a job directory, removed when the block exits
+
+        Args:
+            expected_bytes (int, optional): Disk space the job will need;
+                DEFAULT_JOB_BYTES when unknown
+
+        Yields:
+            ScratchJob: The job's directory
+
+        Raises:
+            ScratchSpaceFull: If no root has enough free space
+        """
+        size = expected_bytes or DEFAULT_JOB_BYTES
+        root = self._pick_root(size)
+        if root is None:
+            SCRATCH_REJECTED.inc()
+            logger.warning("Scratch space exhausted, rejecting job of %s bytes", size)
+            raise ScratchSpaceFull(f"no scratch space for {size} bytes")
+
+        directory = tempfile.mkdtemp(prefix=f"{JOB_PREFIX}{os.getpid()}-", dir=root)
+        self._active[directory] = root
+        self._reserved[root] += size
+        SCRATCH_JOBS.inc()
+        try:
+            yield ScratchJob(directory, size)
+        finally:
+            await asyncio.to_thread(shutil.rmtree, directory, True)
+            del self._active[directory]
+            self._reserved[root] -= size
+            SCRATCH_JOBS.dec()
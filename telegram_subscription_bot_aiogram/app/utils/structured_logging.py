@@ -0,0 +1,170 @@
+"""
+Structured logging for the Telegram bot
+
+Log records are written as JSON lines by a background thread: handlers on the
+event loop only put the record on a queue, and formatting and I/O happen in a
+``QueueListener``. Every record carries the correlation id of the update being
+processed, so all lines of one request can be grouped. Debug records are
+sampled and rate limited per message template, so verbose hot-path logging
+can stay enabled in production. The correlation id is set by
+``app.middlewares.correlation.CorrelationMiddleware``.
+"""
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+
+NO_CORRELATION_ID = "-"
+
+correlation_id = contextvars.ContextVar("correlation_id", default=NO_CORRELATION_ID)
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects"""
+
+    def format(self, record) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "correlation_id": getattr(record, "correlation_id", NO_CORRELATION_ID),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class CorrelationFilter(logging.Filter):
+    """Attach the correlation id of the current context to each record"""
+
+    def filter(self, record) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """
+    Sample and rate limit records below INFO
+
+    Records at INFO and above always pass. Debug records pass with
+    probability ``sample_rate`` and at most ``max_per_second`` times per
+    second for each message template, so a hot loop cannot flood the log.
+
+    Args:
+        sample_rate (float): Fraction of debug records to keep (0..1)
+        max_per_second (int): Budget per message template and second
+    """
+
+    def __init__(self, sample_rate=1.0, max_per_second=20):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.max_per_second = max_per_second
+        self.dropped = 0
+        self._window = 0
+        self._counts = {}
+
+    def filter(self, record) -> bool:
+        if record.levelno >= logging.INFO:
+            return True
+
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.dropped += 1
+            return False
+
+        window = int(time.monotonic())
+        if window != self._window:
+            self._window = window
+            self._counts.clear()
+
+        key = (record.name, record.msg)
+        count = self._counts.get(key, 0)
+        if count >= self.max_per_second:
+            self.dropped += 1
+            return False
+        self._counts[key] = count + 1
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves formatting to the listener thread
+
+    The stock handler formats the record before queueing it, which would put
+    the JSON encoding back on the event loop. Here only the message is merged
+    with its arguments (so mutable arguments are captured at call time) and
+    the traceback is rendered to text.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level=logging.INFO, json_output=True, debug_sample_rate=1.0, debug_rate_limit=20):
+    """
+    Route all logging through a queue to a background writer
+
+    Args:
+        level (int or str): Root log level
+        json_output (bool): Write JSON lines instead of plain text
+        debug_sample_rate (float): Fraction of debug records to keep
+        debug_rate_limit (int): Debug records per message template and second
+
+    Returns:
+        logging.handlers.QueueListener: Started listener; pass it to stop_logging
+    """
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if json_output:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s'
+        ))
+
+    queue_handler = _QueueHandler(queue.SimpleQueue())
+    # Filters run in the logging thread of the caller, where the context
+    # variable holds the id of the update being handled
+    queue_handler.addFilter(DebugSampler(debug_sample_rate, debug_rate_limit))
+    queue_handler.addFilter(CorrelationFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    # aiogram logs every handled update at INFO
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+    listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_logging(listener) -> None:
+    """
+    Flush queued records and stop the background writer
+
+    Args:
+        listener (logging.handlers.QueueListener): Listener from setup_logging
+    """
+    if listener is not None:
+        listener.stop()
@@ -0,0 +1,105 @@
+"""
+Cutting a window out of a long video before it is encoded
+
+With ``LONG_VIDEO_MODE=trim`` videos over the duration limit are not
+rejected: the circle is made from the first ``MAX_VIDEO_DURATION`` seconds,
+or from a window the user writes in the caption (``1:30`` or ``1:30-2:00``).
+The window is cut with an ffmpeg stream copy seeking on the input, so nothing
+is decoded and the cost does not grow with the length of the input; the cut
+starts at the keyframe before the requested start. Only the kept part is
+decoded by the encoder afterwards.
+"""
+import logging
+import re
+import subprocess
+
+from moviepy.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Seconds a stream copy may take before the encoder cuts the window itself
+EXTRACT_TIMEOUT = 30
+
+_TIMESTAMP = r"\d+(?::\d{1,2}){0,2}"
+_WINDOW = re.compile(rf"^\s*({_TIMESTAMP})(?:\s*[-–]\s*({_TIMESTAMP}))?\s*$")
+
+
+def _seconds(timestamp):
+    seconds = 0
+    for part in timestamp.split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+def parse_window(caption):
+    """
+    Read a time window from a video caption
+
+    Args:
+        caption (str, optional): Caption such as ``90``, ``1:30`` or
+            ``1:30-2:00``
+
+    Returns:
+        tuple: (start, end) in seconds with end None if not given, or None
+        if the caption is not a window
+    """
+    match = _WINDOW.match(caption or "")
+    if match is None:
+        return None
+    start = _seconds(match.group(1))
+    end = _seconds(match.group(2)) if match.group(2) else None
+    if end is not None and end <= start:
+        return None
+    return start, end
+
+
+def format_timestamp(seconds):
+    """
+    Format seconds as ``m:ss``
+
+    Args:
+        seconds (float): Offset in seconds
+
+    Returns:
+        str: Timestamp for user-facing messages
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
+
+
+def extract_window(input_file, output_file, start, length):
+    """
+    Copy a window of a video into a new file without re-encoding
+
+    Blocking; run in an executor.
+
+    Args:
+        input_file (str): Source video
+        output_file (str): Destination, same container format
+        start (float): Start of the window in seconds
+        length (float): Length of the window in seconds
+
+    Returns:
+        bool: True if the window was copied; on False the caller should cut
+        while decoding instead
+    """
+    command = [
+        get_setting("FFMPEG_BINARY"), "-nostdin", "-y", "-loglevel", "error",
+        # Seeking before -i jumps to the keyframe before ``start`` without
+        # reading what lies before it
+        "-ss", f"{start:.3f}", "-i", input_file, "-t", f"{length:.3f}",
+        "-map", "0:v:0", "-map", "0:a:0?", "-c", "copy",
+        "-avoid_negative_ts", "make_zero",
+        output_file,
+    ]
+    try:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                timeout=EXTRACT_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning("Stream copy of %s failed: %s", input_file, e)
+        return False
+    if result.returncode != 0:
+        logger.warning("Stream copy of %s failed: %s", input_file,
+                       result.stderr.decode(errors="replace").strip()[-500:])
+        return False
+    return True
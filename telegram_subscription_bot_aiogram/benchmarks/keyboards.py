@@ -0,0 +1,68 @@
+"""
+Benchmark: per-request keyboard cost, rebuilt vs prebuilt
+
+aiogram validates reply_markup as a model and dumps it into every request,
+so the cacheable part is model construction and validation. This compares
+construct + dump against dumping the prebuilt keyboards from app.keyboards.
+
+Usage:
+    python -m benchmarks.keyboards [--iterations N]
+"""
+import argparse
+import timeit
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from app.utils.localization import get_text, Msg
+from app.keyboards.subscription import get_main_menu_keyboard
+from app.keyboards.video import get_share_keyboard
+
+
+def build_main_menu(lang):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=get_text(Msg.CREATE_CIRCLE_BUTTON, lang), callback_data="create_circle")],
+        [InlineKeyboardButton(text=get_text(Msg.CREATE_CIRCLE_PRANK_BUTTON, lang), callback_data="create_circle_prank")],
+        [InlineKeyboardButton(text=get_text(Msg.LANGUAGE_BUTTON, lang), callback_data="language")],
+    ])
+
+
+def build_share(lang, short_id):
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=get_text(Msg.SHARE_YES, lang), callback_data=f"sy_{short_id}"),
+        InlineKeyboardButton(text=get_text(Msg.SHARE_NO, lang), callback_data="sn"),
+    ]])
+
+
+def measure(label, func, iterations):
+    seconds = min(timeit.repeat(func, number=iterations, repeat=5))
+    per_call_us = seconds / iterations * 1e6
+    print(f"{label:<32} {per_call_us:8.2f} us/request")
+    return per_call_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    cases = [
+        (
+            "main menu",
+            lambda: build_main_menu("en").model_dump(exclude_none=True),
+            lambda: get_main_menu_keyboard("en").model_dump(exclude_none=True),
+        ),
+        (
+            "share (sy_<short_id>)",
+            lambda: build_share("en", "a1b2c3").model_dump(exclude_none=True),
+            lambda: get_share_keyboard("a1b2c3", "en").model_dump(exclude_none=True),
+        ),
+    ]
+
+    for name, rebuilt, prebuilt in cases:
+        before = measure(f"{name}: rebuilt", rebuilt, args.iterations)
+        after = measure(f"{name}: prebuilt", prebuilt, args.iterations)
+        print(f"{name + ': saved':<32} {before - after:8.2f} us/request ({before / after:.1f}x)\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Benchmark: subscription check latency with and without connection reuse
+
+Starts a local HTTPS server that answers ``getChatMember`` like the Bot API
+and compares three client strategies:
+
+- a new aiohttp session per check (the old SubscriptionService behaviour:
+  TCP connect + TLS handshake every time),
+- one shared keep-alive session, channels checked one by one,
+- one shared session, all channels of a user checked concurrently.
+
+On localhost the handshake is almost pure CPU; against api.telegram.org every
+new connection also costs 2-3 network round trips on top of the numbers
+printed here.
+
+Usage:
+    python -m benchmarks.tls_handshake [--iterations N] [--channels N]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import ssl
+import statistics
+import subprocess
+import tempfile
+import time
+
+import aiohttp
+
+RESPONSE_BODY = b'{"ok":true,"result":{"status":"member","user":{"id":1,"is_bot":false,"first_name":"u"}}}'
+RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Connection: keep-alive\r\n"
+    b"Content-Length: " + str(len(RESPONSE_BODY)).encode() + b"\r\n\r\n" + RESPONSE_BODY
+)
+
+
+def make_certificate(directory):
+    """
+    Create a self-signed certificate for 127.0.0.1
+
+    Uses the cryptography package when available, the openssl CLI otherwise.
+
+    Args:
+        directory (str): Directory for the PEM files
+
+    Returns:
+        tuple: (certificate path, key path)
+    """
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+
+    try:
+        import datetime
+        import ipaddress
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.x509.oid import NameOID
+    except ImportError:
+        if shutil.which("openssl") is None:
+            raise SystemExit("Install the cryptography package or the openssl CLI to run this benchmark")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+             "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+             "-keyout", key_path, "-out", cert_path],
+            check=True, capture_output=True
+        )
+        return cert_path, key_path
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), False)
+        .sign(key, hashes.SHA256())
+    )
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ))
+    return cert_path, key_path
+
+
+async def handle_connection(reader, writer):
+    """Answer every request on a keep-alive connection with a member status"""
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if length:
+                await reader.readexactly(length)
+            writer.write(RESPONSE)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def check(session, url):
+    async with session.post(url, data={"chat_id": "-100", "user_id": "1"}) as response:
+        await response.read()
+
+
+async def run_new_session_per_check(url, client_ssl, iterations, channels):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        for _ in range(channels):
+            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=client_ssl)) as session:
+                await check(session, url)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def run_shared_session(url, client_ssl, iterations, channels, concurrent):
+    timings = []
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=client_ssl)) as session:
+        # Warm the pool like a running bot would be
+        await asyncio.gather(*(check(session, url) for _ in range(channels)))
+        for _ in range(iterations):
+            start = time.perf_counter()
+            if concurrent:
+                await asyncio.gather(*(check(session, url) for _ in range(channels)))
+            else:
+                for _ in range(channels):
+                    await check(session, url)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label, timings):
+    mean_ms = statistics.mean(timings) * 1000
+    p95_ms = sorted(timings)[int(len(timings) * 0.95) - 1] * 1000
+    print(f"{label:<40} mean {mean_ms:7.2f} ms   p95 {p95_ms:7.2f} ms")
+    return mean_ms
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200, help="subscription checks per strategy")
+    parser.add_argument("--channels", type=int, default=3, help="required channels per check")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert_path, key_path = make_certificate(directory)
+
+        server_ssl = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server_ssl.load_cert_chain(cert_path, key_path)
+        client_ssl = ssl.create_default_context(cafile=cert_path)
+
+        server = await asyncio.start_server(handle_connection, "127.0.0.1", 0, ssl=server_ssl)
+        port = server.sockets[0].getsockname()[1]
+        url = f"https://127.0.0.1:{port}/bot123:TEST/getChatMember"
+
+        print(f"{args.iterations} checks of {args.channels} channels each against a local TLS mock\n")
+        async with server:
+            cold = report("new session per check (before)",
+                          await run_new_session_per_check(url, client_ssl, args.iterations, args.channels))
+            warm = report("shared session, sequential",
+                          await run_shared_session(url, client_ssl, args.iterations, args.channels, False))
+            concurrent = report("shared session, concurrent (after)",
+                                await run_shared_session(url, client_ssl, args.iterations, args.channels, True))
+
+    print(f"\nsaved per check: {cold - concurrent:.2f} ms "
+          f"({(cold - warm) / args.channels:.2f} ms handshake + connect per channel)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
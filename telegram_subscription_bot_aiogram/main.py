@@ -2,23 +2,137 @@ import asyncio
 import logging
 import sys
 from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.filters import CommandStart
 from aiogram.types import Message
 from tortoise import Tortoise
 
 from app.handlers import main_router
-from app.utils.localization import get_text
-from config.config import BOT_TOKEN, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+from app.middlewares import (
+    CorrelationMiddleware, HandlerMetricsMiddleware, BotApiMetricsMiddleware, RateLimitMiddleware
+)
+from app.keyboards.language import get_language_keyboard
+from app.models.schema import add_missing_columns
+from app.services.upload_service import UploadService
+from app.services.subscription_sweeper import SubscriptionSweeper
+from app.services.channel_health import channel_health
+from app.services.known_users import known_users
+from app.utils.localization import get_text, Msg
+from app.utils.metrics import InstrumentedAsyncRedis, instrument_tortoise, start_metrics_server
+from app.utils.rate_limiter import RequestScheduler
+from app.utils.scratch import ScratchSpace
+from app.utils.memory import EncoderWorkers, MemoryBudget
+from app.utils.previews import PreviewStore
+from app.utils.fsm_storage import RedisHashStorage
+from app.utils.request_pools import build_bot_session, build_media_session
+from app.utils.structured_logging import setup_logging, stop_logging
+from config.config import (
+    BOT_TOKEN, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME, METRICS_HOST, METRICS_PORT,
+    LOG_LEVEL, LOG_JSON, LOG_DEBUG_SAMPLE_RATE, LOG_DEBUG_RATE_LIMIT,
+    CONTROL_POOL_SIZE, CONTROL_TIMEOUT, CONTROL_KEEPALIVE, MEDIA_POOL_SIZE, MEDIA_TIMEOUT,
+    UPLOAD_CONCURRENCY, UPLOAD_MAX_INFLIGHT_MB, UPLOAD_ATTEMPTS,
+    RATE_LIMIT_OVERALL, RATE_LIMIT_CHAT, RATE_LIMIT_CHAT_BURST, RATE_LIMIT_GROUP, RATE_LIMIT_MAX_RETRIES,
+    TEMP_DIRECTORY, SCRATCH_TMPFS_DIRECTORY, SCRATCH_MIN_FREE_MB, SCRATCH_MAX_MB,
+    SCRATCH_ORPHAN_AGE, SCRATCH_SWEEP_INTERVAL,
+    MEMORY_BUDGET_MB, MEMORY_WAIT_TIMEOUT, ENCODER_WORKERS,
+    PREVIEW_DIRECTORY, PREVIEW_TTL,
+    REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD, ADMIN_FSM_TTL,
+    VERIFIED_TTL, SWEEP_RATE, SWEEP_BATCH_SIZE, SWEEP_INTERVAL, SWEEP_ACTIVE_WINDOW
+)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO,
-                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Control calls (answers, messages, edits) and media calls (video notes,
+# getFile, downloads) use separate connection pools
+media_session = build_media_session(MEDIA_POOL_SIZE, MEDIA_TIMEOUT)
 
 # Initialize bot and dispatcher
-bot = Bot(token=BOT_TOKEN, parse_mode=ParseMode.HTML)
+bot = Bot(
+    token=BOT_TOKEN,
+    default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    session=build_bot_session(
+        CONTROL_POOL_SIZE, CONTROL_TIMEOUT, media_session, MEDIA_POOL_SIZE,
+        keepalive_timeout=CONTROL_KEEPALIVE
+    )
+)
 dp = Dispatcher()
 
+# Tag log records with the id of the update being processed
+dp.update.outer_middleware(CorrelationMiddleware())
+
+# Outgoing requests are paced within Telegram's flood limits, callback
+# answers first; uploads share the limits through the media session
+scheduler = RequestScheduler(
+    overall_rate=RATE_LIMIT_OVERALL,
+    chat_rate=RATE_LIMIT_CHAT,
+    chat_burst=RATE_LIMIT_CHAT_BURST,
+    group_rate=RATE_LIMIT_GROUP,
+    max_retries=RATE_LIMIT_MAX_RETRIES
+)
+rate_limit = RateLimitMiddleware(scheduler)
+bot.session.middleware(rate_limit)
+media_session.middleware(rate_limit)
+
+# Latency instrumentation: handler wall time and Bot API calls by method
+dp.message.middleware(HandlerMetricsMiddleware())
+dp.callback_query.middleware(HandlerMetricsMiddleware())
+bot.session.middleware(BotApiMetricsMiddleware())
+media_session.middleware(BotApiMetricsMiddleware())
+
+# Encoded videos are uploaded through the media pool; handlers receive the
+# service as the ``uploads`` argument
+dp["uploads"] = UploadService(
+    BOT_TOKEN,
+    media_session,
+    max_concurrent=UPLOAD_CONCURRENCY,
+    max_inflight_bytes=UPLOAD_MAX_INFLIGHT_MB * 1024 * 1024,
+    attempts=UPLOAD_ATTEMPTS
+)
+
+# Per-job scratch directories for downloads and encodes, injected as
+# ``scratch``
+dp["scratch"] = ScratchSpace(
+    [root for root in (SCRATCH_TMPFS_DIRECTORY, TEMP_DIRECTORY) if root],
+    min_free_bytes=SCRATCH_MIN_FREE_MB * 1024 * 1024,
+    max_bytes=SCRATCH_MAX_MB * 1024 * 1024,
+    orphan_age=SCRATCH_ORPHAN_AGE,
+    sweep_interval=SCRATCH_SWEEP_INTERVAL
+)
+
+# Encodes are admitted against a global memory budget, injected as
+# ``encoders``
+dp["encoders"] = EncoderWorkers(
+    MemoryBudget(MEMORY_BUDGET_MB * 1024 * 1024, wait_timeout=MEMORY_WAIT_TIMEOUT),
+    mode=ENCODER_WORKERS
+)
+
+# Moderation previews wait until their circle is moderated, injected as
+# ``previews``
+dp["previews"] = PreviewStore(PREVIEW_DIRECTORY, ttl=PREVIEW_TTL)
+
+# Admin conversations, one Redis hash each, injected as ``admin_storage``
+dp["admin_storage"] = RedisHashStorage(
+    InstrumentedAsyncRedis(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_DB,
+        password=REDIS_PASSWORD,
+        decode_responses=True,
+        socket_timeout=3,
+        socket_connect_timeout=3
+    ),
+    ttl=ADMIN_FSM_TTL
+)
+
+# Subscriptions of all users are re-checked in the background
+sweeper = SubscriptionSweeper(
+    bot,
+    rate=SWEEP_RATE,
+    batch_size=SWEEP_BATCH_SIZE,
+    interval=SWEEP_INTERVAL,
+    active_window=SWEEP_ACTIVE_WINDOW,
+    verified_ttl=VERIFIED_TTL
+)
+
 # Register all routers
 dp.include_router(main_router)
 
@@ -35,7 +149,7 @@ async def start_command(message: Message):
     
     # Send welcome message with language selection
     await message.answer(
-        get_text("welcome_message", user_lang),
+        get_text(Msg.WELCOME_MESSAGE, user_lang),
         reply_markup=get_language_keyboard()
     )
 
@@ -49,8 +163,20 @@ async def on_startup():
         modules={"models": ["app.models.models"]}
     )
     
-    # Create tables if they don't exist
+    # Create tables if they don't exist, and columns added since
     await Tortoise.generate_schemas()
+    await add_missing_columns()
+    
+    # Record query time of the ORM connections
+    instrument_tortoise()
+    
+    # Remove job directories left by a crashed run
+    await dp["scratch"].start()
+    await dp["previews"].start()
+    channel_health.start(bot)
+    known_users.start()
+    if SWEEP_RATE > 0:
+        sweeper.start()
     
     logging.info("Database connection established")
 
@@ -58,29 +184,46 @@ async def on_shutdown():
     """
     Close database connection
     """
+    await sweeper.stop()
+    await channel_health.stop()
+    await known_users.stop()
     await Tortoise.close_connections()
+    await dp["uploads"].close()
+    await scheduler.stop()
+    await dp["scratch"].stop()
+    await dp["previews"].stop()
+    await dp["admin_storage"].close()
+    dp["encoders"].shutdown()
     logging.info("Database connection closed")
 
 async def main():
     """
     Main function to start the bot
     """
-    # Import here to avoid circular imports
-    from app.keyboards.language import get_language_keyboard
-    
     # Initialize database
     await on_startup()
     
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    
     # Start polling
     try:
         logging.info("Starting bot...")
-        await dp.start_polling(bot)
+        # chat_member updates are only sent when asked for
+        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         await on_shutdown()
 
 if __name__ == "__main__":
+    # JSON lines written by a background thread
+    log_listener = setup_logging(LOG_LEVEL, LOG_JSON, LOG_DEBUG_SAMPLE_RATE, LOG_DEBUG_RATE_LIMIT)
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logging.info("Bot stopped")
         sys.exit(0)
+    finally:
+        stop_logging(log_listener)
@@ -0,0 +1,205 @@
+"""
+Admission of incoming videos before anything is downloaded
+
+Telegram sends the size, duration, dimensions and MIME type of a video with
+the message. The admission stage rejects videos the bot cannot or should not
+process (too long, over the Bot API download limit, not a video, absurd
+resolutions) before a single byte is fetched, and plans the downscale so
+ffmpeg scales frames while decoding instead of handing full-size frames to
+moviepy.
+
+Videos sent as files (``document``) and animations carry less metadata; the
+duration of a document is only known once it is downloaded and probed.
+
+In trim mode over-long videos are admitted with a window to cut (see
+``utils.trimming``) instead of being rejected.
+"""
+import logging
+
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+from utils.localization import Msg
+from utils.metrics import ADMISSION_REJECTED, ADMISSION_BYTES_SAVED
+
+logger = logging.getLogger(__name__)
+
+# Largest file a bot can download through getFile
+MAX_DOWNLOAD_BYTES = 20 * 1024 * 1024
+
+# Longer side above which a video is not worth decoding for a 640px circle
+MAX_INPUT_DIMENSION = 4096
+
+
+class AdmissionDecision:
+    """
+    Outcome of the admission stage
+
+    Attributes:
+        file_id (str): File to download
+        file_size (int): Size in bytes, None if unknown
+        duration (int): Duration in seconds, None if unknown (documents)
+        width (int): Width in pixels, None if unknown (documents)
+        height (int): Height in pixels, None if unknown (documents)
+        reject (Msg): Message to answer with if the video is rejected,
+            None if it is admitted
+        reason (str): Metric label of the rejection
+        target_resolution (tuple): ``(height, width)`` for VideoFileClip
+            with one side None to keep the aspect ratio, or None to decode
+            at the original size
+        trim (tuple): ``(start, length)`` in seconds of the part to keep,
+            or None to keep the whole video
+    """
+
+    __slots__ = ("file_id", "file_size", "duration", "width", "height", "reject", "reason",
+                 "target_resolution", "trim")
+
+    def __init__(self, file_id, file_size, duration, width=None, height=None):
+        self.file_id = file_id
+        self.file_size = file_size
+        self.duration = duration
+        self.width = width
+        self.height = height
+        self.reject = None
+        self.reason = None
+        self.target_resolution = None
+        self.trim = None
+
+    @property
+    def admitted(self):
+        return self.reject is None
+
+
+def incoming_video(message):
+    """
+    Find the video in a message
+
+    Args:
+        message (telegram.Message): Incoming message
+
+    Returns:
+        Video, Animation or Document: The media, or None if the message
+        carries no video
+    """
+    if message.video:
+        return message.video
+    if message.animation:
+        return message.animation
+    document = message.document
+    if document and (document.mime_type or "").startswith("video/"):
+        return document
+    return None
+
+
+def admit_video(media, max_duration, max_size=640, trim=False, window=None):
+    """
+    Decide from Telegram metadata whether to process a video
+
+    Args:
+        media (Video, Animation or Document): Media from incoming_video()
+        max_duration (int): Longest accepted duration in seconds
+        max_size (int): Side of the encoded video note
+        trim (bool): Cut over-long videos instead of rejecting them
+        window (tuple, optional): ``(start, end)`` requested in the caption,
+            used in trim mode only
+
+    Returns:
+        AdmissionDecision: Decision; rejections are already counted
+    """
+    width = getattr(media, "width", None)
+    height = getattr(media, "height", None)
+    decision = AdmissionDecision(media.file_id, media.file_size, getattr(media, "duration", None), width, height)
+    mime_type = media.mime_type
+
+    if mime_type and not mime_type.startswith("video/"):
+        _reject(decision, "mime_type", Msg.VIDEO_UNSUPPORTED)
+    elif decision.file_size and decision.file_size > MAX_DOWNLOAD_BYTES:
+        _reject(decision, "file_size", Msg.VIDEO_TOO_BIG)
+    elif decision.duration is not None and decision.duration > max_duration and not trim:
+        _reject(decision, "duration", Msg.VIDEO_TOO_LONG)
+    elif width and height and max(width, height) > MAX_INPUT_DIMENSION:
+        _reject(decision, "dimensions", Msg.VIDEO_UNSUPPORTED)
+    else:
+        _plan_scaling(decision, max_size)
+
+    if trim and decision.admitted:
+        _plan_trim(decision, max_duration, window)
+    return decision
+
+
+def admit_download(decision, path, max_duration, trim=False, window=None, max_size=640):
+    """
+    Check the duration and size of a downloaded video that came without them
+
+    Reads the container header only, nothing is decoded. Blocking; run in
+    an executor.
+
+    Args:
+        decision (AdmissionDecision): Decision from admit_video()
+        path (str): Downloaded file
+        max_duration (int): Longest accepted duration in seconds
+        trim (bool): Cut over-long videos instead of rejecting them
+        window (tuple, optional): ``(start, end)`` requested in the caption
+        max_size (int): Side of the encoded video note
+
+    Returns:
+        AdmissionDecision: The same decision, rejected if the video is too
+        long or too large
+    """
+    try:
+        infos = ffmpeg_parse_infos(path)
+    except (IOError, OSError) as e:
+        # Let the encoder fail with its own error
+        logger.warning("Could not probe %s: %s", path, e)
+        return decision
+
+    decision.duration = infos.get("duration")
+    if not decision.width and infos.get("video_size"):
+        decision.width, decision.height = infos["video_size"]
+        if max(decision.width, decision.height) > MAX_INPUT_DIMENSION:
+            _reject(decision, "dimensions", Msg.VIDEO_UNSUPPORTED, downloaded=True)
+            return decision
+        _plan_scaling(decision, max_size)
+
+    if decision.duration is None:
+        return decision
+    if trim:
+        _plan_trim(decision, max_duration, window, downloaded=True)
+    elif decision.duration > max_duration:
+        _reject(decision, "duration", Msg.VIDEO_TOO_LONG, downloaded=True)
+    return decision
+
+
+def _plan_scaling(decision, max_size):
+    width, height = decision.width, decision.height
+    if width and height and min(width, height) > max_size:
+        # Scale the shorter side to the circle size while decoding; the
+        # encoder then only crops
+        decision.target_resolution = (None, max_size) if width <= height else (max_size, None)
+
+
+def _plan_trim(decision, max_duration, window, downloaded=False):
+    start, end = window or (0, None)
+    length = max_duration if end is None else min(end - start, max_duration)
+
+    if decision.duration is None:
+        # Documents: the full plan is made once the file is probed
+        if window:
+            decision.trim = (start, length)
+        return
+    if start >= decision.duration:
+        _reject(decision, "window", Msg.VIDEO_WINDOW_INVALID, downloaded)
+        return
+    if start > 0 or decision.duration > start + length:
+        decision.trim = (start, min(length, decision.duration - start))
+
+
+def _reject(decision, reason, message, downloaded=False):
+    decision.reject = message
+    decision.reason = reason
+    ADMISSION_REJECTED.inc(reason)
+    if decision.file_size and not downloaded:
+        ADMISSION_BYTES_SAVED.inc(amount=decision.file_size)
+    logger.info("Video rejected (%s)", reason, extra={
+        "reason": reason, "file_size": decision.file_size, "duration": decision.duration,
+        "downloaded": downloaded,
+    })
@@ -0,0 +1,169 @@
+"""
+Asynchronous startup checks for the bot's external dependencies
+"""
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DependencyCheck:
+    """
+    Description of a single dependency probe
+
+    Args:
+        name (str): Dependency name used in the startup timeline
+        probe (callable): Coroutine function that raises if the dependency is not usable
+        timeout (float): Timeout for a single probe attempt in seconds
+        required (bool): Whether the bot must wait for this dependency before serving updates
+        on_ready (callable, optional): Called once the probe succeeds
+    """
+
+    def __init__(self, name, probe, timeout, required=False, on_ready=None):
+        self.name = name
+        self.probe = probe
+        self.timeout = timeout
+        self.required = required
+        self.on_ready = on_ready
+
+
+class Bootstrap:
+    """
+    Run dependency checks concurrently and keep retrying failed ones in the background
+
+    Every check gets its own timeout per attempt. Checks that fail are retried
+    with exponential backoff and jitter until they succeed or the bootstrap is
+    shut down, so optional dependencies (Redis, MySQL) can come up after the
+    bot has already started polling.
+    """
+
+    def __init__(self, initial_backoff=0.5, max_backoff=30.0):
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.started_at = time.monotonic()
+        self.timeline = []
+        self.ready = {}
+        self._ready_events = {}
+        self._tasks = []
+
+    def mark(self, name, event) -> None:
+        """
+        Record a startup event
+
+        Args:
+            name (str): Dependency name
+            event (str): Event description
+        """
+        elapsed = time.monotonic() - self.started_at
+        self.timeline.append((elapsed, name, event))
+        logger.info("[startup +%.3fs] %s: %s", elapsed, name, event)
+
+    async def _attempt(self, check) -> bool:
+        """
+        Run a single probe attempt
+
+        Args:
+            check (DependencyCheck): Check to run
+
+        Returns:
+            bool: True if the probe succeeded, False otherwise
+        """
+        try:
+            await asyncio.wait_for(check.probe(), timeout=check.timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.mark(check.name, f"timed out after {check.timeout}s")
+        except Exception as e:
+            self.mark(check.name, f"failed: {e}")
+        return False
+
+    async def _run_check(self, check, first_attempt_done) -> None:
+        """
+        Probe a dependency until it is ready
+
+        Args:
+            check (DependencyCheck): Check to run
+            first_attempt_done (asyncio.Event): Set after the first attempt finishes
+        """
+        delay = self.initial_backoff
+        attempt = 1
+
+        while True:
+            self.mark(check.name, f"attempt {attempt}")
+            ok = await self._attempt(check)
+            first_attempt_done.set()
+
+            if ok:
+                self.ready[check.name] = True
+                self._ready_events[check.name].set()
+                self.mark(check.name, "ready")
+                if check.on_ready is not None:
+                    try:
+                        check.on_ready()
+                    except Exception as e:
+                        logger.error("on_ready callback for %s failed: %s", check.name, e)
+                return
+
+            sleep_for = delay * (1 + random.random() * 0.2)
+            self.mark(check.name, f"retrying in {sleep_for:.1f}s")
+            await asyncio.sleep(sleep_for)
+            delay = min(delay * 2, self.max_backoff)
+            attempt += 1
+
+    async def start(self, checks) -> dict:
+        """
+        Start all checks concurrently
+
+        Returns once every check has finished its first attempt and every
+        required check is ready. Optional checks that are not ready yet keep
+        retrying in the background.
+
+        Args:
+            checks (list): List of DependencyCheck objects
+
+        Returns:
+            dict: Dependency name -> readiness after the first round
+        """
+        first_attempts = []
+
+        for check in checks:
+            self.ready[check.name] = False
+            self._ready_events[check.name] = asyncio.Event()
+            first_attempt_done = asyncio.Event()
+            first_attempts.append(first_attempt_done.wait())
+            self._tasks.append(asyncio.create_task(self._run_check(check, first_attempt_done)))
+
+        await asyncio.gather(*first_attempts)
+
+        required = [self._ready_events[check.name].wait() for check in checks if check.required]
+        if required:
+            await asyncio.gather(*required)
+
+        self.log_timeline()
+        return dict(self.ready)
+
+    async def wait_ready(self, name) -> None:
+        """
+        Wait until a dependency is ready
+
+        Args:
+            name (str): Dependency name
+        """
+        await self._ready_events[name].wait()
+
+    def log_timeline(self) -> None:
+        """Log a summary of the startup timeline"""
+        pending = [name for name, ok in self.ready.items() if not ok]
+        lines = [f"+{elapsed:.3f}s {name}: {event}" for elapsed, name, event in self.timeline]
+        logger.info("Startup timeline:\n%s", "\n".join(lines))
+        if pending:
+            logger.warning("Still waiting for: %s (retrying in background)", ", ".join(pending))
+
+    async def shutdown(self) -> None:
+        """Cancel background retries"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
@@ -0,0 +1,236 @@
+"""
+Prebuilt inline keyboards for the Telegram bot
+
+Static keyboards are rendered once per language at import time and kept as
+the final JSON ``reply_markup`` string, which python-telegram-bot forwards to
+the Bot API untouched. Keyboards with per-message data (short ids, user ids,
+links) are compiled into templates, so rendering them only splices the
+variable values into the prebuilt JSON.
+"""
+import json
+from functools import lru_cache
+
+from utils.localization import get_text, Msg, SUPPORTED_LANGUAGES, LANGUAGE_NAMES
+
+# Marks a template field inside button data; private-use code point that
+# never occurs in translations
+_FIELD = "\ue000"
+
+
+def serialize_keyboard(rows) -> str:
+    """
+    Serialize inline keyboard rows into a reply_markup JSON string
+
+    Args:
+        rows (list): Rows of button dicts in Bot API format
+
+    Returns:
+        str: Serialized InlineKeyboardMarkup
+    """
+    return json.dumps({"inline_keyboard": rows}, ensure_ascii=False, separators=(",", ":"))
+
+
+def field(name) -> str:
+    """
+    Placeholder for a variable part of a keyboard template
+
+    Args:
+        name (str): Field name passed to KeyboardTemplate.render
+
+    Returns:
+        str: Marker to embed in button data
+    """
+    return f"{_FIELD}{name}{_FIELD}"
+
+
+class KeyboardTemplate:
+    """
+    Serialized keyboard with variable fields
+
+    Args:
+        rows (list): Rows of button dicts; variable parts are built with field()
+    """
+
+    __slots__ = ("_parts",)
+
+    def __init__(self, rows):
+        # After splitting, odd positions hold field names
+        self._parts = tuple(serialize_keyboard(rows).split(_FIELD))
+
+    def render(self, **values) -> str:
+        """
+        Render the template
+
+        Args:
+            **values: Value for every field of the template
+
+        Returns:
+            str: Serialized InlineKeyboardMarkup
+        """
+        parts = list(self._parts)
+        for i in range(1, len(parts), 2):
+            # JSON-escape the value without the surrounding quotes
+            parts[i] = json.dumps(str(values[parts[i]]), ensure_ascii=False)[1:-1]
+        return "".join(parts)
+
+
+def _button(text, **kwargs):
+    return dict(text=text, **kwargs)
+
+
+def _per_language(build):
+    return {lang: build(lang) for lang in SUPPORTED_LANGUAGES}
+
+
+_LANGUAGE_BUTTONS = [_button(LANGUAGE_NAMES[lang], callback_data=f"lang_{lang}") for lang in SUPPORTED_LANGUAGES]
+
+LANGUAGE_KEYBOARD = serialize_keyboard(
+    [_LANGUAGE_BUTTONS[i:i + 2] for i in range(0, len(_LANGUAGE_BUTTONS), 2)]
+)
+
+_MAIN_MENU = _per_language(lambda lang: serialize_keyboard([
+    [_button(get_text(Msg.CREATE_CIRCLE_BUTTON, lang), callback_data="create_circle")],
+    [_button(get_text(Msg.CREATE_CIRCLE_PRANK_BUTTON, lang), callback_data="create_circle_prank")],
+]))
+
+_ADMIN_PANEL = _per_language(lambda lang: serialize_keyboard([
+    [_button(get_text(Msg.ADMIN_CHANNELS_LIST, lang), callback_data="admin_channels_list")],
+    [_button(get_text(Msg.ADMIN_ADD_CHANNEL, lang), callback_data="admin_add_channel")],
+]))
+
+_ADMIN_BACK_ROW = _per_language(lambda lang: [_button(get_text(Msg.ADMIN_BACK, lang), callback_data="admin_back")])
+
+_ADMIN_BACK = {lang: serialize_keyboard([row]) for lang, row in _ADMIN_BACK_ROW.items()}
+
+_CHECK_SUBSCRIPTION_ROW = _per_language(
+    lambda lang: [_button(get_text(Msg.CHECK_SUBSCRIPTION_BUTTON, lang), callback_data="check_sub")]
+)
+
+_SHARE = _per_language(lambda lang: KeyboardTemplate([[
+    _button(get_text(Msg.SHARE_YES, lang), callback_data=f"sy_{field('short_id')}"),
+    _button(get_text(Msg.SHARE_NO, lang), callback_data="sn"),
+]]))
+
+_MODERATION_ROW = _per_language(lambda lang: [
+    _button(get_text(Msg.ADMIN_PUBLISH, lang), callback_data=f"p_{field('short_id')}_{field('user_id')}"),
+    _button(get_text(Msg.ADMIN_REJECT, lang), callback_data=f"r_{field('short_id')}_{field('user_id')}"),
+])
+
+_MODERATION = {lang: KeyboardTemplate([row]) for lang, row in _MODERATION_ROW.items()}
+
+# Sent with a preview instead of the circle itself
+_PREVIEW_MODERATION = {
+    lang: KeyboardTemplate([
+        [_button(get_text(Msg.ADMIN_FULL_VIDEO, lang), callback_data=f"fv_{field('short_id')}")],
+        row,
+    ])
+    for lang, row in _MODERATION_ROW.items()
+}
+
+_VIEW_IN_CHANNEL = _per_language(lambda lang: KeyboardTemplate([
+    [_button(get_text(Msg.VIEW_IN_CHANNEL, lang), url=field("url"))],
+]))
+
+# One template per language and join requests setting
+_CHANNEL_EDIT = {
+    (lang, join_requests): KeyboardTemplate([
+        [_button(get_text(Msg.ADMIN_EDIT_CHANNEL, lang), callback_data=f"admin_edit_channel_name_{field('id')}")],
+        [_button(
+            get_text(Msg.ADMIN_DISABLE_JOIN_REQUESTS if join_requests else Msg.ADMIN_ENABLE_JOIN_REQUESTS, lang),
+            callback_data=f"admin_join_requests_{field('id')}"
+        )],
+        [_button(get_text(Msg.ADMIN_DELETE_CHANNEL, lang), callback_data=f"admin_delete_channel_{field('id')}")],
+        [_button(get_text(Msg.ADMIN_BACK, lang), callback_data="admin_channels_list")],
+    ])
+    for lang in SUPPORTED_LANGUAGES
+    for join_requests in (False, True)
+}
+
+
+def _lang(lang):
+    return lang if lang in _MAIN_MENU else SUPPORTED_LANGUAGES[0]
+
+
+def language_keyboard() -> str:
+    """Language selection keyboard"""
+    return LANGUAGE_KEYBOARD
+
+
+def main_menu_keyboard(lang) -> str:
+    """Main menu keyboard"""
+    return _MAIN_MENU[_lang(lang)]
+
+
+def admin_panel_keyboard(lang) -> str:
+    """Admin panel keyboard"""
+    return _ADMIN_PANEL[_lang(lang)]
+
+
+def admin_back_keyboard(lang) -> str:
+    """Keyboard with a single back-to-admin-panel button"""
+    return _ADMIN_BACK[_lang(lang)]
+
+
+def share_keyboard(lang, short_id) -> str:
+    """Yes/No keyboard offering to share a circle"""
+    return _SHARE[_lang(lang)].render(short_id=short_id)
+
+
+def moderation_keyboard(lang, short_id, user_id, full_video=False) -> str:
+    """Publish/reject keyboard sent to admins, with a full video button under a preview"""
+    keyboards = _PREVIEW_MODERATION if full_video else _MODERATION
+    return keyboards[_lang(lang)].render(short_id=short_id, user_id=user_id)
+
+
+def view_in_channel_keyboard(lang, url) -> str:
+    """Keyboard with a link to the published post"""
+    return _VIEW_IN_CHANNEL[_lang(lang)].render(url=url)
+
+
+def channel_edit_keyboard(lang, channel_id, join_requests=False) -> str:
+    """Admin keyboard for a single channel, with a toggle for gating it by join requests"""
+    return _CHANNEL_EDIT[_lang(lang), bool(join_requests)].render(id=channel_id)
+
+
+@lru_cache(maxsize=64)
+def _subscription_keyboard(lang, channel_buttons) -> str:
+    rows = [[_button(text, url=link)] for text, link in channel_buttons]
+    rows.append(_CHECK_SUBSCRIPTION_ROW[lang])
+    return serialize_keyboard(rows)
+
+
+def subscription_keyboard(lang, channels) -> str:
+    """
+    Channel buttons plus the check subscription button
+
+    The channel set changes rarely, so rendered keyboards are cached by the
+    exact list of buttons.
+
+    Args:
+        lang (str): User language
+        channels (list): Channels the user still has to join
+
+    Returns:
+        str: Serialized InlineKeyboardMarkup
+    """
+    channel_buttons = tuple((channel.button_text, channel.channel_link) for channel in channels)
+    return _subscription_keyboard(_lang(lang), channel_buttons)
+
+
+def channels_list_keyboard(lang, channels) -> str:
+    """
+    Admin keyboard listing all channels
+
+    Args:
+        lang (str): Admin language
+        channels (list): Channels to list
+
+    Returns:
+        str: Serialized InlineKeyboardMarkup
+    """
+    rows = [
+        [_button(f"{channel.channel_name} ({channel.channel_id})", callback_data=f"admin_edit_channel_{channel.id}")]
+        for channel in channels
+    ]
+    rows.append(_ADMIN_BACK_ROW[_lang(lang)])
+    return serialize_keyboard(rows)
@@ -0,0 +1,242 @@
+"""
+Known Telegram users, to spare returning users the User upsert
+
+User.get_or_create runs a transaction with SELECT ... FOR UPDATE and, for a
+new user, an INSERT. Nearly every lookup is for a user the bot has seen
+before. An in-process Bloom filter of known Telegram IDs tells them apart
+without a query:
+
+- IDs the filter has probably seen are read with a plain SELECT, and the
+  primary keys of recent users are cached, so store_file_id needs no user
+  query at all,
+- only IDs it has certainly not seen, and the rare false positives that find
+  no row, pay for the upsert.
+
+The filter is loaded from the users table at startup in keyset-paginated
+batches, in about 100 s at 10M users; until then lookups take the upsert
+path. Replicas share new users through Redis pub/sub. A missed message
+costs one upsert on another replica, which then knows the user too, so the
+filter never has to be exact.
+
+At 10M users and a 1% false-positive rate the filter takes 11.4 MiB with 7
+hash functions (1.0% false positives measured), where a Python set of the
+same IDs takes about 590 MiB; see ``python -m benchmarks.known_users``.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+
+import redis.asyncio
+
+from config.config import (
+    REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD,
+    KNOWN_USERS_CAPACITY, KNOWN_USERS_ERROR_RATE, KNOWN_USERS_CACHE_SIZE
+)
+from models.models import User
+from utils.cache import TTLCache
+from utils.metrics import KNOWN_USERS, USER_LOOKUPS
+from utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "known_users"
+
+# Users per query while loading the filter; adding one takes about 10 us,
+# so a batch holds up the event loop for about 20 ms
+LOAD_BATCH = 2000
+
+# Seconds before a failed load or subscription is retried
+RETRY_DELAY = 30.0
+
+
+class BloomFilter:
+    """
+    Bloom filter of integers
+
+    Args:
+        capacity (int): Expected number of items
+        error_rate (float): False-positive rate at ``capacity`` items
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.to_bytes(8, "little", signed=True), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item) -> bool:
+        """
+        Add an item
+
+        Returns:
+            bool: True if the item was not in the filter before
+        """
+        new = False
+        bits = self.bits
+        for position in self._positions(item):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def nbytes(self) -> int:
+        """Memory taken by the bit array"""
+        return len(self.bits)
+
+    def error_rate(self) -> float:
+        """Expected false-positive rate at the current number of items"""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class KnownUsers:
+    """
+    Look users up without an upsert when they are probably known
+
+    Args:
+        capacity (int): Expected number of users; 0 disables the filter
+        error_rate (float): False-positive rate at ``capacity`` users
+        cache_size (int): Primary keys of recent users kept in memory
+    """
+
+    def __init__(self, capacity=10_000_000, error_rate=0.01, cache_size=10000):
+        self.capacity = capacity
+        self.filter = BloomFilter(capacity, error_rate) if capacity > 0 else None
+        self._ids = TTLCache("user_ids", maxsize=cache_size)
+        self._tasks = []
+
+    def start(self) -> None:
+        """Load the filter and follow the users created by other replicas"""
+        if self.filter is not None and not self._tasks:
+            self._tasks = [asyncio.create_task(self._load()), asyncio.create_task(self._listen())]
+
+    async def stop(self) -> None:
+        """Stop loading and following"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def add(self, telegram_id) -> None:
+        """Record a user that exists in the database"""
+        if self.filter is not None and self.filter.add(telegram_id):
+            KNOWN_USERS.set(self.filter.count)
+
+    async def get_or_create(self, telegram_id, defaults=None):
+        """
+        User.get_or_create, with a plain SELECT for probably known users
+
+        Args:
+            telegram_id (int): Telegram user ID
+            defaults (dict, optional): Fields of a newly created user
+
+        Returns:
+            tuple: (User, whether it was created)
+        """
+        if self.filter is not None and telegram_id in self.filter:
+            user = await User.get_or_none(telegram_id=telegram_id)
+            if user is not None:
+                USER_LOOKUPS.inc("known")
+                self._ids.set(telegram_id, user.pk)
+                return user, False
+            USER_LOOKUPS.inc("false_positive")
+        else:
+            USER_LOOKUPS.inc("upsert")
+
+        user, created = await User.get_or_create(telegram_id=telegram_id, defaults=defaults)
+        self.add(telegram_id)
+        self._ids.set(telegram_id, user.pk)
+        if created:
+            self._publish(telegram_id)
+        return user, created
+
+    async def user_pk(self, telegram_id, defaults=None) -> int:
+        """
+        Primary key of a user, created if needed
+
+        Args:
+            telegram_id (int): Telegram user ID
+            defaults (dict, optional): Fields of a newly created user
+
+        Returns:
+            int: User primary key
+        """
+        pk = self._ids.get(telegram_id)
+        if pk is not None:
+            USER_LOOKUPS.inc("cached")
+            return pk
+        user, _ = await self.get_or_create(telegram_id, defaults)
+        return user.pk
+
+    def _publish(self, telegram_id) -> None:
+        try:
+            redis_client.publish(CHANNEL, telegram_id)
+        except Exception as e:
+            # Other replicas learn about the user on its first upsert there
+            logger.debug("Publishing new user %s failed: %s", telegram_id, e)
+
+    async def _load(self) -> None:
+        # The database may still be coming up; resume until a full pass succeeds
+        cursor = 0
+        while True:
+            try:
+                while True:
+                    rows = await User.filter(id__gt=cursor).order_by("id").limit(LOAD_BATCH).values_list(
+                        "id", "telegram_id"
+                    )
+                    if not rows:
+                        break
+                    for _, telegram_id in rows:
+                        self.filter.add(telegram_id)
+                    KNOWN_USERS.set(self.filter.count)
+                    cursor = rows[-1][0]
+                break
+            except Exception as e:
+                logger.warning("Loading known users failed: %s", e)
+                await asyncio.sleep(RETRY_DELAY)
+
+        logger.info(
+            "Loaded %s known users into a %.1f MiB filter, expected false-positive rate %.2f%%",
+            self.filter.count, self.filter.nbytes / 2 ** 20, self.filter.error_rate() * 100
+        )
+        if self.filter.count > self.capacity:
+            logger.warning("Known users exceed the filter capacity of %s; raise KNOWN_USERS_CAPACITY", self.capacity)
+
+    async def _listen(self) -> None:
+        while True:
+            client = redis.asyncio.Redis(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                db=REDIS_DB,
+                password=REDIS_PASSWORD,
+                decode_responses=True
+            )
+            try:
+                pubsub = client.pubsub()
+                await pubsub.subscribe(CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.add(int(message["data"]))
+            except Exception as e:
+                logger.debug("Following new users failed: %s", e)
+            finally:
+                await client.close()
+            await asyncio.sleep(RETRY_DELAY)
+
+
+known_users = KnownUsers(KNOWN_USERS_CAPACITY, KNOWN_USERS_ERROR_RATE, KNOWN_USERS_CACHE_SIZE)
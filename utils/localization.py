@@ -1,124 +1,262 @@
 """
 Localization utilities for the Telegram bot
+
+Translations live in JSON catalogs (``locales/<lang>.json``). At import time
+every catalog is compiled into a tuple indexed by ``Msg`` ids, so a lookup is
+a single tuple index. Catalogs that miss a message, contain unknown keys,
+lack plural forms or disagree on placeholders fail the import instead of
+showing a placeholder text to users at runtime.
 """
+import json
+import os
+import string
+import sys
+from enum import IntEnum, auto
+
+from config.config import LOCALES_DIRECTORY
+
+DEFAULT_LANGUAGE = "ru"
+
+
+class LocalizationError(Exception):
+    """Raised when the translation catalogs are inconsistent"""
+
+
+class Msg(IntEnum):
+    """Message identifiers; catalog keys are the lower-case member names"""
+
+    def _generate_next_value_(name, start, count, last_values):
+        return count
+
+    WELCOME_MESSAGE = auto()
+    SUBSCRIPTION_CHECK = auto()
+    SUBSCRIPTION_SUCCESS = auto()
+    SUBSCRIPTION_FAILED = auto()
+    CHECK_SUBSCRIPTION_BUTTON = auto()
+    LANGUAGE_SELECTED = auto()
+    MAIN_MENU = auto()
+    CREATE_CIRCLE_BUTTON = auto()
+    CREATE_CIRCLE_PRANK_BUTTON = auto()
+    SEND_VIDEO_PROMPT = auto()
+    UPLOAD_VIDEO_INSTRUCTION = auto()
+    PROCESSING_VIDEO = auto()
+    VIDEO_TOO_LONG = auto()
+    VIDEO_PROCESSING_ERROR = auto()
+    ADMIN_WELCOME = auto()
+    ADMIN_CHANNELS_LIST = auto()
+    ADMIN_ADD_CHANNEL = auto()
+    ADMIN_EDIT_CHANNEL = auto()
+    ADMIN_DELETE_CHANNEL = auto()
+    ADMIN_ENABLE_JOIN_REQUESTS = auto()
+    ADMIN_DISABLE_JOIN_REQUESTS = auto()
+    ADMIN_BACK = auto()
+    ADMIN_CHANNEL_NAME_PROMPT = auto()
+    ADMIN_BUTTON_TEXT_PROMPT = auto()
+    ADMIN_FORWARD_POST_PROMPT = auto()
+    ADMIN_CHANNEL_LINK_PROMPT = auto()
+    ADMIN_CHANNEL_ADDED = auto()
+    ADMIN_CHANNEL_UPDATED = auto()
+    ADMIN_CHANNEL_DELETED = auto()
+    ADMIN_NOT_ADMIN = auto()
+    ADMIN_INVALID_FORWARD = auto()
+    HELP_TEXT = auto()
+    FEATURE_NOT_AVAILABLE = auto()
+    SUBSCRIPTION_REQUIRED = auto()
+    VIDEO_SAVED = auto()
+    VIDEO_CLEANUP = auto()
+    SHARE_YES = auto()
+    SHARE_NO = auto()
+    SHARE_THANKS = auto()
+    SHARE_DECLINED = auto()
+    ADMIN_PUBLISH = auto()
+    ADMIN_REJECT = auto()
+    ADMIN_NEW_VIDEO = auto()
+    ADMIN_PUBLISHED = auto()
+    ADMIN_REJECTED = auto()
+    USER_VIDEO_PUBLISHED = auto()
+    USER_VIDEO_REJECTED = auto()
+    VIEW_IN_CHANNEL = auto()
+    ERROR_VIDEO_EXPIRED = auto()
+    SERVER_BUSY = auto()
+    VIDEO_TOO_BIG = auto()
+    VIDEO_UNSUPPORTED = auto()
+    VIDEO_TRIMMED = auto()
+    VIDEO_WINDOW_INVALID = auto()
+    ADMIN_FULL_VIDEO = auto()
+    ADMIN_CHANNEL_BROKEN = auto()
+    ADMIN_CHANNEL_RECOVERED = auto()
+
+
+def _plural_one_other(n):
+    return "one" if n == 1 else "other"
+
+
+def _plural_east_slavic(n):
+    if n != int(n):
+        return "other"
+    n = int(abs(n))
+    if n % 10 == 1 and n % 100 != 11:
+        return "one"
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return "few"
+    return "many"
+
+
+def _plural_french(n):
+    return "one" if 0 <= n < 2 else "other"
 
-# Dictionary with translations
-translations = {
-    "ru": {
-        "welcome_message": "Добро пожаловать! Для использования бота необходимо подписаться на наши каналы.",
-        "subscription_check": "Проверяем вашу подписку...",
-        "subscription_success": "Спасибо за подписку! Теперь вы можете использовать бота.",
-        "subscription_failed": "Вы не подписаны на все необходимые каналы. Пожалуйста, подпишитесь для продолжения.",
-        "check_subscription_button": "Проверить подписку",
-        "language_selected": "Выбран русский язык.",
-        "main_menu": "Главное меню:",
-        "create_circle_button": "Создать кружок",
-        "create_circle_prank_button": "Создать кружок пранк",
-        "send_video_prompt": "Отправьте видео для создания кружка (до 1 минуты).",
-        "upload_video_instruction": "Пожалуйста, загрузите видео, которое хотите преобразовать в кружок. Максимальная длительность - 1 минута.",
-        "processing_video": "Обрабатываем ваше видео...",
-        "video_too_long": "Видео слишком длинное. Максимальная длительность - 1 минута.",
-        "video_processing_error": "Ошибка при обработке видео. Пожалуйста, попробуйте еще раз.",
-        "admin_welcome": "Панель администратора:",
-        "admin_channels_list": "Список каналов:",
-        "admin_add_channel": "Добавить канал",
-        "admin_edit_channel": "Редактировать канал",
-        "admin_delete_channel": "Удалить канал",
-        "admin_back": "Назад",
-        "admin_channel_name_prompt": "Введите название канала:",
-        "admin_button_text_prompt": "Введите текст кнопки для этого канала:",
-        "admin_forward_post_prompt": "Перешлите любой пост из канала, чтобы я мог получить ID канала:",
-        "admin_channel_link_prompt": "Введите ссылку на канал:",
-        "admin_channel_added": "Канал успешно добавлен!",
-        "admin_channel_updated": "Канал успешно обновлен!",
-        "admin_channel_deleted": "Канал успешно удален!",
-        "admin_not_admin": "Вы не являетесь администратором этого канала. Пожалуйста, добавьте бота в администраторы канала и попробуйте снова.",
-        "admin_invalid_forward": "Пожалуйста, перешлите сообщение именно из канала, а не из личной переписки или группы.",
-        "help_text": "Этот бот позволяет создавать видео-кружки и требует подписки на определенные каналы.\n\nКоманды:\n/start - Начать работу с ботом\n/help - Показать эту справку\n/admin - Панель администратора (только для админов)",
-        "feature_not_available": "Эта функция пока недоступна.",
-        "subscription_required": "НЕОЖИДАННО! Для использования бота необходимо подписаться на наши каналы.",
-        "video_saved": "Вау ваше видео получилось очень прикольное, хотите поделиться им в нашем канале с кружочками?",
-        "video_cleanup": "Временные файлы удалены.",
-        "share_yes": "Да",
-        "share_no": "Нет",
-        "share_thanks": "Спасибо! Ваш кружок отправлен на модерацию.",
-        "share_declined": "Хорошо, ваш кружок не будет опубликован в канале.",
-        "admin_publish": "Опубликовать",
-        "admin_reject": "Отклонить",
-        "admin_new_video": "Новый кружок от пользователя для публикации:",
-        "admin_published": "Кружок опубликован в канале!",
-        "admin_rejected": "Кружок отклонен.",
-        "user_video_published": "Мы опубликовали ваш кружок!",
-        "user_video_rejected": "К сожалению, ваш кружок не был одобрен для публикации.",
-        "view_in_channel": "Смотреть в канале",
-        "error_video_expired": "Извините, видео больше недоступно. Пожалуйста, загрузите новое видео."
-    },
-    "en": {
-        "welcome_message": "Welcome! To use this bot, you need to subscribe to our channels.",
-        "subscription_check": "Checking your subscription...",
-        "subscription_success": "Thank you for subscribing! Now you can use the bot.",
-        "subscription_failed": "You are not subscribed to all required channels. Please subscribe to continue.",
-        "check_subscription_button": "Check subscription",
-        "language_selected": "English language selected.",
-        "main_menu": "Main menu:",
-        "create_circle_button": "Create circle",
-        "create_circle_prank_button": "Create circle prank",
-        "send_video_prompt": "Send a video to create a circle (up to 1 minute).",
-        "upload_video_instruction": "Please upload a video you want to convert to a circle. Maximum duration is 1 minute.",
-        "processing_video": "Processing your video...",
-        "video_too_long": "Video is too long. Maximum duration is 1 minute.",
-        "video_processing_error": "Error processing video. Please try again.",
-        "admin_welcome": "Admin panel:",
-        "admin_channels_list": "Channels list:",
-        "admin_add_channel": "Add channel",
-        "admin_edit_channel": "Edit channel",
-        "admin_delete_channel": "Delete channel",
-        "admin_back": "Back",
-        "admin_channel_name_prompt": "Enter channel name:",
-        "admin_button_text_prompt": "Enter button text for this channel:",
-        "admin_forward_post_prompt": "Forward any post from the channel so I can get the channel ID:",
-        "admin_channel_link_prompt": "Enter channel link:",
-        "admin_channel_added": "Channel successfully added!",
-        "admin_channel_updated": "Channel successfully updated!",
-        "admin_channel_deleted": "Channel successfully deleted!",
-        "admin_not_admin": "You are not an administrator of this channel. Please add the bot as an administrator to the channel and try again.",
-        "admin_invalid_forward": "Please forward a message from a channel, not from a private chat or group.",
-        "help_text": "This bot allows you to create video circles and requires subscription to certain channels.\n\nCommands:\n/start - Start working with the bot\n/help - Show this help\n/admin - Admin panel (admins only)",
-        "feature_not_available": "This feature is not available yet.",
-        "subscription_required": "UNEXPECTED! To use this bot, you need to subscribe to our channels.",
-        "video_saved": "Wow, your video turned out really cool! Would you like to share it in our circle video channel?",
-        "video_cleanup": "Temporary files deleted.",
-        "share_yes": "Yes",
-        "share_no": "No",
-        "share_thanks": "Thank you! Your circle has been sent for moderation.",
-        "share_declined": "Okay, your circle won't be published in the channel.",
-        "admin_publish": "Publish",
-        "admin_reject": "Reject",
-        "admin_new_video": "New circle from user for publication:",
-        "admin_published": "Circle published in the channel!",
-        "admin_rejected": "Circle rejected.",
-        "user_video_published": "We've published your circle!",
-        "user_video_rejected": "Unfortunately, your circle was not approved for publication.",
-        "view_in_channel": "View in channel",
-        "error_video_expired": "Sorry, the video is no longer available. Please upload a new video."
-    }
+
+# Plural rule name -> (rule, categories the rule can return)
+PLURAL_RULES = {
+    "en": (_plural_one_other, ("one", "other")),
+    "de": (_plural_one_other, ("one", "other")),
+    "es": (_plural_one_other, ("one", "other")),
+    "it": (_plural_one_other, ("one", "other")),
+    "fr": (_plural_french, ("one", "other")),
+    "ru": (_plural_east_slavic, ("one", "few", "many", "other")),
+    "uk": (_plural_east_slavic, ("one", "few", "many", "other")),
+    "be": (_plural_east_slavic, ("one", "few", "many", "other")),
 }
 
-def get_text(key, lang="ru"):
+
+class _Plural:
+    """Compiled plural message: forms keyed by CLDR category"""
+
+    __slots__ = ("rule", "forms")
+
+    def __init__(self, rule, forms):
+        self.rule = rule
+        self.forms = forms
+
+    def select(self, count):
+        return self.forms.get(self.rule(count)) or self.forms["other"]
+
+
+_formatter = string.Formatter()
+
+
+def _placeholders(text):
+    return frozenset(field for _, field, _, _ in _formatter.parse(text) if field)
+
+
+def _compile_catalog(lang, raw, errors):
+    """
+    Compile one raw catalog into a tuple indexed by Msg
+
+    Args:
+        lang (str): Language code
+        raw (dict): Parsed catalog file
+        errors (list): Collected validation errors
+
+    Returns:
+        tuple: (compiled messages tuple, display name, placeholders per message)
+    """
+    meta = raw.pop("_meta", {})
+    rule_name = meta.get("plural", lang)
+    rule, categories = PLURAL_RULES.get(rule_name, PLURAL_RULES["en"])
+
+    unknown = sorted(set(raw) - {msg.name.lower() for msg in Msg})
+    if unknown:
+        errors.append(f"{lang}: unknown keys {', '.join(unknown)}")
+
+    compiled = []
+    placeholders = []
+    for msg in Msg:
+        key = msg.name.lower()
+        value = raw.get(key)
+
+        if isinstance(value, str):
+            compiled.append(sys.intern(value))
+            placeholders.append(_placeholders(value))
+        elif isinstance(value, dict):
+            missing_forms = [c for c in categories if c not in value]
+            if missing_forms:
+                errors.append(f"{lang}: {key} is missing plural forms {', '.join(missing_forms)}")
+            forms = {category: sys.intern(text) for category, text in value.items()}
+            compiled.append(_Plural(rule, forms))
+            placeholders.append(frozenset().union(*(_placeholders(text) for text in forms.values())))
+        else:
+            errors.append(f"{lang}: missing translation for {key}")
+            compiled.append(None)
+            placeholders.append(frozenset())
+
+    return tuple(compiled), meta.get("name", lang), placeholders
+
+
+def compile_catalogs(directory=LOCALES_DIRECTORY):
+    """
+    Load and compile every ``<lang>.json`` catalog in a directory
+
+    Args:
+        directory (str): Directory with catalog files
+
+    Returns:
+        tuple: (catalogs by language, display names by language)
+
+    Raises:
+        LocalizationError: If any catalog is incomplete or inconsistent
+    """
+    catalogs = {}
+    names = {}
+    placeholders = {}
+    errors = []
+
+    for filename in sorted(os.listdir(directory)):
+        lang, ext = os.path.splitext(filename)
+        if ext != ".json":
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            raw = json.load(f)
+        catalogs[lang], names[lang], placeholders[lang] = _compile_catalog(lang, raw, errors)
+
+    if DEFAULT_LANGUAGE not in catalogs:
+        errors.append(f"default language catalog {DEFAULT_LANGUAGE}.json not found in {directory}")
+    else:
+        reference = placeholders[DEFAULT_LANGUAGE]
+        for lang, fields in placeholders.items():
+            for msg in Msg:
+                if fields[msg] != reference[msg]:
+                    errors.append(f"{lang}: placeholders of {msg.name.lower()} differ from {DEFAULT_LANGUAGE}")
+
+    if errors:
+        raise LocalizationError("Invalid translation catalogs:\n" + "\n".join(errors))
+
+    return catalogs, names
+
+
+_CATALOGS, LANGUAGE_NAMES = compile_catalogs()
+_DEFAULT_CATALOG = _CATALOGS[DEFAULT_LANGUAGE]
+_KEY_IDS = {msg.name.lower(): msg.value for msg in Msg}
+
+# Default language first, then the rest in file order
+SUPPORTED_LANGUAGES = (DEFAULT_LANGUAGE,) + tuple(lang for lang in _CATALOGS if lang != DEFAULT_LANGUAGE)
+
+
+def get_text(key, lang=DEFAULT_LANGUAGE, count=None, **params):
     """
-    Get localized text by key and language
-    
+    Get localized text by message id and language
+
     Args:
-        key (str): Text key
-        lang (str): Language code (ru or en)
-        
+        key (Msg or str): Message id (or its lower-case catalog key)
+        lang (str): Language code; unknown languages fall back to Russian
+        count (int, optional): Number used to select the plural form
+        **params: Values for ``{placeholder}`` fields
+
     Returns:
         str: Localized text
+
+    Raises:
+        KeyError: If the key is not a known message
     """
-    if lang not in translations:
-        lang = "ru"  # Default to Russian if language not found
-        
-    if key not in translations[lang]:
-        return f"Missing translation: {key}"
-        
-    return translations[lang][key]
+    if key.__class__ is str:
+        key = _KEY_IDS[key]
+
+    entry = _CATALOGS.get(lang, _DEFAULT_CATALOG)[key]
+
+    if entry.__class__ is _Plural:
+        entry = entry.select(count if count is not None else 0)
+        params["count"] = count
+
+    if params:
+        return entry.format(**params)
+    return entry
@@ -0,0 +1,357 @@
+"""
+Memory governor for video encodes
+
+moviepy decodes frames into RGB arrays inside the bot's process and keeps
+several copies of each (the frame read from ffmpeg, the crop, the resize),
+next to the ffmpeg reader and writer processes. A job's footprint therefore
+grows with the decoded resolution, and a few large jobs at once can push the
+host into the OOM killer.
+
+Before a job encodes, its peak memory is estimated from the probed
+resolution and duration (estimate_job_bytes()) and reserved against a global
+budget (MemoryBudget). Jobs wait in arrival order while the budget is taken
+and are turned away after a timeout.
+
+Encodes run in a thread pool of the bot's process or, in ``process`` mode,
+each in a worker process of its own (EncoderWorkers). A worker's address
+space is capped with RLIMIT_AS, so a job that grows far beyond its estimate
+fails alone instead of taking the bot down with it.
+
+The peak RSS of every job is recorded (VIDEO_JOB_PEAK_RSS) together with its
+ratio to the estimate (VIDEO_JOB_ESTIMATE_RATIO) to tune the model constants
+below. In process mode the peak is that of the worker's process tree; in
+thread mode jobs share the bot's process, so the peak is the growth of the
+whole process tree while the job ran and includes jobs running at the same
+time.
+"""
+import asyncio
+import collections
+import contextlib
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.encoders import EncodeError, encode
+from utils.metrics import (
+    MEMORY_RESERVED_BYTES, MEMORY_WAIT_SECONDS, MEMORY_REJECTED, VIDEO_ENCODE_SECONDS,
+    VIDEO_JOB_PEAK_RSS, VIDEO_JOB_ESTIMATE_RATIO
+)
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Model constants; conservative starting points, compare them with
+# VIDEO_JOB_ESTIMATE_RATIO. Fixed cost of a job: the ffmpeg processes, x264
+# and AAC encoder state.
+JOB_BASE_BYTES = {"moviepy": 96 * MB, "ffmpeg": 48 * MB}
+# Per decoded pixel: moviepy holds about a dozen 24-bit RGB copies of a
+# frame across reader, crop, resize and writer; ffmpeg keeps reference and
+# frame-thread buffers in YUV 4:2:0
+BYTES_PER_PIXEL = {"moviepy": 3 * 12, "ffmpeg": 1.5 * 24}
+# x264 frame buffers per encoder thread at the 640x640 output
+BYTES_PER_THREAD = 8 * MB
+# Audio buffers and the muxer's sample index grow with the length
+BYTES_PER_SECOND = 128 * 1024
+# Second x264 instance of the moderation preview and the contact sheet
+PREVIEW_BYTES = 24 * MB
+# Frame size assumed when neither Telegram nor the probe reported one
+DEFAULT_DIMENSIONS = (1920, 1080)
+
+# RLIMIT_AS counts address space that is reserved but never touched
+# (interpreter, shared libraries, thread stacks, malloc arenas), so worker
+# processes get well above their RSS estimate
+ADDRESS_SPACE_FACTOR = 2
+ADDRESS_SPACE_OVERHEAD = 768 * MB
+
+# Seconds between RSS samples of a running job
+SAMPLE_INTERVAL = 0.25
+
+# Directory ``python -m utils.encoders`` runs from in worker processes
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fewer library threads and malloc arenas keep the reserved address space
+# of a worker close to what it uses
+WORKER_ENVIRONMENT = {"OPENBLAS_NUM_THREADS": "1", "OMP_NUM_THREADS": "1", "MALLOC_ARENA_MAX": "2"}
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class MemoryBudgetFull(Exception):
+    """Raised when a job does not get its memory within the wait timeout"""
+
+
+def _decoded_size(width, height, target_resolution):
+    if not target_resolution:
+        return width, height
+    target_height, target_width = target_resolution
+    if target_width is None:
+        return round(width * target_height / height), target_height
+    if target_height is None:
+        return target_width, round(height * target_width / width)
+    return target_width, target_height
+
+
+def estimate_job_bytes(width, height, duration, backend="moviepy", threads=4, target_resolution=None,
+                       previews=False):
+    """
+    Estimate the peak memory of an encode
+
+    Args:
+        width (int): Width of the input, None if unknown
+        height (int): Height of the input, None if unknown
+        duration (float): Seconds to encode, None if unknown
+        backend (str): Encoder backend, see utils.encoders
+        threads (int): Encoder threads
+        target_resolution (tuple, optional): ``(height, width)`` moviepy
+            decodes at, from the admission stage
+        previews (bool): The encode also writes the moderation preview
+
+    Returns:
+        int: Estimated peak RSS in bytes
+    """
+    if not width or not height:
+        width, height = DEFAULT_DIMENSIONS
+    if backend == "moviepy":
+        # The ffmpeg backend scales inside its filter graph and decodes at
+        # the original size
+        width, height = _decoded_size(width, height, target_resolution)
+    return int(
+        JOB_BASE_BYTES.get(backend, JOB_BASE_BYTES["moviepy"])
+        + width * height * BYTES_PER_PIXEL.get(backend, BYTES_PER_PIXEL["moviepy"])
+        + threads * BYTES_PER_THREAD
+        + (duration or 0) * BYTES_PER_SECOND
+        + (PREVIEW_BYTES if previews else 0)
+    )
+
+
+def _tree_rss(pid):
+    """RSS of a process and all its descendants in bytes; 0 where /proc is missing"""
+    total = 0
+    pending = [pid]
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * _PAGE_SIZE
+            for task in os.listdir(f"/proc/{pid}/task"):
+                with open(f"/proc/{pid}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError, IndexError):
+            # The process exited between listing and reading
+            continue
+    return total
+
+
+class _PeakSampler:
+    """Track the peak RSS of a process tree while a job runs"""
+
+    def __init__(self, pid, baseline=0):
+        self.pid = pid
+        self.baseline = baseline
+        self.peak = 0
+        self._task = asyncio.create_task(self._sample())
+
+    async def _sample(self):
+        while True:
+            self.peak = max(self.peak, _tree_rss(self.pid) - self.baseline)
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        return self.peak
+
+
+class MemoryBudget:
+    """
+    Admit jobs against a global memory budget
+
+    Jobs are admitted in arrival order; a job larger than the whole budget
+    waits until it can run alone.
+
+    Args:
+        budget_bytes (int): Memory all running jobs may use together
+        wait_timeout (float): Seconds a job waits for memory before it is
+            turned away
+    """
+
+    def __init__(self, budget_bytes, wait_timeout=60.0):
+        self.budget_bytes = budget_bytes
+        self.wait_timeout = wait_timeout
+        self._reserved = 0
+        self._waiters = collections.deque()
+
+    def _fits(self, size):
+        return self._reserved == 0 or self._reserved + size <= self.budget_bytes
+
+    def _take(self, size):
+        self._reserved += size
+        MEMORY_RESERVED_BYTES.set(self._reserved)
+
+    def _release(self, size):
+        self._reserved -= size
+        MEMORY_RESERVED_BYTES.set(self._reserved)
+        self._wake()
+
+    def _wake(self):
+        while self._waiters:
+            size, future = self._waiters[0]
+            if future.done():
+                # Timed out or cancelled
+                self._waiters.popleft()
+                continue
+            if not self._fits(size):
+                break
+            self._waiters.popleft()
+            self._take(size)
+            future.set_result(None)
+
+    @contextlib.asynccontextmanager
+    async def job(self, estimate):
+        """
+        Reserve memory for a job, released when the block exits
+
+        Args:
+            estimate (int): Bytes from estimate_job_bytes()
+
+        Raises:
+            MemoryBudgetFull: If the memory is not free within the timeout
+        """
+        size = min(estimate, self.budget_bytes)
+        start = time.perf_counter()
+        if not self._waiters and self._fits(size):
+            self._take(size)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append((size, future))
+            try:
+                await asyncio.wait_for(future, self.wait_timeout)
+            except asyncio.TimeoutError:
+                # The reservation may have been granted as the wait timed out
+                if future.done() and not future.cancelled():
+                    self._release(size)
+                else:
+                    self._wake()
+                MEMORY_REJECTED.inc()
+                logger.warning("Memory budget exhausted, rejecting job of %s bytes", size)
+                raise MemoryBudgetFull(f"no memory for {size} bytes") from None
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release(size)
+                else:
+                    self._wake()
+                raise
+        MEMORY_WAIT_SECONDS.observe(time.perf_counter() - start)
+
+        try:
+            yield
+        finally:
+            self._release(size)
+
+
+class EncoderWorkers:
+    """
+    Run circle encodes under a memory budget
+
+    Args:
+        budget (MemoryBudget): Budget every encode is admitted against
+        mode (str): ``thread`` to encode in the bot's process, ``process``
+            to encode each job in a worker process with a capped address
+            space
+        max_workers (int): Encodes running at the same time at most
+    """
+
+    def __init__(self, budget, mode="thread", max_workers=4):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"unknown encoder worker mode {mode!r}")
+        self.budget = budget
+        self.mode = mode
+        # In process mode the threads only wait for the workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="encoder")
+
+    async def encode(self, backend, input_file, output_file, estimate, **options):
+        """
+        Encode a circle once its memory is reserved
+
+        Args:
+            backend (str): Encoder backend, see utils.encoders
+            input_file (str): Source video
+            output_file (str): Destination MP4
+            estimate (int): Bytes from estimate_job_bytes()
+            **options: Backend options, see utils.encoders.encode_moviepy()
+
+        Raises:
+            MemoryBudgetFull: If the job does not get its memory in time
+            EncodeError: If a worker process fails
+        """
+        async with self.budget.job(estimate):
+            with VIDEO_ENCODE_SECONDS.time():
+                if self.mode == "process":
+                    peak = await self._encode_in_process(backend, input_file, output_file, estimate, options)
+                else:
+                    peak = await self._encode_in_thread(backend, input_file, output_file, options)
+
+        if peak:
+            VIDEO_JOB_PEAK_RSS.observe(peak, self.mode)
+            VIDEO_JOB_ESTIMATE_RATIO.observe(peak / estimate, self.mode)
+            logger.info("Encode peak RSS %s bytes (estimate %s)", peak, estimate, extra={
+                "peak_rss": peak, "estimate": estimate, "mode": self.mode, "backend": backend,
+            })
+
+    async def _encode_in_thread(self, backend, input_file, output_file, options):
+        loop = asyncio.get_running_loop()
+        pid = os.getpid()
+        sampler = _PeakSampler(pid, baseline=_tree_rss(pid))
+        try:
+            await loop.run_in_executor(
+                self.executor, lambda: encode(backend, input_file, output_file, **options)
+            )
+        finally:
+            peak = await sampler.stop()
+        return peak
+
+    async def _encode_in_process(self, backend, input_file, output_file, estimate, options):
+        limit = estimate * ADDRESS_SPACE_FACTOR + ADDRESS_SPACE_OVERHEAD
+        loop = asyncio.get_running_loop()
+        stderr = open(output_file + ".log", "w+b")
+        process = subprocess.Popen(
+            [sys.executable, "-m", encode.__module__, backend, input_file, output_file,
+             json.dumps(options), str(limit)],
+            cwd=PROJECT_ROOT,
+            env={**os.environ, **WORKER_ENVIRONMENT},
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+            # Own process group, so cancelling the job also stops its ffmpeg
+            start_new_session=True
+        )
+        sampler = _PeakSampler(process.pid)
+        try:
+            # wait4 reports the largest single process of the worker's tree;
+            # the sampler adds up the processes running at the same time
+            _, status, usage = await loop.run_in_executor(self.executor, os.wait4, process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+        finally:
+            peak = await sampler.stop()
+            if process.returncode is None:
+                # Cancelled; the waiting thread reaps the worker
+                with contextlib.suppress(ProcessLookupError):
+                    os.killpg(process.pid, signal.SIGKILL)
+            stderr.seek(0)
+            errors = stderr.read().decode(errors="replace").strip()
+            stderr.close()
+            os.remove(stderr.name)
+
+        if process.returncode != 0:
+            raise EncodeError(f"encoder worker exited with {process.returncode}: {errors[-500:]}")
+        return max(peak, usage.ru_maxrss * 1024)
+
+    def shutdown(self):
+        """Stop the worker threads"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,136 @@
+"""
+Moderation previews of circles
+
+The encoder writes a 320px preview video note and a JPEG contact sheet next
+to every circle (see utils/encoders.py). They are moved out of the job's
+scratch directory into this store under the circle's short id, so admins
+get the lightweight preview first when a user shares the circle and fetch
+the full video note only on demand.
+
+Files are removed once the circle is moderated, and by periodic sweeps after
+``ttl`` seconds, the lifetime of the short id.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import shutil
+import time
+
+logger = logging.getLogger(__name__)
+
+_EXTENSIONS = ("mp4", "jpg")
+
+
+class PreviewStore:
+    """
+    Keep previews until their circle is moderated
+
+    Args:
+        directory (str): Directory of the stored previews
+        ttl (float): Seconds after which a preview is removed anyway
+        sweep_interval (float): Seconds between periodic sweeps
+    """
+
+    def __init__(self, directory, ttl=86400.0, sweep_interval=3600.0):
+        self.directory = os.path.abspath(directory)
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._task = None
+
+    async def start(self) -> None:
+        """Remove expired previews and start periodic sweeps"""
+        os.makedirs(self.directory, exist_ok=True)
+        await asyncio.to_thread(self.sweep)
+        self._task = asyncio.create_task(self._sweep_periodically())
+
+    async def stop(self) -> None:
+        """Stop periodic sweeps"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.warning("Preview sweep failed: %s", e)
+
+    def sweep(self) -> int:
+        """
+        Remove previews older than the TTL
+
+        Returns:
+            int: Number of removed files
+        """
+        removed = 0
+        now = time.time()
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.is_file(follow_symlinks=False) and now - entry.stat().st_mtime >= self.ttl:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.info("Removed %s expired previews", removed)
+        return removed
+
+    def _paths(self, short_id):
+        # Short ids come back in callback data; never let them name a path
+        if not short_id or not short_id.isalnum():
+            return None
+        return tuple(os.path.join(self.directory, f"{short_id}.{extension}") for extension in _EXTENSIONS)
+
+    async def keep(self, short_id, video_file, sheet_file) -> None:
+        """
+        Move the preview of a circle into the store
+
+        Missing files are skipped; the circle is then moderated with the
+        full video note.
+
+        Args:
+            short_id (str): Short id of the circle as used in callback data
+            video_file (str): Preview video note written by the encoder
+            sheet_file (str): Contact sheet written by the encoder
+        """
+        paths = self._paths(short_id)
+        if paths is None:
+            return
+        for source, destination in zip((video_file, sheet_file), paths):
+            if os.path.exists(source):
+                try:
+                    await asyncio.to_thread(shutil.move, source, destination)
+                except OSError as e:
+                    logger.warning("Could not keep preview %s: %s", source, e)
+
+    def get(self, short_id):
+        """
+        Look up the preview of a circle
+
+        Args:
+            short_id (str): Short id from callback data
+
+        Returns:
+            tuple: (video path, sheet path), each None if not stored
+        """
+        paths = self._paths(short_id) or (None, None)
+        return tuple(path if path and os.path.exists(path) else None for path in paths)
+
+    async def discard(self, short_id) -> None:
+        """
+        Remove the preview of a moderated circle
+
+        Args:
+            short_id (str): Short id from callback data
+        """
+        for path in self._paths(short_id) or ():
+            with contextlib.suppress(FileNotFoundError):
+                await asyncio.to_thread(os.remove, path)
@@ -0,0 +1,340 @@
+"""
+Client-side rate limiting for outgoing Bot API requests
+
+Every request that sends something to a chat takes a token from a global
+bucket (about 30 messages per second) and from a bucket of the target chat
+(1 message per second in private chats, with a short burst allowed, 20
+per minute in groups and channels). Requests waiting for tokens are served by priority class, so
+callback answers and replies overtake bulk fan-out such as admin
+notifications. When Telegram still answers 429, the request is re-queued
+after ``retry_after`` and the chat (or, without a chat, the whole bot) is
+paused for that time. Reads such as getChatMember take no tokens; a 429 on
+a read pauses only the other reads, never the sends.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from utils.metrics import RATE_LIMIT_WAIT_SECONDS, RATE_LIMIT_RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Priority classes; lower values are served first"""
+
+    INTERACTIVE = 0
+    DEFAULT = 1
+    BULK = 2
+
+
+# Methods answered to the user that pressed a button: served first
+INTERACTIVE_METHODS = frozenset({"answerCallbackQuery", "editMessageText", "editMessageReplyMarkup"})
+
+# Methods with a chat_id that read state instead of sending a message
+READ_METHODS = frozenset({
+    "getChat", "getChatMember", "getChatAdministrators", "getChatMemberCount", "getChatMenuButton",
+    "leaveChat", "approveChatJoinRequest", "declineChatJoinRequest",
+})
+
+# Idle seconds after which a per-chat bucket is dropped
+BUCKET_IDLE_TTL = 120.0
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously
+
+    Args:
+        rate (float): Tokens added per second
+        capacity (float): Maximum burst
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.paused_until = 0.0
+
+    def delay(self, now) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def pause(self, until) -> None:
+        self.paused_until = max(self.paused_until, until)
+        # Refill starts when the pause ends
+        self.tokens = 0
+        self.updated = self.paused_until
+
+
+class RequestScheduler:
+    """
+    Grant outgoing requests by priority within global and per-chat limits
+
+    Args:
+        overall_rate (float): Messages per second for the whole bot
+        chat_rate (float): Messages per second in a private chat
+        chat_burst (float): Messages a private chat may get at once, so an
+            edit followed by a reply or a video note followed by a prompt
+            goes out without waiting
+        group_rate (float): Messages per minute in a group or channel
+        max_retries (int): Retries of a request answered with 429
+        overall_burst (float): Messages the bot may send at once after being
+            idle; 1 paces requests evenly, which keeps any one-second window
+            within ``overall_rate``
+        clock (callable): Monotonic clock, replaceable for simulations
+    """
+
+    def __init__(self, overall_rate=30.0, chat_rate=1.0, group_rate=20.0, max_retries=3, overall_burst=1.0,
+                 chat_burst=4.0,
+                 clock=time.monotonic):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate / 60.0
+        self.max_retries = max_retries
+        self._clock = clock
+        self._overall = TokenBucket(overall_rate, overall_burst, clock())
+        self._chats = {}
+        self._pending = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._last_sweep = clock()
+        # Reads take no tokens and are paused on their own
+        self._reads_paused_until = 0.0
+
+    def start(self) -> None:
+        """Start granting requests (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def stop(self) -> None:
+        """Stop granting requests and fail the ones still waiting"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for _, _, _, future in self._pending:
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+
+    def _bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                bucket = TokenBucket(self.group_rate, 1, now)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst, now)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _sweep(self, now) -> None:
+        waiting = {chat_id for _, _, chat_id, _ in self._pending}
+        for chat_id, bucket in list(self._chats.items()):
+            if chat_id not in waiting and now - bucket.updated > BUCKET_IDLE_TTL and now >= bucket.paused_until:
+                del self._chats[chat_id]
+        self._last_sweep = now
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = self._clock()
+            if now - self._last_sweep > BUCKET_IDLE_TTL:
+                self._sweep(now)
+
+            overall_delay = self._overall.delay(now)
+            if overall_delay > 0:
+                await self._sleep(overall_delay)
+                continue
+
+            # Highest priority request whose chat has a token; requests for
+            # busy chats do not block other chats
+            granted = None
+            next_delay = None
+            for entry in sorted(self._pending):
+                chat_id, future = entry[2], entry[3]
+                if future.done():
+                    granted = entry
+                    break
+                if chat_id is None:
+                    granted = entry
+                    break
+                delay = self._bucket(chat_id, now).delay(now)
+                if delay == 0:
+                    granted = entry
+                    break
+                next_delay = delay if next_delay is None else min(next_delay, delay)
+
+            if granted is None:
+                await self._sleep(next_delay)
+                continue
+
+            self._pending.remove(granted)
+            heapq.heapify(self._pending)
+            future = granted[3]
+            if future.done():
+                continue
+            self._overall.take()
+            if granted[2] is not None:
+                self._chats[granted[2]].take()
+            future.set_result(None)
+
+    async def _sleep(self, delay) -> None:
+        # A new request may be servable earlier than the current wait
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def acquire(self, chat_id, priority) -> None:
+        """
+        Wait for permission to send one request
+
+        Args:
+            chat_id (int or str, optional): Target chat; None for requests
+                that only count against the global limit
+            priority (Priority): Priority class
+        """
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._pending, (int(priority), next(self._sequence), chat_id, future))
+        self._wakeup.set()
+        start = self._clock()
+        try:
+            await future
+        finally:
+            RATE_LIMIT_WAIT_SECONDS.observe(self._clock() - start, Priority(priority).name.lower())
+
+    def pause(self, chat_id, seconds) -> None:
+        """
+        Stop sending to a chat (or everywhere) after a 429 answer
+
+        Args:
+            chat_id (int or str, optional): Throttled chat; None pauses the bot
+            seconds (float): Pause length from retry_after
+        """
+        now = self._clock()
+        bucket = self._overall if chat_id is None else self._bucket(chat_id, now)
+        bucket.pause(now + seconds)
+
+    def pause_reads(self, seconds) -> None:
+        """
+        Hold back requests that take no tokens after a 429 answer to one
+
+        Args:
+            seconds (float): Pause length from retry_after
+        """
+        self._reads_paused_until = max(self._reads_paused_until, self._clock() + seconds)
+
+    async def run(self, call, chat_id, priority, retry_after_of, limited=True):
+        """
+        Run a request within the limits, retrying after 429 answers
+
+        Args:
+            call (callable): Coroutine function performing the request
+            chat_id (int or str, optional): Target chat
+            priority (Priority): Priority class
+            retry_after_of (callable): Returns retry_after seconds for a
+                flood-control exception, None for any other exception
+            limited (bool): Whether the request takes tokens; requests that
+                only read state still get 429 handling
+
+        Returns:
+            Any: Result of ``call``
+        """
+        self.start()
+        for attempt in range(self.max_retries + 1):
+            if limited:
+                await self.acquire(chat_id, priority)
+            else:
+                delay = self._reads_paused_until - self._clock()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            try:
+                return await call()
+            except Exception as e:
+                retry_after = retry_after_of(e)
+                if retry_after is None or attempt == self.max_retries:
+                    raise
+                logger.warning("Flood control for chat %s, retrying in %ss (attempt %s of %s)",
+                               chat_id, retry_after, attempt + 1, self.max_retries)
+                RATE_LIMIT_RETRIES.inc()
+                if limited:
+                    self.pause(chat_id, retry_after)
+                else:
+                    # A throttled background read must not stall interactive sends
+                    self.pause_reads(retry_after)
+                    continue
+                await asyncio.sleep(retry_after)
+
+
+def _retry_after_of(exc):
+    if isinstance(exc, RetryAfter):
+        retry_after = exc.retry_after
+        # timedelta in newer python-telegram-bot releases
+        return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+    return None
+
+
+class ChatRateLimiter(BaseRateLimiter):
+    """
+    python-telegram-bot rate limiter backed by RequestScheduler
+
+    Pass ``rate_limit_args={"priority": Priority.BULK}`` to a bot method to
+    send it in a lower priority class.
+
+    Args:
+        scheduler (RequestScheduler): Shared scheduler
+    """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    async def initialize(self) -> None:
+        self.scheduler.start()
+
+    async def shutdown(self) -> None:
+        await self.scheduler.stop()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint == "getUpdates":
+            return await callback(*args, **kwargs)
+
+        chat_id = data.get("chat_id")
+        if rate_limit_args and "priority" in rate_limit_args:
+            priority = rate_limit_args["priority"]
+        elif endpoint in INTERACTIVE_METHODS:
+            priority = Priority.INTERACTIVE
+        else:
+            priority = Priority.DEFAULT
+
+        # Sends to a chat and callback answers take tokens; reads do not
+        limited = endpoint == "answerCallbackQuery" or (chat_id is not None and endpoint not in READ_METHODS)
+
+        return await self.scheduler.run(
+            lambda: callback(*args, **kwargs), chat_id, priority, _retry_after_of, limited=limited
+        )
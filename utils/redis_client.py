@@ -0,0 +1,46 @@
+"""
+Shared Redis client for the Telegram bot
+"""
+import redis
+
+from config.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
+from utils.metrics import InstrumentedRedis
+
+
+class SharedRedis:
+    """
+    Single Redis handle shared by all handlers
+
+    The underlying client is created once and connects lazily. Until the
+    startup bootstrap confirms that Redis answers, every access raises
+    ``redis.exceptions.ConnectionError`` straight away, so handlers fall back
+    to their in-memory paths instead of waiting for a socket timeout.
+    """
+
+    def __init__(self):
+        self.client = InstrumentedRedis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=REDIS_DB,
+            password=REDIS_PASSWORD,
+            decode_responses=True,
+            socket_timeout=3,
+            socket_connect_timeout=3
+        )
+        self.available = False
+
+    def mark_available(self) -> None:
+        """Route calls to the real client once Redis has answered a ping"""
+        self.available = True
+
+    def mark_unavailable(self) -> None:
+        """Fail fast again, e.g. while the bootstrap is still retrying"""
+        self.available = False
+
+    def __getattr__(self, name):
+        if not self.available:
+            raise redis.exceptions.ConnectionError("Redis is not available yet")
+        return getattr(self.client, name)
+
+
+redis_client = SharedRedis()
@@ -0,0 +1,150 @@
+"""
+Separate Bot API connection pools for control and media requests
+
+Small, latency-sensitive calls (``answerCallbackQuery``, ``sendMessage``,
+``editMessageText``) and slow media calls (video note sends, ``getFile`` and
+file downloads) go through differently sized pools with their own timeouts,
+so a handful of slow transfers cannot exhaust the connections the control
+calls need. Pool usage is exported as metrics and saturation is logged.
+"""
+import logging
+import time
+
+from telegram.request import BaseRequest
+
+from utils.metrics import InstrumentedHTTPXRequest, POOL_IN_USE, POOL_SIZE, POOL_SATURATED
+
+logger = logging.getLogger(__name__)
+
+# Bot API methods that transfer media; everything else is a control call
+MEDIA_METHODS = frozenset({
+    "sendVideoNote", "sendVideo", "sendAnimation", "sendDocument", "sendPhoto",
+    "sendAudio", "sendVoice", "sendMediaGroup", "getFile",
+})
+
+# Seconds between saturation warnings per pool
+SATURATION_LOG_INTERVAL = 60.0
+
+
+class _Pool:
+    __slots__ = ("name", "request", "size", "in_use", "_last_warning")
+
+    def __init__(self, name, request, size):
+        self.name = name
+        self.request = request
+        self.size = size
+        self.in_use = 0
+        self._last_warning = 0.0
+        POOL_SIZE.set(size, name)
+        POOL_IN_USE.set(0, name)
+
+    def acquire(self):
+        if self.in_use >= self.size:
+            # The request will wait for a free connection
+            POOL_SATURATED.inc(self.name)
+            now = time.monotonic()
+            if now - self._last_warning >= SATURATION_LOG_INTERVAL:
+                self._last_warning = now
+                logger.warning("Bot API %s pool saturated (%s of %s connections in use)",
+                               self.name, self.in_use, self.size)
+        self.in_use += 1
+        POOL_IN_USE.set(self.in_use, self.name)
+
+    def release(self):
+        self.in_use -= 1
+        POOL_IN_USE.set(self.in_use, self.name)
+
+
+class RoutingRequest(BaseRequest):
+    """
+    Bot API request that routes every call to the control or media pool
+
+    Args:
+        control (telegram.request.BaseRequest): Request for control calls
+        control_size (int): Connection pool size of ``control``
+        media (telegram.request.BaseRequest): Request for media calls and file downloads
+        media_size (int): Connection pool size of ``media``
+    """
+
+    def __init__(self, control, control_size, media, media_size):
+        self._control = _Pool("control", control, control_size)
+        self._media = _Pool("media", media, media_size)
+
+    @property
+    def read_timeout(self):
+        return self._control.request.read_timeout
+
+    async def initialize(self) -> None:
+        await self._control.request.initialize()
+        await self._media.request.initialize()
+
+    async def shutdown(self) -> None:
+        await self._control.request.shutdown()
+        await self._media.request.shutdown()
+
+    def _pool_for(self, url):
+        if "/file/bot" in url or url.rsplit("/", 1)[-1] in MEDIA_METHODS:
+            return self._media
+        return self._control
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        pool = self._pool_for(url)
+        pool.acquire()
+        try:
+            return await pool.request.do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout,
+                write_timeout=write_timeout, connect_timeout=connect_timeout, pool_timeout=pool_timeout
+            )
+        finally:
+            pool.release()
+
+
+def build_media_request(pool_size, timeout):
+    """
+    Request for the media pool
+
+    Shared by the application bot (sends by file_id, getFile, downloads) and
+    the upload manager.
+
+    Args:
+        pool_size (int): Connections in the pool
+        timeout (float): Read/write timeout in seconds, multipart uploads included
+
+    Returns:
+        InstrumentedHTTPXRequest: Media request
+    """
+    return InstrumentedHTTPXRequest(
+        connection_pool_size=pool_size,
+        read_timeout=timeout,
+        write_timeout=timeout,
+        # Multipart uploads use this instead of write_timeout; defaults to 20s
+        media_write_timeout=timeout,
+        connect_timeout=10.0,
+        # Media calls queue for a free connection instead of failing fast
+        pool_timeout=None
+    )
+
+
+def build_bot_request(control_pool_size, control_timeout, media_request, media_pool_size):
+    """
+    Request for the application bot
+
+    Args:
+        control_pool_size (int): Connections for control calls
+        control_timeout (float): Read/write timeout of control calls in seconds
+        media_request (telegram.request.BaseRequest): Request from build_media_request
+        media_pool_size (int): Connections of ``media_request``
+
+    Returns:
+        RoutingRequest: Request routing control and media calls
+    """
+    control = InstrumentedHTTPXRequest(
+        connection_pool_size=control_pool_size,
+        read_timeout=control_timeout,
+        write_timeout=control_timeout,
+        connect_timeout=5.0,
+        pool_timeout=1.0
+    )
+    return RoutingRequest(control, control_pool_size, media_request, media_pool_size)
@@ -0,0 +1,265 @@
+"""
+Background re-verification of channel subscriptions
+
+``User.subscription_status`` and the "verified until" markers are otherwise
+only refreshed when a user interacts with the bot. The sweeper walks all
+users in rounds and re-checks their memberships:
+
+- users seen within ``active_window`` seconds (see UserStore.touch) are
+  checked first, most recent first,
+- then all active users in keyset-paginated batches by primary key. The
+  last primary key of every written batch is persisted in Redis, so a
+  restarted bot resumes where it stopped instead of starting over.
+
+getChatMember calls are paced by a token bucket of their own, ``rate``
+calls per second, which leaves the interactive traffic its share of the
+Bot API limits. A batch is written back with a few bulk queries instead of
+per-user saves. Users whose check failed are left unchanged, and
+quarantined channels (see utils/channel_health.py) are skipped. Channels
+gated by join requests are not polled; their records are kept current by
+join request and chat member updates and only read here.
+"""
+import asyncio
+import logging
+import time
+
+from models.models import User, Channel, UserSubscription
+from utils.channel_health import channel_health
+from utils.metrics import SWEEP_USERS, SWEEP_CURSOR
+from utils.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+CURSOR_KEY = "sweeper:cursor"
+
+MEMBER_STATUSES = frozenset({"member", "administrator", "creator"})
+
+# Seconds before a failed round is retried
+RETRY_DELAY = 60.0
+
+
+class SubscriptionSweeper:
+    """
+    Re-check the subscriptions of all users in the background
+
+    Args:
+        bot (Bot): Bot used for the membership checks
+        store (UserStore): Store of the activity set and verified markers
+        client (redis.Redis): Redis client holding the cursor
+        rate (float): getChatMember calls per second
+        batch_size (int): Users per batch
+        interval (float): Seconds between the end of a round and the next
+        active_window (float): Users seen within this many seconds are
+            checked first
+        verified_ttl (float): Seconds a verification is trusted; 0 leaves
+            the markers alone
+        clock (callable): Monotonic clock, replaceable in tests
+    """
+
+    def __init__(self, bot, store, client, rate=5.0, batch_size=200, interval=3600.0,
+                 active_window=86400.0, verified_ttl=21600.0, clock=time.monotonic):
+        self.bot = bot
+        self.store = store
+        self.client = client
+        self.batch_size = batch_size
+        self.interval = interval
+        self.active_window = active_window
+        self.verified_ttl = verified_ttl
+        self._clock = clock
+        self._bucket = TokenBucket(rate, 1.0, clock())
+        self._cursor = 0
+        self._task = None
+
+    def start(self) -> None:
+        """Start sweeping in rounds"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop sweeping; the cursor of the last written batch is kept"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+                delay = self.interval
+            except Exception as e:
+                logger.warning("Subscription sweep failed: %s", e)
+                delay = min(self.interval, RETRY_DELAY)
+            await asyncio.sleep(delay)
+
+    async def sweep(self) -> int:
+        """
+        Run one round, resuming the paginated pass from the persisted cursor
+
+        Returns:
+            int: Number of users checked
+        """
+        checked = await self._sweep_active()
+        count = len(checked)
+
+        cursor = self._load_cursor()
+        while True:
+            rows = await (
+                User.filter(is_active=True, id__gt=cursor)
+                .order_by("id")
+                .limit(self.batch_size)
+                .values_list("id", "telegram_id")
+            )
+            if not rows:
+                break
+            pending = [row for row in rows if row[1] not in checked]
+            if pending:
+                await self._check_batch(pending)
+                count += len(pending)
+            cursor = rows[-1][0]
+            self._save_cursor(cursor)
+
+        # Round complete; the next one starts from the beginning
+        self._save_cursor(0)
+        return count
+
+    async def _sweep_active(self) -> set:
+        """Check users seen within the active window, most recent first"""
+        since = time.time() - self.active_window
+        checked = set()
+        before = None
+        while True:
+            try:
+                if before is None:
+                    self.store.forget_inactive(since)
+                page = self.store.active_since(since, before, self.batch_size)
+            except Exception as e:
+                logger.warning("Reading recently active users failed: %s", e)
+                return checked
+            if not page:
+                return checked
+            telegram_ids = [telegram_id for telegram_id, _ in page]
+            rows = await User.filter(telegram_id__in=telegram_ids, is_active=True).values_list("id", "telegram_id")
+            if rows:
+                await self._check_batch(rows)
+            checked.update(telegram_ids)
+            # Users seen at exactly this time on the next page are left to
+            # the paginated pass
+            before = page[-1][1]
+
+    def _load_cursor(self) -> int:
+        try:
+            value = self.client.get(CURSOR_KEY)
+            self._cursor = int(value) if value else 0
+        except Exception as e:
+            # Keep the in-process cursor while Redis is unavailable
+            logger.warning("Reading the sweeper cursor failed: %s", e)
+        return self._cursor
+
+    def _save_cursor(self, cursor) -> None:
+        self._cursor = cursor
+        SWEEP_CURSOR.set(cursor)
+        try:
+            self.client.set(CURSOR_KEY, cursor)
+        except Exception as e:
+            logger.warning("Saving the sweeper cursor failed: %s", e)
+
+    async def _take(self) -> None:
+        while True:
+            delay = self._bucket.delay(self._clock())
+            if delay <= 0:
+                self._bucket.take()
+                return
+            await asyncio.sleep(delay)
+
+    async def _is_member(self, telegram_id, channel):
+        await self._take()
+        try:
+            chat_member = await self.bot.get_chat_member(chat_id=channel.channel_id, user_id=telegram_id)
+        except Exception as e:
+            logger.debug("Checking user %s in channel %s failed: %s", telegram_id, channel.channel_id, e)
+            # Probes the channel; the user is checked again in the next round
+            await channel_health.report_error(channel, e)
+            return None
+        return chat_member.status in MEMBER_STATUSES
+
+    async def _memberships(self, telegram_id, channels):
+        memberships = {}
+        for channel in channels:
+            is_member = await self._is_member(telegram_id, channel)
+            if is_member is None:
+                return None
+            memberships[channel.id] = is_member
+        return memberships
+
+    async def _check_batch(self, rows) -> None:
+        """
+        Check a batch of users and write the results back in bulk
+
+        Args:
+            rows (list): (primary key, Telegram ID) pairs
+        """
+        channels = channel_health.healthy(await Channel.filter(is_active=True))
+        polled = [channel for channel in channels if not channel.join_requests]
+        gated = [channel.id for channel in channels if channel.join_requests]
+        results = await asyncio.gather(*(self._memberships(telegram_id, polled) for _, telegram_id in rows))
+
+        checked = [(pk, telegram_id, memberships) for (pk, telegram_id), memberships in zip(rows, results)
+                   if memberships is not None]
+        failed = len(rows) - len(checked)
+        if failed:
+            SWEEP_USERS.inc("failed", amount=failed)
+        if not checked:
+            return
+
+        if gated:
+            joined = set(await UserSubscription.filter(
+                user_id__in=[pk for pk, _, _ in checked], channel_id__in=gated, is_subscribed=True
+            ).values_list("user_id", "channel_id"))
+            for pk, _, memberships in checked:
+                memberships.update((channel_id, (pk, channel_id) in joined) for channel_id in gated)
+
+        subscribed = [(pk, telegram_id) for pk, telegram_id, memberships in checked if all(memberships.values())]
+        unsubscribed = [(pk, telegram_id) for pk, telegram_id, memberships in checked if not all(memberships.values())]
+        SWEEP_USERS.inc("subscribed", amount=len(subscribed))
+        SWEEP_USERS.inc("unsubscribed", amount=len(unsubscribed))
+
+        if subscribed:
+            await User.filter(id__in=[pk for pk, _ in subscribed]).update(subscription_status=True)
+        if unsubscribed:
+            await User.filter(id__in=[pk for pk, _ in unsubscribed]).update(subscription_status=False)
+        await self._write_subscriptions(checked, polled)
+
+        if self.verified_ttl > 0:
+            try:
+                self.store.record_verifications(
+                    [telegram_id for _, telegram_id in subscribed],
+                    [telegram_id for _, telegram_id in unsubscribed],
+                    time.time() + self.verified_ttl
+                )
+            except Exception as e:
+                logger.warning("Writing verification markers failed: %s", e)
+
+    @staticmethod
+    async def _write_subscriptions(checked, channels) -> None:
+        pks = [pk for pk, _, _ in checked]
+        existing = set(await UserSubscription.filter(
+            user_id__in=pks, channel_id__in=[channel.id for channel in channels]
+        ).values_list("user_id", "channel_id"))
+
+        missing = []
+        for channel in channels:
+            members = [pk for pk, _, memberships in checked if memberships[channel.id]]
+            others = [pk for pk, _, memberships in checked if not memberships[channel.id]]
+            if members:
+                await UserSubscription.filter(user_id__in=members, channel_id=channel.id).update(is_subscribed=True)
+            if others:
+                await UserSubscription.filter(user_id__in=others, channel_id=channel.id).update(is_subscribed=False)
+            missing.extend(
+                UserSubscription(user_id=pk, channel_id=channel.id, is_subscribed=memberships[channel.id])
+                for pk, _, memberships in checked if (pk, channel.id) not in existing
+            )
+        if missing:
+            # Rows created meanwhile by a subscription check or a join request
+            # are newer than this batch's results and are kept
+            await UserSubscription.bulk_create(missing, ignore_conflicts=True)
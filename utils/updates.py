@@ -0,0 +1,114 @@
+"""
+Concurrent update processing with per-user ordering
+
+python-telegram-bot processes one update at a time unless the Application
+gets an update processor, so one user's video encode holds up every other
+user's /start. UserOrderedUpdateProcessor runs updates of different users in
+parallel while updates of the same user (or, without a user, the same chat)
+run one after another in arrival order, so a user's button press never
+overtakes the video it belongs to.
+
+Updates first wait for the user's earlier updates and only then for one of
+``max_running`` handler slots, so a user flooding the bot queues behind
+themselves instead of occupying slots other users need.
+"""
+import asyncio
+
+from telegram.ext import BaseUpdateProcessor
+
+from utils.metrics import (
+    UPDATES_RUNNING, UPDATES_WAITING, UPDATE_USER_WAIT_SECONDS, UPDATE_SLOT_WAIT_SECONDS, UPDATE_USER_CONTENDED
+)
+
+
+def update_key(update):
+    """
+    Key under which updates are serialized
+
+    Args:
+        update (object): Update from the update queue
+
+    Returns:
+        int: User id, or chat id for updates without a user; None for
+        updates that need no ordering
+    """
+    user = getattr(update, "effective_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(update, "effective_chat", None)
+    return chat.id if chat is not None else None
+
+
+class _UserQueue:
+    """Lock of one user and the number of updates holding or awaiting it"""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Process updates of different users concurrently, each user's in order
+
+    Args:
+        max_running (int): Updates processed at once across all users
+        max_pending (int): Updates accepted at once, running or waiting;
+            further updates stay in PTB's update queue
+    """
+
+    def __init__(self, max_running=16, max_pending=256):
+        super().__init__(max_pending)
+        self.max_running = max_running
+        self._slots = asyncio.Semaphore(max_running)
+        self._queues = {}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_process_update(self, update, coroutine) -> None:
+        key = update_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _UserQueue()
+        queue.users += 1
+        try:
+            if queue.lock.locked():
+                UPDATE_USER_CONTENDED.inc()
+            UPDATES_WAITING.inc()
+            try:
+                with UPDATE_USER_WAIT_SECONDS.time():
+                    await queue.lock.acquire()
+            finally:
+                UPDATES_WAITING.dec()
+            try:
+                await self._run(coroutine)
+            finally:
+                queue.lock.release()
+        finally:
+            queue.users -= 1
+            if queue.users == 0:
+                del self._queues[key]
+
+    async def _run(self, coroutine) -> None:
+        UPDATES_WAITING.inc()
+        try:
+            with UPDATE_SLOT_WAIT_SECONDS.time():
+                await self._slots.acquire()
+        finally:
+            UPDATES_WAITING.dec()
+        UPDATES_RUNNING.inc()
+        try:
+            await coroutine
+        finally:
+            UPDATES_RUNNING.dec()
+            self._slots.release()
@@ -0,0 +1,187 @@
+"""
+Media upload manager for the Telegram bot
+
+Encoded video notes are uploaded through a Bot instance bound to the media
+connection pool (see ``utils.request_pools``), so multipart uploads never
+hold the connections that ``reply_text`` and ``answer`` calls need. Files are
+streamed from disk in chunks instead of being read into memory, and the
+number of uploads and bytes in flight is bounded: callers wait for capacity
+instead of piling more data onto a saturated link. Transient failures are
+retried with backoff, re-opening the file for every attempt.
+
+Once a file has been uploaded, later sends (moderation, publishing) reuse its
+``file_id`` and do not go through this manager.
+"""
+import asyncio
+import logging
+import os
+import random
+
+from telegram import InputFile
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+from telegram.ext import ExtBot
+
+from utils.metrics import UPLOADS_IN_FLIGHT, UPLOAD_BYTES_IN_FLIGHT, UPLOAD_RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+class ByteBudget:
+    """
+    Bound the number of bytes in flight
+
+    A single request larger than the limit is admitted alone, so oversized
+    files are slowed down but never deadlock.
+
+    Args:
+        limit (int): Maximum bytes in flight
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, size) -> int:
+        """
+        Wait until ``size`` bytes fit into the budget
+
+        Args:
+            size (int): Bytes to reserve
+
+        Returns:
+            int: Bytes actually reserved; pass to release()
+        """
+        size = min(size, self.limit)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.used + size <= self.limit)
+            self.used += size
+        return size
+
+    async def release(self, size) -> None:
+        """
+        Return reserved bytes to the budget
+
+        Args:
+            size (int): Value returned by acquire()
+        """
+        async with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+
+class UploadManager:
+    """
+    Upload local media files through the media connection pool
+
+    Args:
+        token (str): Bot token
+        request (telegram.request.BaseRequest): Media pool request; its
+            timeouts apply to the uploads
+        max_concurrent (int): Uploads running at the same time
+        max_inflight_bytes (int): Bytes of all running uploads together
+        attempts (int): Attempts per upload, including the first one
+        initial_backoff (float): Delay before the first retry in seconds
+        rate_limiter (telegram.ext.BaseRateLimiter, optional): Limiter shared
+            with the main bot, so uploads count against the same limits
+    """
+
+    def __init__(self, token, request, max_concurrent=4, max_inflight_bytes=64 * 1024 * 1024,
+                 attempts=3, initial_backoff=1.0, rate_limiter=None):
+        self.attempts = attempts
+        self.initial_backoff = initial_backoff
+        self.bot = ExtBot(token, request=request, rate_limiter=rate_limiter)
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._budget = ByteBudget(max_inflight_bytes)
+
+    async def start(self) -> None:
+        """Initialize the media bot"""
+        await self.bot.initialize()
+
+    async def shutdown(self) -> None:
+        """Shut down the media bot"""
+        await self.bot.shutdown()
+
+    async def send_video_note(self, chat_id, path, **kwargs):
+        """
+        Upload a video note from a local file
+
+        Args:
+            chat_id (int): Target chat
+            path (str): Path of the encoded video note
+            **kwargs: Extra arguments for Bot.send_video_note
+
+        Returns:
+            telegram.Message: Sent message
+        """
+        return await self._upload(self.bot.send_video_note, "video_note", chat_id, path, **kwargs)
+
+    async def send_photo(self, chat_id, path, **kwargs):
+        """
+        Upload a photo from a local file
+
+        Args:
+            chat_id (int): Target chat
+            path (str): Path of the image
+            **kwargs: Extra arguments for Bot.send_photo
+
+        Returns:
+            telegram.Message: Sent message
+        """
+        return await self._upload(self.bot.send_photo, "photo", chat_id, path, **kwargs)
+
+    async def _upload(self, send, field_name, chat_id, path, **kwargs):
+        """
+        Run one upload with concurrency and byte limits and retries
+
+        Args:
+            send (callable): Bot method to call
+            field_name (str): Name of the media argument of ``send``
+            chat_id (int): Target chat
+            path (str): Local file to upload
+            **kwargs: Extra arguments for ``send``
+
+        Returns:
+            telegram.Message: Sent message
+        """
+        size = os.path.getsize(path)
+
+        async with self._slots:
+            reserved = await self._budget.acquire(size)
+            UPLOADS_IN_FLIGHT.inc()
+            UPLOAD_BYTES_IN_FLIGHT.inc(amount=size)
+            try:
+                return await self._send_with_retries(send, field_name, chat_id, path, **kwargs)
+            finally:
+                UPLOADS_IN_FLIGHT.dec()
+                UPLOAD_BYTES_IN_FLIGHT.dec(amount=size)
+                await self._budget.release(reserved)
+
+    async def _send_with_retries(self, send, field_name, chat_id, path, **kwargs):
+        delay = self.initial_backoff
+
+        for attempt in range(1, self.attempts + 1):
+            try:
+                with open(path, "rb") as f:
+                    # read_file_handle=False lets httpx stream the file in chunks
+                    media = InputFile(f, filename=os.path.basename(path), read_file_handle=False)
+                    return await send(chat_id=chat_id, **{field_name: media}, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.attempts:
+                    raise
+                wait = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                logger.warning("Upload to %s throttled, retrying in %ss", chat_id, wait)
+                UPLOAD_RETRIES.inc("retry_after")
+                await asyncio.sleep(wait)
+            except (BadRequest, Forbidden):
+                # Permanent errors; BadRequest is a NetworkError subclass
+                raise
+            except (TimedOut, NetworkError) as e:
+                if attempt == self.attempts:
+                    raise
+                sleep_for = delay * (1 + random.random() * 0.2)
+                logger.warning("Upload to %s failed (%s), attempt %s of %s, retrying in %.1fs",
+                               chat_id, e, attempt, self.attempts, sleep_for)
+                UPLOAD_RETRIES.inc(type(e).__name__)
+                await asyncio.sleep(sleep_for)
+                delay *= 2